@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Wspólna pętla tury Google ADK dla wszystkich agentów
+Jeden runner na agenta, jedna sesja ADK na połączenie (WebSocket lub terminal)
+Importy ADK są leniwe - ramki odpowiedzi używa też agent bez ADK
+"""
+
+import uuid
+import logging
+from typing import Any, AsyncIterator, Dict, Hashable, Optional, Tuple
+
+from agent_metrics import track_turn
+from agent_tracing import TURN_SPAN, span
+from ws_gateway import protocol_frame
+
+logger = logging.getLogger(__name__)
+
+# Połączenie bez WebSocketu (tryb testowy w terminalu)
+CLI_CONNECTION = "cli"
+
+
+class ADKTurnRunner:
+    """Runner ADK współdzielony między połączeniami, z sesją per połączenie"""
+
+    def __init__(self, agent=None, app_name: str = "BusinessAgent", runner=None):
+        # Runner tworzony raz - koszt setupu nie wchodzi w żadną turę
+        if runner is None:
+            from google.adk.runners import InMemoryRunner
+            runner = InMemoryRunner(agent=agent, app_name=app_name)
+        self.runner = runner
+        self.app_name = app_name
+        self.session_service = self.runner.session_service
+        self._bindings: Dict[Hashable, Dict[str, str]] = {}
+
+    def bind(self, connection: Hashable, session_id: Optional[str] = None,
+             user_id: Optional[str] = None) -> Dict[str, str]:
+        """Zwraca (lub tworzy) powiązanie połączenia z sesją ADK"""
+        binding = self._bindings.get(connection)
+        if binding is None:
+            binding = self._bindings[connection] = {
+                "session_id": session_id or f"session_{uuid.uuid4().hex}",
+                "user_id": user_id or "default_user",
+            }
+        return binding
+
+    async def release(self, connection: Hashable, binding: Optional[Dict[str, str]] = None):
+        """
+        Zamyka sesję połączenia (rozłączenie klienta)
+
+        binding - powiązanie trzymane przez agenta poza runnerem (websocket_sessions)
+        """
+        binding = self._bindings.pop(connection, None) or binding
+        if binding:
+            try:
+                await self.session_service.delete_session(
+                    app_name=self.app_name,
+                    user_id=binding["user_id"],
+                    session_id=binding["session_id"]
+                )
+            except Exception as e:
+                logger.debug("Nie można usunąć sesji %s: %s", binding["session_id"], e)
+
+    async def ensure_session(self, user_id: str, session_id: str):
+        """Pobiera sesję ADK albo tworzy ją przy pierwszej turze"""
+        session = await self.session_service.get_session(
+            app_name=self.app_name,
+            user_id=user_id,
+            session_id=session_id
+        )
+        if session is None:
+            session = await self.session_service.create_session(
+                app_name=self.app_name,
+                user_id=user_id,
+                session_id=session_id
+            )
+            logger.info("💾 Utworzono sesję %s", session_id)
+        return session
+
+    async def run_events(self, text: str, user_id: str, session_id: str) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+        """
+        Jedna tura: runner.run_async() z nową wiadomością użytkownika
+
+        Sesja musi istnieć (patrz ensure_session).
+
+        Yields:
+            Para (event, tekst pierwszej części eventu lub None)
+        """
+        from google.genai import types
+        from google.adk.agents.run_config import RunConfig
+
+        user_message = types.Content(role='user', parts=[types.Part(text=text)])
+        run_config = RunConfig(response_modalities=["TEXT"])
+
+        async for event in self.runner.run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=user_message,
+            run_config=run_config
+        ):
+            event_text = None
+            if event.content and event.content.parts:
+                event_text = event.content.parts[0].text
+            yield event, event_text
+
+    async def record_exchange(self, user_id: str, session_id: str, text: str, response: str):
+        """Dopisuje do sesji pytanie i odpowiedź spoza runnera (np. z cache) - historia pozostaje spójna"""
+        from google.genai import types
+        from google.adk.events import Event
+
+        session = await self.ensure_session(user_id, session_id)
+        invocation_id = f"e-{uuid.uuid4()}"
+        for author, role, content in (("user", "user", text), (self.runner.agent.name, "model", response)):
+            await self.session_service.append_event(session, Event(
+                invocation_id=invocation_id,
+                author=author,
+                content=types.Content(role=role, parts=[types.Part(text=content)])
+            ))
+
+    async def ask(self, text: str, connection: Hashable = CLI_CONNECTION, websocket=None) -> str:
+        """
+        Tura dla połączenia - zwraca końcową odpowiedź
+
+        Gdy podano websocket, teksty pośrednie i końcowa odpowiedź idą tą samą
+        ścieżką co w GoogleADKBusinessAgent (response_chunk + response_complete).
+        """
+        binding = self.bind(connection)
+        with track_turn(self.app_name), \
+                span(TURN_SPAN, **{"session.id": binding["session_id"], "user.id": binding["user_id"],
+                                   "message.chars": len(text)}):
+            await self.ensure_session(binding["user_id"], binding["session_id"])
+
+            final_text = None
+            last_text = None
+            async for event, event_text in self.run_events(text, binding["user_id"], binding["session_id"]):
+                if not event_text:
+                    continue
+                last_text = event_text
+                if event.is_final_response():
+                    final_text = event_text
+                elif websocket is not None:
+                    # Teksty pośrednie (np. zapowiedź wywołania narzędzia) od razu do klienta
+                    await send_response_chunk(websocket, event_text, partial=True)
+
+            final_text = final_text or last_text or "Agent otrzymał wiadomość, ale nie wygenerował odpowiedzi."
+            if websocket is not None:
+                await send_response_chunk(websocket, final_text)
+                await send_response_complete(websocket)
+            return final_text
+
+
+async def send_response_chunk(websocket, content: str, partial: bool = False):
+    """Ramka z fragmentem odpowiedzi agenta"""
+    fields: Dict[str, Any] = {"content": content}
+    if partial:
+        fields["partial"] = True
+    await websocket.send(protocol_frame("response_chunk", **fields))
+
+
+async def send_response_complete(websocket):
+    """Ramka kończąca odpowiedź agenta"""
+    await websocket.send(protocol_frame("response_complete"))
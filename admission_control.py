@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Kontrola dopuszczenia tur agenta i limity upstreamów Google
+Globalny limit współbieżnych tur, token bucket per użytkownik, uczciwa kolejka FIFO
+oraz osobne limity współbieżności dla Gmail, Calendar, Drive i TTS
+"""
+
+import os
+import time
+import asyncio
+import logging
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Domyślne limity współbieżnych wywołań per upstream (nadpisywane przez UPSTREAM_<NAZWA>_CONCURRENCY)
+UPSTREAM_LIMITS = {
+    "gmail": 4,
+    "calendar": 4,
+    "drive": 4,
+    "docs": 4,
+    "tts": 2,
+}
+
+# Co ile sekund usuwać pełne (bezczynne) buckety - klucze anonimowych klientów to id sesji
+BUCKET_SWEEP_INTERVAL = 60.0
+
+QueueNotifier = Callable[[int], Awaitable[Any]]
+
+
+class AdmissionRejected(Exception):
+    """Tura odrzucona - limit użytkownika lub przeciążenie"""
+
+    def __init__(self, reason: str, retry_after: float = 0.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Klasyczny token bucket: `rate` tokenów na sekundę, maksymalnie `capacity`"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """Pobiera token; zwraca 0 przy sukcesie albo liczbę sekund do kolejnego tokenu"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """Zwraca token tury, która nie została wykonana (odrzucona w kolejce)"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def is_full(self, now: float) -> bool:
+        """Bucket po uzupełnieniu jest pełny - nie różni się od nowego i można go usunąć"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class AdmissionController:
+    """Dopuszcza tury agenta: limit globalny + bucket per użytkownik + kolejka FIFO"""
+
+    def __init__(self,
+                 max_concurrent_turns: Optional[int] = None,
+                 user_turns_per_minute: Optional[float] = None,
+                 user_burst: Optional[int] = None,
+                 max_queue: Optional[int] = None,
+                 max_queued_per_user: Optional[int] = None,
+                 queue_timeout: Optional[float] = None):
+        self.max_concurrent_turns = max_concurrent_turns or int(os.getenv("AGENT_MAX_CONCURRENT_TURNS", "8"))
+        self.user_rate = (user_turns_per_minute or float(os.getenv("AGENT_USER_TURNS_PER_MINUTE", "20"))) / 60.0
+        self.user_burst = user_burst or int(os.getenv("AGENT_USER_BURST", "5"))
+        self.max_queue = max_queue or int(os.getenv("AGENT_MAX_QUEUE", "100"))
+        self.max_queued_per_user = max_queued_per_user or int(os.getenv("AGENT_MAX_QUEUED_PER_USER", "2"))
+        self.queue_timeout = queue_timeout or float(os.getenv("AGENT_QUEUE_TIMEOUT", "60"))
+
+        self.active = 0
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._buckets_swept = time.monotonic()
+        # Kolejka oczekujących: (future, user_id, notifier)
+        self._waiters: deque = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        now = time.monotonic()
+        if now - self._buckets_swept >= BUCKET_SWEEP_INTERVAL:
+            self._buckets_swept = now
+            for key in [key for key, bucket in self._buckets.items() if bucket.is_full(now)]:
+                del self._buckets[key]
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def _notify_positions(self):
+        """Wysyła aktualne pozycje w kolejce (bez blokowania zwalniającego)"""
+        for position, (future, _user_id, notifier) in enumerate(self._waiters, start=1):
+            if notifier and not future.done():
+                asyncio.ensure_future(self._safe_notify(notifier, position))
+
+    @staticmethod
+    async def _safe_notify(notifier: QueueNotifier, position: int):
+        try:
+            await notifier(position)
+        except Exception as e:
+            logger.debug("Nie można wysłać pozycji w kolejce: %s", e)
+
+    async def _acquire(self, user_id: str, notifier: Optional[QueueNotifier]):
+        bucket = self._bucket(user_id)
+        retry_after = bucket.try_acquire()
+        if retry_after:
+            raise AdmissionRejected("rate_limited", retry_after)
+        try:
+            await self._acquire_slot(user_id, notifier)
+        except (AdmissionRejected, asyncio.CancelledError):
+            # Tura się nie odbyła - nie zużywa limitu użytkownika
+            bucket.refund()
+            raise
+
+    async def _acquire_slot(self, user_id: str, notifier: Optional[QueueNotifier]):
+        """Slot tury: od razu albo po oczekiwaniu w kolejce FIFO"""
+        # Wolny slot i nikt nie czeka - wchodzimy od razu (bez wyprzedzania kolejki)
+        if self.active < self.max_concurrent_turns and not self._waiters:
+            self.active += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected("overloaded", self.queue_timeout)
+        if sum(1 for _f, uid, _n in self._waiters if uid == user_id) >= self.max_queued_per_user:
+            raise AdmissionRejected("too_many_queued", 1.0)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, user_id, notifier)
+        self._waiters.append(entry)
+        if notifier:
+            await self._safe_notify(notifier, len(self._waiters))
+
+        try:
+            # Slot jest przekazywany przez _release (active nie spada między turami)
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done():
+                return
+            self._waiters.remove(entry)
+            self._notify_positions()
+            raise AdmissionRejected("queue_timeout", self.queue_timeout)
+        except asyncio.CancelledError:
+            if future.done():
+                self._release()
+            else:
+                self._waiters.remove(entry)
+                self._notify_positions()
+            raise
+
+    def _release(self):
+        while self._waiters:
+            future, _user_id, _notifier = self._waiters.popleft()
+            if not future.done():
+                # Przekazanie slotu następnemu w kolejce
+                future.set_result(None)
+                self._notify_positions()
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, on_queued: Optional[QueueNotifier] = None):
+        """
+        Kontekst jednej tury agenta
+
+        Args:
+            user_id: Klucz limitu per użytkownik
+            on_queued: Wywoływane z pozycją w kolejce, gdy tura czeka na slot
+
+        Raises:
+            AdmissionRejected: Limit użytkownika, pełna kolejka lub przekroczony czas oczekiwania
+        """
+        await self._acquire(user_id, on_queued)
+        try:
+            yield
+        finally:
+            self._release()
+
+
+# Semafory upstreamów tworzone leniwie per event loop (tryb testowy uruchamia kilka pętli)
+_upstream_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def upstream_limit(upstream: str) -> int:
+    default = UPSTREAM_LIMITS.get(upstream, 4)
+    return int(os.getenv(f"UPSTREAM_{upstream.upper()}_CONCURRENCY", str(default)))
+
+
+def upstream_slot(upstream: str) -> asyncio.Semaphore:
+    """Semafor ograniczający współbieżne wywołania danego upstreamu (gmail/calendar/drive/docs/tts)"""
+    loop = asyncio.get_running_loop()
+    semaphores = _upstream_semaphores.setdefault(loop, {})
+    semaphore = semaphores.get(upstream)
+    if semaphore is None:
+        semaphore = semaphores[upstream] = asyncio.Semaphore(upstream_limit(upstream))
+    return semaphore
+
+
+async def execute_with_limit(upstream: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Wykonuje blokujące wywołanie Google API w wątku, w ramach limitu upstreamu"""
+    async with upstream_slot(upstream):
+        return await asyncio.to_thread(func, *args, **kwargs)
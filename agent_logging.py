@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Warstwa logowania dla Google ADK Business Agent
+Leniwe formatowanie, sampling logów per-event i nieblokujący handler oparty o kolejkę
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import itertools
+import logging.handlers
+from typing import Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Formatter zapisujący rekordy jako jedną linię JSON (LOG_JSON=1)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        # Pola strukturalne przekazane przez extra={"fields": {...}}
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: Optional[str] = None) -> None:
+    """
+    Konfiguruje logowanie procesu (idempotentnie)
+
+    Wszystkie loggery piszą do QueueHandler, a wyjście na konsolę obsługuje
+    QueueListener w osobnym wątku - event loop nigdy nie czeka na I/O logów.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+
+    console = logging.StreamHandler()
+    if os.getenv("LOG_JSON", "").lower() in ("1", "true", "yes"):
+        console.setFormatter(JsonLogFormatter())
+    else:
+        console.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, console, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class EventLogSampler:
+    """Przepuszcza co N-ty log per-event, żeby gorąca pętla nie zalewała logów"""
+
+    def __init__(self, every_n: Optional[int] = None):
+        self.every_n = max(1, int(every_n or os.getenv("LOG_EVENT_SAMPLE_EVERY", "20")))
+        self._counter = itertools.count()
+
+    def should_log(self, logger: logging.Logger, level: int = logging.DEBUG) -> bool:
+        """True gdy poziom jest włączony i ten event wypada w próbce"""
+        if not logger.isEnabledFor(level):
+            return False
+        return next(self._counter) % self.every_n == 0
+
+
+class TurnLogSummary:
+    """Zbiera statystyki jednej tury i emituje je jednym wpisem na koniec"""
+
+    __slots__ = ("session_id", "started", "events", "text_events", "response_chars", "status")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.started = time.perf_counter()
+        self.events = 0
+        self.text_events = 0
+        self.response_chars = 0
+        self.status = "ok"
+
+    def record_event(self, text: Optional[str] = None) -> None:
+        self.events += 1
+        if text:
+            self.text_events += 1
+            self.response_chars += len(text)
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def emit(self, logger: logging.Logger) -> None:
+        """Jeden wpis INFO na turę - koszt niezależny od rozmiaru sesji"""
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        logger.info(
+            "📊 Tura %s: status=%s eventy=%d tekstowe=%d znaki=%d czas=%.0fms",
+            self.session_id, self.status, self.events, self.text_events,
+            self.response_chars, self.elapsed_ms,
+            extra={"fields": {
+                "session_id": self.session_id,
+                "status": self.status,
+                "events": self.events,
+                "response_chars": self.response_chars,
+                "elapsed_ms": round(self.elapsed_ms, 1),
+            }}
+        )
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Metryki Prometheus dla session_api i serwera agenta (opcjonalne prometheus_client)
+Histogramy latencji tras HTTP i tur, liczniki narzędzi, trafień cache, tokenów
+i znaków TTS, gauge połączeń i tur w toku. Agent wystawia /metrics przez
+lekki listener HTTP w osobnym wątku (AGENT_METRICS_PORT, + indeks workera).
+
+Bez prometheus_client wszystkie metryki są no-op.
+"""
+
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest, start_http_server
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("AGENT_METRICS_PORT", "9464"))  # 0 = bez listenera
+METRICS_HOST = os.getenv("AGENT_METRICS_HOST", "0.0.0.0")
+
+# Tury i wywołania modelu trwają sekundy, trasy API - milisekundy
+TURN_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60, 120)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+if PROMETHEUS_AVAILABLE:
+    HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Latencja żądań HTTP per trasa",
+                                     ["method", "route", "status"], buckets=HTTP_BUCKETS)
+    TURN_SECONDS = Histogram("agent_turn_duration_seconds", "Czas pełnej tury agenta",
+                             ["agent", "status"], buckets=TURN_BUCKETS)
+    TOOL_CALLS = Counter("agent_tool_calls_total", "Wywołania narzędzi", ["tool", "outcome"])
+    CACHE_EVENTS = Counter("agent_cache_events_total", "Trafienia i chybienia cache", ["cache", "result"])
+    TOKENS = Counter("agent_llm_tokens_total", "Tokeny modelu", ["model", "kind"])
+    TOOL_RESULT_CHARS = Counter("agent_tool_result_chars_total", "Rozmiar wyników narzędzi przed i po skróceniu",
+                                ["tool", "stage"])
+    INTENT_ROUTES = Counter("agent_intent_routes_total", "Wiadomości wg intencji routera (llm = przekazane do modelu)",
+                            ["intent"])
+    TTS_CHARACTERS = Counter("agent_tts_characters_total", "Znaki wysłane do syntezy mowy", ["provider"])
+    CONNECTED_CLIENTS = Gauge("agent_connected_clients", "Otwarte połączenia WebSocket", ["agent"])
+    TURNS_IN_FLIGHT = Gauge("agent_turns_in_flight", "Tury w trakcie przetwarzania", ["agent"])
+else:
+    HTTP_REQUEST_SECONDS = TURN_SECONDS = TOOL_CALLS = CACHE_EVENTS = TOKENS = TOOL_RESULT_CHARS = \
+        INTENT_ROUTES = TTS_CHARACTERS = CONNECTED_CLIENTS = TURNS_IN_FLIGHT = _NoopMetric()
+
+_server_started = False
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[int]:
+    """Listener /metrics w wątku (idempotentnie); workery dostają port bazowy + indeks"""
+    global _server_started
+    if _server_started:
+        return None
+    port = METRICS_PORT if port is None else port
+    if not PROMETHEUS_AVAILABLE or not port:
+        return None
+    port += int(os.getenv("AGENT_WORKER_INDEX", "0"))
+    try:
+        start_http_server(port, addr=METRICS_HOST)
+    except OSError as e:
+        logger.warning("⚠️ Nie można uruchomić /metrics na porcie %d: %s", port, e)
+        return None
+    _server_started = True
+    logger.info("📈 Metryki Prometheus na http://%s:%d/metrics", METRICS_HOST, port)
+    return port
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Treść i content-type dla endpointu /metrics"""
+    if not PROMETHEUS_AVAILABLE:
+        return b"# prometheus_client nie jest zainstalowany\n", CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+@contextmanager
+def track_turn(agent: str) -> Iterator[Dict[str, str]]:
+    """Tura w toku + histogram czasu; status ustawiany przez wywołującego (turn["status"])"""
+    turn = {"status": "ok"}
+    TURNS_IN_FLIGHT.labels(agent).inc()
+    started = time.perf_counter()
+    try:
+        yield turn
+    except BaseException:
+        turn["status"] = "error"
+        raise
+    finally:
+        TURNS_IN_FLIGHT.labels(agent).dec()
+        TURN_SECONDS.labels(agent, turn["status"]).observe(time.perf_counter() - started)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_EVENTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def tool_call_callback(tool, args, tool_context, tool_response):
+    """after_tool_callback ADK: licznik wywołań z wynikiem ok/error"""
+    failed = isinstance(tool_response, dict) and tool_response.get("success") is False
+    TOOL_CALLS.labels(tool.name, "error" if failed else "ok").inc()
+    return None
+
+
+def model_usage_callback(callback_context, llm_response):
+    """after_model_callback ADK: tokeny z usage_metadata (pomija fragmenty strumienia)"""
+    usage = getattr(llm_response, "usage_metadata", None)
+    if usage is None or getattr(llm_response, "partial", False):
+        return None
+    model = getattr(llm_response, "model_version", None) or "unknown"
+    TOKENS.labels(model, "prompt").inc(getattr(usage, "prompt_token_count", None) or 0)
+    TOKENS.labels(model, "output").inc(getattr(usage, "candidates_token_count", None) or 0)
+    return None
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Śledzenie tur agenta spanami OpenTelemetry (opcjonalne)
+Tura, wywołania modelu i narzędzi (callbacki ADK), TTS, operacje bazy i zapisy
+analityki trafiają do pliku OTLP/JSON (jedna linia = jeden eksport), z którego
+session_api buduje waterfall tury dla dashboardu.
+
+Włączenie: AGENT_TRACING=1 (wymaga opentelemetry-sdk); plik: AGENT_TRACE_FILE.
+Bez SDK lub z wyłączonym śledzeniem wszystkie funkcje są no-op.
+"""
+
+import os
+import json
+import time
+import logging
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+    from opentelemetry.trace import Status, StatusCode
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+    SpanExporter = object
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("AGENT_TRACING", "0").lower() in ("1", "true", "yes")
+TRACE_FILE = os.getenv("AGENT_TRACE_FILE", "agent_traces.jsonl")
+TRACE_FILE_MAX_MB = float(os.getenv("AGENT_TRACE_FILE_MAX_MB", "50"))
+
+TURN_SPAN = "agent.turn"
+# Spany otwarte w callbacku "before" bez pary "after" (błąd narzędzia, przerwana tura)
+_ORPHAN_SECONDS = 300
+
+_tracer = None
+_setup_lock = threading.Lock()
+
+
+# === Eksport OTLP/JSON do pliku ===
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in (attributes or {}).items()]
+
+
+class OtlpJsonFileExporter(SpanExporter):
+    """Eksporter zapisujący ExportTraceServiceRequest (OTLP/JSON) jako linie pliku"""
+
+    def __init__(self, path: str = TRACE_FILE, max_mb: float = TRACE_FILE_MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+
+    def _encode(self, spans: Sequence[Any]) -> Dict[str, Any]:
+        by_resource: Dict[int, Tuple[Any, Dict[str, List[Dict[str, Any]]]]] = {}
+        for span in spans:
+            resource, scopes = by_resource.setdefault(id(span.resource), (span.resource, {}))
+            scope = getattr(span, "instrumentation_scope", None) or getattr(span, "instrumentation_info", None)
+            parent = span.parent
+            scopes.setdefault(scope.name if scope else "", []).append({
+                "traceId": format(span.context.trace_id, "032x"),
+                "spanId": format(span.context.span_id, "016x"),
+                "parentSpanId": format(parent.span_id, "016x") if parent else "",
+                "name": span.name,
+                "kind": span.kind.value + 1,  # OTLP: 1 = INTERNAL
+                "startTimeUnixNano": str(span.start_time),
+                "endTimeUnixNano": str(span.end_time),
+                "attributes": _otlp_attributes(span.attributes),
+                "status": {"code": span.status.status_code.value, "message": span.status.description or ""},
+            })
+        return {"resourceSpans": [
+            {"resource": {"attributes": _otlp_attributes(resource.attributes)},
+             "scopeSpans": [{"scope": {"name": name}, "spans": encoded} for name, encoded in scopes.items()]}
+            for resource, scopes in by_resource.values()
+        ]}
+
+    def export(self, spans):
+        try:
+            line = json.dumps(self._encode(spans), ensure_ascii=False)
+            with self._lock:
+                # Prosta rotacja: jeden plik archiwalny .1
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            return SpanExportResult.SUCCESS
+        except Exception as e:
+            logger.warning("⚠️ Eksport spanów nie powiódł się: %s", e)
+            return SpanExportResult.FAILURE
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def setup_tracing(service_name: str = "business-agent") -> bool:
+    """Konfiguruje TracerProvider procesu (idempotentnie); False gdy śledzenie wyłączone"""
+    global _tracer
+    if _tracer is not None:
+        return True
+    if not TRACING_ENABLED:
+        return False
+    if not OTEL_AVAILABLE:
+        logger.warning("⚠️ AGENT_TRACING=1, ale brak opentelemetry-sdk - śledzenie wyłączone")
+        return False
+    with _setup_lock:
+        if _tracer is not None:
+            return True
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(OtlpJsonFileExporter(TRACE_FILE)))
+        # Opcjonalnie także do kolektora (OTEL_EXPORTER_OTLP_ENDPOINT)
+        if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            try:
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            except ImportError:
+                logger.warning("⚠️ Brak opentelemetry-exporter-otlp - eksport tylko do pliku")
+        # Globalny provider - spany ADK (call_llm, execute_tool) trafiają do tego samego pliku
+        trace.set_tracer_provider(provider)
+        _tracer = trace.get_tracer("business_agent")
+    logger.info(f"🔭 Śledzenie OpenTelemetry włączone (plik {TRACE_FILE})")
+    return True
+
+
+# === Spany ===
+
+def _clean(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in attributes.items() if value is not None}
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """Span jako bieżący kontekst (no-op bez śledzenia); wyjątek oznacza span jako błąd"""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=_clean(attributes)) as current:
+        yield current
+
+
+def set_attributes(current, **attributes):
+    if current is not None:
+        current.set_attributes(_clean(attributes))
+
+
+def traced(name: str):
+    """Dekorator metod async (operacje bazy, zapisy analityki)"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return await func(*args, **kwargs)
+            with _tracer.start_as_current_span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class AdkSpanCallbacks:
+    """
+    Spany modelu i narzędzi z callbacków ADK (before/after model, before/after tool)
+
+    Span startuje w "before" i kończy się w "after"; równoległe narzędzia
+    rozróżnia function_call_id.
+    """
+
+    def __init__(self):
+        self._open: Dict[Any, Tuple[Any, float]] = {}
+
+    def _start(self, key, name: str, attributes: Dict[str, Any]):
+        now = time.monotonic()
+        for stale_key in [k for k, (_, started) in self._open.items() if now - started > _ORPHAN_SECONDS]:
+            self._finish(stale_key, error="brak callbacku after")
+        self._finish(key, error="brak callbacku after")
+        self._open[key] = (_tracer.start_span(name, attributes=_clean(attributes)), now)
+
+    def _finish(self, key, error: Optional[str] = None, **attributes):
+        entry = self._open.pop(key, None)
+        if entry is None:
+            return
+        current = entry[0]
+        current.set_attributes(_clean(attributes))
+        if error:
+            current.set_status(Status(StatusCode.ERROR, error))
+        current.end()
+
+    def before_model_callback(self, callback_context, llm_request):
+        if _tracer is not None:
+            self._start(("llm", callback_context.invocation_id), "llm.call", {
+                "llm.model": getattr(llm_request, "model", None),
+                "llm.contents": len(llm_request.contents or []),
+                "agent.name": getattr(callback_context, "agent_name", None),
+            })
+        return None
+
+    def after_model_callback(self, callback_context, llm_response):
+        if _tracer is None or getattr(llm_response, "partial", False):
+            return None
+        usage = getattr(llm_response, "usage_metadata", None)
+        parts = (llm_response.content.parts or []) if llm_response.content else []
+        self._finish(
+            ("llm", callback_context.invocation_id),
+            error=getattr(llm_response, "error_message", None) or getattr(llm_response, "error_code", None),
+            **{
+                "llm.prompt_tokens": getattr(usage, "prompt_token_count", None),
+                "llm.output_tokens": getattr(usage, "candidates_token_count", None),
+                "llm.function_calls": sum(1 for part in parts if part.function_call),
+            }
+        )
+        return None
+
+    @staticmethod
+    def _tool_key(tool, args, tool_context):
+        return ("tool", getattr(tool_context, "function_call_id", None) or (tool.name, id(args)))
+
+    def before_tool_callback(self, tool, args, tool_context):
+        if _tracer is not None:
+            self._start(self._tool_key(tool, args, tool_context), f"tool.{tool.name}", {
+                "tool.name": tool.name,
+                "tool.args": len(args or {}),
+            })
+        return None
+
+    def after_tool_callback(self, tool, args, tool_context, tool_response):
+        if _tracer is None:
+            return None
+        failed = isinstance(tool_response, dict) and tool_response.get("success") is False
+        self._finish(self._tool_key(tool, args, tool_context),
+                     error=str(tool_response.get("error", "success=False")) if failed else None)
+        return None
+
+
+# === Odczyt pliku - waterfall dla dashboardu ===
+
+def _plain_value(value: Dict[str, Any]) -> Any:
+    if "intValue" in value:
+        return int(value["intValue"])
+    if "arrayValue" in value:
+        return [_plain_value(item) for item in value["arrayValue"].get("values", [])]
+    return next(iter(value.values()), None)
+
+
+def _tail_lines(path: str, max_bytes: int) -> List[str]:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - max_bytes))
+        data = f.read()
+    lines = data.decode("utf-8", "replace").splitlines()
+    return lines[1:] if size > max_bytes else lines
+
+
+def load_turn_traces(path: str = TRACE_FILE, limit: int = 20, max_bytes: int = 4 * 1024 * 1024) -> List[Dict[str, Any]]:
+    """Ostatnie tury (najnowsze pierwsze) jako waterfall: offset, czas i głębokość każdego spanu"""
+    if not os.path.exists(path):
+        return []
+    spans_by_trace: Dict[str, List[Dict[str, Any]]] = {}
+    for line in _tail_lines(path, max_bytes):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        for resource_spans in request.get("resourceSpans", []):
+            for scope_spans in resource_spans.get("scopeSpans", []):
+                for encoded in scope_spans.get("spans", []):
+                    spans_by_trace.setdefault(encoded["traceId"], []).append(encoded)
+
+    turns = []
+    for trace_id, spans in spans_by_trace.items():
+        root = next((item for item in spans if item["name"] == TURN_SPAN and not item.get("parentSpanId")), None)
+        if root is None:
+            continue
+        children: Dict[str, List[Dict[str, Any]]] = {}
+        for item in spans:
+            children.setdefault(item.get("parentSpanId", ""), []).append(item)
+        turn_start = int(root["startTimeUnixNano"])
+
+        waterfall = []
+        pending = deque([(root, 0)])
+        while pending:
+            item, depth = pending.popleft()
+            start, end = int(item["startTimeUnixNano"]), int(item["endTimeUnixNano"])
+            waterfall.append({
+                "name": item["name"],
+                "span_id": item["spanId"],
+                "parent_span_id": item.get("parentSpanId", ""),
+                "depth": depth,
+                "offset_ms": round((start - turn_start) / 1e6, 2),
+                "duration_ms": round((end - start) / 1e6, 2),
+                "error": item.get("status", {}).get("code") == 2,
+                "attributes": {attr["key"]: _plain_value(attr["value"]) for attr in item.get("attributes", [])},
+            })
+            for child in sorted(children.get(item["spanId"], []), key=lambda span_: int(span_["startTimeUnixNano"])):
+                pending.append((child, depth + 1))
+        waterfall.sort(key=lambda entry: (entry["offset_ms"], entry["depth"]))
+
+        turns.append({
+            "trace_id": trace_id,
+            "started_at": turn_start / 1e9,
+            "duration_ms": waterfall[0]["duration_ms"],
+            "attributes": waterfall[0]["attributes"],
+            "spans": waterfall,
+        })
+    turns.sort(key=lambda turn: turn["started_at"], reverse=True)
+    return turns[:limit]
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Tryb wieloprocesowy dla Google ADK Business Agent
+N procesów-workerów za SO_REUSEPORT albo za małym dispatcherem z afinicją sesji
+"""
+
+import os
+import sys
+import zlib
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import multiprocessing
+from typing import List, Optional
+from urllib.parse import urlencode, urlparse, parse_qs
+
+import websockets
+
+from agent_logging import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Wspólny magazyn sesji ADK - każdy worker może podjąć dowolną sesję
+DEFAULT_SESSION_DB_URL = "sqlite:///adk_sessions.db"
+
+
+def reuse_port_supported() -> bool:
+    """SO_REUSEPORT jest dostępny na Linux/macOS, nie na Windows"""
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def worker_for_session(session_id: str, workers: int) -> int:
+    """Stabilne przypisanie sesji do workera (ta sama sesja -> ten sam proces)"""
+    return zlib.crc32(session_id.encode("utf-8")) % workers
+
+
+def _worker_main(host: str, port: int, reuse_port: bool, index: int):
+    """Punkt wejścia procesu-workera"""
+    setup_logging()
+    os.environ.setdefault("AGENT_SESSION_DB_URL", DEFAULT_SESSION_DB_URL)
+    os.environ["AGENT_WORKER_INDEX"] = str(index)
+
+    from google_adk_business_agent import GoogleADKBusinessAgent
+
+    agent = GoogleADKBusinessAgent()
+    try:
+        asyncio.run(agent.start_server(host, port, reuse_port=reuse_port))
+    except KeyboardInterrupt:
+        agent.stop_server()
+
+
+class AgentWorkerPool:
+    """Uruchamia i nadzoruje procesy-workery (restart po awarii)"""
+
+    def __init__(self, workers: int, host: str, port: int, use_dispatcher: bool):
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.use_dispatcher = use_dispatcher
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+
+    def worker_address(self, index: int):
+        """Adres nasłuchu workera (dispatcher: prywatne porty na loopback)"""
+        if self.use_dispatcher:
+            return "127.0.0.1", self.port + 1 + index
+        return self.host, self.port
+
+    def _spawn(self, index: int):
+        host, port = self.worker_address(index)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(host, port, not self.use_dispatcher, index),
+            name=f"adk-agent-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info("👷 Worker %d uruchomiony (pid=%s) na %s:%d", index, process.pid, host, port)
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def restart_dead(self):
+        """Wskrzesza workery, które zakończyły się nieoczekiwanie"""
+        for index, process in enumerate(self._processes):
+            if process is not None and not process.is_alive():
+                logger.warning("⚠️ Worker %d zakończył się (kod %s) - restart", index, process.exitcode)
+                self._spawn(index)
+
+    def stop(self):
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout=5)
+
+
+class SessionAffinityDispatcher:
+    """
+    Front WebSocket kierujący połączenia do workerów według session_id
+
+    Klient może wznowić sesję przez ?session_id=...; bez niej dispatcher
+    nadaje nowe ID, więc każde połączenie ma deterministyczny worker.
+    """
+
+    def __init__(self, pool: AgentWorkerPool):
+        self.pool = pool
+        self.server = None
+
+    async def handle_client(self, websocket):
+        request = getattr(websocket, "request", None)
+        path = getattr(request, "path", None) or getattr(websocket, "path", "") or "/"
+
+        query = {k: v[0] for k, v in parse_qs(urlparse(path).query).items()}
+        session_id = query.get("session_id") or f"session_{uuid.uuid4().hex}"
+        query["session_id"] = session_id
+
+        index = worker_for_session(session_id, self.pool.workers)
+        host, port = self.pool.worker_address(index)
+        upstream_uri = f"ws://{host}:{port}/?{urlencode(query)}"
+
+        try:
+            # Wewnętrzny hop bez kompresji - oszczędza CPU po obu stronach
+            async with websockets.connect(upstream_uri, compression=None,
+                                          max_size=None, ping_interval=None) as upstream:
+                pumps = [
+                    asyncio.create_task(self._pump(websocket, upstream)),
+                    asyncio.create_task(self._pump(upstream, websocket)),
+                ]
+                done, pending = await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+                for task in pending:
+                    task.cancel()
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            logger.error("❌ Worker %d niedostępny dla sesji %s: %s", index, session_id, e)
+            await websocket.close(code=1013, reason="worker unavailable")
+
+    @staticmethod
+    async def _pump(source, target):
+        try:
+            async for message in source:
+                await target.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def serve(self):
+        self.server = await websockets.serve(
+            self.handle_client,
+            self.pool.host,
+            self.pool.port,
+            ping_interval=20,
+            ping_timeout=60
+        )
+        logger.info("🚦 Dispatcher na ws://%s:%d -> %d workerów",
+                    self.pool.host, self.pool.port, self.pool.workers)
+        while True:
+            await asyncio.sleep(2)
+            self.pool.restart_dead()
+
+
+def run_workers(workers: int, host: str = "localhost", port: int = 8765,
+                use_dispatcher: Optional[bool] = None):
+    """
+    Uruchamia agenta w trybie wieloprocesowym
+
+    Args:
+        workers: Liczba procesów-workerów
+        host: Publiczny adres nasłuchu
+        port: Publiczny port WebSocket
+        use_dispatcher: True = dispatcher z afinicją sesji, False = SO_REUSEPORT,
+            None = SO_REUSEPORT gdy dostępny
+    """
+    setup_logging()
+    os.environ.setdefault("AGENT_SESSION_DB_URL", DEFAULT_SESSION_DB_URL)
+
+    if use_dispatcher is None:
+        use_dispatcher = not reuse_port_supported()
+    elif not use_dispatcher and not reuse_port_supported():
+        logger.warning("⚠️ SO_REUSEPORT niedostępny na %s - używam dispatchera", sys.platform)
+        use_dispatcher = True
+
+    pool = AgentWorkerPool(workers, host, port, use_dispatcher)
+    pool.start()
+
+    try:
+        if use_dispatcher:
+            asyncio.run(SessionAffinityDispatcher(pool).serve())
+        else:
+            # Jądro rozkłada połączenia między procesy nasłuchujące na tym samym porcie
+            logger.info("🚀 %d workerów na ws://%s:%d (SO_REUSEPORT)", workers, host, port)
+            while True:
+                time.sleep(2)
+                pool.restart_dead()
+    except KeyboardInterrupt:
+        logger.info("Otrzymano sygnał przerwania - zatrzymuję workery...")
+    finally:
+        pool.stop()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Benchmark obciążeniowy agenta WebSocket (GoogleADKBusinessAgent) - w pełni offline
+N symulowanych klientów prowadzi skryptowe rozmowy z agentem działającym na
+lokalnym modelu (mock_llm_backend.MockLlm) i zaślepionych narzędziach Google. Mierzy czas do pierwszego
+fragmentu odpowiedzi, percentyle latencji tury, przepustowość i pamięć na połączenie.
+
+Użycie:
+    python benchmark_websocket_agent.py --clients 50 --ramp 5 --output wyniki.json
+    python benchmark_websocket_agent.py --clients 50 --compare baseline.json
+    python benchmark_websocket_agent.py --url ws://localhost:8765 --clients 5   # działający agent
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import platform
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+# Domyślna rozmowa: pytania bez narzędzi, z jednym narzędziem i z dwoma równoległymi
+DEFAULT_CONVERSATIONS = [
+    [
+        "Cześć, która jest godzina?",
+        "Jakie mam dziś spotkania w kalendarzu?",
+        "Sprawdź nieprzeczytane maile",
+        "Jaki mam plan dnia?",
+        "Dziękuję, to wszystko",
+    ]
+]
+
+READY_MARKER = "BENCHMARK_SERVER_READY"
+
+
+# === Serwer: agent na skryptowym modelu i zaślepionych narzędziach ===
+
+def _stub_tools(tool_latency: float):
+    """Zaślepki narzędzi Google o stałym opóźnieniu (te same nazwy co custom_google_tools)"""
+
+    async def get_calendar_events(calendar_id: str = "primary", time_min: Optional[str] = None,
+                                  time_max: Optional[str] = None, max_results: int = 10) -> Dict[str, Any]:
+        """Pobiera wydarzenia z Google Calendar"""
+        await asyncio.sleep(tool_latency)
+        events = [{"id": f"evt{i}", "summary": f"Spotkanie {i}", "start": f"2025-06-10T{9 + i:02d}:00:00+02:00",
+                   "end": f"2025-06-10T{10 + i:02d}:00:00+02:00", "location": "", "attendees": []}
+                  for i in range(3)]
+        return {"success": True, "events_count": len(events), "events": events, "calendar_id": calendar_id}
+
+    async def get_gmail_messages(user_id: str = "me", query: str = "", max_results: int = 10) -> Dict[str, Any]:
+        """Pobiera wiadomości z Gmail"""
+        await asyncio.sleep(tool_latency)
+        messages = [{"id": f"msg{i}", "subject": f"Temat {i}", "sender": f"nadawca{i}@example.com",
+                     "date": "Tue, 10 Jun 2025 08:00:00 +0200", "snippet": "Krótki podgląd treści", "labels": ["UNREAD"]}
+                    for i in range(5)]
+        return {"success": True, "messages_count": len(messages), "messages": messages, "query": query}
+
+    return [get_calendar_events, get_gmail_messages]
+
+
+async def serve(port: int, first_token_latency: float, tokens_per_second: float, tool_latency: float,
+                mock_script: Optional[str] = None):
+    """Agent na porcie lokalnym - uruchamiany jako osobny proces, żeby pomiar pamięci obejmował tylko serwer"""
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    # Mierzymy ścieżkę modelu - router intencji i cache odpowiedzi tylko po jawnym włączeniu w env
+    os.environ.setdefault("AGENT_INTENT_ROUTER", "0")
+    os.environ.setdefault("AGENT_RESPONSE_CACHE", "0")
+    from google_adk_business_agent import GoogleADKBusinessAgent, get_current_datetime
+    from mock_llm_backend import MockLlm
+
+    model = MockLlm.from_script(mock_script, latency=first_token_latency, tokens_per_second=tokens_per_second)
+    agent = GoogleADKBusinessAgent()
+    agent.build_agent(model, [get_current_datetime] + _stub_tools(tool_latency))
+
+    server_task = asyncio.create_task(agent.start_server("127.0.0.1", port))
+    # Bramka nasłuchuje, gdy start_server ustawi agent.server
+    while agent.server is None:
+        if server_task.done():
+            await server_task
+        await asyncio.sleep(0.01)
+    print(READY_MARKER, flush=True)
+    await server_task
+
+
+# === Klienci ===
+
+@dataclass
+class TurnResult:
+    client: int
+    turn: int
+    ttfc_ms: Optional[float]
+    latency_ms: Optional[float]
+    status: str  # ok | busy | error | timeout
+
+
+async def run_client(url: str, client_id: int, conversation: List[str], start_delay: float,
+                     timeout: float, results: List[TurnResult], connected: asyncio.Event, counter: Dict[str, int]):
+    await asyncio.sleep(start_delay)
+    try:
+        async with websockets.connect(url, max_size=None) as websocket:
+            await websocket.recv()  # powitanie
+            counter["connected"] += 1
+            if counter["connected"] == counter["total"]:
+                connected.set()
+
+            for turn, text in enumerate(conversation):
+                started = time.perf_counter()
+                first_chunk = None
+                status = "ok"
+                await websocket.send(json.dumps({"type": "message", "content": text}))
+                try:
+                    while True:
+                        raw = await asyncio.wait_for(websocket.recv(), timeout)
+                        if isinstance(raw, bytes):
+                            continue  # audio binarne
+                        frame_type = json.loads(raw).get("type")
+                        if frame_type == "response_chunk" and first_chunk is None:
+                            first_chunk = time.perf_counter()
+                        elif frame_type == "response_complete":
+                            break
+                        elif frame_type in ("busy", "error"):
+                            status = frame_type
+                            break
+                except asyncio.TimeoutError:
+                    status = "timeout"
+                finished = time.perf_counter()
+
+                results.append(TurnResult(
+                    client=client_id,
+                    turn=turn,
+                    ttfc_ms=(first_chunk - started) * 1000 if first_chunk else None,
+                    latency_ms=(finished - started) * 1000 if status == "ok" else None,
+                    status=status
+                ))
+    except Exception as e:
+        results.append(TurnResult(client=client_id, turn=-1, ttfc_ms=None, latency_ms=None, status="error"))
+        print(f"❌ Klient {client_id}: {e}", file=sys.stderr)
+    finally:
+        counter["finished"] += 1
+        if counter["finished"] == counter["total"]:
+            connected.set()
+
+
+# === Pamięć serwera ===
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """RSS procesu (psutil, a bez niego /proc na Linuksie)"""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+async def _sample_memory(pid: int, samples: List[int], stop: asyncio.Event):
+    while not stop.is_set():
+        rss = _rss_bytes(pid)
+        if rss:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), 0.2)
+        except asyncio.TimeoutError:
+            pass
+
+
+# === Statystyki i porównanie ===
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p90": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        # Metoda najbliższej rangi: ceil(p/100 * n)-ty element (indeks od 0)
+        index = math.ceil(p / 100 * len(ordered)) - 1
+        return round(ordered[min(len(ordered) - 1, max(0, index))], 2)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": rank(50), "p90": rank(90), "p95": rank(95), "p99": rank(99),
+        "max": round(ordered[-1], 2),
+    }
+
+
+# Metryki porównywane z baseline: (ścieżka, czy większa wartość jest lepsza)
+COMPARED_METRICS = [
+    (("ttfc_ms", "p50"), False),
+    (("ttfc_ms", "p95"), False),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("throughput_turns_per_s",), True),
+    (("memory", "per_connection_kb"), False),
+]
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Wypisuje różnice względem baseline; False gdy któraś metryka pogorszyła się ponad tolerancję"""
+    ok = True
+    print(f"\n📐 Porównanie z baseline (tolerancja {tolerance:.0%}):")
+    for path, higher_is_better in COMPARED_METRICS:
+        current, previous = results["results"], baseline["results"]
+        for key in path:
+            current = (current or {}).get(key)
+            previous = (previous or {}).get(key)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        regression = -change if higher_is_better else change
+        marker = "❌" if regression > tolerance else "✅"
+        ok = ok and regression <= tolerance
+        print(f"  {marker} {'.'.join(path):32s} {previous:>10.2f} -> {current:>10.2f} ({change:+.1%})")
+    return ok
+
+
+# === Przebieg benchmarku ===
+
+async def _start_local_server(args) -> "asyncio.subprocess.Process":
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port),
+        "--first-token-latency", str(args.first_token_latency),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--tool-latency", str(args.tool_latency),
+        *(["--mock-script", args.mock_script] if args.mock_script else []),
+        stdout=asyncio.subprocess.PIPE
+    )
+    while True:
+        line = await asyncio.wait_for(process.stdout.readline(), 120)
+        if not line:
+            raise RuntimeError("Serwer benchmarku zakończył się przed startem")
+        if line.decode().strip() == READY_MARKER:
+            return process
+
+
+def _load_conversations(path: Optional[str]) -> List[List[str]]:
+    if not path:
+        return DEFAULT_CONVERSATIONS
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    # Lista rozmów albo jedna rozmowa (lista tekstów)
+    return [data] if data and isinstance(data[0], str) else data
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    conversations = _load_conversations(args.script)
+    process = None
+    url = args.url
+    if not url:
+        process = await _start_local_server(args)
+        url = f"ws://127.0.0.1:{args.port}"
+
+    samples: List[int] = []
+    stop_sampling = asyncio.Event()
+    sampler = None
+    baseline_rss = None
+    if process:
+        baseline_rss = _rss_bytes(process.pid)
+        sampler = asyncio.create_task(_sample_memory(process.pid, samples, stop_sampling))
+
+    results: List[TurnResult] = []
+    connected = asyncio.Event()
+    counter = {"connected": 0, "finished": 0, "total": args.clients}
+    rng = random.Random(args.seed)
+    print(f"🚀 {args.clients} klientów -> {url} (ramp {args.ramp}s, {len(conversations)} scenariuszy)")
+
+    started = time.perf_counter()
+    try:
+        clients = [
+            run_client(url, client_id, conversations[client_id % len(conversations)],
+                       rng.uniform(0, args.ramp) if args.ramp else 0.0, args.timeout, results, connected, counter)
+            for client_id in range(args.clients)
+        ]
+        load = asyncio.gather(*clients)
+        # Pamięć przy wszystkich połączeniach otwartych naraz
+        await connected.wait()
+        connected_rss = _rss_bytes(process.pid) if process else None
+        await load
+        elapsed = time.perf_counter() - started
+    finally:
+        stop_sampling.set()
+        if sampler:
+            await sampler
+        if process:
+            process.terminate()
+            await process.wait()
+
+    turns = [result for result in results if result.turn >= 0]
+    completed = [result for result in turns if result.status == "ok"]
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[result.status] = statuses.get(result.status, 0) + 1
+
+    memory = {}
+    if baseline_rss:
+        peak = max(samples + [connected_rss or 0, baseline_rss])
+        memory = {
+            "rss_baseline_mb": round(baseline_rss / 2**20, 2),
+            "rss_connected_mb": round(connected_rss / 2**20, 2) if connected_rss else None,
+            "rss_peak_mb": round(peak / 2**20, 2),
+            "per_connection_kb": round((peak - baseline_rss) / 1024 / args.clients, 2),
+        }
+
+    return {
+        "benchmark": "websocket_agent",
+        "timestamp": datetime.now().isoformat(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {
+            "url": args.url or "local",
+            "clients": args.clients,
+            "ramp_s": args.ramp,
+            "turns_per_client": [len(conversation) for conversation in conversations],
+            "first_token_latency_s": args.first_token_latency,
+            "tokens_per_second": args.tokens_per_second,
+            "tool_latency_s": args.tool_latency,
+            "mock_script": args.mock_script,
+            "seed": args.seed,
+        },
+        "results": {
+            "turns": len(turns),
+            "completed": len(completed),
+            "statuses": statuses,
+            "duration_s": round(elapsed, 3),
+            "throughput_turns_per_s": round(len(completed) / elapsed, 2) if elapsed else None,
+            "ttfc_ms": percentiles([result.ttfc_ms for result in completed if result.ttfc_ms is not None]),
+            "latency_ms": percentiles([result.latency_ms for result in completed]),
+            "memory": memory,
+        },
+    }
+
+
+def _print_summary(report: Dict[str, Any]):
+    results = report["results"]
+    print(f"\n📊 Tury: {results['completed']}/{results['turns']} ok, statusy: {results['statuses']}")
+    print(f"⏱️  Czas: {results['duration_s']}s, przepustowość: {results['throughput_turns_per_s']} tur/s")
+    for name in ("ttfc_ms", "latency_ms"):
+        stats = results[name]
+        print(f"   {name:10s} p50={stats['p50']} p90={stats['p90']} p95={stats['p95']} "
+              f"p99={stats['p99']} max={stats['max']}")
+    if results["memory"]:
+        memory = results["memory"]
+        print(f"🧠 RSS: {memory['rss_baseline_mb']} MB -> szczyt {memory['rss_peak_mb']} MB "
+              f"({memory['per_connection_kb']} KB/połączenie)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark obciążeniowy agenta WebSocket (offline)")
+    parser.add_argument("--clients", type=int, default=10, help="Liczba równoczesnych klientów")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Rozłożenie startu klientów (s)")
+    parser.add_argument("--script", help="JSON z rozmowami (lista list tekstów lub jedna lista)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Limit czasu jednej tury (s)")
+    parser.add_argument("--url", help="Zamiast lokalnego serwera - działający agent (ws://...)")
+    parser.add_argument("--port", type=int, default=8799, help="Port lokalnego serwera benchmarku")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="Opóźnienie modelu (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="Tempo generowania modelu")
+    parser.add_argument("--tool-latency", type=float, default=0.15, help="Opóźnienie zaślepek Google API (s)")
+    parser.add_argument("--mock-script", help="Skrypt modelu mock (format AGENT_MOCK_SCRIPT)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="Plik JSON z wynikami")
+    parser.add_argument("--compare", help="Baseline JSON do porównania (kod wyjścia 1 przy regresji)")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Dopuszczalne pogorszenie (ułamek)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        asyncio.run(serve(args.port, args.first_token_latency, args.tokens_per_second, args.tool_latency,
+                          args.mock_script))
+        return
+
+    report = asyncio.run(run_benchmark(args))
+    _print_summary(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Wyniki zapisane: {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Poranny briefing liczony z wyprzedzeniem
+Zadanie w tle (mini-cron) pobiera kalendarz dnia, nieprzeczytane emaile i ostatnie
+dokumenty, zapisuje gotowy snapshot w SQLite i odświeża go przyrostowo w ciągu dnia
+"""
+
+import os
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional
+
+from session_database import SessionDatabase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER = "default_user"
+
+# Sekcje odświeżane w ciągu dnia; dokumenty tylko przy pełnym przebiegu crona
+INCREMENTAL_SECTIONS = ("calendar", "emails")
+
+MAX_EMAILS = int(os.getenv("BRIEFING_MAX_EMAILS", "10"))
+MAX_DOCUMENTS = 5
+
+SectionSource = Callable[[str], Awaitable[List[Dict[str, Any]]]]
+
+
+class CronSchedule:
+    """Minimalny cron: 'minuta godzina dzień_miesiąca miesiąc dzień_tygodnia' (*, */n, a-b, a,b)"""
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Wyrażenie cron musi mieć 5 pól: '{expression}'")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self._RANGES)
+        )
+        # 0 i 7 to niedziela
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> FrozenSet[int]:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                step = int(step_text)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start_text, end_text = part.split("-", 1)
+                start, end = int(start_text), int(end_text)
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"Pole cron poza zakresem {low}-{high}: '{field}'")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, moment: datetime) -> bool:
+        if moment.month not in self.months:
+            return False
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        # Semantyka crona: przy obu polach ograniczonych wystarczy jedno
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Najbliższe uruchomienie ściśle po podanym momencie"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(366 * 4):
+            if self._day_matches(candidate):
+                for hour in sorted(self.hours):
+                    if hour < candidate.hour:
+                        continue
+                    for minute in sorted(self.minutes):
+                        if hour == candidate.hour and minute < candidate.minute:
+                            continue
+                        return candidate.replace(hour=hour, minute=minute)
+            candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+        raise ValueError(f"Wyrażenie cron nigdy się nie uruchamia: '{self.expression}'")
+
+    def fired_today(self, moment: datetime) -> bool:
+        """Czy dzisiejsze uruchomienie już minęło (nadrabianie po restarcie)"""
+        if not self._day_matches(moment):
+            return False
+        return any((hour, minute) <= (moment.hour, moment.minute)
+                   for hour in self.hours for minute in self.minutes)
+
+
+# === Źródła danych ===
+
+def _today_range():
+    start = datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+    return start.isoformat(), (start + timedelta(days=1)).isoformat()
+
+
+def _checked(result: Dict[str, Any]) -> Dict[str, Any]:
+    if not result.get("success"):
+        raise RuntimeError(result.get("message") or result.get("error") or "nieznany błąd")
+    return result
+
+
+def custom_tools_sources() -> Dict[str, SectionSource]:
+    """Źródła z custom_google_tools (token OAuth2 agenta ADK)"""
+    import custom_google_tools as tools
+
+    async def calendar(user_id: str):
+        time_min, time_max = _today_range()
+        result = _checked(await tools.get_calendar_events(time_min=time_min, time_max=time_max, max_results=20))
+        return [{"title": event["summary"], "start": event["start"], "location": event.get("location", "")}
+                for event in result["events"]]
+
+    async def emails(user_id: str):
+        result = _checked(await tools.get_gmail_messages(query="is:unread", max_results=MAX_EMAILS))
+        return [{"sender": message["sender"], "subject": message["subject"], "date": message["date"]}
+                for message in result["messages"]]
+
+    async def documents(user_id: str):
+        result = _checked(await tools.list_google_docs(max_results=MAX_DOCUMENTS))
+        return [{"title": doc["title"], "modified": doc.get("modified_date", "")}
+                for doc in result["documents"]]
+
+    return {"calendar": calendar, "emails": emails, "documents": documents}
+
+
+def business_integration_sources(integration) -> Dict[str, SectionSource]:
+    """Źródła z GoogleBusinessIntegration (Service Account agentów Enhanced/Simple)"""
+
+    async def calendar(user_id: str):
+        # Cały dzień od północy - także spotkania, które już się zaczęły
+        time_min, time_max = _today_range()
+        events = await integration.get_calendar_events(time_min=time_min, time_max=time_max)
+        return [{"title": event["title"], "start": event["start"], "location": event.get("location", "")}
+                for event in events]
+
+    async def emails(user_id: str):
+        messages = await integration.get_recent_emails(MAX_EMAILS)
+        return [{"sender": message["sender"], "subject": message["subject"], "date": message["date"]}
+                for message in messages]
+
+    async def documents(user_id: str):
+        return await integration.get_recent_documents(MAX_DOCUMENTS)
+
+    return {"calendar": calendar, "emails": emails, "documents": documents}
+
+
+# === Scheduler ===
+
+class BriefingScheduler:
+    """
+    Snapshot briefingu per użytkownik: pełny przebieg wg crona, przyrostowe odświeżanie w ciągu dnia
+
+    Snapshot trafia do SQLite, więc kolejne workery i restarty serwera
+    przejmują gotowe dane zamiast pobierać je ponownie.
+    """
+
+    def __init__(self, db: SessionDatabase, sources: Dict[str, SectionSource],
+                 users: Optional[Iterable[str]] = None, schedule: Optional[str] = None,
+                 refresh_minutes: Optional[float] = None):
+        self.db = db
+        self.sources = sources
+        if users is None:
+            users = [user.strip() for user in os.getenv("BRIEFING_USERS", DEFAULT_USER).split(",") if user.strip()]
+        self.users = list(users)
+        self.schedule = CronSchedule(schedule or os.getenv("BRIEFING_CRON", "30 6 * * 1-5"))
+        self.refresh_interval = 60 * float(refresh_minutes or os.getenv("BRIEFING_REFRESH_MINUTES", "10"))
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._stale: Dict[str, set] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._background: set = set()
+
+    # === Cykl życia ===
+
+    def start(self):
+        """Uruchamia zadanie w tle w bieżącym event loopie (idempotentne)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        await self.db.init_database()
+        # Restart po porannym przebiegu - zbuduj brakujące snapshoty od razu
+        if self.schedule.fired_today(datetime.now()):
+            await self._for_all_users(self.build)
+        logger.info("☀️ Briefing: cron '%s', odświeżanie co %.0f min, użytkownicy: %s",
+                    self.schedule.expression, self.refresh_interval / 60, ", ".join(self.users))
+
+        while True:
+            now = datetime.now()
+            next_run = self.schedule.next_after(now)
+            await asyncio.sleep(max(1.0, min((next_run - now).total_seconds(), self.refresh_interval)))
+            if datetime.now() >= next_run:
+                await self._for_all_users(self.build)
+            else:
+                await self._for_all_users(self.refresh)
+
+    async def _for_all_users(self, action: Callable[[str], Awaitable[Any]]):
+        results = await asyncio.gather(*(action(user_id) for user_id in self.users), return_exceptions=True)
+        for user_id, result in zip(self.users, results):
+            if isinstance(result, Exception):
+                logger.warning("⚠️ Briefing dla %s nie powiódł się: %s", user_id, result)
+
+    # === Budowanie snapshotu ===
+
+    async def build(self, user_id: str) -> Dict[str, Any]:
+        """Pełny snapshot (wszystkie sekcje)"""
+        return await self._update(user_id, list(self.sources))
+
+    async def refresh(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Przyrostowe odświeżenie szybko zmieniających się sekcji (tylko gdy dzisiejszy snapshot istnieje)"""
+        if await self.get_snapshot(user_id) is None:
+            return None
+        return await self._update(user_id, [name for name in INCREMENTAL_SECTIONS if name in self.sources])
+
+    def mark_stale(self, user_id: str, section: str):
+        """Sekcja zmieniona przez agenta (np. nowe spotkanie) - odśwież w tle"""
+        if section not in self.sources or user_id not in self._snapshots:
+            return
+        self._stale.setdefault(user_id, set()).add(section)
+        task = asyncio.create_task(self._update(user_id, [section]))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _is_due(self, user_id: str, snapshot: Dict[str, Any], section: str, now: datetime) -> bool:
+        if section in self._stale.get(user_id, ()):
+            return True
+        updated_at = snapshot["sections"].get(section, {}).get("updated_at")
+        # Świeże dane (np. zapisane przez inny worker) są przejmowane bez pobierania
+        return updated_at is None or (now - datetime.fromisoformat(updated_at)).total_seconds() >= self.refresh_interval / 2
+
+    async def _update(self, user_id: str, sections: List[str]) -> Dict[str, Any]:
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            day = date.today().isoformat()
+            snapshot = await self.db.get_briefing_snapshot(user_id, day) or {
+                "user_id": user_id, "day": day, "sections": {}
+            }
+            now = datetime.now()
+            due = [name for name in sections if self._is_due(user_id, snapshot, name, now)]
+            if due:
+                results = await asyncio.gather(*(self.sources[name](user_id) for name in due), return_exceptions=True)
+                for name, result in zip(due, results):
+                    if isinstance(result, Exception):
+                        # Zostają poprzednie dane sekcji (jeśli były)
+                        logger.warning("⚠️ Briefing %s/%s: %s", user_id, name, result)
+                        snapshot["sections"].setdefault(name, {})["error"] = str(result)
+                        continue
+                    snapshot["sections"][name] = {"data": result, "updated_at": now.isoformat()}
+                    self._stale.get(user_id, set()).discard(name)
+                snapshot["updated_at"] = now.isoformat()
+                await self.db.save_briefing_snapshot(user_id, day, snapshot)
+                logger.debug("☀️ Briefing %s: odświeżono %s", user_id, ", ".join(due))
+            self._snapshots[user_id] = snapshot
+            return snapshot
+
+    # === Odczyt ===
+
+    async def get_snapshot(self, user_id: str = DEFAULT_USER) -> Optional[Dict[str, Any]]:
+        """Dzisiejszy snapshot bez pobierania danych (None jeśli jeszcze nie powstał)"""
+        day = date.today().isoformat()
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is None or snapshot["day"] != day:
+            snapshot = await self.db.get_briefing_snapshot(user_id, day)
+            if snapshot is None:
+                return None
+            self._snapshots[user_id] = snapshot
+        return snapshot
+
+    async def get_briefing(self, user_id: str = DEFAULT_USER) -> Dict[str, Any]:
+        """Snapshot z pamięci/bazy, a przed pierwszym przebiegiem crona - zbudowany na żądanie"""
+        snapshot = await self.get_snapshot(user_id)
+        if snapshot is None:
+            snapshot = await self.build(user_id)
+        return snapshot
+
+
+def section_data(snapshot: Optional[Dict[str, Any]], section: str) -> Optional[List[Dict[str, Any]]]:
+    """Dane sekcji snapshotu (None gdy sekcji nie udało się jeszcze pobrać)"""
+    if not snapshot:
+        return None
+    return snapshot["sections"].get(section, {}).get("data")
+
+
+def format_briefing(snapshot: Dict[str, Any], max_items: int = 5) -> str:
+    """Briefing jako krótki tekst do odczytania przez avatara"""
+    lines = [f"☀️ BRIEFING NA {snapshot['day']}"]
+
+    events = section_data(snapshot, "calendar")
+    if events is not None:
+        if events:
+            lines.append(f"\n📅 Spotkania dziś ({len(events)}):")
+            for event in events[:max_items]:
+                start = event["start"][11:16] if "T" in event["start"] else "cały dzień"
+                lines.append(f"• {start} {event['title']}")
+        else:
+            lines.append("\n📅 Brak spotkań w kalendarzu na dziś.")
+
+    emails = section_data(snapshot, "emails")
+    if emails is not None:
+        if emails:
+            lines.append(f"\n📧 Nieprzeczytane emaile ({len(emails)}):")
+            for email in emails[:max_items]:
+                sender = email["sender"].split("<")[0].strip().strip('"')
+                lines.append(f"• {sender}: {email['subject'][:60]}")
+        else:
+            lines.append("\n📧 Brak nieprzeczytanych emaili.")
+
+    documents = section_data(snapshot, "documents")
+    if documents:
+        lines.append("\n📄 Ostatnio edytowane dokumenty:")
+        lines.extend(f"• {doc['title']}" for doc in documents[:max_items])
+
+    if snapshot.get("updated_at"):
+        lines.append(f"\n🕐 Dane z {snapshot['updated_at'][11:16]}")
+    return "\n".join(lines)
+
+
+def make_briefing_tool(scheduler: BriefingScheduler):
+    """Narzędzie ADK get_morning_briefing czytające gotowy snapshot"""
+
+    async def get_morning_briefing(tool_context=None) -> Dict[str, Any]:
+        """
+        Poranny briefing: dzisiejsze spotkania, nieprzeczytane emaile i ostatnie dokumenty.
+        Używaj jako pierwszego narzędzia przy pytaniach o plan dnia ("co mam dziś?").
+        """
+        user_id = getattr(tool_context, "user_id", None) or DEFAULT_USER
+        snapshot = await scheduler.get_briefing(user_id)
+        return {
+            "success": True,
+            "day": snapshot["day"],
+            "updated_at": snapshot.get("updated_at"),
+            "calendar_events": section_data(snapshot, "calendar"),
+            "unread_emails": section_data(snapshot, "emails"),
+            "recent_documents": section_data(snapshot, "documents"),
+            "summary": format_briefing(snapshot)
+        }
+
+    return get_morning_briefing
+
+
+class BriefingAgentMixin:
+    """
+    Briefing i mirror Workspace dla agentów na GoogleBusinessIntegration (Enhanced/Simple)
+
+    Klasa agenta wywołuje setup_briefing() w __init__ i start_briefing()
+    przy starcie serwera (zadania w tle potrzebują działającego event loopa).
+    """
+
+    briefings: Optional[BriefingScheduler] = None
+    workspace_sync = None
+
+    def setup_briefing(self, gcp_manager, business_integration):
+        """Snapshot briefingu i odczyty Gmail/Calendar z mirrora (WORKSPACE_SYNC_ENABLED)"""
+        from workspace_sync import SERVICE_ACCOUNT, SYNC_ENABLED, WorkspaceSync, get_mirror
+
+        self.briefings = None
+        self.workspace_sync = None
+        if not business_integration:
+            return
+        self.briefings = BriefingScheduler(SessionDatabase(), business_integration_sources(business_integration))
+        if SYNC_ENABLED:
+            self.workspace_sync = WorkspaceSync(
+                gcp_manager.gmail_service, gcp_manager.calendar_service, get_mirror(SERVICE_ACCOUNT)
+            )
+            business_integration.mirror = self.workspace_sync.mirror
+
+    def start_briefing(self):
+        if self.briefings:
+            self.briefings.start()
+        if self.workspace_sync:
+            self.workspace_sync.start()
+
+    async def _briefing_snapshot(self) -> Optional[Dict[str, Any]]:
+        """Dzisiejszy snapshot briefingu (None gdy jeszcze nie powstał)"""
+        if not self.briefings:
+            return None
+        try:
+            return await self.briefings.get_snapshot()
+        except Exception as e:
+            logger.warning("⚠️ Briefing niedostępny: %s", e)
+            return None
+
+    async def get_morning_briefing(self) -> str:
+        """Poranny briefing: dzisiejsze spotkania, nieprzeczytane emaile i ostatnie dokumenty"""
+        if not self.briefings:
+            return "⚠️ Briefing niedostępny - sprawdź konfigurację Google Cloud"
+
+        try:
+            return format_briefing(await self.briefings.get_briefing())
+        except Exception as e:
+            return f"❌ Błąd briefingu: {str(e)}"
+
+    async def briefing_report_lines(self) -> List[str]:
+        """Sekcja 'dziś' raportu biznesowego z gotowego snapshotu (bez zapytań do Google API)"""
+        snapshot = await self._briefing_snapshot()
+        events = section_data(snapshot, "calendar")
+        emails = section_data(snapshot, "emails")
+        lines = []
+        if events is not None:
+            first = f" (pierwsze: {events[0]['title']})" if events else ""
+            lines.append(f"• Spotkania dziś: {len(events)}{first}")
+        if emails is not None:
+            lines.append(f"• Nieprzeczytane emaile: {len(emails)}")
+        return lines or ["• Briefing dnia jeszcze się przygotowuje"]
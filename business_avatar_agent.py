@@ -14,17 +14,16 @@ Funkcje:
 
 import os
 import asyncio
-import json
 import base64
-from datetime import datetime
 from typing import Dict, List, Optional
 
 from google.adk.agents import LlmAgent
 from google.adk.tools import google_search_tool
-from google.adk.tools.mcp_tool import MCPToolset, StdioConnectionParams, SseConnectionParams
 from google.adk.tools.function_tool import function_tool
-from google.adk.runners import InMemoryRunner
-from mcp import StdioServerParameters
+
+from adk_turn_runner import ADKTurnRunner, CLI_CONNECTION
+from ws_gateway import ConversationBackend, WebSocketGateway
+from mcp_server_pool import MCPServerPool, MCPServerSpec
 
 # Import ElevenLabs integration
 from elevenlabs_voice_integration import ElevenLabsVoiceManager, UE5AudioStreamer
@@ -45,49 +44,42 @@ class BusinessAvatarAgent:
     def setup_agent(self):
         """Konfiguruje agenta z business tools"""
         
-        # Business MCP Tools
-        business_tools = [
+        # Serwery MCP w puli - startują raz i są utrzymywane w gotowości
+        self.mcp_pool = MCPServerPool([
             # 📅 Google Calendar Management
-            MCPToolset(
-                connection_params=StdioConnectionParams(
-                    server_params=StdioServerParameters(
-                        command="npx",
-                        args=["-y", "google-calendar-mcp-server"],
-                        env={"GOOGLE_API_KEY": GOOGLE_API_KEY}
-                    ),
-                    timeout=10.0
-                ),
+            MCPServerSpec(
+                name="calendar",
+                package="google-calendar-mcp-server",
+                binary="google-calendar-mcp-server",
+                env={"GOOGLE_API_KEY": GOOGLE_API_KEY},
                 tool_filter=['list_events', 'create_event', 'update_event', 'find_free_time']
             ),
             
             # 📧 Gmail Integration
-            MCPToolset(
-                connection_params=StdioConnectionParams(
-                    server_params=StdioServerParameters(
-                        command="npx", 
-                        args=["-y", "gmail-mcp-server"],
-                        env={"GOOGLE_API_KEY": GOOGLE_API_KEY}
-                    ),
-                    timeout=10.0
-                ),
+            MCPServerSpec(
+                name="gmail",
+                package="gmail-mcp-server",
+                binary="gmail-mcp-server",
+                env={"GOOGLE_API_KEY": GOOGLE_API_KEY},
                 tool_filter=['read_emails', 'send_email', 'search_emails', 'mark_as_read']
             ),
             
             # 📝 Notion Workspace  
-            MCPToolset(
-                connection_params=StdioConnectionParams(
-                    server_params=StdioServerParameters(
-                        command="npx",
-                        args=["-y", "@notionhq/notion-mcp-server"],
-                        env={
-                            "NOTION_API_KEY": NOTION_API_KEY,
-                            "OPENAPI_MCP_HEADERS": f'{{"Authorization": "Bearer {NOTION_API_KEY}", "Notion-Version": "2022-06-28"}}'
-                        }
-                    ),
-                    timeout=10.0
-                ),
+            MCPServerSpec(
+                name="notion",
+                package="@notionhq/notion-mcp-server",
+                binary="notion-mcp-server",
+                env={
+                    "NOTION_API_KEY": NOTION_API_KEY,
+                    "OPENAPI_MCP_HEADERS": f'{{"Authorization": "Bearer {NOTION_API_KEY}", "Notion-Version": "2022-06-28"}}'
+                },
                 tool_filter=['search_pages', 'create_page', 'update_page', 'query_database']
             ),
+        ])
+        
+        # Business Tools
+        business_tools = [
+            *self.mcp_pool.toolsets,
             
             # 🔍 Google Search
             google_search_tool,
@@ -133,6 +125,9 @@ class BusinessAvatarAgent:
             """,
             tools=business_tools
         )
+        
+        # Jeden runner na cały proces, sesja ADK per połączenie
+        self.turn_runner = ADKTurnRunner(self.agent, app_name="MetaHumanBusinessAssistant")
     
     # Custom Business Functions
     async def analyze_business_metrics(self, timeframe: str = "week") -> str:
@@ -213,11 +208,11 @@ class BusinessAvatarAgent:
 
     async def run_conversation(self, user_input: str, websocket=None) -> str:
         """Główna metoda do komunikacji z agentem"""
-        runner = InMemoryRunner(self.agent)
+        connection = websocket if websocket is not None else CLI_CONNECTION
         
         try:
-            response = await runner.run(user_input)
-            response_text = response.text if hasattr(response, 'text') else str(response)
+            # Wspólny runner - kontekst rozmowy zostaje w sesji połączenia
+            response_text = await self.turn_runner.ask(user_input, connection, websocket)
             
             # Generuj audio z ElevenLabs i wyślij do UE5
             if websocket:
@@ -229,6 +224,10 @@ class BusinessAvatarAgent:
             if websocket:
                 await self.audio_streamer.stream_to_ue5(error_msg, websocket)
             return error_msg
+    
+    async def end_conversation(self, websocket=None):
+        """Zamyka sesję ADK połączenia"""
+        await self.turn_runner.release(websocket if websocket is not None else CLI_CONNECTION)
 
 # Klasa WebSocket Server dla UE5 Communication
 class UE5WebSocketServer:
@@ -237,40 +236,23 @@ class UE5WebSocketServer:
     def __init__(self, agent: BusinessAvatarAgent, port: int = 8765):
         self.agent = agent
         self.port = port
+        self.gateway = None
         
     async def start_server(self):
-        """Uruchamia WebSocket server dla UE5"""
-        import websockets
-        
-        async def handle_client(websocket, path):
-            """Obsługuje połączenia z UE5"""
-            print(f"🔗 MetaHuman połączony: {websocket.remote_address}")
-            
-            try:
-                async for message in websocket:
-                    print(f"💬 Otrzymano: {message}")
-                    
-                    # Przetwarzanie przez agenta (z audio)
-                    response = await self.agent.run_conversation(message, websocket)
-                    
-                    # Wysyłanie tekstu odpowiedzi do UE5 (audio już został wysłany)
-                    text_message = {
-                        "type": "text",
-                        "content": response,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    await websocket.send(json.dumps(text_message))
-                    print(f"🤖 Wysłano tekst: {response[:50]}...")
-                    
-            except websockets.exceptions.ConnectionClosed:
-                print("🔌 MetaHuman rozłączony")
-            except Exception as e:
-                print(f"❌ Błąd: {e}")
+        """Uruchamia WebSocket server dla UE5 (wspólna bramka)"""
+        backend = ConversationBackend(
+            self.agent,
+            name="MetaHuman Business Assistant",
+            welcome_message="🎭 MetaHuman Business Assistant gotowy!"
+        )
+        # Rozgrzanie serwerów MCP zanim pierwszy klient wywoła narzędzie
+        await self.agent.mcp_pool.start()
         
         print(f"🚀 Uruchamiam serwer WebSocket na porcie {self.port}")
         print(f"🎭 Czekam na połączenie z MetaHuman avatar...")
         
-        await websockets.serve(handle_client, "localhost", self.port)
+        self.gateway = WebSocketGateway(backend)
+        await self.gateway.start("localhost", self.port)
 
 # Main Application
 if __name__ == "__main__":
@@ -4,15 +4,25 @@ Niestandardowe narzędzia Google Calendar i Gmail
 używające bezpośrednio Google APIs z tokenami OAuth2
 """
 
-import json
-import os
+import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 import base64
 
+from admission_control import execute_with_limit
+from google_credentials_manager import get_credentials_manager
+from workspace_sync import OAUTH_ACCOUNT, get_mirror, read_events, read_messages
+
+logger = logging.getLogger(__name__)
+
+
+async def _execute(request, upstream: str):
+    """Wykonuje żądanie Google API poza event loopem, w ramach limitu współbieżności upstreamu"""
+    # Każdy wątek roboczy ma własne AuthorizedHttp (httplib2 nie jest bezpieczny wątkowo)
+    manager = get_credentials_manager()
+    return await execute_with_limit(upstream, lambda: request.execute(http=manager.authorized_http()))
+
+
 class CustomGoogleTools:
     """Niestandardowe narzędzia Google z tokenami OAuth2"""
     
@@ -27,64 +37,22 @@ class CustomGoogleTools:
         self._setup_credentials()
     
     def _setup_credentials(self):
-        """Konfiguracja credentials z plików OAuth2"""
+        """Credentials i klienci API ze wspólnego managera (bez odświeżania na ścieżce żądania)"""
         try:
-            # Ładuj tokeny z token.json
-            if os.path.exists(self.token_file):
-                with open(self.token_file, 'r') as f:
-                    token_data = json.load(f)
-                
-                # Stwórz Credentials object
-                self.credentials = Credentials(
-                    token=token_data.get('token'),
-                    refresh_token=token_data.get('refresh_token'),
-                    token_uri=token_data.get('token_uri'),
-                    client_id=token_data.get('client_id'),
-                    client_secret=token_data.get('client_secret'),
-                    scopes=token_data.get('scopes', [])
-                )
-                
-                # Odśwież token jeśli potrzeba
-                if self.credentials.expired:
-                    self.credentials.refresh(Request())
-                    # Zapisz odświeżony token
-                    self._save_token()
-                
-                # Inicjalizuj usługi Google APIs
-                self.calendar_service = build('calendar', 'v3', credentials=self.credentials)
-                self.gmail_service = build('gmail', 'v1', credentials=self.credentials)
-                self.docs_service = build('docs', 'v1', credentials=self.credentials)
-                self.drive_service = build('drive', 'v3', credentials=self.credentials)
-                
-                print(f"✅ Google APIs skonfigurowane z tokenami OAuth2")
-                
-            else:
-                raise FileNotFoundError(f"Brak pliku {self.token_file}")
-                
-        except Exception as e:
-            print(f"❌ Błąd konfiguracji Google APIs: {e}")
-            raise
-    
-    def _save_token(self):
-        """Zapisz odświeżony token do pliku"""
-        try:
-            token_data = {
-                'token': self.credentials.token,
-                'refresh_token': self.credentials.refresh_token,
-                'token_uri': self.credentials.token_uri,
-                'client_id': self.credentials.client_id,
-                'client_secret': self.credentials.client_secret,
-                'scopes': self.credentials.scopes,
-                'universe_domain': 'googleapis.com',
-                'account': '',
-                'expiry': self.credentials.expiry.isoformat() if self.credentials.expiry else None
-            }
+            manager = get_credentials_manager(self.token_file)
+            self.credentials = manager.credentials
             
-            with open(self.token_file, 'w') as f:
-                json.dump(token_data, f)
+            # Klienci budowani raz na proces - token odświeżany w tle przed wygaśnięciem
+            self.calendar_service = manager.service('calendar', 'v3')
+            self.gmail_service = manager.service('gmail', 'v1')
+            self.docs_service = manager.service('docs', 'v1')
+            self.drive_service = manager.service('drive', 'v3')
+            manager.start_background_refresh()
                 
         except Exception as e:
-            print(f"⚠️ Nie można zapisać odświeżonego tokena: {e}")
+            logger.error("❌ Błąd konfiguracji Google APIs: %s", e)
+            raise
+
 
 async def get_calendar_events(
     calendar_id: str = "primary",
@@ -113,16 +81,29 @@ async def get_calendar_events(
             tomorrow_end = datetime.utcnow().replace(hour=23, minute=59, second=59) + timedelta(days=1)
             time_max = tomorrow_end.isoformat() + 'Z'
         
-        print(f"📅 Pobieranie wydarzeń kalendarza {calendar_id} od {time_min} do {time_max}")
+        # Lokalny mirror (workspace_sync.py) zamiast Calendar API, gdy obejmuje zakres
+        if calendar_id == "primary":
+            mirrored = await read_events(get_mirror(OAUTH_ACCOUNT), time_min, time_max, max_results)
+            if mirrored is not None:
+                return {
+                    'success': True,
+                    'events_count': len(mirrored),
+                    'events': mirrored,
+                    'calendar_id': calendar_id,
+                    'time_range': f"{time_min} do {time_max}",
+                    'source': 'mirror'
+                }
+        
+        logger.debug("📅 Pobieranie wydarzeń kalendarza %s od %s do %s", calendar_id, time_min, time_max)
         
-        events_result = tools.calendar_service.events().list(
+        events_result = await _execute(tools.calendar_service.events().list(
             calendarId=calendar_id,
             timeMin=time_min,
             timeMax=time_max,
             maxResults=max_results,
             singleEvents=True,
             orderBy='startTime'
-        ).execute()
+        ), "calendar")
         
         events = events_result.get('items', [])
         
@@ -156,6 +137,7 @@ async def get_calendar_events(
             'message': f"Błąd pobierania wydarzeń kalendarza: {e}"
         }
 
+
 async def get_gmail_messages(
     user_id: str = "me",
     query: str = "",
@@ -176,26 +158,39 @@ async def get_gmail_messages(
     - "" - wszystkie najnowsze emaile
     """
     try:
+        # Najczęstsze zapytania (najnowsze / nieprzeczytane) z lokalnego mirrora zamiast Gmail API
+        if user_id == "me" and query.strip() in ("", "is:unread"):
+            mirrored = await read_messages(get_mirror(OAUTH_ACCOUNT), query.strip() == "is:unread", max_results)
+            if mirrored is not None:
+                return {
+                    'success': True,
+                    'messages_count': len(mirrored),
+                    'messages': mirrored,
+                    'user_id': user_id,
+                    'query': query,
+                    'source': 'mirror'
+                }
+        
         tools = CustomGoogleTools()
         
-        print(f"📧 Pobieranie wiadomości Gmail dla {user_id}, query: '{query}'")
+        logger.debug("📧 Pobieranie wiadomości Gmail dla %s, query: '%s'", user_id, query)
         
         # Pobierz listę wiadomości
-        messages_result = tools.gmail_service.users().messages().list(
+        messages_result = await _execute(tools.gmail_service.users().messages().list(
             userId=user_id,
             q=query,
             maxResults=max_results
-        ).execute()
+        ), "gmail")
         
         messages = messages_result.get('messages', [])
         
         formatted_messages = []
         for msg in messages:
             # Pobierz szczegóły każdej wiadomości
-            message = tools.gmail_service.users().messages().get(
+            message = await _execute(tools.gmail_service.users().messages().get(
                 userId=user_id,
                 id=msg['id']
-            ).execute()
+            ), "gmail")
             
             # Wyciągnij nagłówki
             headers = message['payload'].get('headers', [])
@@ -227,6 +222,7 @@ async def get_gmail_messages(
             'message': f"Błąd pobierania wiadomości Gmail: {e}"
         }
 
+
 async def get_gmail_message_content(
     message_id: str,
     user_id: str = "me"
@@ -241,14 +237,14 @@ async def get_gmail_message_content(
     try:
         tools = CustomGoogleTools()
         
-        print(f"📧 Pobieranie treści wiadomości {message_id} dla {user_id}")
+        logger.debug("📧 Pobieranie treści wiadomości %s dla %s", message_id, user_id)
         
         # Pobierz szczegóły wiadomości
-        message = tools.gmail_service.users().messages().get(
+        message = await _execute(tools.gmail_service.users().messages().get(
             userId=user_id,
             id=message_id,
             format='full'
-        ).execute()
+        ), "gmail")
         
         # Wyciągnij nagłówki
         headers = message['payload'].get('headers', [])
@@ -295,6 +291,7 @@ async def get_gmail_message_content(
             'message': f"Błąd pobierania treści wiadomości: {e}"
         }
 
+
 async def create_calendar_event(
     title: str,
     start_time: str,
@@ -349,17 +346,17 @@ async def create_calendar_event(
             },
         }
         
-        print(f"📅 Tworzenie wydarzenia: {title} w kalendarzu {calendar_id}")
+        logger.debug("📅 Tworzenie wydarzenia: %s w kalendarzu %s", title, calendar_id)
         
         # Dodaj timeout żeby uniknąć zawieszenia
         import socket
         socket.setdefaulttimeout(30)  # 30 sekund timeout
         
-        created_event = tools.calendar_service.events().insert(
+        created_event = await _execute(tools.calendar_service.events().insert(
             calendarId=calendar_id,
             body=event,
             conferenceDataVersion=1  # Wymagane dla conferenceData
-        ).execute()
+        ), "calendar")
         
         # Pobierz informacje o Google Meet
         conference_data = created_event.get('conferenceData', {})
@@ -388,6 +385,7 @@ async def create_calendar_event(
             'message': f"Błąd tworzenia wydarzenia: {e}"
         }
 
+
 async def update_calendar_event(
     event_id: str,
     title: Optional[str] = None,
@@ -415,12 +413,12 @@ async def update_calendar_event(
         tools = CustomGoogleTools()
         
         # Pobierz istniejące wydarzenie
-        existing_event = tools.calendar_service.events().get(
+        existing_event = await _execute(tools.calendar_service.events().get(
             calendarId=calendar_id,
             eventId=event_id
-        ).execute()
+        ), "calendar")
         
-        print(f"📅 Aktualizowanie wydarzenia: {event_id}")
+        logger.debug("📅 Aktualizowanie wydarzenia: %s", event_id)
         
         # Aktualizuj tylko te pola które zostały podane
         if title is not None:
@@ -446,11 +444,11 @@ async def update_calendar_event(
         import socket
         socket.setdefaulttimeout(30)  # 30 sekund timeout
         
-        updated_event = tools.calendar_service.events().update(
+        updated_event = await _execute(tools.calendar_service.events().update(
             calendarId=calendar_id,
             eventId=event_id,
             body=existing_event
-        ).execute()
+        ), "calendar")
         
         return {
             'success': True,
@@ -467,6 +465,7 @@ async def update_calendar_event(
             'message': f"Błąd aktualizacji wydarzenia: {e}"
         }
 
+
 async def delete_calendar_event(
     event_id: str,
     calendar_id: str = "primary"
@@ -481,16 +480,16 @@ async def delete_calendar_event(
     try:
         tools = CustomGoogleTools()
         
-        print(f"🗑️ Usuwanie wydarzenia: {event_id}")
+        logger.debug("🗑️ Usuwanie wydarzenia: %s", event_id)
         
         # Dodaj timeout żeby uniknąć zawieszenia
         import socket
         socket.setdefaulttimeout(30)
         
-        tools.calendar_service.events().delete(
+        await _execute(tools.calendar_service.events().delete(
             calendarId=calendar_id,
             eventId=event_id
-        ).execute()
+        ), "calendar")
         
         return {
             'success': True,
@@ -506,6 +505,7 @@ async def delete_calendar_event(
             'message': f"Błąd usuwania wydarzenia: {e}"
         }
 
+
 # Google Docs API functions
 async def create_google_doc(
     title: str,
@@ -523,7 +523,7 @@ async def create_google_doc(
     try:
         tools = CustomGoogleTools()
         
-        print(f"📄 Tworzenie dokumentu Google Docs: {title}")
+        logger.debug("📄 Tworzenie dokumentu Google Docs: %s", title)
         
         # Dodaj timeout żeby uniknąć zawieszenia
         import socket
@@ -538,9 +538,9 @@ async def create_google_doc(
         if folder_id:
             doc_metadata['parents'] = [folder_id]
         
-        doc = tools.docs_service.documents().create(body={
+        doc = await _execute(tools.docs_service.documents().create(body={
             'title': title
-        }).execute()
+        }), "docs")
         
         doc_id = doc.get('documentId')
         
@@ -557,22 +557,21 @@ async def create_google_doc(
                 }
             ]
             
-            tools.docs_service.documents().batchUpdate(
+            await _execute(tools.docs_service.documents().batchUpdate(
                 documentId=doc_id,
                 body={'requests': requests}
-            ).execute()
+            ), "docs")
         
         # Przenieś do odpowiedniego folderu w Drive jeśli podano
         if folder_id and hasattr(tools, 'drive_service'):
             try:
-                tools.drive_service.files().update(
+                await _execute(tools.drive_service.files().update(
                     fileId=doc_id,
                     addParents=folder_id,
                     fields='id, parents'
-                ).execute()
+                ), "drive")
             except Exception as e:
-                print(f"⚠️ Nie można przenieść do folderu: {e}")
-        
+                logger.warning("⚠️ Nie można przenieść do folderu: %s", e)
         return {
             'success': True,
             'document_id': doc_id,
@@ -583,13 +582,14 @@ async def create_google_doc(
         }
         
     except Exception as e:
-        print(f"❌ Błąd tworzenia dokumentu: {e}")
+        logger.error("❌ Błąd tworzenia dokumentu: %s", e)
         return {
             'success': False,
             'error': str(e),
             'message': f'Nie można utworzyć dokumentu: {e}'
         }
 
+
 async def get_google_doc_content(
     document_id: str
 ) -> Dict[str, Any]:
@@ -602,14 +602,14 @@ async def get_google_doc_content(
     try:
         tools = CustomGoogleTools()
         
-        print(f"📄 Pobieranie treści dokumentu: {document_id}")
+        logger.debug("📄 Pobieranie treści dokumentu: %s", document_id)
         
         # Dodaj timeout żeby uniknąć zawieszenia
         import socket
         socket.setdefaulttimeout(30)
         
         # Pobierz dokument
-        document = tools.docs_service.documents().get(documentId=document_id).execute()
+        document = await _execute(tools.docs_service.documents().get(documentId=document_id), "docs")
         
         title = document.get('title', 'Bez tytułu')
         
@@ -638,13 +638,14 @@ async def get_google_doc_content(
         }
         
     except Exception as e:
-        print(f"❌ Błąd pobierania dokumentu: {e}")
+        logger.error("❌ Błąd pobierania dokumentu: %s", e)
         return {
             'success': False,
             'error': str(e),
             'message': f'Nie można pobrać dokumentu: {e}'
         }
 
+
 async def update_google_doc(
     document_id: str,
     new_content: str,
@@ -661,7 +662,7 @@ async def update_google_doc(
     try:
         tools = CustomGoogleTools()
         
-        print(f"📄 Aktualizacja dokumentu: {document_id}")
+        logger.debug("📄 Aktualizacja dokumentu: %s", document_id)
         
         # Dodaj timeout żeby uniknąć zawieszenia
         import socket
@@ -682,7 +683,7 @@ async def update_google_doc(
         else:
             # Zastąp całą treść
             # Najpierw pobierz dokument żeby znać długość
-            document = tools.docs_service.documents().get(documentId=document_id).execute()
+            document = await _execute(tools.docs_service.documents().get(documentId=document_id), "docs")
             
             # Znajdź koniec dokumentu
             body = document.get('body', {})
@@ -709,10 +710,10 @@ async def update_google_doc(
             })
         
         # Wykonaj aktualizację
-        result = tools.docs_service.documents().batchUpdate(
+        result = await _execute(tools.docs_service.documents().batchUpdate(
             documentId=document_id,
             body={'requests': requests}
-        ).execute()
+        ), "docs")
         
         return {
             'success': True,
@@ -725,13 +726,14 @@ async def update_google_doc(
         }
         
     except Exception as e:
-        print(f"❌ Błąd aktualizacji dokumentu: {e}")
+        logger.error("❌ Błąd aktualizacji dokumentu: %s", e)
         return {
             'success': False,
             'error': str(e),
             'message': f'Nie można zaktualizować dokumentu: {e}'
         }
 
+
 async def list_google_docs(
     max_results: int = 10,
     search_query: str = ""
@@ -746,7 +748,7 @@ async def list_google_docs(
     try:
         tools = CustomGoogleTools()
         
-        print(f"📄 Pobieranie listy dokumentów Google Docs...")
+        logger.debug("📄 Pobieranie listy dokumentów Google Docs...")
         
         # Dodaj timeout żeby uniknąć zawieszenia
         import socket
@@ -758,12 +760,12 @@ async def list_google_docs(
             query += f" and name contains '{search_query}'"
         
         # Pobierz listę dokumentów przez Drive API v3
-        results = tools.drive_service.files().list(
+        results = await _execute(tools.drive_service.files().list(
             q=query,
             pageSize=max_results,
             fields='files(id,name,modifiedTime,owners)',
             orderBy='modifiedTime desc'
-        ).execute()
+        ), "drive")
         
         documents = results.get('files', [])
         
@@ -788,13 +790,14 @@ async def list_google_docs(
         }
         
     except Exception as e:
-        print(f"❌ Błąd pobierania listy dokumentów: {e}")
+        logger.error("❌ Błąd pobierania listy dokumentów: %s", e)
         return {
             'success': False,
             'error': str(e),
             'message': f'Nie można pobrać listy dokumentów: {e}'
         }
 
+
 async def list_drawio_files(
     max_results: int = 10,
     search_query: str = ""
@@ -809,7 +812,7 @@ async def list_drawio_files(
     try:
         tools = CustomGoogleTools()
         
-        print(f"🎨 Pobieranie listy plików draw.io z Google Drive...")
+        logger.debug("🎨 Pobieranie listy plików draw.io z Google Drive...")
         
         # Dodaj timeout żeby uniknąć zawieszenia
         import socket
@@ -833,18 +836,18 @@ async def list_drawio_files(
                 full_query = query
             
             try:
-                results = tools.drive_service.files().list(
+                results = await _execute(tools.drive_service.files().list(
                     q=full_query,
                     pageSize=max_results,
                     fields='files(id,name,mimeType,modifiedTime,size,webViewLink,owners)',
                     orderBy='modifiedTime desc'
-                ).execute()
+                ), "drive")
                 
                 files = results.get('files', [])
                 all_files.extend(files)
                 
             except Exception as e:
-                print(f"⚠️ Błąd dla zapytania '{query}': {e}")
+                logger.warning("⚠️ Błąd dla zapytania '%s': %s", query, e)
                 continue
         
         # Usuń duplikaty na podstawie ID
@@ -878,13 +881,14 @@ async def list_drawio_files(
         }
         
     except Exception as e:
-        print(f"❌ Błąd pobierania plików draw.io: {e}")
+        logger.error("❌ Błąd pobierania plików draw.io: %s", e)
         return {
             'success': False,
             'error': str(e),
             'message': f'Nie można pobrać plików draw.io: {e}'
         }
 
+
 async def get_drawio_content(
     file_id: str
 ) -> Dict[str, Any]:
@@ -897,20 +901,20 @@ async def get_drawio_content(
     try:
         tools = CustomGoogleTools()
         
-        print(f"🎨 Pobieranie treści pliku draw.io: {file_id}")
+        logger.debug("🎨 Pobieranie treści pliku draw.io: %s", file_id)
         
         # Dodaj timeout żeby uniknąć zawieszenia
         import socket
         socket.setdefaulttimeout(30)
         
         # Pobierz metadane pliku
-        file_metadata = tools.drive_service.files().get(
+        file_metadata = await _execute(tools.drive_service.files().get(
             fileId=file_id,
             fields='id,name,mimeType,size,modifiedTime,webViewLink,owners'
-        ).execute()
+        ), "drive")
         
         # Pobierz treść pliku
-        content = tools.drive_service.files().get_media(fileId=file_id).execute()
+        content = await _execute(tools.drive_service.files().get_media(fileId=file_id), "drive")
         
         # Dekoduj treść
         if isinstance(content, bytes):
@@ -950,8 +954,7 @@ async def get_drawio_content(
                 diagram_texts = list(dict.fromkeys(diagram_texts))
                 
             except Exception as e:
-                print(f"⚠️ Błąd parsowania XML: {e}")
-        
+                logger.warning("⚠️ Błąd parsowania XML: %s", e)
         return {
             'success': True,
             'file_id': file_id,
@@ -971,13 +974,14 @@ async def get_drawio_content(
         }
         
     except Exception as e:
-        print(f"❌ Błąd pobierania treści draw.io: {e}")
+        logger.error("❌ Błąd pobierania treści draw.io: %s", e)
         return {
             'success': False,
             'error': str(e),
             'message': f'Nie można pobrać treści pliku draw.io: {e}'
         }
 
+
 async def search_drawio_diagrams(
     search_text: str,
     max_results: int = 10
@@ -990,7 +994,7 @@ async def search_drawio_diagrams(
         max_results: Maksymalna liczba wyników
     """
     try:
-        print(f"🔍 Wyszukiwanie '{search_text}' w diagramach draw.io...")
+        logger.debug("🔍 Wyszukiwanie '%s' w diagramach draw.io...", search_text)
         
         # Najpierw pobierz wszystkie pliki draw.io
         all_files_result = await list_drawio_files(max_results=50)
@@ -1037,7 +1041,7 @@ async def search_drawio_diagrams(
                         matching_files.append(match_info)
                 
             except Exception as e:
-                print(f"⚠️ Błąd przeszukiwania pliku {file_info['name']}: {e}")
+                logger.warning("⚠️ Błąd przeszukiwania pliku %s: %s", file_info['name'], e)
                 continue
         
         # Ogranicz wyniki
@@ -1053,13 +1057,14 @@ async def search_drawio_diagrams(
         }
         
     except Exception as e:
-        print(f"❌ Błąd wyszukiwania w diagramach draw.io: {e}")
+        logger.error("❌ Błąd wyszukiwania w diagramach draw.io: %s", e)
         return {
             'success': False,
             'error': str(e),
             'message': f'Nie można przeszukać diagramów draw.io: {e}'
         }
 
+
 async def send_gmail_message(
     to: str,
     subject: str,
@@ -1082,7 +1087,7 @@ async def send_gmail_message(
     try:
         tools = CustomGoogleTools()
         
-        print(f"📤 Wysyłanie emaila do: {to}, temat: '{subject}'")
+        logger.debug("📤 Wysyłanie emaila do: %s, temat: '%s'", to, subject)
         
         # Buduj wiadomość email
         message = f"To: {to}\n"
@@ -1104,10 +1109,10 @@ async def send_gmail_message(
         }
         
         # Wyślij wiadomość
-        sent_message = tools.gmail_service.users().messages().send(
+        sent_message = await _execute(tools.gmail_service.users().messages().send(
             userId=user_id,
             body=gmail_message
-        ).execute()
+        ), "gmail")
         
         return {
             'success': True,
@@ -1122,7 +1127,7 @@ async def send_gmail_message(
         }
         
     except Exception as e:
-        print(f"❌ Błąd wysyłania emaila: {e}")
+        logger.error("❌ Błąd wysyłania emaila: %s", e)
         return {
             'success': False,
             'error': str(e),
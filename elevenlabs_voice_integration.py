@@ -9,13 +9,24 @@ import requests
 import asyncio
 import aiohttp
 import io
+import json
 from typing import Optional, Dict, List
 from datetime import datetime
 from dotenv import load_dotenv
 
+from admission_control import upstream_slot
+from agent_metrics import TTS_CHARACTERS
+from agent_tracing import span
+from tts_text_normalizer import prepare_for_tts
+
 # Load environment variables
 load_dotenv()
 
+# Silnik TTS agentów: elevenlabs | google (GoogleCloudTTS); bez klucza ElevenLabs - Google, jeśli dostępny
+TTS_PROVIDER = os.getenv("TTS_PROVIDER", "elevenlabs").lower()
+# Audio odpowiedzi wysyłane fragmentami w miarę syntezy (0 = jedna ramka z całym audio)
+TTS_STREAMING = os.getenv("TTS_STREAMING", "1").lower() in ("1", "true", "yes")
+
 class ElevenLabsVoiceManager:
     """Manager dla integracji z ElevenLabs API"""
     
@@ -80,22 +91,24 @@ class ElevenLabsVoiceManager:
             "voice_settings": self.voice_settings
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data, headers=headers) as response:
-                if response.status == 200:
-                    audio_data = await response.read()
+        TTS_CHARACTERS.labels("elevenlabs").inc(len(text))
+        with span("tts.synthesize", **{"tts.provider": "elevenlabs", "tts.chars": len(text)}):
+            async with upstream_slot("tts"), aiohttp.ClientSession() as session:
+                async with session.post(url, json=data, headers=headers) as response:
+                    if response.status == 200:
+                        audio_data = await response.read()
                     
-                    # Zapis do pliku jeśli podano ścieżkę
-                    if save_path:
-                        with open(save_path, 'wb') as f:
-                            f.write(audio_data)
-                        print(f"✅ Audio zapisane: {save_path}")
+                        # Zapis do pliku jeśli podano ścieżkę
+                        if save_path:
+                            with open(save_path, 'wb') as f:
+                                f.write(audio_data)
+                            print(f"✅ Audio zapisane: {save_path}")
                     
-                    return audio_data
-                else:
-                    error_text = await response.text()
-                    print(f"❌ Błąd generowania mowy: {response.status} - {error_text}")
-                    return b""
+                        return audio_data
+                    else:
+                        error_text = await response.text()
+                        print(f"❌ Błąd generowania mowy: {response.status} - {error_text}")
+                        return b""
     
     async def generate_speech_stream(self, text: str, voice_id: Optional[str] = None):
         """
@@ -118,10 +131,11 @@ class ElevenLabsVoiceManager:
             "voice_settings": self.voice_settings
         }
         
-        async with aiohttp.ClientSession() as session:
+        TTS_CHARACTERS.labels("elevenlabs").inc(len(text))
+        async with upstream_slot("tts"), aiohttp.ClientSession() as session:
             async with session.post(url, json=data, headers=headers) as response:
                 if response.status == 200:
-                    async for chunk in response.content.iter_chunked(1024):
+                    async for chunk in response.content.iter_chunked(16 * 1024):
                         yield chunk
                 else:
                     error_text = await response.text()
@@ -192,58 +206,81 @@ class ElevenLabsVoiceManager:
         """
         Optymalizuje tekst dla lepszej jakości TTS w czasie rzeczywistym
         """
-        # Usuń nadmierne formatting
-        text = text.replace("📊", "").replace("✅", "").replace("🎯", "")
-        text = text.replace("📅", "").replace("⏰", "").replace("📋", "")
-        
-        # Dodaj pauzy dla lepszej dykcji
-        text = text.replace(".", ". ")
-        text = text.replace("!", "! ")
-        text = text.replace("?", "? ")
-        
-        # Skróć długie teksty
-        if len(text) > 500:
-            sentences = text.split(". ")
-            text = ". ".join(sentences[:3]) + "."
-        
-        return text.strip()
+        # Bez emoji i markdown, liczby słownie, tylko pełne zdania do limitu
+        return prepare_for_tts(text, max_chars=500)
+
+def create_voice_manager(gcp_manager=None):
+    """
+    Silnik TTS według TTS_PROVIDER: ElevenLabsVoiceManager albo GoogleCloudTTS
+    
+    Bez ELEVENLABS_API_KEY agent mówi głosem Google Cloud TTS (gdy gcp_manager jest dostępny).
+    """
+    if gcp_manager is not None and (TTS_PROVIDER == "google" or not os.getenv("ELEVENLABS_API_KEY")):
+        from google_cloud_integration import GoogleCloudTTS
+        return GoogleCloudTTS(gcp_manager)
+    return ElevenLabsVoiceManager()
 
 class UE5AudioStreamer:
-    """Streamer audio dla integracji z UE5"""
+    """Streamer audio dla integracji z UE5 (ElevenLabs lub GoogleCloudTTS)"""
     
     def __init__(self, voice_manager: ElevenLabsVoiceManager):
         self.voice_manager = voice_manager
         self.audio_queue = asyncio.Queue()
+        # GoogleCloudTTS może zwracać WAV/OGG Opus zamiast MP3
+        self.audio_format = getattr(voice_manager, "audio_format", "mp3")
+        # Format fragmentów generate_speech_stream (GoogleCloudTTS LINEAR16: PCM bez nagłówków)
+        self.stream_audio_format = getattr(voice_manager, "stream_audio_format", self.audio_format)
+        self.streaming = TTS_STREAMING and hasattr(voice_manager, "generate_speech_stream")
         
     async def stream_to_ue5(self, text: str, websocket=None):
         """
         Streamuje audio do UE5 przez WebSocket
+        
+        W trybie strumieniowym każdy fragment syntezy to osobna ramka audio (seq),
+        a ramka audio_complete zamyka wypowiedź - UE5 zaczyna odtwarzać po pierwszym zdaniu.
         """
         try:
             # Optymalizuj tekst dla TTS
             optimized_text = await self.voice_manager.optimize_for_realtime(text)
             
-            # Generuj audio
-            audio_data = await self.voice_manager.generate_speech(optimized_text)
+            if not self.streaming:
+                audio_data = await self.voice_manager.generate_speech(optimized_text)
+                if audio_data and websocket:
+                    await self._send_audio(websocket, audio_data, self.audio_format, text)
+                    print(f"🔊 Audio wysłane do UE5: {len(audio_data)} bytes")
+                return
             
-            if audio_data and websocket:
-                # Wyślij audio jako base64 do UE5
-                import base64
-                audio_b64 = base64.b64encode(audio_data).decode('utf-8')
-                
-                audio_message = {
-                    "type": "audio",
-                    "data": audio_b64,
-                    "format": "mp3",
-                    "text": text,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                await websocket.send(str(audio_message))
-                print(f"🔊 Audio wysłane do UE5: {len(audio_data)} bytes")
+            sent = total = 0
+            fields = {"sample_rate": self.voice_manager.sample_rate} \
+                if self.stream_audio_format.startswith("pcm") else {}
+            async for chunk in self.voice_manager.generate_speech_stream(optimized_text):
+                if websocket:
+                    await self._send_audio(websocket, chunk, self.stream_audio_format, text, seq=sent, **fields)
+                sent += 1
+                total += len(chunk)
+            if sent and websocket:
+                await self._send_frame(websocket, "audio_complete", format=self.stream_audio_format,
+                                       chunks=sent, bytes=total)
+                print(f"🔊 Audio wysłane do UE5: {total} bytes w {sent} fragmentach")
                 
         except Exception as e:
             print(f"❌ Błąd streaming audio: {e}")
+    
+    async def _send_audio(self, websocket, audio: bytes, audio_format: str, text: str, **fields):
+        if hasattr(websocket, "send_audio"):
+            # Połączenie bramki - binarnie lub base64, zależnie od klienta
+            await websocket.send_audio(audio, audio_format, text=text, **fields)
+            return
+        # Surowy websocket - ramka JSON z audio w base64
+        import base64
+        await self._send_frame(websocket, "audio", data=base64.b64encode(audio).decode('utf-8'),
+                               format=audio_format, text=text, **fields)
+    
+    async def _send_frame(self, websocket, frame_type: str, **fields):
+        if hasattr(websocket, "send_frame"):
+            await websocket.send_frame(frame_type, **fields)
+            return
+        await websocket.send(json.dumps({"type": frame_type, **fields, "timestamp": datetime.now().isoformat()}))
 
 # Test funkcji
 async def test_elevenlabs():
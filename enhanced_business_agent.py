@@ -11,7 +11,6 @@ Najlepszy z dwóch światów:
 
 import os
 import asyncio
-import json
 import base64
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
@@ -21,18 +20,30 @@ from dotenv import load_dotenv
 from google.adk.agents import LlmAgent
 from google.adk.tools import google_search_tool
 from google.adk.tools.function_tool import FunctionTool
-from google.adk.runners import InMemoryRunner
+from mock_llm_backend import create_model
+from agent_tracing import AdkSpanCallbacks, setup_tracing
+from agent_metrics import model_usage_callback, tool_call_callback
+
+from adk_turn_runner import ADKTurnRunner, CLI_CONNECTION
+from ws_gateway import ConversationBackend, WebSocketGateway
 
 # ElevenLabs integration
-from elevenlabs_voice_integration import ElevenLabsVoiceManager, UE5AudioStreamer
+from elevenlabs_voice_integration import UE5AudioStreamer, create_voice_manager
 
 # Google Cloud integration (bez TTS)
 from google_cloud_integration import GoogleCloudManager, GoogleBusinessIntegration, GoogleAnalytics
 
+# Poranny briefing liczony w tle
+from briefing_scheduler import BriefingAgentMixin, section_data
+from session_database import SessionDatabase
+from token_accounting import TokenAccountant
+from history_compaction import HistoryCompactor
+
 # Load environment
 load_dotenv()
+setup_tracing("enhanced-business-agent")
 
-class EnhancedMetaHumanAgent:
+class EnhancedMetaHumanAgent(BriefingAgentMixin):
     """
     Zaawansowany MetaHuman Business Assistant
     🎤 ElevenLabs Voice + ☁️ Google Cloud APIs + 🤖 ADK
@@ -41,11 +52,6 @@ class EnhancedMetaHumanAgent:
     def __init__(self):
         print("🚀 Inicjalizuję Enhanced MetaHuman Business Assistant...")
         
-        # ElevenLabs Voice (główny TTS)
-        self.voice_manager = ElevenLabsVoiceManager()
-        self.audio_streamer = UE5AudioStreamer(self.voice_manager)
-        print("✅ ElevenLabs Voice Manager")
-        
         # Google Cloud Business APIs
         try:
             self.gcp_manager = GoogleCloudManager()
@@ -58,6 +64,14 @@ class EnhancedMetaHumanAgent:
             self.business_integration = None
             self.analytics = None
         
+        # Głos: ElevenLabs (główny TTS) albo strumieniowy Google Cloud TTS (TTS_PROVIDER, brak klucza ElevenLabs)
+        self.voice_manager = create_voice_manager(self.gcp_manager)
+        self.audio_streamer = UE5AudioStreamer(self.voice_manager)
+        print(f"✅ Voice Manager: {type(self.voice_manager).__name__}")
+        
+        # Snapshot briefingu i mirror Gmail/Calendar - start razem z serwerem
+        self.setup_briefing(self.gcp_manager, self.business_integration)
+        
         # Setup ADK Agent
         self.setup_agent()
         print("✅ Google ADK Agent configured")
@@ -71,6 +85,7 @@ class EnhancedMetaHumanAgent:
             google_search_tool,
             
             # Custom business functions 
+            FunctionTool(self.get_morning_briefing),
             FunctionTool(self.get_calendar_summary),
             FunctionTool(self.get_email_summary),
             FunctionTool(self.create_meeting),
@@ -81,8 +96,27 @@ class EnhancedMetaHumanAgent:
         ]
         
         # Main ADK Agent
+        self.spans = AdkSpanCallbacks()
+        database = SessionDatabase()
+        model = create_model("gemini-2.0-flash")
+        self.token_usage = TokenAccountant(database)
+        self.history = HistoryCompactor(database, model)
+        
+        async def before_model_callback(callback_context, llm_request):
+            self.spans.before_model_callback(callback_context, llm_request)
+            await self.history.before_model_callback(callback_context, llm_request)
+            return await self.token_usage.before_model_callback(callback_context, llm_request)
+        
+        async def after_model_callback(callback_context, llm_response):
+            self.spans.after_model_callback(callback_context, llm_response)
+            model_usage_callback(callback_context, llm_response)
+            return await self.token_usage.after_model_callback(callback_context, llm_response)
+        
+        def after_tool_callback(tool, args, tool_context, tool_response):
+            self.spans.after_tool_callback(tool, args, tool_context, tool_response)
+            return tool_call_callback(tool, args, tool_context, tool_response)
         self.agent = LlmAgent(
-            model="gemini-2.0-flash",
+            model=model,
             name="Enhanced_MetaHuman_Assistant",
             instruction="""
             Jesteś zaawansowanym asystentem biznesowym MetaHuman z pełną integracją Google Cloud.
@@ -107,12 +141,21 @@ class EnhancedMetaHumanAgent:
             
             ZAWSZE:
             - Wykorzystuj prawdziwe dane z Google APIs
+            - Przy pytaniach o plan dnia najpierw użyj get_morning_briefing (gotowe dane)
             - Proponuj konkretne działania
             - Myśl jak doświadczony asystent executivny
             - Optymalizuj odpowiedzi dla naturalnego głosu
             """,
-            tools=business_tools
+            tools=business_tools,
+            # Spany (AGENT_TRACING=1) i metryki modelu oraz narzędzi
+            before_model_callback=before_model_callback,
+            after_model_callback=after_model_callback,
+            before_tool_callback=self.spans.before_tool_callback,
+            after_tool_callback=after_tool_callback
         )
+        
+        # Jeden runner na cały proces, sesja ADK per połączenie
+        self.turn_runner = ADKTurnRunner(self.agent, app_name="EnhancedMetaHumanAssistant")
     
     # === GOOGLE CLOUD BUSINESS FUNCTIONS ===
     
@@ -146,7 +189,11 @@ class EnhancedMetaHumanAgent:
             return "⚠️ Gmail niedostępny - sprawdź konfigurację"
         
         try:
-            emails = await self.business_integration.get_recent_emails(max_emails)
+            # Gotowy snapshot briefingu zamiast zapytań do Gmail
+            emails = section_data(await self._briefing_snapshot(), "emails")
+            if emails is None:
+                emails = await self.business_integration.get_recent_emails(max_emails)
+            emails = emails[:max_emails]
             
             if not emails:
                 return "📧 Brak nieprzeczytanych emaili. Inbox zero achieved!"
@@ -243,6 +290,8 @@ class EnhancedMetaHumanAgent:
         """Generuje raport biznesowy"""
         current_time = datetime.now()
         
+        today = "\n        ".join(await self.briefing_report_lines())
+        
         return f"""
         📊 RAPORT BIZNESOWY - {report_type.upper()}
         
@@ -254,6 +303,9 @@ class EnhancedMetaHumanAgent:
         • ElevenLabs Voice: ✅ Premium Quality
         • Analytics Engine: {'✅ Recording' if self.analytics else '⚠️ Offline'}
         
+        📆 DZIŚ:
+        {today}
+        
         💼 GOTOWOŚĆ BIZNESOWA: 100%
         
         📋 NASTĘPNE KROKI:
@@ -276,10 +328,9 @@ class EnhancedMetaHumanAgent:
         start_time = datetime.now()
         
         try:
-            # Run ADK agent
-            runner = InMemoryRunner(self.agent)
-            response = await runner.run(user_input)
-            response_text = response.text if hasattr(response, 'text') else str(response)
+            # Run ADK agent (wspólny runner, kontekst w sesji połączenia)
+            connection = websocket if websocket is not None else CLI_CONNECTION
+            response_text = await self.turn_runner.ask(user_input, connection, websocket)
             
             # Generate voice with ElevenLabs
             if websocket:
@@ -300,6 +351,10 @@ class EnhancedMetaHumanAgent:
                 await self.audio_streamer.stream_to_ue5(error_msg, websocket)
             
             return error_msg
+    
+    async def end_conversation(self, websocket=None):
+        """Zamyka sesję ADK połączenia"""
+        await self.turn_runner.release(websocket if websocket is not None else CLI_CONNECTION)
 
 # WebSocket Server dla UE5
 class EnhancedUE5Server:
@@ -308,59 +363,34 @@ class EnhancedUE5Server:
     def __init__(self, agent: EnhancedMetaHumanAgent, port: int = 8765):
         self.agent = agent
         self.port = port
+        self.gateway = None
         
     async def start_server(self):
-        """Uruchamia WebSocket server"""
-        import websockets
-        
-        async def handle_client(websocket, path):
-            print(f"🎭 MetaHuman Avatar połączony: {websocket.remote_address}")
-            
-            try:
-                # Welcome message
-                welcome_msg = {
-                    "type": "system",
-                    "content": "🎭 Enhanced MetaHuman Business Assistant gotowy!",
-                    "features": [
-                        "🎤 ElevenLabs Premium Voice",
-                        "📅 Real Google Calendar",
-                        "📧 Live Gmail Integration", 
-                        "📊 BigQuery Analytics",
-                        "🤖 Google ADK AI"
-                    ],
-                    "timestamp": datetime.now().isoformat()
-                }
-                await websocket.send(json.dumps(welcome_msg))
-                
-                async for message in websocket:
-                    print(f"💬 User: {message}")
-                    
-                    # Process with enhanced agent (includes voice)
-                    response = await self.agent.run_conversation(message, websocket)
-                    
-                    # Send text response
-                    text_message = {
-                        "type": "text",
-                        "content": response,
-                        "timestamp": datetime.now().isoformat(),
-                        "voice": "elevenlabs",
-                        "model": "gemini-2.0-flash"
-                    }
-                    await websocket.send(json.dumps(text_message))
-                    print(f"🤖 Response sent: {response[:100]}...")
-                    
-            except websockets.exceptions.ConnectionClosed:
-                print("🔌 MetaHuman disconnected")
-            except Exception as e:
-                print(f"❌ Error: {e}")
-        
+        """Uruchamia WebSocket server (wspólna bramka)"""
+        backend = ConversationBackend(
+            self.agent,
+            name="Enhanced MetaHuman Business Assistant",
+            welcome_message="🎭 Enhanced MetaHuman Business Assistant gotowy!",
+            features=[
+                "🎤 ElevenLabs Premium Voice",
+                "📅 Real Google Calendar",
+                "📧 Live Gmail Integration", 
+                "📊 BigQuery Analytics",
+                "🤖 Google ADK AI"
+            ]
+        )
         print(f"🚀 Enhanced MetaHuman Server starting on port {self.port}")
         print(f"🎤 Voice: ElevenLabs Premium")
         print(f"☁️ Business APIs: Google Cloud")
         print(f"🤖 AI Engine: Google ADK + Gemini 2.0")
         print(f"🎭 Waiting for MetaHuman avatar connection...")
         
-        await websockets.serve(handle_client, "localhost", self.port)
+        # Briefing i synchronizacja w tle (potrzebują działającego event loopa)
+        self.agent.start_briefing()
+        # Wejście głosowe na credentials Service Account agenta (jeśli dostępne)
+        speech_input = self.agent.gcp_manager.speech_input if self.agent.gcp_manager else None
+        self.gateway = WebSocketGateway(backend, speech_input=speech_input)
+        await self.gateway.start("localhost", self.port)
 
 # Main Application
 if __name__ == "__main__":
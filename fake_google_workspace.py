@@ -0,0 +1,878 @@
+#!/usr/bin/env python3
+"""
+Lokalny, fałszywy Google Workspace (Gmail, Calendar, Docs, Drive) w procesie agenta
+Transport zgodny z httplib2 dla klientów googleapiclient - narzędzia wykonują swój
+zwykły kod, a odpowiedzi pochodzą z syntetycznych danych o zadanej skali.
+
+Włączenie: GOOGLE_WORKSPACE_FAKE=1 (get_credentials_manager() zwraca wtedy fałszywy manager)
+albo w kodzie: install(FakeWorkspace.seeded(emails=10000, diagrams=1000))
+
+Obsługiwane: gmail users.messages list/get/send, users.getProfile, users.history.list;
+calendar events list/get/insert/update/patch/delete (z syncToken); docs documents
+get/create/batchUpdate; drive files list/get/get_media/update.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import logging
+import threading
+import unicodedata
+from email import message_from_bytes
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timedelta, timezone
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+FAKE_EMAILS = int(os.getenv("FAKE_WORKSPACE_EMAILS", "1000"))
+FAKE_EVENTS = int(os.getenv("FAKE_WORKSPACE_EVENTS", "200"))
+FAKE_DOCUMENTS = int(os.getenv("FAKE_WORKSPACE_DOCUMENTS", "100"))
+FAKE_DIAGRAMS = int(os.getenv("FAKE_WORKSPACE_DIAGRAMS", "100"))
+FAKE_SEED = int(os.getenv("FAKE_WORKSPACE_SEED", "42"))
+FAKE_LATENCY = float(os.getenv("FAKE_WORKSPACE_LATENCY", "0.05"))  # s na żądanie
+FAKE_JITTER = float(os.getenv("FAKE_WORKSPACE_JITTER", "0.2"))  # ułamek opóźnienia
+FAKE_ERROR_RATE = float(os.getenv("FAKE_WORKSPACE_ERROR_RATE", "0"))  # losowe 429
+FAKE_QUOTA_QPS = float(os.getenv("FAKE_WORKSPACE_QUOTA_QPS", "0"))  # 0 = bez limitu
+
+ACCOUNT_EMAIL = "agent@example.com"
+DRAWIO_MIME = "application/vnd.jgraph.mxfile"
+GDOC_MIME = "application/vnd.google-apps.document"
+
+_FIRST_NAMES = ["Anna", "Piotr", "Katarzyna", "Tomasz", "Magdalena", "Paweł", "Agnieszka", "Marcin",
+                "Joanna", "Michał", "Ewa", "Krzysztof", "Monika", "Łukasz", "Aleksandra", "Jakub"]
+_LAST_NAMES = ["Nowak", "Kowalski", "Wiśniewski", "Wójcik", "Kamiński", "Lewandowski", "Zieliński", "Szymański"]
+_DOMAINS = ["firma.pl", "klient.com", "partner.eu", "dostawca.pl", "example.com"]
+_PROJECTS = ["Aurora", "Bałtyk", "Kompas", "Orion", "Wisła", "Tatry", "Fenix", "Mozaika"]
+_SUBJECTS = ["Faktura {n}/{year}", "Spotkanie: projekt {project}", "Raport tygodniowy {project}",
+             "Oferta współpracy - {project}", "Pytanie o harmonogram {project}", "Umowa {project} do akceptacji",
+             "Przypomnienie: termin {project}", "Notatka ze spotkania {project}", "Zmiana budżetu {project}"]
+_SENTENCES = ["Przesyłam dokumenty do przeglądu.", "Proszę o informację zwrotną do piątku.",
+              "W załączniku aktualny harmonogram.", "Budżet wymaga ponownej akceptacji.",
+              "Termin wdrożenia przesuwa się o tydzień.", "Klient potwierdził zakres prac.",
+              "Czy możemy umówić krótką rozmowę?", "Dziękuję za szybką odpowiedź."]
+_EVENT_TITLES = ["Daily {project}", "Przegląd sprintu {project}", "Spotkanie z klientem {project}",
+                 "Warsztat architektury {project}", "1:1", "Planowanie kwartału", "Demo {project}"]
+_DIAGRAM_KINDS = ["architektura", "przepływ danych", "proces sprzedaży", "infrastruktura", "model domeny"]
+
+
+def _ascii(text: str) -> str:
+    return unicodedata.normalize("NFKD", text.replace("ł", "l").replace("Ł", "L")).encode("ascii", "ignore").decode()
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def _rfc3339(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _parse_time(value: str) -> datetime:
+    if len(value) == 10:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class FakeApiError(Exception):
+    def __init__(self, status: int, message: str, reason: str = ""):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason or HTTPStatus(status).name.lower()
+
+
+# === Zapytania Drive (q) ===
+
+_DRIVE_TOKEN = re.compile(r"\s*(?:'((?:[^'\\]|\\.)*)'|(\(|\))|(!=|<=|>=|=|<|>)|([A-Za-z_]+))")
+
+
+def _drive_tokens(query: str) -> List[Tuple[str, str]]:
+    tokens, position = [], 0
+    query = query.strip()
+    while position < len(query):
+        match = _DRIVE_TOKEN.match(query, position)
+        if not match or match.end() == position:
+            raise FakeApiError(400, f"Invalid Value: {query}", "invalid")
+        string, paren, operator, word = match.groups()
+        if string is not None:
+            tokens.append(("value", string.replace("\\'", "'")))
+        elif paren:
+            tokens.append((paren, paren))
+        elif operator:
+            tokens.append(("op", operator))
+        elif word.lower() in ("and", "or", "not", "in", "contains"):
+            tokens.append((word.lower(), word.lower()))
+        else:
+            tokens.append(("word", word))
+        position = match.end()
+    return tokens
+
+
+def compile_drive_query(query: str) -> Callable[[Dict[str, Any]], bool]:
+    """Podzbiór składni q z Drive v3: =, !=, contains, <, >, in parents, and/or/not, nawiasy"""
+    tokens = _drive_tokens(query)
+    position = 0
+
+    def peek(kind: str) -> bool:
+        return position < len(tokens) and tokens[position][0] == kind
+
+    def take() -> Tuple[str, str]:
+        nonlocal position
+        if position >= len(tokens):
+            raise FakeApiError(400, f"Invalid Value: {query}", "invalid")
+        position += 1
+        return tokens[position - 1]
+
+    def expression():
+        terms = [conjunction()]
+        while peek("or"):
+            take()
+            terms.append(conjunction())
+        return lambda item: any(term(item) for term in terms)
+
+    def conjunction():
+        factors = [factor()]
+        while peek("and"):
+            take()
+            factors.append(factor())
+        return lambda item: all(check(item) for check in factors)
+
+    def factor():
+        if peek("not"):
+            take()
+            inner = factor()
+            return lambda item: not inner(item)
+        if peek("("):
+            take()
+            inner = expression()
+            take()
+            return inner
+        return predicate()
+
+    def predicate():
+        kind, first = take()
+        if kind == "value" and peek("in"):
+            take()
+            _, field = take()
+            return lambda item: first in item.get(field, [])
+        operator = take()[1]
+        _, value = take()
+        if value in ("true", "false"):
+            value = value == "true"
+        if first == "fullText":
+            needle = str(value).lower()
+            return lambda item: needle in item["name"].lower() or needle in item.get("_content", "").lower()
+        if operator == "contains":
+            needle = str(value).lower()
+            return lambda item: needle in str(item.get(first, "")).lower()
+        compare = {"=": lambda a, b: a == b, "!=": lambda a, b: a != b, "<": lambda a, b: a < b,
+                   ">": lambda a, b: a > b, "<=": lambda a, b: a <= b, ">=": lambda a, b: a >= b}[operator]
+        return lambda item: compare(item.get(first), value)
+
+    check = expression()
+    if position != len(tokens):
+        raise FakeApiError(400, f"Invalid Value: {query}", "invalid")
+    return check
+
+
+# === Zapytania Gmail (q) ===
+
+_GMAIL_TOKEN = re.compile(r'[(){}]|-?(?:[^\s"(){}]+:)?"[^"]*"|[^\s(){}]+')
+
+
+def _gmail_term(term: str) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    """Pojedynczy warunek (operator:wartość albo słowo); None dla nieobsługiwanych operatorów"""
+    operator, _, value = term.partition(":") if ":" in term else ("", "", term)
+    value = value.strip('"').lower()
+    operator = operator.lower()
+    if operator == "is":
+        label = {"unread": "UNREAD", "starred": "STARRED", "important": "IMPORTANT"}.get(value)
+        if value == "read":
+            return lambda message: "UNREAD" not in message["labelIds"]
+        if label:
+            return lambda message: label in message["labelIds"]
+    elif operator in ("label", "in"):
+        return lambda message, label=value.upper(): label in message["labelIds"]
+    elif operator in ("from", "to", "subject"):
+        return lambda message: value in message["_" + operator].lower()
+    elif operator in ("after", "before"):
+        moment = datetime.strptime(value.replace("-", "/"), "%Y/%m/%d").replace(tzinfo=timezone.utc)
+        millis = int(moment.timestamp() * 1000)
+        if operator == "after":
+            return lambda message: int(message["internalDate"]) >= millis
+        return lambda message: int(message["internalDate"]) < millis
+    elif operator == "newer_than":
+        units = {"d": 86400, "m": 30 * 86400, "y": 365 * 86400}
+        seconds = int(value[:-1]) * units.get(value[-1], 86400)
+        return lambda message: int(message["internalDate"]) >= (time.time() - seconds) * 1000
+    elif not operator:
+        word = term.strip('"').lower()
+        return lambda message: word in message["_subject"].lower() or word in message["_body"].lower()
+    return None
+
+
+def compile_gmail_query(query: str) -> Callable[[Dict[str, Any]], bool]:
+    """Podzbiór operatorów Gmail: is:, from:, to:, subject:, label:, in:, after:, before:, newer_than:, słowa,
+    OR, nawiasy (), grupy {} (dowolny z warunków) i negacja -"""
+    tokens = _GMAIL_TOKEN.findall(query or "")
+    position = 0
+
+    def peek(*values: str) -> bool:
+        return position < len(tokens) and tokens[position] in values
+
+    def take() -> str:
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def expression(closing: Optional[str] = None):
+        # Gmail łączy sąsiednie warunki przez AND, a OR (tylko wielkimi literami) wiąże mocniej:
+        # "a OR b c" to "(a OR b) AND c"
+        factors = []
+        while position < len(tokens) and not peek(closing):
+            check = disjunction()
+            if check is not None:
+                factors.append(check)
+        return lambda message: all(check(message) for check in factors)
+
+    def disjunction() -> Optional[Callable[[Dict[str, Any]], bool]]:
+        alternatives = [factor()]
+        while peek("OR"):
+            take()
+            if position < len(tokens) and not peek(")", "}"):
+                alternatives.append(factor())
+        alternatives = [check for check in alternatives if check is not None]
+        if len(alternatives) <= 1:
+            return alternatives[0] if alternatives else None
+        return lambda message: any(check(message) for check in alternatives)
+
+    def factor() -> Optional[Callable[[Dict[str, Any]], bool]]:
+        token = take()
+        if token == "(":
+            inner = expression(")")
+        elif token == "{":
+            # {a b c} - dowolny z warunków
+            alternatives = []
+            while position < len(tokens) and not peek("}"):
+                check = factor()
+                if check is not None:
+                    alternatives.append(check)
+            inner = lambda message: any(check(message) for check in alternatives)
+        elif token in (")", "}", "OR"):
+            # Niesparowany nawias albo OR w grupie {} - bez znaczenia dla wyniku
+            return None
+        elif token == "-":
+            # -(...) / -{...} - negacja całej grupy
+            negated = factor() if position < len(tokens) else None
+            return (lambda message: not negated(message)) if negated else None
+        elif token.startswith("-") and len(token) > 1:
+            negated = _gmail_term(token[1:])
+            return (lambda message: not negated(message)) if negated else None
+        else:
+            return _gmail_term(token)
+        if peek({"(": ")", "{": "}"}[token]):
+            take()
+        return inner
+
+    return expression()
+
+
+# === Dane ===
+
+class FakeWorkspace:
+    """Syntetyczne dane Workspace, opóźnienia i błędy limitów; bezpieczne wątkowo"""
+
+    def __init__(self, latency: float = FAKE_LATENCY, jitter: float = FAKE_JITTER,
+                 error_rate: float = FAKE_ERROR_RATE, quota_qps: float = FAKE_QUOTA_QPS, seed: int = FAKE_SEED):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_qps = quota_qps
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        self.events: Dict[str, Dict[str, Any]] = {}
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.history: List[Dict[str, Any]] = []
+        self.history_id = 1000
+        self.calendar_seq = 0
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._quota_window: List[float] = []
+        self._routes = self._build_routes()
+
+    # --- Generowanie ---
+
+    @classmethod
+    def seeded(cls, emails: int = FAKE_EMAILS, events: int = FAKE_EVENTS, documents: int = FAKE_DOCUMENTS,
+               diagrams: int = FAKE_DIAGRAMS, seed: int = FAKE_SEED, **options) -> "FakeWorkspace":
+        """Workspace z deterministycznym zbiorem danych zadanej wielkości"""
+        workspace = cls(seed=seed, **options)
+        rng = random.Random(seed)
+        now = datetime.now(timezone.utc)
+        people = [(f"{first} {last}", f"{_ascii(first).lower()}.{_ascii(last).lower()}@{rng.choice(_DOMAINS)}")
+                  for first in _FIRST_NAMES for last in _LAST_NAMES]
+
+        for i in range(emails):
+            name, address = rng.choice(people)
+            project = rng.choice(_PROJECTS)
+            subject = rng.choice(_SUBJECTS).format(n=i + 1, year=now.year, project=project)
+            body = " ".join(rng.sample(_SENTENCES, 3)) + f"\n\nPozdrawiam,\n{name}"
+            sent = now - timedelta(minutes=int(i * 90 * 24 * 60 / max(emails, 1)) + rng.randint(0, 60))
+            labels = ["INBOX"] + (["UNREAD"] if rng.random() < 0.3 else []) + \
+                     (["IMPORTANT"] if rng.random() < 0.1 else [])
+            workspace._add_message(f"{name} <{address}>", ACCOUNT_EMAIL, subject, body, sent, labels)
+
+        start_day = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30)
+        for i in range(events):
+            day = start_day + timedelta(days=rng.randint(0, 60))
+            start = day + timedelta(hours=rng.randint(8, 17), minutes=rng.choice([0, 15, 30, 45]))
+            end = start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90, 120]))
+            project = rng.choice(_PROJECTS)
+            workspace._store_event({
+                "summary": rng.choice(_EVENT_TITLES).format(project=project),
+                "description": rng.choice(_SENTENCES),
+                "location": rng.choice(["", "Sala Wisła", "Google Meet", "Biuro klienta"]),
+                "start": {"dateTime": _rfc3339(start), "timeZone": "Europe/Warsaw"},
+                "end": {"dateTime": _rfc3339(end), "timeZone": "Europe/Warsaw"},
+                "attendees": [{"email": address} for _, address in rng.sample(people, rng.randint(0, 4))],
+            })
+
+        for i in range(documents):
+            project = rng.choice(_PROJECTS)
+            text = "\n".join(rng.sample(_SENTENCES, 5)) + "\n"
+            modified = now - timedelta(hours=rng.randint(0, 24 * 180))
+            workspace._create_document(f"{project} - notatka {i + 1}", text, modified)
+
+        for i in range(diagrams):
+            project = rng.choice(_PROJECTS)
+            kind = rng.choice(_DIAGRAM_KINDS)
+            cells = "".join(f'<mxCell id="{n}" value="{project} {n}" vertex="1" parent="1"/>'
+                            for n in range(2, 2 + rng.randint(3, 30)))
+            content = f'<mxfile><diagram name="{kind}"><mxGraphModel><root>' \
+                      f'<mxCell id="0"/><mxCell id="1" parent="0"/>{cells}</root></mxGraphModel></diagram></mxfile>'
+            modified = now - timedelta(hours=rng.randint(0, 24 * 365))
+            workspace._add_file(f"{project} - {kind} {i + 1}.drawio", DRAWIO_MIME, content, modified)
+
+        logger.info(f"🧪 Fałszywy Workspace: {emails} emaili, {events} wydarzeń, "
+                    f"{documents} dokumentów, {diagrams} diagramów")
+        return workspace
+
+    def _new_id(self) -> str:
+        return f"{self._rng.getrandbits(64):016x}"
+
+    def _add_message(self, sender: str, to: str, subject: str, body: str, sent: datetime,
+                     labels: List[str], message_id: Optional[str] = None) -> Dict[str, Any]:
+        message_id = message_id or self._new_id()
+        self.history_id += 1
+        message = {
+            "id": message_id,
+            "threadId": message_id,
+            "labelIds": labels,
+            "snippet": body.replace("\n", " ")[:120],
+            "historyId": str(self.history_id),
+            "internalDate": str(int(sent.timestamp() * 1000)),
+            "sizeEstimate": len(body) + 400,
+            "_from": sender, "_to": to, "_subject": subject, "_body": body,
+            "_date": format_datetime(sent),
+        }
+        self.messages[message_id] = message
+        self.history.append({"id": str(self.history_id),
+                             "messagesAdded": [{"message": {"id": message_id, "threadId": message_id,
+                                                            "labelIds": labels}}]})
+        return message
+
+    def _store_event(self, event: Dict[str, Any], event_id: Optional[str] = None) -> Dict[str, Any]:
+        event_id = event_id or event.get("id") or uuid.uuid4().hex
+        self.calendar_seq += 1
+        stamp = _rfc3339(datetime.now(timezone.utc))
+        stored = {key: value for key, value in event.items() if not key.startswith("_")}
+        stored.update({
+            "kind": "calendar#event",
+            "id": event_id,
+            "status": event.get("status", "confirmed"),
+            "htmlLink": f"https://calendar.google.com/calendar/event?eid={event_id}",
+            "created": self.events.get(event_id, {}).get("created", stamp),
+            "updated": stamp,
+            "_seq": self.calendar_seq,
+        })
+        self.events[event_id] = stored
+        return stored
+
+    def _add_file(self, name: str, mime_type: str, content: str, modified: datetime,
+                  file_id: Optional[str] = None) -> Dict[str, Any]:
+        file_id = file_id or self._new_id()
+        stored = {
+            "kind": "drive#file",
+            "id": file_id,
+            "name": name,
+            "mimeType": mime_type,
+            "modifiedTime": _rfc3339(modified),
+            "size": str(len(content.encode("utf-8"))),
+            "webViewLink": f"https://drive.google.com/file/d/{file_id}/view",
+            "owners": [{"displayName": "Agent", "emailAddress": ACCOUNT_EMAIL}],
+            "parents": ["root"],
+            "trashed": False,
+            "_content": content,
+        }
+        self.files[file_id] = stored
+        return stored
+
+    def _create_document(self, title: str, text: str, modified: datetime) -> Dict[str, Any]:
+        document_id = self._new_id()
+        self.documents[document_id] = {"documentId": document_id, "title": title, "_text": text, "revision": 1}
+        self._add_file(title, GDOC_MIME, text, modified, file_id=document_id)
+        return self.documents[document_id]
+
+    # --- Transport ---
+
+    def http(self) -> "FakeHttp":
+        return FakeHttp(self)
+
+    def _admit(self, endpoint: str):
+        """Opóźnienie i wstrzykiwane błędy limitów (429) - poza blokadą danych"""
+        if self.latency:
+            time.sleep(max(0.0, self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter))))
+        with self._lock:
+            counters = self.stats.setdefault(endpoint, {"calls": 0, "errors": 0})
+            counters["calls"] += 1
+            if self.quota_qps:
+                now = time.monotonic()
+                self._quota_window = [moment for moment in self._quota_window if now - moment < 1.0]
+                if len(self._quota_window) >= self.quota_qps:
+                    counters["errors"] += 1
+                    raise FakeApiError(429, "Quota exceeded for quota metric 'Queries'", "rateLimitExceeded")
+                self._quota_window.append(now)
+            if self.error_rate and self._rng.random() < self.error_rate:
+                counters["errors"] += 1
+                raise FakeApiError(429, "Rate Limit Exceeded", "rateLimitExceeded")
+
+    def handle(self, method: str, uri: str, body: Optional[bytes]) -> Tuple[int, Any]:
+        parsed = urlparse(uri)
+        params = {key: values if len(values) > 1 else values[0] for key, values in parse_qs(parsed.query).items()}
+        payload = json.loads(body) if body else {}
+        for route_method, pattern, endpoint, handler in self._routes:
+            match = pattern.search(parsed.path)
+            if match and route_method == method:
+                self._admit(endpoint)
+                with self._lock:
+                    return handler(params, payload, *[unquote(group) for group in match.groups()])
+        raise FakeApiError(404, f"Not Found: {method} {parsed.path}", "notFound")
+
+    def _build_routes(self):
+        routes = [
+            ("GET", r"/gmail/v1/users/([^/]+)/messages$", "gmail.messages.list", self._messages_list),
+            ("POST", r"/gmail/v1/users/([^/]+)/messages/send$", "gmail.messages.send", self._messages_send),
+            ("GET", r"/gmail/v1/users/([^/]+)/messages/([^/]+)$", "gmail.messages.get", self._messages_get),
+            ("GET", r"/gmail/v1/users/([^/]+)/profile$", "gmail.users.getProfile", self._profile),
+            ("GET", r"/gmail/v1/users/([^/]+)/history$", "gmail.history.list", self._history_list),
+            ("GET", r"/calendar/v3/calendars/([^/]+)/events$", "calendar.events.list", self._events_list),
+            ("POST", r"/calendar/v3/calendars/([^/]+)/events$", "calendar.events.insert", self._events_insert),
+            ("GET", r"/calendar/v3/calendars/([^/]+)/events/([^/]+)$", "calendar.events.get", self._events_get),
+            ("PUT", r"/calendar/v3/calendars/([^/]+)/events/([^/]+)$", "calendar.events.update", self._events_update),
+            ("PATCH", r"/calendar/v3/calendars/([^/]+)/events/([^/]+)$", "calendar.events.patch", self._events_patch),
+            ("DELETE", r"/calendar/v3/calendars/([^/]+)/events/([^/]+)$", "calendar.events.delete",
+             self._events_delete),
+            ("POST", r"/v1/documents$", "docs.documents.create", self._documents_create),
+            ("POST", r"/v1/documents/([^/:]+):batchUpdate$", "docs.documents.batchUpdate", self._documents_batch),
+            ("GET", r"/v1/documents/([^/:]+)$", "docs.documents.get", self._documents_get),
+            ("GET", r"/drive/v3/files$", "drive.files.list", self._files_list),
+            ("GET", r"/drive/v3/files/([^/]+)$", "drive.files.get", self._files_get),
+            ("PATCH", r"/drive/v3/files/([^/]+)$", "drive.files.update", self._files_update),
+        ]
+        return [(method, re.compile(pattern), endpoint, handler) for method, pattern, endpoint, handler in routes]
+
+    # --- Gmail ---
+
+    @staticmethod
+    def _page(items: List[Any], params: Dict[str, Any], size_param: str, default_size: int):
+        offset = int(params.get("pageToken") or 0)
+        size = int(params.get(size_param) or default_size)
+        page = items[offset:offset + size]
+        next_token = str(offset + size) if offset + size < len(items) else None
+        return page, next_token
+
+    def _messages_list(self, params, payload, user_id):
+        matches = compile_gmail_query(params.get("q", ""))
+        labels = params.get("labelIds", [])
+        labels = [labels] if isinstance(labels, str) else labels
+        found = sorted((message for message in self.messages.values()
+                        if matches(message) and all(label in message["labelIds"] for label in labels)),
+                       key=lambda message: int(message["internalDate"]), reverse=True)
+        page, next_token = self._page(found, params, "maxResults", 100)
+        result = {"messages": [{"id": message["id"], "threadId": message["threadId"]} for message in page],
+                  "resultSizeEstimate": len(found)}
+        if next_token:
+            result["nextPageToken"] = next_token
+        if not page:
+            result.pop("messages")
+        return 200, result
+
+    def _messages_get(self, params, payload, user_id, message_id):
+        message = self.messages.get(message_id)
+        if message is None:
+            raise FakeApiError(404, "Requested entity was not found.", "notFound")
+        resource = {key: value for key, value in message.items() if not key.startswith("_")}
+        headers = [{"name": "From", "value": message["_from"]}, {"name": "To", "value": message["_to"]},
+                   {"name": "Subject", "value": message["_subject"]}, {"name": "Date", "value": message["_date"]}]
+        message_format = params.get("format", "full")
+        if message_format == "minimal":
+            return 200, resource
+        if message_format == "metadata":
+            wanted = params.get("metadataHeaders")
+            if wanted:
+                wanted = {wanted.lower()} if isinstance(wanted, str) else {name.lower() for name in wanted}
+                headers = [header for header in headers if header["name"].lower() in wanted]
+            resource["payload"] = {"mimeType": "multipart/alternative", "headers": headers}
+            return 200, resource
+        if message_format == "raw":
+            raw = "".join(f"{header['name']}: {header['value']}\r\n" for header in headers) + "\r\n" + message["_body"]
+            resource["raw"] = _b64url(raw.encode("utf-8"))
+            return 200, resource
+        body = message["_body"].encode("utf-8")
+        resource["payload"] = {
+            "partId": "", "mimeType": "multipart/alternative", "headers": headers, "body": {"size": 0},
+            "parts": [
+                {"partId": "0", "mimeType": "text/plain", "body": {"size": len(body), "data": _b64url(body)}},
+                {"partId": "1", "mimeType": "text/html",
+                 "body": {"size": len(body) + 13, "data": _b64url(b"<p>" + body + b"</p>")}},
+            ],
+        }
+        return 200, resource
+
+    def _messages_send(self, params, payload, user_id):
+        raw = base64.urlsafe_b64decode(payload.get("raw", "") + "==")
+        parsed = message_from_bytes(raw)
+        if parsed.is_multipart():
+            text = next((part.get_payload(decode=True) for part in parsed.walk()
+                         if part.get_content_type() == "text/plain"), b"")
+        else:
+            text = parsed.get_payload(decode=True) or b""
+        sent = datetime.now(timezone.utc)
+        if parsed.get("Date"):
+            try:
+                sent = parsedate_to_datetime(parsed["Date"])
+            except (TypeError, ValueError):
+                pass
+        message = self._add_message(parsed.get("From", ACCOUNT_EMAIL), parsed.get("To", ""),
+                                    parsed.get("Subject", ""), text.decode("utf-8", "replace"), sent, ["SENT"])
+        return 200, {"id": message["id"], "threadId": message["threadId"], "labelIds": message["labelIds"]}
+
+    def _profile(self, params, payload, user_id):
+        return 200, {"emailAddress": ACCOUNT_EMAIL, "messagesTotal": len(self.messages),
+                     "threadsTotal": len(self.messages), "historyId": str(self.history_id)}
+
+    def _history_list(self, params, payload, user_id):
+        start = int(params.get("startHistoryId", 0))
+        if self.history and start < int(self.history[0]["id"]) - 1:
+            raise FakeApiError(404, "Requested entity was not found.", "notFound")
+        records = [record for record in self.history if int(record["id"]) > start]
+        page, next_token = self._page(records, params, "maxResults", 100)
+        result = {"history": page, "historyId": str(self.history_id)}
+        if next_token:
+            result["nextPageToken"] = next_token
+        return 200, result
+
+    # --- Calendar ---
+
+    @staticmethod
+    def _event_bounds(event: Dict[str, Any]) -> Tuple[datetime, datetime]:
+        start = event["start"].get("dateTime") or event["start"].get("date")
+        end = event["end"].get("dateTime") or event["end"].get("date")
+        return _parse_time(start), _parse_time(end)
+
+    @staticmethod
+    def _public_event(event: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in event.items() if not key.startswith("_")}
+
+    def _events_list(self, params, payload, calendar_id):
+        sync_token = params.get("syncToken")
+        if sync_token:
+            if int(sync_token) > self.calendar_seq:
+                raise FakeApiError(410, "Sync token is no longer valid, a full sync is required.", "fullSyncRequired")
+            changed = sorted((event for event in self.events.values() if event["_seq"] > int(sync_token)),
+                             key=lambda event: event["_seq"])
+            return 200, {"kind": "calendar#events", "items": [self._public_event(event) for event in changed],
+                         "nextSyncToken": str(self.calendar_seq)}
+
+        time_min = _parse_time(params["timeMin"]) if params.get("timeMin") else None
+        time_max = _parse_time(params["timeMax"]) if params.get("timeMax") else None
+        text = (params.get("q") or "").lower()
+        found = []
+        for event in self.events.values():
+            if event["status"] == "cancelled" and params.get("showDeleted") != "true":
+                continue
+            start, end = self._event_bounds(event)
+            if (time_min and end <= time_min) or (time_max and start >= time_max):
+                continue
+            if text and text not in (event.get("summary", "") + " " + event.get("description", "")).lower():
+                continue
+            found.append((start, event))
+        found.sort(key=lambda pair: pair[0])
+        page, next_token = self._page([event for _, event in found], params, "maxResults", 250)
+        result = {"kind": "calendar#events", "summary": ACCOUNT_EMAIL, "timeZone": "Europe/Warsaw",
+                  "items": [self._public_event(event) for event in page]}
+        if next_token:
+            result["nextPageToken"] = next_token
+        else:
+            result["nextSyncToken"] = str(self.calendar_seq)
+        return 200, result
+
+    def _existing_event(self, event_id: str) -> Dict[str, Any]:
+        event = self.events.get(event_id)
+        if event is None or event["status"] == "cancelled":
+            raise FakeApiError(404, "Not Found", "notFound")
+        return event
+
+    def _events_get(self, params, payload, calendar_id, event_id):
+        return 200, self._public_event(self._existing_event(event_id))
+
+    def _events_insert(self, params, payload, calendar_id):
+        if "start" not in payload or "end" not in payload:
+            raise FakeApiError(400, "Missing time range.", "required")
+        return 200, self._public_event(self._store_event(payload, event_id=uuid.uuid4().hex))
+
+    def _events_update(self, params, payload, calendar_id, event_id):
+        self._existing_event(event_id)
+        return 200, self._public_event(self._store_event(payload, event_id=event_id))
+
+    def _events_patch(self, params, payload, calendar_id, event_id):
+        merged = dict(self._existing_event(event_id))
+        merged.update(payload)
+        return 200, self._public_event(self._store_event(merged, event_id=event_id))
+
+    def _events_delete(self, params, payload, calendar_id, event_id):
+        event = dict(self._existing_event(event_id))
+        event["status"] = "cancelled"
+        self._store_event(event, event_id=event_id)
+        return 204, None
+
+    # --- Docs ---
+
+    def _document_resource(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        content, index = [{"endIndex": 1, "sectionBreak": {}}], 1
+        for line in document["_text"].splitlines(keepends=True):
+            end = index + len(line)
+            content.append({"startIndex": index, "endIndex": end, "paragraph": {
+                "elements": [{"startIndex": index, "endIndex": end, "textRun": {"content": line}}]}})
+            index = end
+        return {"documentId": document["documentId"], "title": document["title"],
+                "body": {"content": content}, "revisionId": str(document["revision"])}
+
+    def _existing_document(self, document_id: str) -> Dict[str, Any]:
+        document = self.documents.get(document_id)
+        if document is None:
+            raise FakeApiError(404, "Requested entity was not found.", "notFound")
+        return document
+
+    def _documents_get(self, params, payload, document_id):
+        return 200, self._document_resource(self._existing_document(document_id))
+
+    def _documents_create(self, params, payload):
+        document = self._create_document(payload.get("title", "Dokument bez tytułu"), "\n",
+                                         datetime.now(timezone.utc))
+        return 200, self._document_resource(document)
+
+    def _documents_batch(self, params, payload, document_id):
+        document = self._existing_document(document_id)
+        text, replies = document["_text"], []
+        for request in payload.get("requests", []):
+            if "insertText" in request:
+                insert = request["insertText"]
+                if "endOfSegmentLocation" in insert:
+                    position = len(text) - 1 if text.endswith("\n") else len(text)
+                else:
+                    position = insert.get("location", {}).get("index", 1) - 1
+                if not 0 <= position <= len(text):
+                    raise FakeApiError(400, "Index out of bounds.", "badRequest")
+                text = text[:position] + insert["text"] + text[position:]
+                replies.append({})
+            elif "deleteContentRange" in request:
+                range_ = request["deleteContentRange"]["range"]
+                text = text[:range_["startIndex"] - 1] + text[range_["endIndex"] - 1:]
+                replies.append({})
+            elif "replaceAllText" in request:
+                replace = request["replaceAllText"]
+                needle = replace["containsText"]["text"]
+                flags = 0 if replace["containsText"].get("matchCase") else re.IGNORECASE
+                text, count = re.subn(re.escape(needle), lambda _: replace.get("replaceText", ""), text, flags=flags)
+                replies.append({"replaceAllText": {"occurrencesChanged": count} if count else {}})
+            else:
+                raise FakeApiError(400, f"Unsupported request: {list(request)}", "badRequest")
+        document["_text"] = text if text.endswith("\n") else text + "\n"
+        document["revision"] += 1
+        stored = self.files.get(document_id)
+        if stored:
+            stored.update({"_content": document["_text"], "modifiedTime": _rfc3339(datetime.now(timezone.utc)),
+                           "size": str(len(document["_text"].encode("utf-8")))})
+        return 200, {"documentId": document_id, "replies": replies,
+                     "writeControl": {"requiredRevisionId": str(document["revision"])}}
+
+    # --- Drive ---
+
+    @staticmethod
+    def _public_file(stored: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in stored.items() if not key.startswith("_")}
+
+    def _files_list(self, params, payload):
+        query = params.get("q")
+        matches = compile_drive_query(query) if query else (lambda item: True)
+        found = [stored for stored in self.files.values() if not stored["trashed"] or "trashed" in (query or "")]
+        found = [stored for stored in found if matches(stored)]
+        order = (params.get("orderBy") or "").split(",")[0].strip()
+        if order:
+            field, _, direction = order.partition(" ")
+            found.sort(key=lambda stored: str(stored.get(field, "")).lower(), reverse=direction == "desc")
+        page, next_token = self._page(found, params, "pageSize", 100)
+        result = {"kind": "drive#fileList", "files": [self._public_file(stored) for stored in page]}
+        if next_token:
+            result["nextPageToken"] = next_token
+        return 200, result
+
+    def _existing_file(self, file_id: str) -> Dict[str, Any]:
+        stored = self.files.get(file_id)
+        if stored is None:
+            raise FakeApiError(404, f"File not found: {file_id}.", "notFound")
+        return stored
+
+    def _files_get(self, params, payload, file_id):
+        stored = self._existing_file(file_id)
+        if params.get("alt") == "media":
+            return 200, stored["_content"].encode("utf-8")
+        return 200, self._public_file(stored)
+
+    def _files_update(self, params, payload, file_id):
+        stored = self._existing_file(file_id)
+        parents = [parent for parent in stored["parents"] if parent not in (params.get("removeParents") or "").split(",")]
+        parents += [parent for parent in (params.get("addParents") or "").split(",") if parent]
+        stored.update({key: value for key, value in payload.items() if key in ("name", "starred", "trashed")})
+        stored["parents"] = parents
+        stored["modifiedTime"] = _rfc3339(datetime.now(timezone.utc))
+        return 200, self._public_file(stored)
+
+
+# === Transport i manager zgodny z google_credentials_manager ===
+
+class _Response(dict):
+    """Odpowiedź w kształcie httplib2.Response (status jako atrybut + nagłówki w słowniku)"""
+
+    def __init__(self, status: int, content_type: str):
+        super().__init__({"status": str(status), "content-type": content_type})
+        self.status = status
+        self.reason = HTTPStatus(status).phrase
+
+
+class FakeHttp:
+    """Obiekt http dla googleapiclient (build(..., http=...) i request.execute(http=...))"""
+
+    def __init__(self, workspace: FakeWorkspace):
+        self.workspace = workspace
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        try:
+            status, result = self.workspace.handle(method, uri, body)
+        except FakeApiError as e:
+            status = "RESOURCE_EXHAUSTED" if e.status == 429 else HTTPStatus(e.status).name
+            error = {"error": {"code": e.status, "message": str(e), "status": status,
+                               "errors": [{"message": str(e), "domain": "global", "reason": e.reason}]}}
+            return _Response(e.status, "application/json; charset=UTF-8"), json.dumps(error).encode("utf-8")
+        if isinstance(result, bytes):
+            return _Response(status, "application/octet-stream"), result
+        content = json.dumps(result, ensure_ascii=False).encode("utf-8") if result is not None else b""
+        return _Response(status, "application/json; charset=UTF-8"), content
+
+
+class FakeCredentialsManager:
+    """Zamiennik GoogleCredentialsManager (i GoogleCloudManager dla GoogleBusinessIntegration)"""
+
+    credentials = None
+
+    def __init__(self, workspace: FakeWorkspace):
+        self.workspace = workspace
+        self.http = FakeHttp(workspace)
+        self._services: Dict[Tuple[str, str], Any] = {}
+
+    def service(self, name: str, version: str):
+        service = self._services.get((name, version))
+        if service is None:
+            from googleapiclient.discovery import build
+            service = self._services[(name, version)] = build(name, version, http=self.http,
+                                                              cache_discovery=False, static_discovery=True)
+        return service
+
+    def authorized_http(self):
+        return self.http
+
+    async def ensure_fresh(self):
+        pass
+
+    def start_background_refresh(self):
+        pass
+
+    @property
+    def gmail_service(self):
+        return self.service("gmail", "v1")
+
+    @property
+    def calendar_service(self):
+        return self.service("calendar", "v3")
+
+    @property
+    def drive_service(self):
+        return self.service("drive", "v3")
+
+    sheets_service = None
+
+
+def install(workspace: Optional[FakeWorkspace] = None) -> FakeCredentialsManager:
+    """Podmienia managera credentials w procesie - narzędzia Google trafiają do fałszywego Workspace"""
+    from google_credentials_manager import use_credentials_manager
+    manager = FakeCredentialsManager(workspace or FakeWorkspace.seeded())
+    use_credentials_manager(manager)
+    return manager
+
+
+def uninstall():
+    from google_credentials_manager import use_credentials_manager
+    use_credentials_manager(None)
+
+
+def _demo():
+    """Szybki pomiar: list_drawio_files i get_gmail_messages na dużym zbiorze"""
+    import asyncio
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fałszywy Google Workspace - szybki pomiar narzędzi")
+    parser.add_argument("--emails", type=int, default=10000)
+    parser.add_argument("--diagrams", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=FAKE_LATENCY)
+    parser.add_argument("--error-rate", type=float, default=FAKE_ERROR_RATE)
+    args = parser.parse_args()
+
+    workspace = FakeWorkspace.seeded(emails=args.emails, diagrams=args.diagrams,
+                                     latency=args.latency, error_rate=args.error_rate)
+    install(workspace)
+    import custom_google_tools
+
+    async def measure():
+        for name, call in (("get_gmail_messages", custom_google_tools.get_gmail_messages(query="is:unread")),
+                           ("get_calendar_events", custom_google_tools.get_calendar_events()),
+                           ("list_drawio_files", custom_google_tools.list_drawio_files(max_results=50))):
+            started = time.perf_counter()
+            result = await call
+            print(f"⏱️  {name:22s} {(time.perf_counter() - started) * 1000:8.1f} ms  success={result.get('success')}")
+        print(json.dumps(workspace.stats, indent=2))
+
+    asyncio.run(measure())
+
+
+if __name__ == "__main__":
+    _demo()
@@ -0,0 +1,122 @@
+import { useEffect, useState } from 'react';
+import { Box, Chip, IconButton, Paper, Tooltip, Typography } from '@mui/material';
+import { Refresh as RefreshIcon } from '@mui/icons-material';
+import { tracesApi } from '../services/api';
+
+// Kolor paska wg rodzaju spanu (prefiks nazwy)
+const SPAN_COLORS = {
+  agent: '#8E8E93',
+  llm: '#007AFF',
+  tool: '#30D158',
+  tts: '#FF9500',
+  db: '#AF52DE',
+  ws: '#5AC8FA',
+  analytics: '#FF2D55',
+};
+
+const spanColor = (name) => SPAN_COLORS[name.split('.')[0]] || '#636366';
+
+const glassPaper = {
+  p: 3,
+  background: 'rgba(255, 255, 255, 0.25)',
+  backdropFilter: 'blur(20px)',
+  border: '1px solid rgba(255, 255, 255, 0.4)',
+  borderRadius: '16px',
+};
+
+function SpanRow({ span, total }) {
+  const left = total ? (span.offset_ms / total) * 100 : 0;
+  const width = total ? Math.max((span.duration_ms / total) * 100, 0.5) : 100;
+  const details = Object.entries(span.attributes)
+    .map(([key, value]) => `${key}: ${value}`)
+    .join('\n');
+
+  return (
+    <Box sx={{ display: 'flex', alignItems: 'center', mb: 0.5 }}>
+      <Typography
+        variant="body2"
+        noWrap
+        sx={{ width: 220, pl: span.depth * 1.5, flexShrink: 0, color: span.error ? 'error.main' : 'text.primary' }}
+      >
+        {span.name}
+      </Typography>
+      <Box sx={{ position: 'relative', flexGrow: 1, height: 18 }}>
+        <Tooltip title={<pre style={{ margin: 0 }}>{details || span.name}</pre>}>
+          <Box
+            sx={{
+              position: 'absolute',
+              left: `${left}%`,
+              width: `${width}%`,
+              height: '100%',
+              borderRadius: '4px',
+              background: span.error ? '#FF3B30' : spanColor(span.name),
+            }}
+          />
+        </Tooltip>
+      </Box>
+      <Typography variant="caption" sx={{ width: 80, textAlign: 'right', flexShrink: 0 }}>
+        {span.duration_ms.toFixed(0)} ms
+      </Typography>
+    </Box>
+  );
+}
+
+function TurnWaterfall() {
+  const [turns, setTurns] = useState([]);
+  const [selected, setSelected] = useState(null);
+  const [error, setError] = useState(null);
+
+  const load = async () => {
+    try {
+      const response = await tracesApi.getTurns(20);
+      setTurns(response.data.turns);
+      setSelected((current) => current || response.data.turns[0]?.trace_id || null);
+      setError(null);
+    } catch (e) {
+      setError('Nie udało się pobrać śladów tur');
+    }
+  };
+
+  useEffect(() => {
+    load();
+  }, []);
+
+  const turn = turns.find((item) => item.trace_id === selected);
+
+  return (
+    <Paper sx={glassPaper}>
+      <Box sx={{ display: 'flex', alignItems: 'center', mb: 2 }}>
+        <Typography variant="h6" sx={{ flexGrow: 1 }}>
+          Czas tur agenta
+        </Typography>
+        <IconButton onClick={load} size="small">
+          <RefreshIcon />
+        </IconButton>
+      </Box>
+
+      {error && <Typography color="error">{error}</Typography>}
+      {!error && turns.length === 0 && (
+        <Typography color="text.secondary">
+          Brak śladów - uruchom agenta z AGENT_TRACING=1
+        </Typography>
+      )}
+
+      <Box sx={{ display: 'flex', flexWrap: 'wrap', gap: 1, mb: 2 }}>
+        {turns.map((item) => (
+          <Chip
+            key={item.trace_id}
+            label={`${new Date(item.started_at * 1000).toLocaleTimeString()} · ${item.duration_ms.toFixed(0)} ms`}
+            color={item.trace_id === selected ? 'primary' : 'default'}
+            onClick={() => setSelected(item.trace_id)}
+          />
+        ))}
+      </Box>
+
+      {turn && turn.spans.map((span) => (
+        <SpanRow key={span.span_id} span={span} total={turn.duration_ms} />
+      ))}
+    </Paper>
+  );
+}
+
+export default TurnWaterfall;
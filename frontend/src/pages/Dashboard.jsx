@@ -5,6 +5,7 @@ import {
   Email as EmailIcon,
   CalendarMonth as CalendarIcon,
 } from '@mui/icons-material';
+import TurnWaterfall from '../components/TurnWaterfall';
 
 function StatCard({ title, value, icon, color }) {
   return (
@@ -99,6 +100,10 @@ function Dashboard() {
           </Typography>
         </Paper>
       </Box>
+
+      <Box sx={{ mt: 4 }}>
+        <TurnWaterfall />
+      </Box>
     </Box>
   );
 }
@@ -37,7 +37,21 @@ export const sessionsApi = {
     getSessions: () => axios.get('/api/sessions'),
     createSession: (sessionData) => axios.post('/api/sessions', sessionData),
     getSessionMessages: (sessionId) => axios.get(`/api/sessions/${sessionId}/messages`),
-    saveMessage: (sessionId, message) => axios.post(`/api/sessions/${sessionId}/messages`, message)
+    saveMessage: (sessionId, message) => axios.post(`/api/sessions/${sessionId}/messages`, message),
+    // Wyszukiwanie w historii; snippet zawiera podświetlenie <mark> (reszta treści jest escapowana)
+    searchMessages: (q, { userId, limit = 20, offset = 0 } = {}) =>
+        axios.get('/api/search', { params: { q, user_id: userId, limit, offset } })
+};
+
+// API dla śledzenia tur agenta (waterfall spanów OpenTelemetry)
+export const tracesApi = {
+    getTurns: (limit = 20) => axios.get('/api/traces', { params: { limit } })
+};
+
+// API dla zużycia tokenów i kosztu modelu
+export const usageApi = {
+    getUsage: (userId = null, days = 30) => axios.get('/api/usage', { params: { user_id: userId, days } }),
+    getSessionUsage: (sessionId) => axios.get(`/api/sessions/${sessionId}/usage`)
 };
 
 // Klasa do obsługi WebSocket
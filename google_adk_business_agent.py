@@ -4,6 +4,8 @@ Google ADK Business Agent - Prawdziwy agent biznesowy używający Google ADK Fra
 Obsługuje zadania biznesowe, kalendarz, email, notatki i analizy
 """
 
+from startup_profiler import startup_profiler
+
 import os
 import sys
 import asyncio
@@ -11,43 +13,29 @@ import json
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-import websockets
-from websockets.server import WebSocketServerProtocol
 import pytz
-import traceback
+import uuid
+
+from agent_logging import setup_logging, EventLogSampler, TurnLogSummary
+from admission_control import AdmissionController, AdmissionRejected
+from agent_tracing import TURN_SPAN, AdkSpanCallbacks, set_attributes, setup_tracing, span
+from agent_metrics import model_usage_callback, tool_call_callback, track_turn
+from intent_router import TEMPLATE_INTENTS
+
+# Konfiguracja logowania (kolejka + wątek listenera, poziom z LOG_LEVEL)
+setup_logging()
+# Spany OpenTelemetry tur agenta (AGENT_TRACING=1)
+setup_tracing("google-adk-business-agent")
+logger = logging.getLogger(__name__)
 
 # Dodaj ścieżkę do Google ADK
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'adk-python', 'src'))
 
-# Import Google ADK
-from google.adk.agents import LlmAgent
-from google.adk.models import Gemini
-from google.adk.tools import FunctionTool, BaseTool, google_search
-from google.adk.tools.google_api_tool import GmailToolset, CalendarToolset
-# OAuth2 credentials będą automatycznie wykryte z pliku oauth2_credentials.json
-# RAG imports - opcjonalne
-try:
-    from google.adk.tools.retrieval import VertexAiRagRetrieval
-    from google.adk.memory import VertexAiRagMemoryService
-    RAG_AVAILABLE = True
-except ImportError:
-    RAG_AVAILABLE = False
-    logger.warning("⚠️ Vertex AI RAG niedostępne - kontynuuję bez RAG")
-from google.adk.sessions import Session
-from google.genai import types
-from google.adk.agents.run_config import RunConfig
-from google.adk.runners import InMemoryRunner
-from google.adk.sessions.in_memory_session_service import InMemorySessionService
-from google.adk.agents.invocation_context import InvocationContext, new_invocation_context_id
-from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
-from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
-
-# Konfiguracja logowania
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# Moduły Google ADK importowane leniwie w setup_agent() - serwer WebSocket
+# nasłuchuje zanim załaduje się ciężki stos ADK/genai
+with startup_profiler.step("import adk_turn_runner + ws_gateway"):
+    from adk_turn_runner import ADKTurnRunner, send_response_chunk, send_response_complete
+    from ws_gateway import AgentBackend, GatewayConnection, WebSocketGateway
 
 # Funkcje biznesowe jako zwykłe funkcje (będą opakowane w FunctionTool)
 
@@ -87,7 +75,7 @@ async def get_current_datetime() -> Dict[str, Any]:
 async def schedule_meeting(title: str, date: str, time: str, 
                          participants: List[str], description: str = "") -> Dict[str, Any]:
     """Zaplanuj spotkanie biznesowe"""
-    logger.info(f"Planowanie spotkania: {title} na {date} {time}")
+    logger.debug("Planowanie spotkania: %s na %s %s", title, date, time)
     
     meeting = {
         "id": f"meeting_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
@@ -108,7 +96,7 @@ async def schedule_meeting(title: str, date: str, time: str,
 
 async def analyze_email(emails: List[Dict[str, Any]]) -> Dict[str, Any]:
     """Analizuj wiadomości email pod kątem priorytetów"""
-    logger.info(f"Analizowanie {len(emails)} emaili")
+    logger.debug("Analizowanie %d emaili", len(emails))
     
     high_priority = []
     medium_priority = []
@@ -140,7 +128,7 @@ async def analyze_email(emails: List[Dict[str, Any]]) -> Dict[str, Any]:
 
 async def create_business_report(report_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
     """Stwórz raport biznesowy"""
-    logger.info(f"Tworzenie raportu: {report_type}")
+    logger.debug("Tworzenie raportu: %s", report_type)
     
     report = {
         "id": f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
@@ -175,7 +163,7 @@ async def create_business_report(report_type: str, data: Dict[str, Any]) -> Dict
 
 async def task_management(action: str, task_data: Dict[str, Any]) -> Dict[str, Any]:
     """Zarządzaj zadaniami i projektami"""
-    logger.info(f"Zarządzanie zadaniami: {action}")
+    logger.debug("Zarządzanie zadaniami: %s", action)
     
     if action == "create":
         task = {
@@ -203,7 +191,7 @@ async def task_management(action: str, task_data: Dict[str, Any]) -> Dict[str, A
 async def financial_analysis(analysis_type: str, period: str, 
                            data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Wykonaj analizę finansową"""
-    logger.info(f"Analiza finansowa: {analysis_type} za okres {period}")
+    logger.debug("Analiza finansowa: %s za okres %s", analysis_type, period)
     
     analysis = {
         "type": analysis_type,
@@ -256,7 +244,7 @@ async def analyze_and_store_email(
         sender: Nadawca emaila  
         subject: Temat emaila
     """
-    logger.info(f"🧠 Analizuję email od {sender}: {subject}")
+    logger.debug("🧠 Analizuję email od %s: %s", sender, subject)
     
     # Klasyfikacja biznesowa emaila
     categories = []
@@ -296,7 +284,7 @@ async def analyze_and_store_email(
         "rag_ready": True  # Oznacza że email jest gotowy do dodania do RAG
     }
     
-    logger.info(f"📧 Email sklasyfikowany: {result}")
+    logger.debug("📧 Email sklasyfikowany: %s", result)
     
     return {
         "success": True,
@@ -307,12 +295,13 @@ async def analyze_and_store_email(
 # Dodaj callbacks dla bezpieczeństwa i logowania
 def business_before_model_callback(callback_context, llm_request):
     """Callback wykonywany przed każdym wywołaniem LLM"""
-    logger.info(f"🧠 LLM Call dla agenta: {callback_context.agent_name}")
+    logger.debug("🧠 LLM Call dla agenta: %s", callback_context.agent_name)
     
     # Dodaj business context do każdego zapytania
     business_prefix = f"[BUSINESS AGENT | AGENT: {callback_context.agent_name}] "
     
-    # Modyfikuj system instruction
+    # Modyfikuj system instruction (genai jest już załadowany przez setup_agent)
+    from google.genai import types
     original_instruction = llm_request.config.system_instruction or types.Content(role="system", parts=[])
     if not isinstance(original_instruction, types.Content):
         original_instruction = types.Content(role="system", parts=[types.Part(text=str(original_instruction))])
@@ -324,7 +313,7 @@ def business_before_model_callback(callback_context, llm_request):
     original_instruction.parts[0].text = modified_text
     llm_request.config.system_instruction = original_instruction
     
-    logger.info(f"🧠 System instruction wzbogacony o business context")
+    logger.debug("🧠 System instruction wzbogacony o business context")
     return None
 
 def business_before_tool_callback(**kwargs):
@@ -347,7 +336,8 @@ def business_before_tool_callback(**kwargs):
     else:
         agent_name = "unknown_agent"
     
-    logger.info(f"🔧 Tool Call: {agent_name} -> {tool_name}({str(args)[:100] if args else ''})")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔧 Tool Call: %s -> %s(%.100s)", agent_name, tool_name, args or '')
     
     # Jeśli callback_context ma atrybut 'state', użyj go do przechowywania informacji
     if callback_context and hasattr(callback_context, 'state'):
@@ -369,6 +359,9 @@ def business_before_tool_callback(**kwargs):
     
     return None
 
+# Narzędzia zmieniające kalendarz (odświeżenie sekcji briefingu)
+CALENDAR_WRITE_TOOLS = {"create_calendar_event", "update_calendar_event", "delete_calendar_event"}
+
 def business_after_tool_callback(**kwargs):
     """Callback wykonywany po każdym wywołaniu narzędzia"""
     # Obsługa różnych sygnatur callback funkcji
@@ -384,7 +377,8 @@ def business_after_tool_callback(**kwargs):
     else:
         tool_name = "unknown_tool"
     
-    logger.info(f"🔧 Tool Response: {tool_name} - Response: {str(tool_response)[:100]}...")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔧 Tool Response: %s - Response: %.100s...", tool_name, tool_response)
     
     # Zlicz statystyki użycia narzędzi
     if callback_context and hasattr(callback_context, 'state'):
@@ -395,7 +389,7 @@ def business_after_tool_callback(**kwargs):
         # Specjalna obróbka dla Google Calendar events
         if tool_name == "create_calendar_event":
             if isinstance(tool_response, dict) and tool_response.get('success'):
-                logger.info(f"✅ Utworzono wydarzenie w Google Calendar: {tool_response.get('event_id', 'N/A')}")
+                logger.info("✅ Utworzono wydarzenie w Google Calendar: %s", tool_response.get('event_id', 'N/A'))
                 
                 # Zapisz ID utworzonego wydarzenia w sesji
                 created_events = callback_context.state.get("created_events", [])
@@ -409,7 +403,7 @@ def business_after_tool_callback(**kwargs):
         # Specjalna obróbka dla Gmail send message
         if tool_name == "send_gmail_message":
             if isinstance(tool_response, dict) and tool_response.get('success'):
-                logger.info(f"✅ Wysłano email do: {tool_response.get('to', 'N/A')} z tematem: {tool_response.get('subject', 'N/A')}")
+                logger.info("✅ Wysłano email do: %s z tematem: %s", tool_response.get('to', 'N/A'), tool_response.get('subject', 'N/A'))
                 
                 # Zapisz informacje o wysłanym emailu w sesji
                 sent_emails = callback_context.state.get("sent_emails", [])
@@ -432,28 +426,46 @@ def business_after_agent_callback(callback_context):
     created_events = callback_context.state.get("created_events", [])
     sent_emails = callback_context.state.get("sent_emails", [])
     
-    logger.info(f"📊 Agent {callback_context.agent_name} - Statystyki:")
-    logger.info(f"📊 Użyte narzędzia: {tool_stats}")
-    logger.info(f"📊 Google API calls: {len(google_tools)}")
-    logger.info(f"📊 Utworzone wydarzenia: {len(created_events)}")
-    logger.info(f"📊 Wysłane emaile: {len(sent_emails)}")
+    # Jeden wpis na turę zamiast pięciu osobnych linii
+    logger.info(
+        "📊 Agent %s - narzędzia: %s | Google API calls: %d | wydarzenia: %d | emaile: %d",
+        callback_context.agent_name, tool_stats, len(google_tools),
+        len(created_events), len(sent_emails)
+    )
     
     return None
 
-class GoogleADKBusinessAgent:
+class GoogleADKBusinessAgent(AgentBackend):
     """Główny agent biznesowy używający Google ADK"""
     
+    name = "Google ADK Business Agent"
+    welcome_message = "🤖 Google ADK Business Agent gotowy do pracy!"
+    features = ["📅 Google Calendar", "📧 Gmail", "📊 Raporty biznesowe", "🤖 Google ADK"]
+    
     def __init__(self):
         self.agent = None
         self.server = None
+        self.gateway = None
+        self._setup_task = None
+        self.briefings = None
+        self.workspace_sync = None
+        self.response_cache = None
+        self.intent_router = None
         self.connected_clients = set()
         
         # POPRAWKA: Globalny session service i runner zgodnie z dokumentacją Google ADK
         self.session_service = None
         self.runner = None
+        self.turn_runner = None
         
         # NOWE: Mapa WebSocket -> session_id dla utrzymania kontekstu
         self.websocket_sessions = {}  # websocket -> {"session_id": str, "user_id": str}
+        
+        # Sampling logów per-event (co N-ty event na poziomie DEBUG)
+        self._event_sampler = EventLogSampler()
+        
+        # Kontrola dopuszczenia tur (limit globalny, per użytkownik, kolejka FIFO)
+        self.admission = AdmissionController()
     
     async def setup_agent(self):
         """Konfiguracja Google ADK Agent"""
@@ -488,19 +500,22 @@ class GoogleADKBusinessAgent:
             logger.info("📝 Google AI Studio API nie skonfigurowany - używam tylko Vertex AI")
         
         try:
-            # Konfiguracja modelu Gemini dla Vertex AI
+            with startup_profiler.step("import google.adk (models)"):
+                from mock_llm_backend import create_model
+            
+            # Konfiguracja modelu Gemini dla Vertex AI (AGENT_MODEL_BACKEND=mock - lokalny model offline)
             logger.info("🔧 Konfiguracja modelu Gemini dla Vertex AI...")
             
             # POPRAWKA: Używaj wyłącznie Vertex AI z Twoimi credentials
             logger.info("🎯 Używam Vertex AI z Google Cloud Service Account")
-            model = Gemini(
-                model="gemini-2.0-flash-001",
+            model = create_model(
+                "gemini-2.0-flash-001",
                 # Vertex AI wymaga project_id i location
                 project_id=os.getenv('GOOGLE_CLOUD_PROJECT', 'districtagent'),
                 location=os.getenv('GOOGLE_CLOUD_LOCATION', 'us-central1')
             )
             
-            logger.info("✅ Model Gemini skonfigurowany dla Vertex AI")
+            logger.info("✅ Model skonfigurowany")
             
             # POPRAWKA: Tworzymy prostego agenta z podstawowymi narzędziami i optymalnymi ustawieniami
             logger.info("🛠️ Tworzę agenta z podstawowymi narzędziami biznesowymi...")
@@ -515,100 +530,22 @@ class GoogleADKBusinessAgent:
                 analyze_and_store_email
             ]
             
-            # PRZYWRACAM PEŁNE NARZĘDZIA GMAIL I CALENDAR z OAuth2! 🎉
+            # Gmail i Calendar wymagają OAuth2 (niestandardowe narzędzia i toolsety ADK)
             oauth2_credentials_file = "oauth2_credentials.json"
-            if os.path.exists(oauth2_credentials_file):
-                logger.info("📱 Ładowanie OAuth2 credentials...")
-                with open(oauth2_credentials_file, 'r') as f:
-                    oauth2_data = json.load(f)
-                    # Obsługuj zarówno format "installed" jak i "web"
-                    if 'installed' in oauth2_data:
-                        client_id = oauth2_data['installed']['client_id']
-                        client_secret = oauth2_data['installed']['client_secret']
-                    elif 'web' in oauth2_data:
-                        client_id = oauth2_data['web']['client_id']
-                        client_secret = oauth2_data['web']['client_secret']
-                    else:
-                        raise ValueError("Nieprawidłowy format oauth2_credentials.json")
-                    logger.info(f"✅ OAuth2 Client ID: {client_id[:20]}...")
-                
-                # Sprawdź czy istnieje plik z tokenami
-                token_file = "token.json"
-                access_token = None
-                refresh_token = None
-                
-                if os.path.exists(token_file):
-                    logger.info("🔑 Ładowanie istniejących tokenów OAuth2...")
-                    with open(token_file, 'r') as f:
-                        token_data = json.load(f)
-                        access_token = token_data.get('token')
-                        refresh_token = token_data.get('refresh_token')
-                        logger.info(f"✅ Token dostępny: {access_token[:20] if access_token else 'brak'}...")
-                        logger.info(f"✅ Refresh token: {'dostępny' if refresh_token else 'brak'}")
-                else:
-                    logger.info("⚠️ Brak pliku token.json - będzie wymagana autoryzacja")
-                
-                logger.info("📧 Ładowanie narzędzi Gmail...")
-                gmail_tools = GmailToolset(
-                    client_id=client_id,
-                    client_secret=client_secret
-                )
-                
-                # EKSPERYMENT: Skonfiguruj tokeny dla wszystkich narzędzi Gmail
-                if access_token and refresh_token:
-                    logger.info("🔑 Konfiguracja tokenów OAuth2 dla Gmail tools...")
-                    gmail_tools_list = await gmail_tools.get_tools()
-                    for tool in gmail_tools_list:
-                        if hasattr(tool, 'configure_auth'):
-                            # Dodaj tokeny do OAuth2Auth
-                            tool.configure_auth(client_id, client_secret)
-                            if hasattr(tool, '_rest_api_tool') and hasattr(tool._rest_api_tool, 'auth_credential'):
-                                if tool._rest_api_tool.auth_credential and tool._rest_api_tool.auth_credential.oauth2:
-                                    tool._rest_api_tool.auth_credential.oauth2.access_token = access_token
-                                    tool._rest_api_tool.auth_credential.oauth2.refresh_token = refresh_token
-                                    logger.info(f"✅ Skonfigurowano tokeny dla: {tool.name}")
-                
-                logger.info("✅ Załadowano Gmail Toolset")
-                
-                logger.info("📅 Ładowanie narzędzi Calendar...")
-                calendar_tools = CalendarToolset(
-                    client_id=client_id,
-                    client_secret=client_secret
-                )
-                
-                # EKSPERYMENT: Skonfiguruj tokeny dla wszystkich narzędzi Calendar
-                if access_token and refresh_token:
-                    logger.info("🔑 Konfiguracja tokenów OAuth2 dla Calendar tools...")
-                    calendar_tools_list = await calendar_tools.get_tools()
-                    for tool in calendar_tools_list:
-                        if hasattr(tool, 'configure_auth'):
-                            # Dodaj tokeny do OAuth2Auth
-                            tool.configure_auth(client_id, client_secret)
-                            if hasattr(tool, '_rest_api_tool') and hasattr(tool._rest_api_tool, 'auth_credential'):
-                                if tool._rest_api_tool.auth_credential and tool._rest_api_tool.auth_credential.oauth2:
-                                    tool._rest_api_tool.auth_credential.oauth2.access_token = access_token
-                                    tool._rest_api_tool.auth_credential.oauth2.refresh_token = refresh_token
-                                    logger.info(f"✅ Skonfigurowano tokeny dla: {tool.name}")
-                
-                logger.info("✅ Załadowano Calendar Toolset")
-                
-                if access_token and refresh_token:
-                    logger.info("🎉 Wszystkie narzędzia skonfigurowane z istniejącymi tokenami OAuth2!")
-                else:
-                    logger.info("⚠️ Brak tokenów - narzędzia będą wymagać autoryzacji")
-            else:
+            if not os.path.exists(oauth2_credentials_file):
                 logger.error("❌ Brak pliku oauth2_credentials.json")
                 raise FileNotFoundError("Potrzebny plik oauth2_credentials.json dla Gmail i Calendar")
             
-            # EKSPERYMENT: Użyj niestandardowych narzędzi Google zamiast problematycznych toolsetów
+            # Niestandardowe narzędzia Google API zamiast toolsetów ADK
             logger.info("🔧 Próba z niestandardowymi narzędziami Google...")
             try:
-                from custom_google_tools import (
-                    get_calendar_events, get_gmail_messages, get_gmail_message_content, send_gmail_message,
-                    create_calendar_event, update_calendar_event, delete_calendar_event,
-                    create_google_doc, get_google_doc_content, update_google_doc, list_google_docs,
-                    list_drawio_files, get_drawio_content, search_drawio_diagrams
-                )
+                with startup_profiler.step("import custom_google_tools"):
+                    from custom_google_tools import (
+                        get_calendar_events, get_gmail_messages, get_gmail_message_content, send_gmail_message,
+                        create_calendar_event, update_calendar_event, delete_calendar_event,
+                        create_google_doc, get_google_doc_content, update_google_doc, list_google_docs,
+                        list_drawio_files, get_drawio_content, search_drawio_diagrams
+                    )
                 custom_google_tools = [
                     get_calendar_events, get_gmail_messages, get_gmail_message_content, send_gmail_message,
                     create_calendar_event, update_calendar_event, delete_calendar_event,
@@ -617,28 +554,115 @@ class GoogleADKBusinessAgent:
                 ]
                 logger.info("✅ Załadowano niestandardowe narzędzia Google (w tym Google Docs i draw.io)!")
                 
+                # Token OAuth2 odświeżany w tle - żadna tura nie czeka na refresh
+                from google_credentials_manager import get_credentials_manager
+                get_credentials_manager().start_background_refresh()
+                
+                # Mirror Gmail/Calendar - narzędzia czytają z SQLite zamiast odpytywać API
+                from workspace_sync import SYNC_ENABLED, oauth_workspace_sync
+                if SYNC_ENABLED:
+                    self.workspace_sync = oauth_workspace_sync()
+                    self.workspace_sync.start()
+                
+                # Poranny briefing liczony w tle - pierwsze pytanie dnia bez wywołań Google API
+                from briefing_scheduler import BriefingScheduler, custom_tools_sources, make_briefing_tool
+                from session_database import SessionDatabase
+                self.briefings = BriefingScheduler(SessionDatabase(), custom_tools_sources())
+                self.briefings.start()
+                
                 # Łączymy wszystkie narzędzia
-                all_tools = business_tools + custom_google_tools
+                all_tools = business_tools + [make_briefing_tool(self.briefings)] + custom_google_tools
                 logger.info("🎯 Używam niestandardowych narzędzi Google API zamiast Google ADK toolsetów")
                 
             except ImportError as e:
                 logger.warning(f"⚠️ Nie można załadować niestandardowych narzędzi: {e}")
-                # Fallback do Google ADK toolsetów
-                all_tools = business_tools + [gmail_tools, calendar_tools]
+                # Fallback do Google ADK toolsetów - budowanych dopiero przy pierwszym użyciu
+                with startup_profiler.step("fallback: leniwe toolsety Gmail/Calendar"):
+                    all_tools = business_tools + self._fallback_google_toolsets(oauth2_credentials_file)
                 logger.info("🔄 Używam standardowych Google ADK toolsetów jako fallback")
             
             logger.info("🎯 Agent będzie działać z OAuth2 authorization flow")
-            logger.info(f"🛠️ Łącznie załadowano {len(business_tools)} podstawowych narzędzi + Gmail Toolset + Calendar Toolset")
             
-            # Stwórz agenta z callbacks
-            self.agent = LlmAgent(
-                name="GoogleADKBusinessAgent",
-                model=model,
-                tools=all_tools,  # POPRAWKA: Dodano narzędzia!
-                instruction="""Jesteś profesjonalnym asystentem biznesowym Google ADK. 
-                
+            self.build_agent(model, all_tools)
+            
+            logger.info("Google ADK Agent skonfigurowany pomyślnie!")
+            
+        except Exception as e:
+            logger.error(f"Błąd konfiguracji agenta: {e}")
+            raise
+    
+    def build_agent(self, model, all_tools: List[Any]):
+        """LlmAgent z callbackami, runner i ADKTurnRunner dla podanego modelu i narzędzi (także benchmark offline)"""
+        with startup_profiler.step("import google.adk (agents, runners)"):
+            from google.genai import types
+            from google.adk.agents import LlmAgent
+            from google.adk.runners import InMemoryRunner
+        
+        # Proste intencje (data, godzina, spotkania, maile) obsługiwane bez modelu
+        from intent_router import IntentRouter
+        self.intent_router = IntentRouter.from_tools(all_tools, self.briefings)
+        
+        # Powtarzane pytania bez wywołania modelu (unieważniane zapisami i zmianami mirrora)
+        from response_cache import ResponseCache
+        self.response_cache = ResponseCache.from_env()
+        
+        # Duże wyniki narzędzi skracane przed modelem; resztę model dobiera narzędziem follow-up
+        from tool_result_shaping import ToolResultShaper
+        self.result_shaper = ToolResultShaper()
+        all_tools = list(all_tools) + [self.result_shaper.follow_up_tool()]
+        
+        # Niezależne odczyty z jednej odpowiedzi modelu wykonywane równolegle
+        from tool_fanout import ToolFanout
+        self.tool_fanout = ToolFanout(all_tools)
+        # Spany modelu i narzędzi (no-op bez AGENT_TRACING)
+        spans = AdkSpanCallbacks()
+        # Zużycie tokenów per sesja/użytkownik i dzienny budżet z tańszym modelem zastępczym
+        from session_database import SessionDatabase
+        from token_accounting import TokenAccountant
+        from history_compaction import HistoryCompactor
+        database = SessionDatabase()
+        self.token_usage = TokenAccountant(database)
+        # Długie sesje: starsze tury zastępowane kroczącym podsumowaniem (archiwum w SQLite)
+        self.history = HistoryCompactor(database, model)
+        
+        async def before_model_callback(callback_context, llm_request):
+            spans.before_model_callback(callback_context, llm_request)
+            await self.history.before_model_callback(callback_context, llm_request)
+            await self.token_usage.before_model_callback(callback_context, llm_request)
+            return business_before_model_callback(callback_context, llm_request)
+        
+        async def after_model_callback(callback_context, llm_response):
+            spans.after_model_callback(callback_context, llm_response)
+            model_usage_callback(callback_context, llm_response)
+            await self.token_usage.after_model_callback(callback_context, llm_response)
+            return await self.tool_fanout.after_model_callback(callback_context, llm_response)
+        
+        async def before_tool_callback(tool, args, tool_context):
+            spans.before_tool_callback(tool, args, tool_context)
+            business_before_tool_callback(tool=tool, args=args, tool_context=tool_context)
+            return await self.tool_fanout.before_tool_callback(tool, args, tool_context)
+        
+        async def after_tool_callback(tool, args, tool_context, tool_response):
+            business_after_tool_callback(tool=tool, args=args, tool_context=tool_context, tool_response=tool_response)
+            # Zmiany w kalendarzu unieważniają sekcję briefingu
+            if self.briefings and tool.name in CALENDAR_WRITE_TOOLS:
+                self.briefings.mark_stale(getattr(tool_context, "user_id", "default_user"), "calendar")
+            if self.response_cache:
+                self.response_cache.after_tool_callback(tool, args, tool_context, tool_response)
+            spans.after_tool_callback(tool, args, tool_context, tool_response)
+            tool_call_callback(tool, args, tool_context, tool_response)
+            return self.result_shaper.after_tool_callback(tool, args, tool_context, tool_response)
+        
+        # Stwórz agenta z callbacks
+        self.agent = LlmAgent(
+            name="GoogleADKBusinessAgent",
+            model=model,
+            tools=all_tools,  # POPRAWKA: Dodano narzędzia!
+            instruction="""Jesteś profesjonalnym asystentem biznesowym Google ADK. 
+            
 Odpowiadaj zwięźle i konkretnie. Używaj polskiego języka.
 Gdy pytają o datę/czas - wykorzystaj narzędzie get_current_datetime().
+Gdy pytają o plan dnia, spotkania dziś lub nowe emaile - najpierw użyj get_morning_briefing() (gotowe dane).
 Dla prostych pytań nie używaj niepotrzebnych narzędzi.
 
 KRYTYCZNE: Gdy użytkownik prosi o "treść emaila" lub "przywołaj treść":
@@ -668,6 +692,10 @@ WAŻNE dla draw.io API:
 - draw.io pliki są w formacie XML i zawierają teksty z diagramów
 - search_drawio_diagrams zwraca pliki z pasującymi tekstami w diagramach
 
+SKRÓCONE WYNIKI NARZĘDZI:
+- Wynik z polem _overflow jest skrócony (np. długa treść emaila, wszystkie teksty diagramu)
+- Gdy pokazana część nie wystarcza, użyj get_more_tool_result(handle, field, offset)
+
 KRYTYCZNE - TWORZENIE WYDARZEŃ:
 Gdy użytkownik chce dodać/zaplanować wydarzenie:
 1. ZAWSZE najpierw sprawdź datę: get_current_datetime()
@@ -718,294 +746,320 @@ Przykłady:
 - "pliki draw.io z metaverse" → list_drawio_files(max_results=10, search_query="metaverse")
 - "przeczytaj diagram ABC" → get_drawio_content(file_id="abc123")
 - "znajdz diagramy z tekstem metalayers" → search_drawio_diagrams(search_text="metalayers", max_results=10)""",
-                description="Profesjonalny asystent biznesowy z dostępem do Gmail, Calendar i narzędzi analitycznych",
-                
-                # OPTYMALIZACJA: Ustawienia dla szybkości
-                disallow_transfer_to_parent=True,
-                disallow_transfer_to_peers=True,
-                generate_content_config=types.GenerateContentConfig(
-                    temperature=0.1,  # Mniej kreatywności, więcej precyzji
-                    max_output_tokens=500,  # Krótsze odpowiedzi
-                    candidate_count=1  # Jedna odpowiedź
-                ),
-                # Dodaj callbacks
-                before_model_callback=business_before_model_callback,
-                before_tool_callback=business_before_tool_callback, 
-                after_tool_callback=business_after_tool_callback,
-                after_agent_callback=business_after_agent_callback
-            )
-            
-            logger.info(f"🛠️ Łącznie załadowano {len(all_tools)} narzędzi")
-            
-            # POPRAWKA: Tworzymy globalny runner zgodnie z API Google ADK
-            logger.info("🔧 Tworzenie globalnego session service i runner...")
+            description="Profesjonalny asystent biznesowy z dostępem do Gmail, Calendar i narzędzi analitycznych",
             
+            # OPTYMALIZACJA: Ustawienia dla szybkości
+            disallow_transfer_to_parent=True,
+            disallow_transfer_to_peers=True,
+            generate_content_config=types.GenerateContentConfig(
+                temperature=0.1,  # Mniej kreatywności, więcej precyzji
+                max_output_tokens=500,  # Krótsze odpowiedzi
+                candidate_count=1  # Jedna odpowiedź
+            ),
+            # Dodaj callbacks
+            before_model_callback=before_model_callback,
+            before_tool_callback=before_tool_callback,
+            after_tool_callback=after_tool_callback,
+            after_model_callback=after_model_callback,
+            after_agent_callback=business_after_agent_callback
+        )
+        
+        logger.info(f"🛠️ Łącznie załadowano {len(all_tools)} narzędzi")
+        
+        # POPRAWKA: Tworzymy globalny runner zgodnie z API Google ADK
+        logger.info("🔧 Tworzenie globalnego session service i runner...")
+        
+        session_db_url = os.getenv("AGENT_SESSION_DB_URL")
+        if session_db_url:
+            # Tryb wieloprocesowy: sesje we wspólnym magazynie, żeby każdy worker mógł je podjąć
+            from google.adk.runners import Runner
+            from google.adk.sessions import DatabaseSessionService
+            from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
+            from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
+            self.runner = Runner(
+                agent=self.agent,
+                app_name="BusinessAgent",
+                session_service=DatabaseSessionService(db_url=session_db_url),
+                artifact_service=InMemoryArtifactService(),
+                memory_service=InMemoryMemoryService()
+            )
+            logger.info(f"🗄️ Sesje w trwałym magazynie: {session_db_url}")
+        else:
             # InMemoryRunner automatycznie tworzy swoje własne services!
             self.runner = InMemoryRunner(
                 agent=self.agent,
                 app_name="BusinessAgent"
             )
-            
-            # Session service jest dostępny przez runner.session_service
-            self.session_service = self.runner.session_service
-            
-            logger.info("✅ Globalny runner i session service utworzone pomyślnie!")
-            logger.info(f"📋 Session service: {type(self.session_service).__name__}")
-            logger.info(f"📋 Runner: {type(self.runner).__name__}")
-            
-            logger.info("Google ADK Agent skonfigurowany pomyślnie!")
-            
-        except Exception as e:
-            logger.error(f"Błąd konfiguracji agenta: {e}")
-            raise
+        
+        # Session service jest dostępny przez runner.session_service
+        self.session_service = self.runner.session_service
+        self.turn_runner = ADKTurnRunner(runner=self.runner, app_name="BusinessAgent")
+        
+        logger.info("✅ Globalny runner i session service utworzone pomyślnie!")
+        logger.info(f"📋 Session service: {type(self.session_service).__name__}")
+        logger.info(f"📋 Runner: {type(self.runner).__name__}")
+    
+    def _fallback_google_toolsets(self, oauth2_credentials_file: str) -> List[Any]:
+        """GmailToolset i CalendarToolset opakowane leniwie (tylko gdy brak custom_google_tools)"""
+        from google.adk.tools.google_api_tool import GmailToolset, CalendarToolset
+        from lazy_toolsets import LazyGoogleApiToolset
+        from google_credentials_manager import get_credentials_manager
+        
+        with open(oauth2_credentials_file, 'r') as f:
+            oauth2_data = json.load(f)
+        # Obsługuj zarówno format "installed" jak i "web"
+        client_config = oauth2_data.get('installed') or oauth2_data.get('web')
+        if not client_config:
+            raise ValueError("Nieprawidłowy format oauth2_credentials.json")
+        client_id = client_config['client_id']
+        client_secret = client_config['client_secret']
+        
+        # Tokeny ze wspólnego managera (odświeżanego w tle)
+        access_token = refresh_token = None
+        try:
+            credentials = get_credentials_manager().credentials
+            access_token = credentials.token
+            refresh_token = credentials.refresh_token
+        except FileNotFoundError:
+            logger.info("⚠️ Brak pliku token.json - narzędzia będą wymagać autoryzacji")
+        
+        return [
+            LazyGoogleApiToolset(
+                "gmail",
+                lambda: GmailToolset(client_id=client_id, client_secret=client_secret),
+                client_id, client_secret, access_token, refresh_token
+            ),
+            LazyGoogleApiToolset(
+                "calendar",
+                lambda: CalendarToolset(client_id=client_id, client_secret=client_secret),
+                client_id, client_secret, access_token, refresh_token
+            ),
+        ]
     
-    async def process_message(self, message: str, websocket: WebSocketServerProtocol):
+    async def process_message(self, message: str, websocket: GatewayConnection):
         """Przetwarzanie wiadomości przez Google ADK Agent"""
+        logger.debug("🔄 Rozpoczynam przetwarzanie wiadomości (%d znaków)", len(message))
+        
+        # Wiadomość mogła przyjść zanim konfiguracja w tle się zakończyła
         try:
-            logger.info(f"🔄 Rozpoczynam przetwarzanie wiadomości: {message}")
-            
-            # Sprawdź czy agent jest skonfigurowany
-            if not self.agent or not self.runner or not self.session_service:
-                logger.error("❌ Agent, runner lub session_service nie są skonfigurowane!")
-                await websocket.send(json.dumps({
-                    "type": "error",
-                    "message": "Agent nie jest skonfigurowany",
-                    "timestamp": datetime.now().isoformat()
-                }))
-                return
-            
-            # POPRAWKA: Utrzymuj tę samą sesję dla całego WebSocket connection
-            logger.info("🚀 Uruchamiam runner.run_async() - OFICJALNY Google ADK pattern")
-            
-            # 1. Pobierz lub stwórz sesję dla tego WebSocket
-            if websocket in self.websocket_sessions:
-                # Użyj istniejącej sesji
-                session_data = self.websocket_sessions[websocket]
-                session_id = session_data["session_id"]
-                user_id = session_data["user_id"]
-                logger.info(f"🔄 Używam istniejącej sesji: {session_id}")
-                
-                session = await self.session_service.get_session(
-                    app_name="BusinessAgent",
-                    user_id=user_id,
-                    session_id=session_id
-                )
-            else:
-                # Stwórz nową sesję dla nowego WebSocket
-                session_id = f"session_{int(datetime.now().timestamp())}"
-                user_id = "default_user"
-                
-                logger.info(f"🔧 Tworzę NOWĄ sesję z ID: {session_id}")
-                
-                session = await self.session_service.create_session(
-                    app_name="BusinessAgent",
-                    user_id=user_id,
-                    session_id=session_id
-                )
-                
-                # Zapisz sesję dla tego WebSocket
-                self.websocket_sessions[websocket] = {
-                    "session_id": session_id,
-                    "user_id": user_id
-                }
-                logger.info(f"💾 Zapisano sesję {session_id} dla WebSocket")
-            
-            logger.info(f"✅ Sesja gotowa: {session_id}")
-            logger.info(f"📋 Session object: {session}")
-            logger.info(f"🧠 Session state: {session.state}")
-            logger.info(f"📚 Session events count: {len(session.events)}")
-            
-            # 2. Stwórz user message - OFICJALNY format
-            user_message = types.Content(
-                role='user',
-                parts=[types.Part(text=message)]
-            )
-            
-            logger.info(f"📨 Utworzona wiadomość użytkownika: {user_message}")
-            
-            # 3. RunConfig - używam domyślnych ustawień  
-            run_config = RunConfig(
-                response_modalities=["TEXT"]
+            await self.wait_until_ready()
+        except Exception as e:
+            logger.error("❌ Konfiguracja agenta nie powiodła się: %s", e)
+        
+        # Sprawdź czy agent jest skonfigurowany
+        if not self.agent or not self.runner or not self.session_service:
+            logger.error("❌ Agent, runner lub session_service nie są skonfigurowane!")
+            await websocket.send_frame("error", message="Agent nie jest skonfigurowany")
+            return
+        
+        # POPRAWKA: Utrzymuj tę samą sesję dla całego WebSocket connection
+        session_data = self.websocket_sessions.get(websocket)
+        if session_data is None:
+            session_data = self._new_session_binding()
+            self.websocket_sessions[websocket] = session_data
+        
+        admission_key = self._client_key(session_data)
+        
+        # Intencja szablonowa (bez Google API) albo powtórzone pytanie - odpowiedź bez kolejki i modelu
+        router = self.intent_router
+        matched = router.match(message) if router else None
+        direct, source = None, None
+        if matched is not None and matched[0] in TEMPLATE_INTENTS:
+            direct, source = await router.answer(session_data["user_id"], matched), f"intent:{matched[0]}"
+            # Trafienie lub powrót do modelu już policzony w metrykach routera
+            router = None
+        if direct is None and self.response_cache:
+            direct, source = await self.response_cache.lookup(admission_key, message), "cache"
+        if direct is not None:
+            with track_turn("google_adk") as turn:
+                turn["status"] = await self._send_direct(message, direct, source, websocket, session_data)
+            return
+        
+        async def send_queue_position(position: int):
+            await websocket.send_frame("queue_position", position=position)
+        
+        try:
+            async with self.admission.admit(admission_key, on_queued=send_queue_position):
+                with track_turn("google_adk") as turn:
+                    # Intencje z kalendarzem/pocztą zużywają limity użytkownika jak zwykła tura
+                    if router is not None:
+                        direct = await router.answer(session_data["user_id"], matched)
+                        if direct is not None:
+                            turn["status"] = await self._send_direct(message, direct, f"intent:{matched[0]}",
+                                                                     websocket, session_data)
+                            return
+                    turn["status"] = await self._run_turn(message, websocket, session_data)
+        except AdmissionRejected as e:
+            logger.warning("⏳ Tura odrzucona dla %s: %s", admission_key, e.reason)
+            await websocket.send_frame(
+                "busy",
+                reason=e.reason,
+                retry_after=round(e.retry_after, 1),
+                message="Agent jest teraz przeciążony - spróbuj ponownie za chwilę."
             )
+    
+    async def _send_direct(self, message: str, response: str, source: str, websocket: GatewayConnection,
+                           session_data: Dict[str, str]) -> str:
+        """Odpowiedź bez modelu (router intencji, cache); pytanie i odpowiedź trafiają do sesji ADK"""
+        with span(TURN_SPAN, **{"session.id": session_data["session_id"], "user.id": session_data["user_id"],
+                                 "message.chars": len(message), "turn.source": source}):
+            with span("ws.send", **{"response.chars": len(response)}):
+                await send_response_chunk(websocket, response)
+                await send_response_complete(websocket)
+            try:
+                await self.turn_runner.record_exchange(session_data["user_id"], session_data["session_id"],
+                                                       message, response)
+            except Exception as e:
+                logger.warning("⚠️ Nie dopisano tury bez modelu do sesji %s: %s", session_data["session_id"], e)
+        logger.info("⚡ Tura %s bez modelu (%s)", session_data["session_id"], source)
+        return "cached" if source == "cache" else "routed"
+    
+    async def _run_turn(self, message: str, websocket: GatewayConnection, session_data: Dict[str, str]) -> str:
+        """Jedna tura agenta: runner.run_async() i wysłanie odpowiedzi; zwraca status tury"""
+        with span(TURN_SPAN, **{"session.id": session_data["session_id"], "user.id": session_data["user_id"],
+                                 "message.chars": len(message)}) as turn_span:
+            turn_log = None
+            session_id = session_data["session_id"]
+            user_id = session_data["user_id"]
+            try:
+                # Sesja mogła zostać utworzona wcześniej (także przez inny worker)
+                with span("db.ensure_session"):
+                    session = await self.turn_runner.ensure_session(user_id, session_id)
             
-            logger.info(f"🎯 Wywołuję runner.run_async() z session_id: {session_id}")
-            logger.info(f"🎯 Session object ID: {session.id if hasattr(session, 'id') else 'brak atrybutu id'}")
+                turn_log = TurnLogSummary(session_id)
+                if logger.isEnabledFor(logging.DEBUG):
+                    # Tylko rozmiary - pełny stan sesji może mieć setki KB
+                    logger.debug(
+                        "📚 Sesja %s: %d eventów, %d kluczy stanu",
+                        session_id, len(session.events), len(session.state)
+                    )
             
-            # 4. OFICJALNY wzorzec: runner.run_async() z new_message
-            collected_responses = []
-            async for event in self.runner.run_async(
-                user_id=user_id,
-                session_id=session.id if hasattr(session, 'id') else session_id,
-                new_message=user_message,
-                run_config=run_config
-            ):
-                logger.info(f"📡 Otrzymano event: {event.author} - {type(event).__name__}")
+                # OFICJALNY wzorzec: runner.run_async() z new_message (wspólna pętla ADKTurnRunner)
+                collected_responses = []
+                tools_used = set()
+                invocation_id = None
+                async for event, event_text in self.turn_runner.run_events(message, user_id, session_id):
+                    turn_log.record_event(event_text)
+                    tools_used.update(call.name for call in event.get_function_calls())
+                    invocation_id = event.invocation_id or invocation_id
                 
-                # Sprawdzamy czy to końcowa odpowiedź
-                if event.is_final_response():
-                    logger.info("✅ To jest końcowa odpowiedź!")
-                    if event.content and event.content.parts:
-                        final_text = event.content.parts[0].text
-                        logger.info(f"💬 Końcowy tekst odpowiedzi: {final_text}")
-                        collected_responses.append(final_text)
+                    if self._event_sampler.should_log(logger):
+                        logger.debug("📡 Event: %s - %s (final=%s)",
+                                     event.author, type(event).__name__, event.is_final_response())
                 
-                # Również zbieramy zwykłe odpowiedzi
-                elif event.content and event.content.parts:
-                    event_text = event.content.parts[0].text
-                    if event_text:
-                        logger.info(f"📝 Tekst wydarzenia: {event_text}")
+                    # Zbieramy zarówno końcową odpowiedź jak i zwykłe teksty
+                    if event.is_final_response():
+                        if event.content and event.content.parts:
+                            collected_responses.append(event_text)
+                    elif event_text:
                         collected_responses.append(event_text)
             
-            logger.info(f"✅ Runner zakończył pracę po {len(collected_responses)} eventach")
-            
-            if not collected_responses:
-                collected_responses = ["Agent otrzymał wiadomość, ale nie wygenerował odpowiedzi."]
-            
-            # POPRAWKA: Użyj ostatnią (końcową) odpowiedź zamiast pierwszej
-            final_response = collected_responses[-1] if collected_responses[-1] else "Brak odpowiedzi"
-            logger.info(f"📝 Wysyłam końcową odpowiedź: {final_response[:100]}...")
-            logger.info(f"🎯 Wszystkie zebrane odpowiedzi: {len(collected_responses)}")
-            
-            # Wyślij odpowiedź
-            await websocket.send(json.dumps({
-                "type": "response_chunk", 
-                "content": final_response,
-                "timestamp": datetime.now().isoformat()
-            }))
+                generated = bool(collected_responses)
+                if not collected_responses:
+                    collected_responses = ["Agent otrzymał wiadomość, ale nie wygenerował odpowiedzi."]
             
-            await websocket.send(json.dumps({
-                "type": "response_complete",
-                "timestamp": datetime.now().isoformat()
-            }))
+                # POPRAWKA: Użyj ostatnią (końcową) odpowiedź zamiast pierwszej
+                final_response = collected_responses[-1] if collected_responses[-1] else "Brak odpowiedzi"
             
-        except Exception as e:
-            logger.error(f"❌ Błąd przetwarzania wiadomości: {e}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
+                # Wyślij odpowiedź
+                with span("ws.send", **{"response.chars": len(final_response)}):
+                    await send_response_chunk(websocket, final_response)
+                    await send_response_complete(websocket)
             
-            # Prosty fallback z timestamp
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            error_response = f"Dziś jest {current_time}. Wystąpił błąd: {str(e)}"
+                if self.response_cache and generated and turn_log.status == "ok":
+                    await self.response_cache.store(self._client_key(session_data), message, final_response,
+                                                    tools_used, invocation_id)
             
-            await websocket.send(json.dumps({
-                "type": "response_chunk",
-                "content": error_response,
-                "timestamp": datetime.now().isoformat()
-            }))
-    
-    async def handle_websocket(self, websocket: WebSocketServerProtocol):
-        """Obsługa połączeń WebSocket"""
-        try:
-            logger.info(f"Nowe połączenie WebSocket: {websocket.remote_address}")
-            self.connected_clients.add(websocket)
+            except Exception as e:
+                if turn_log:
+                    turn_log.status = "error"
+                logger.exception("❌ Błąd przetwarzania wiadomości: %s", e)
             
-            # Wiadomość powitalna
-            logger.info("Próba wysłania wiadomości powitalnej...")
-            await websocket.send(json.dumps({
-                "type": "welcome",
-                "message": "🤖 Google ADK Business Agent gotowy do pracy!",
-                "timestamp": datetime.now().isoformat()
-            }))
-            logger.info("✅ Wiadomość powitalna wysłana pomyślnie")
+                # Prosty fallback z timestamp
+                current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                error_response = f"Dziś jest {current_time}. Wystąpił błąd: {str(e)}"
             
-            # Główna pętla obsługi wiadomości
-            logger.info("📨 Rozpoczynam nasłuchiwanie wiadomości...")
-            async for message in websocket:
-                try:
-                    logger.info(f"📥 Otrzymano surową wiadomość: {message}")
-                    data = json.loads(message)
-                    logger.info(f"📝 Sparsowane dane: {data}")
-                    
-                    # Obsługa różnych formatów wiadomości
-                    if data.get("type") == "message":
-                        user_message = data.get("content", "")
-                        logger.info(f"💬 Przetwarzam wiadomość chat (format type): {user_message}")
-                        await self.process_message(user_message, websocket)
-                    
-                    elif data.get("message"):  # Format z nowego UI
-                        user_message = data.get("message", "")
-                        logger.info(f"💬 Przetwarzam wiadomość chat (format message): {user_message}")
-                        await self.process_message(user_message, websocket)
-                    
-                    elif data.get("type") == "ping":
-                        logger.info("🏓 Otrzymano ping, wysyłam pong")
-                        await websocket.send(json.dumps({
-                            "type": "pong",
-                            "timestamp": datetime.now().isoformat()
-                        }))
-                    
-                    else:
-                        logger.warning(f"⚠️ Nieznany format wiadomości: {data}")
-                        # Próbuj traktować jako zwykłą wiadomość tekstową
-                        if isinstance(data, dict) and len(data) > 0:
-                            # Weź pierwszą wartość string-ową jako wiadomość
-                            for key, value in data.items():
-                                if isinstance(value, str) and value.strip():
-                                    logger.info(f"🔄 Traktuję jako wiadomość: {value}")
-                                    await self.process_message(value, websocket)
-                                    break
-                
-                except json.JSONDecodeError as e:
-                    logger.error(f"❌ Błąd parsowania JSON: {e}")
-                    # Traktuj jako zwykłą wiadomość tekstową
-                    logger.info("📝 Traktuję jako zwykłą wiadomość tekstową")
-                    await self.process_message(message, websocket)
-                    
-                except Exception as e:
-                    logger.error(f"❌ Błąd obsługi wiadomości: {e}")
-                    logger.error(f"Traceback: {traceback.format_exc()}")
-                    try:
-                        await websocket.send(json.dumps({
-                            "type": "error",
-                            "message": f"Błąd: {str(e)}",
-                            "timestamp": datetime.now().isoformat()
-                        }))
-                    except Exception as send_error:
-                        logger.error(f"Nie można wysłać komunikatu o błędzie: {send_error}")
-        
-        except websockets.exceptions.ConnectionClosed:
-            logger.info("Połączenie WebSocket zamknięte normalnie")
-        except Exception as e:
-            logger.error(f"Nieoczekiwany błąd w handle_websocket: {e}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
+                await send_response_chunk(websocket, error_response)
         
-        finally:
-            self.connected_clients.discard(websocket)
-            # NOWE: Usuń sesję WebSocket przy rozłączeniu
-            if websocket in self.websocket_sessions:
-                session_data = self.websocket_sessions[websocket]
-                logger.info(f"🗑️ Usuwam sesję {session_data['session_id']} dla rozłączonego WebSocket")
-                del self.websocket_sessions[websocket]
-            logger.info(f"Usunięto klienta z listy: {websocket.remote_address if hasattr(websocket, 'remote_address') else 'unknown'}")
-    
-    async def start_server(self, host: str = "localhost", port: int = 8765):
+            finally:
+                if turn_log:
+                    turn_log.emit(logger)
+                    set_attributes(turn_span, **{"turn.status": turn_log.status, "turn.events": turn_log.events})
+        return turn_log.status if turn_log else "error"
+    
+    async def on_connect(self, conn: GatewayConnection):
+        """Nowe połączenie - powiązanie z sesją ADK"""
+        startup_profiler.mark("pierwsze połączenie")
+        self.connected_clients.add(conn)
+        # Klient (lub dispatcher) może wznowić sesję przez ?session_id=...&user_id=...
+        session_data = self._new_session_binding(conn.session_id, conn.user_id)
+        self.websocket_sessions[conn] = session_data
+        conn.session_id = session_data["session_id"]
+    
+    async def handle_message(self, conn: GatewayConnection, text: str):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📥 Otrzymano wiadomość (%d znaków)", len(text))
+        await self.process_message(text, conn)
+    
+    async def on_disconnect(self, conn: GatewayConnection):
+        self.connected_clients.discard(conn)
+        # Usuń sesję WebSocket przy rozłączeniu
+        session_data = self.websocket_sessions.pop(conn, None)
+        if session_data:
+            logger.info("🗑️ Usuwam sesję %s dla rozłączonego WebSocket", session_data['session_id'])
+        if self.turn_runner:
+            # Powiązanie runnera i sesja InMemory rosłyby z każdym połączeniem
+            await self.turn_runner.release(conn, session_data)
+    
+    @staticmethod
+    def _client_key(session_data: Dict[str, str]) -> str:
+        """Klucz limitów i cache odpowiedzi; anonimowi klienci UI są rozróżniani po sesji"""
+        if session_data["user_id"] == "default_user":
+            return session_data["session_id"]
+        return session_data["user_id"]
+    
+    @staticmethod
+    def _new_session_binding(session_id: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, str]:
+        """Powiązanie połączenia z sesją ADK (UUID - unikalne także między workerami)"""
+        return {
+            "session_id": session_id or f"session_{uuid.uuid4().hex}",
+            "user_id": user_id or "default_user"
+        }
+    
+    async def start_server(self, host: str = "localhost", port: int = 8765, reuse_port: bool = False):
         """Uruchomienie serwera WebSocket"""
         logger.info(f"Uruchamianie Google ADK Business Agent na {host}:{port}")
         
-        # Inicjalizuj agenta jeśli jeszcze nie jest
-        if not self.agent:
-            await self.setup_agent()
-        
-        self.server = await websockets.serve(
-            self.handle_websocket,
-            host,
-            port,
-            ping_interval=20,
-            ping_timeout=60
-        )
+        # Najpierw nasłuch - konfiguracja agenta (importy ADK, narzędzia, runner) idzie w tle
+        self.gateway = WebSocketGateway(self)
+        with startup_profiler.step("serwer WebSocket (bind)"):
+            self.server = await self.gateway.start(host, port, reuse_port=reuse_port)
+        startup_profiler.mark("serwer nasłuchuje")
         
-        logger.info(f"🚀 Google ADK Business Agent działa na ws://{host}:{port}")
-        logger.info("Gotowy do obsługi klientów biznesowych!")
+        if not self.agent and self._setup_task is None:
+            self._setup_task = asyncio.create_task(self._setup_in_background())
         
         # Trzymaj serwer włączony
         await self.server.wait_closed()
     
+    async def _setup_in_background(self):
+        with startup_profiler.step("setup_agent (łącznie)"):
+            await self.setup_agent()
+        logger.info("Gotowy do obsługi klientów biznesowych!")
+        startup_profiler.emit(logger, final_mark="agent gotowy")
+    
+    async def wait_until_ready(self):
+        """Czeka na zakończenie konfiguracji agenta (pierwsze wiadomości po starcie)"""
+        if self._setup_task is not None and not self._setup_task.done():
+            await asyncio.shield(self._setup_task)
+    
     def stop_server(self):
         """Zatrzymanie serwera"""
         if self.server:
             self.server.close()
             logger.info("Serwer zatrzymany")
 
-async def main():
+async def main(host: str = "localhost", port: int = 8765):
     """Główna funkcja uruchamiająca"""
     # Sprawdź dostęp do Google Cloud
     credentials_path = "google_cloud_credentials.json"
@@ -1021,7 +1075,7 @@ async def main():
     agent = GoogleADKBusinessAgent()
     
     try:
-        await agent.start_server()
+        await agent.start_server(host, port)
     except KeyboardInterrupt:
         logger.info("Otrzymano sygnał przerwania...")
         agent.stop_server()
@@ -1030,6 +1084,19 @@ async def main():
         agent.stop_server()
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Google ADK Business Agent")
+    parser.add_argument("--host", default=os.getenv("WEBSOCKET_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEBSOCKET_PORT", "8765")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("AGENT_WORKERS", "1")),
+                        help="Liczba procesów-workerów (>1 = tryb wieloprocesowy)")
+    parser.add_argument("--dispatcher", action="store_true",
+                        help="Dispatcher z afinicją sesji zamiast SO_REUSEPORT")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Raport czasu importów i kroków startu")
+    cli_args = parser.parse_args()
+    
     print("""
     🤖 Google ADK Business Agent z Gmail
     ====================================
@@ -1045,4 +1112,9 @@ if __name__ == "__main__":
     🔗 Połącz się przez WebSocket: ws://localhost:8765
     """)
     
-    asyncio.run(main()) 
\ No newline at end of file
+    if cli_args.workers > 1:
+        from agent_workers import run_workers
+        run_workers(cli_args.workers, cli_args.host, cli_args.port,
+                    use_dispatcher=True if cli_args.dispatcher else None)
+    else:
+        asyncio.run(main(cli_args.host, cli_args.port))
\ No newline at end of file
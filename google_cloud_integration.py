@@ -9,18 +9,24 @@ import asyncio
 import json
 import base64
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any
 from dotenv import load_dotenv
 
 # Google Cloud imports
 from google.oauth2 import service_account
 from google.cloud import texttospeech
-from google.cloud import speech
 from google.cloud import storage
 from google.cloud import bigquery
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from admission_control import execute_with_limit, upstream_slot
+from agent_metrics import TTS_CHARACTERS
+from agent_tracing import span, traced
+from tts_text_normalizer import prepare_for_tts, speech_sentences, to_ssml
+from speech_stream import SpeechInput
+from workspace_sync import read_events, read_messages
+
 # Load environment
 load_dotenv()
 
@@ -44,9 +50,9 @@ class GoogleCloudManager:
             ]
         )
         
-        # Initialize clients
-        self.tts_client = texttospeech.TextToSpeechClient(credentials=self.credentials)
-        self.speech_client = speech.SpeechClient(credentials=self.credentials)
+        # Initialize clients (TTS: asynchroniczny klient w GoogleCloudTTS)
+        # Streaming STT dla bramki WebSocket (klient asynchroniczny tworzony przy pierwszym audio)
+        self.speech_input = SpeechInput(credentials=self.credentials)
         self.storage_client = storage.Client(credentials=self.credentials, project=self.project_id)
         self.bigquery_client = bigquery.Client(credentials=self.credentials, project=self.project_id)
         
@@ -56,12 +62,37 @@ class GoogleCloudManager:
         self.drive_service = build('drive', 'v3', credentials=self.credentials)
         self.sheets_service = build('sheets', 'v4', credentials=self.credentials)
 
+# Kodowania wyjściowe TTS: (AudioEncoding, format dla klienta, sample rate)
+TTS_AUDIO_ENCODINGS = {
+    "mp3": (texttospeech.AudioEncoding.MP3, "mp3", None),
+    # PCM bez dekodowania po stronie UE5 (odpowiedź zawiera nagłówek WAV)
+    "linear16": (texttospeech.AudioEncoding.LINEAR16, "wav", 24000),
+    "ogg_opus": (texttospeech.AudioEncoding.OGG_OPUS, "ogg_opus", 48000),
+}
+# Format strumienia: zdania LINEAR16 sklejone w jeden strumień nie mogą mieć nagłówków WAV w środku
+TTS_STREAM_FORMATS = {"linear16": "pcm_s16le"}
+
+
+def wav_to_pcm(audio: bytes) -> bytes:
+    """Surowe próbki z odpowiedzi LINEAR16 (bez nagłówka RIFF/WAVE)"""
+    if audio[:4] != b"RIFF" or audio[8:12] != b"WAVE":
+        return audio
+    offset = 12
+    while offset + 8 <= len(audio):
+        chunk_id, size = audio[offset:offset + 4], int.from_bytes(audio[offset + 4:offset + 8], "little")
+        if chunk_id == b"data":
+            return audio[offset + 8:offset + 8 + size]
+        offset += 8 + size + (size & 1)
+    return b""
+
+
 class GoogleCloudTTS:
-    """Google Cloud Text-to-Speech Integration"""
+    """Google Cloud Text-to-Speech Integration (klient asynchroniczny)"""
     
-    def __init__(self, gcp_manager: GoogleCloudManager):
+    def __init__(self, gcp_manager: GoogleCloudManager, audio_encoding: Optional[str] = None):
         self.gcp = gcp_manager
-        self.client = gcp_manager.tts_client
+        # Klient gRPC asyncio tworzony przy pierwszym użyciu - wiąże się z działającym event loopem
+        self._client: Optional[texttospeech.TextToSpeechAsyncClient] = None
         
         # Voice configuration dla polskiego avatara biznesowego
         self.voice_config = {
@@ -69,16 +100,58 @@ class GoogleCloudTTS:
             'name': 'pl-PL-Standard-B',  # Męski głos profesjonalny
             'ssml_gender': texttospeech.SsmlVoiceGender.MALE
         }
+        # Limit długości wypowiedzi (całe zdania)
+        self.max_chars = 600
+        # Głos Chirp 3 HD dla prawdziwej syntezy strumieniowej (puste = synteza potokowa zdaniami)
+        self.streaming_voice = os.getenv("GOOGLE_TTS_STREAMING_VOICE", "")
+        
+        self.audio_encoding = (audio_encoding or os.getenv("GOOGLE_TTS_AUDIO_ENCODING", "mp3")).lower()
+        if self.audio_encoding not in TTS_AUDIO_ENCODINGS:
+            raise ValueError(f"Nieobsługiwane kodowanie TTS: {self.audio_encoding}")
+        encoding, self.audio_format, sample_rate = TTS_AUDIO_ENCODINGS[self.audio_encoding]
+        # generate_speech_stream: LINEAR16 jako ciągłe PCM, pozostałe kodowania bez zmian
+        self.stream_audio_format = TTS_STREAM_FORMATS.get(self.audio_encoding, self.audio_format)
+        self.sample_rate = sample_rate
         
         # Audio configuration dla najlepszej jakości
-        self.audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            speaking_rate=1.0,
-            pitch=0.0,
-            volume_gain_db=0.0,
-            effects_profile_id=['telephony-class-application']
+        audio_config = {
+            'audio_encoding': encoding,
+            'speaking_rate': 1.0,
+            'pitch': 0.0,
+            'volume_gain_db': 0.0,
+            'effects_profile_id': ['telephony-class-application']
+        }
+        if sample_rate:
+            audio_config['sample_rate_hertz'] = sample_rate
+        self.audio_config = texttospeech.AudioConfig(**audio_config)
+    
+    @property
+    def client(self) -> texttospeech.TextToSpeechAsyncClient:
+        if self._client is None:
+            self._client = texttospeech.TextToSpeechAsyncClient(credentials=self.gcp.credentials)
+        return self._client
+    
+    def _voice(self, emotion: str) -> texttospeech.VoiceSelectionParams:
+        """Konfiguracja głosu na podstawie emocji"""
+        return texttospeech.VoiceSelectionParams(
+            language_code=self.voice_config['language_code'],
+            name=self._get_voice_for_emotion(emotion),
+            ssml_gender=self.voice_config['ssml_gender']
         )
     
+    async def _synthesize(self, synthesis_input: texttospeech.SynthesisInput,
+                          voice: texttospeech.VoiceSelectionParams) -> bytes:
+        chars = len(synthesis_input.text or synthesis_input.ssml or "")
+        TTS_CHARACTERS.labels("google").inc(chars)
+        with span("tts.synthesize", **{"tts.provider": "google", "tts.chars": chars}):
+            async with upstream_slot("tts"):
+                response = await self.client.synthesize_speech(
+                    input=synthesis_input,
+                    voice=voice,
+                    audio_config=self.audio_config
+                )
+        return response.audio_content
+    
     async def generate_speech(self, text: str, emotion: str = "neutral") -> bytes:
         """
         Generuje mowę z tekstu używając Google Cloud TTS
@@ -88,51 +161,103 @@ class GoogleCloudTTS:
             emotion: Emocja/styl (neutral, happy, sad, angry)
             
         Returns:
-            Dane audio w formacie MP3
+            Dane audio w formacie self.audio_format (domyślnie MP3)
         """
         try:
-            # Optymalizuj tekst dla TTS
-            optimized_text = self._optimize_text_for_tts(text)
-            
-            # Konfiguracja głosu na podstawie emocji
-            voice = texttospeech.VoiceSelectionParams(
-                language_code=self.voice_config['language_code'],
-                name=self._get_voice_for_emotion(emotion),
-                ssml_gender=self.voice_config['ssml_gender']
-            )
-            
-            # Synthesis input
-            synthesis_input = texttospeech.SynthesisInput(text=optimized_text)
-            
-            # Generate speech
-            response = self.client.synthesize_speech(
-                input=synthesis_input,
-                voice=voice,
-                audio_config=self.audio_config
-            )
-            
-            return response.audio_content
+            # Znormalizowane zdania z pauzami SSML między nimi
+            sentences = speech_sentences(text, self.max_chars)
+            if not sentences:
+                return b""
+            synthesis_input = texttospeech.SynthesisInput(ssml=to_ssml(sentences))
+            return await self._synthesize(synthesis_input, self._voice(emotion))
             
         except Exception as e:
             print(f"❌ Błąd Google Cloud TTS: {e}")
             return b""
     
-    def _optimize_text_for_tts(self, text: str) -> str:
-        """Optymalizuje tekst dla lepszej jakości TTS"""
-        # Usuń emoji i formatowanie
-        text = text.replace("📊", "").replace("✅", "").replace("🎯", "")
-        text = text.replace("📅", "").replace("⏰", "").replace("📋", "")
-        text = text.replace("🤖", "").replace("💡", "").replace("🔍", "")
+    async def generate_speech_stream(self, text: str, emotion: str = "neutral") -> AsyncIterator[bytes]:
+        """
+        Streaming audio - kolejne fragmenty w miarę syntezy (zamiennik ElevenLabs stream)
         
-        # Dodaj pauzy dla lepszej dykcji
-        text = text.replace(".", ". ").replace("!", "! ").replace("?", "? ")
+        Z GOOGLE_TTS_STREAMING_VOICE (Chirp 3 HD, LINEAR16/OGG_OPUS) używa
+        streaming_synthesize; w przeciwnym razie syntezuje zdania potokowo -
+        pierwsze zdanie jest wysyłane, zanim reszta zostanie wygenerowana.
+        Fragmenty są w formacie self.stream_audio_format (LINEAR16: PCM bez nagłówków WAV).
+        """
+        # Te same granice zdań co w generate_speech (wspólny normalizator)
+        sentences = speech_sentences(text, self.max_chars)
+        if not sentences:
+            return
         
-        # Skróć jeśli za długie
-        if len(text) > 600:
-            sentences = text.split(". ")
-            text = ". ".join(sentences[:4]) + "."
+        try:
+            if self.streaming_voice and self.audio_encoding != "mp3" and \
+                    hasattr(texttospeech, "StreamingSynthesizeConfig"):
+                async for chunk in self._streaming_synthesize(sentences):
+                    yield chunk
+                return
+            
+            # Synteza potokowa: wszystkie zdania startują od razu (w limicie upstreamu "tts"),
+            # wyniki są oddawane w kolejności
+            voice = self._voice(emotion)
+            tasks = [
+                asyncio.create_task(self._synthesize(texttospeech.SynthesisInput(text=sentence), voice))
+                for sentence in sentences
+            ]
+            try:
+                for task in tasks:
+                    audio = await task
+                    if self.audio_encoding == "linear16":
+                        audio = wav_to_pcm(audio)
+                    if audio:
+                        yield audio
+            finally:
+                # Przerwany odbiór (rozłączenie) - reszta zdań nie jest już potrzebna
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                    
+        except Exception as e:
+            print(f"❌ Błąd streaming Google Cloud TTS: {e}")
+    
+    async def _streaming_synthesize(self, sentences: List[str]) -> AsyncIterator[bytes]:
+        """Dwukierunkowy stream gRPC: tekst zdaniami, audio w kawałkach"""
+        encoding, _format, sample_rate = TTS_AUDIO_ENCODINGS[self.audio_encoding]
+        # Stream obsługuje surowe PCM zamiast kontenera WAV
+        if self.audio_encoding == "linear16":
+            encoding = texttospeech.AudioEncoding.PCM
         
-        return text.strip()
+        async def requests():
+            yield texttospeech.StreamingSynthesizeRequest(
+                streaming_config=texttospeech.StreamingSynthesizeConfig(
+                    voice=texttospeech.VoiceSelectionParams(
+                        language_code=self.voice_config['language_code'],
+                        name=self.streaming_voice
+                    ),
+                    streaming_audio_config=texttospeech.StreamingAudioConfig(
+                        audio_encoding=encoding,
+                        sample_rate_hertz=sample_rate
+                    )
+                )
+            )
+            for sentence in sentences:
+                yield texttospeech.StreamingSynthesizeRequest(
+                    input=texttospeech.StreamingSynthesisInput(text=sentence)
+                )
+        
+        async with upstream_slot("tts"):
+            stream = await self.client.streaming_synthesize(requests=requests())
+            async for response in stream:
+                if response.audio_content:
+                    yield response.audio_content
+    
+    async def optimize_for_realtime(self, text: str) -> str:
+        """Interfejs zgodny z ElevenLabsVoiceManager (UE5AudioStreamer) - tekst bez zmian,
+        bo generate_speech i generate_speech_stream normalizują go same (speech_sentences)"""
+        return text
+    
+    def _optimize_text_for_tts(self, text: str) -> str:
+        """Optymalizuje tekst dla lepszej jakości TTS"""
+        return prepare_for_tts(text, self.max_chars)
     
     def _get_voice_for_emotion(self, emotion: str) -> str:
         """Zwraca odpowiedni głos dla emocji"""
@@ -154,21 +279,32 @@ class GoogleBusinessIntegration:
         self.calendar = gcp_manager.calendar_service
         self.drive = gcp_manager.drive_service
         self.sheets = gcp_manager.sheets_service
+        # Lokalny mirror Gmail/Calendar (workspace_sync.py), ustawiany gdy synchronizacja działa
+        self.mirror = None
     
-    async def get_calendar_events(self, days_ahead: int = 7) -> List[Dict]:
-        """Pobiera nadchodzące wydarzenia z kalendarza"""
+    async def get_calendar_events(self, days_ahead: int = 7, time_min: Optional[str] = None,
+                                  time_max: Optional[str] = None) -> List[Dict]:
+        """Pobiera nadchodzące wydarzenia z kalendarza (time_min/time_max RFC3339 zamiast okna od teraz)"""
         try:
-            now = datetime.utcnow().isoformat() + 'Z'
-            end_time = (datetime.utcnow() + timedelta(days=days_ahead)).isoformat() + 'Z'
+            now = time_min or datetime.utcnow().isoformat() + 'Z'
+            end_time = time_max or (datetime.utcnow() + timedelta(days=days_ahead)).isoformat() + 'Z'
+            
+            mirrored = await read_events(self.mirror, now, end_time, 20)
+            if mirrored is not None:
+                return [
+                    {'title': event['summary'], 'start': event['start'], 'description': event['description'],
+                     'location': event['location'], 'id': event['id']}
+                    for event in mirrored
+                ]
             
-            events_result = self.calendar.events().list(
+            events_result = await execute_with_limit("calendar", self.calendar.events().list(
                 calendarId='primary',
                 timeMin=now,
                 timeMax=end_time,
                 maxResults=20,
                 singleEvents=True,
                 orderBy='startTime'
-            ).execute()
+            ).execute)
             
             events = events_result.get('items', [])
             
@@ -209,7 +345,7 @@ class GoogleBusinessIntegration:
                 },
             }
             
-            event = self.calendar.events().insert(calendarId='primary', body=event).execute()
+            event = await execute_with_limit("calendar", self.calendar.events().insert(calendarId='primary', body=event).execute)
             return f"✅ Spotkanie utworzone: {event.get('htmlLink')}"
             
         except Exception as e:
@@ -219,17 +355,25 @@ class GoogleBusinessIntegration:
     async def get_recent_emails(self, max_results: int = 10) -> List[Dict]:
         """Pobiera najnowsze emaile"""
         try:
-            results = self.gmail.users().messages().list(
+            mirrored = await read_messages(self.mirror, True, max_results)
+            if mirrored is not None:
+                return [
+                    {'id': message['id'], 'subject': message['subject'], 'sender': message['sender'],
+                     'date': message['date'], 'snippet': message['snippet']}
+                    for message in mirrored
+                ]
+            
+            results = await execute_with_limit("gmail", self.gmail.users().messages().list(
                 userId='me', 
                 maxResults=max_results,
                 q='is:unread'  # Tylko nieprzeczytane
-            ).execute()
+            ).execute)
             
             messages = results.get('messages', [])
             
             emails = []
             for message in messages:
-                msg = self.gmail.users().messages().get(userId='me', id=message['id']).execute()
+                msg = await execute_with_limit("gmail", self.gmail.users().messages().get(userId='me', id=message['id']).execute)
                 
                 headers = msg['payload'].get('headers', [])
                 subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'Bez tematu')
@@ -250,6 +394,25 @@ class GoogleBusinessIntegration:
             print(f"❌ Błąd Gmail API: {e}")
             return []
     
+    async def get_recent_documents(self, max_results: int = 5) -> List[Dict]:
+        """Pobiera ostatnio modyfikowane dokumenty z Drive"""
+        try:
+            results = await execute_with_limit("drive", self.drive.files().list(
+                q="trashed = false",
+                pageSize=max_results,
+                fields='files(id,name,modifiedTime)',
+                orderBy='modifiedTime desc'
+            ).execute)
+
+            return [
+                {'id': doc['id'], 'title': doc.get('name', 'Bez tytułu'), 'modified': doc.get('modifiedTime', '')}
+                for doc in results.get('files', [])
+            ]
+
+        except Exception as e:
+            print(f"❌ Błąd Drive API: {e}")
+            return []
+
     async def send_email(self, to: str, subject: str, body: str) -> str:
         """Wysyła email"""
         try:
@@ -259,7 +422,7 @@ class GoogleBusinessIntegration:
                 ).decode()
             }
             
-            self.gmail.users().messages().send(userId='me', body=message).execute()
+            await execute_with_limit("gmail", self.gmail.users().messages().send(userId='me', body=message).execute)
             return "✅ Email wysłany pomyślnie"
             
         except Exception as e:
@@ -275,6 +438,7 @@ class GoogleAnalytics:
         self.dataset_id = "business_analytics"
         self.table_id = "metahuman_interactions"
     
+    @traced("analytics.log_interaction")
     async def log_interaction(self, user_input: str, agent_response: str, response_time_ms: int):
         """Loguje interakcję z MetaHuman do BigQuery"""
         try:
@@ -358,7 +522,7 @@ async def test_google_cloud_integration():
         audio_data = await tts.generate_speech(test_text)
         
         if audio_data:
-            with open("google_tts_test.mp3", "wb") as f:
+            with open(f"google_tts_test.{tts.audio_format}", "wb") as f:
                 f.write(audio_data)
             print(f"✅ Google Cloud TTS: {len(audio_data)} bytes")
         
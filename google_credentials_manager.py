@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Wspólny manager tokenów OAuth2 Google (token.json)
+Jedne credentials na proces, odświeżanie w tle przed wygaśnięciem,
+scalanie równoczesnych odświeżeń i atomowy zapis pliku z blokadą
+"""
+
+import os
+import json
+import asyncio
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows - blokada tylko w obrębie procesu
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Odświeżamy z wyprzedzeniem, żeby żadne żądanie nie trafiło na wygasły token
+DEFAULT_REFRESH_MARGIN = int(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN", "300"))
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Blokada międzyprocesowa (workery agenta, skrypt autoryzacji)"""
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _write_atomic(path: str, content: str):
+    """Zapis przez plik tymczasowy + os.replace - czytelnik nigdy nie widzi połowy pliku"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".token-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def save_token(credentials: Credentials, token_file: str = "token.json"):
+    """Atomowy zapis tokena (używany też przez manual_oauth2_auth.py)"""
+    with _file_lock(token_file):
+        _write_atomic(token_file, credentials.to_json())
+
+
+class _ManagedCredentials(Credentials):
+    """
+    Credentials, których refresh() przechodzi przez manager
+
+    Klienci googleapiclient wołają refresh() z wątków roboczych; manager
+    scala takie wywołania w jedno odświeżenie i zapisuje wynik. Transport woła
+    refresh() także po 401 dla tokena, który wg expiry jest jeszcze ważny
+    (unieważniony) - wtedy odświeżenie jest wymuszone.
+    """
+
+    _manager: "GoogleCredentialsManager" = None
+
+    def refresh(self, request):
+        self._manager._refresh_blocking(request, rejected_token=self.token)
+
+    def _refresh_upstream(self, request):
+        super().refresh(request)
+
+
+class GoogleCredentialsManager:
+    """Credentials OAuth2 współdzielone przez wszystkich klientów Google w procesie"""
+
+    def __init__(self, token_file: str = "token.json", refresh_margin: int = DEFAULT_REFRESH_MARGIN):
+        self.token_file = token_file
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self._credentials: Optional[_ManagedCredentials] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._services_lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._services: Dict[Tuple[str, str], object] = {}
+        self._thread_local = threading.local()
+
+    # === Ładowanie ===
+
+    def _read_token_file(self) -> Optional[_ManagedCredentials]:
+        if not os.path.exists(self.token_file):
+            return None
+        with open(self.token_file, "r") as f:
+            token_data = json.load(f)
+        credentials = _ManagedCredentials.from_authorized_user_info(token_data)
+        credentials._manager = self
+        return credentials
+
+    @property
+    def credentials(self) -> _ManagedCredentials:
+        """Credentials współdzielone (ładowane raz, bez odświeżania na ścieżce żądania)"""
+        if self._credentials is None:
+            with self._load_lock:
+                if self._credentials is None:
+                    credentials = self._read_token_file()
+                    if credentials is None:
+                        raise FileNotFoundError(f"Brak pliku {self.token_file}")
+                    self._credentials = credentials
+                    logger.debug("🔑 Załadowano token OAuth2 z %s", self.token_file)
+        return self._credentials
+
+    def service(self, name: str, version: str):
+        """Klient Google API budowany raz na proces (współdzielone credentials)"""
+        key = (name, version)
+        service = self._services.get(key)
+        if service is None:
+            with self._services_lock:
+                service = self._services.get(key)
+                if service is None:
+                    from googleapiclient.discovery import build
+                    service = self._services[key] = build(name, version, credentials=self.credentials,
+                                                          cache_discovery=False)
+        return service
+
+    def authorized_http(self):
+        """
+        AuthorizedHttp dla bieżącego wątku (httplib2 nie jest bezpieczny wątkowo)
+
+        Użycie: request.execute(http=manager.authorized_http())
+        """
+        http = getattr(self._thread_local, "http", None)
+        if http is None:
+            import httplib2
+            import google_auth_httplib2
+            http = self._thread_local.http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+        return http
+
+    # === Odświeżanie ===
+
+    def _needs_refresh(self, credentials: Credentials) -> bool:
+        if not credentials.token or credentials.expiry is None:
+            return not credentials.token
+        # google-auth trzyma expiry jako naiwny UTC
+        return credentials.expiry - self.refresh_margin <= datetime.utcnow()
+
+    def _refresh_blocking(self, request=None, rejected_token: Optional[str] = None):
+        """
+        Odświeża token raz dla wszystkich czekających wątków i procesów
+
+        Po uzyskaniu blokady sprawdza, czy ktoś inny już odświeżył token
+        (ten proces albo inny worker, który zapisał token.json).
+        rejected_token - odświeżenie z transportu (np. po 401): wymuszone mimo
+        ważnego expiry, chyba że token został już wymieniony.
+        """
+        credentials = self.credentials
+        with self._lock:
+            if rejected_token is not None:
+                if credentials.token and credentials.token != rejected_token:
+                    return
+            elif not self._needs_refresh(credentials):
+                return
+            with _file_lock(self.token_file):
+                on_disk = self._read_token_file()
+                if on_disk is not None and on_disk.token and not self._needs_refresh(on_disk) \
+                        and on_disk.token != rejected_token:
+                    credentials.token = on_disk.token
+                    credentials.expiry = on_disk.expiry
+                    logger.debug("🔑 Token odświeżony przez inny proces - przejmuję")
+                    return
+                credentials._refresh_upstream(request or Request())
+                _write_atomic(self.token_file, credentials.to_json())
+            logger.info("🔄 Token OAuth2 odświeżony (ważny do %s UTC)", credentials.expiry)
+
+    async def ensure_fresh(self):
+        """Odświeżenie poza event loopem (scalane z trwającym odświeżeniem)"""
+        if self._needs_refresh(self.credentials):
+            await asyncio.to_thread(self._refresh_blocking)
+
+    def start_background_refresh(self):
+        """Uruchamia odświeżanie w tle w bieżącym event loopie (idempotentne)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done() \
+                and self._refresh_task.get_loop() is loop:
+            return
+        self._refresh_task = loop.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.ensure_fresh()
+                expiry = self.credentials.expiry
+                if expiry is None:
+                    delay = 3600.0
+                else:
+                    delay = (expiry - self.refresh_margin - datetime.utcnow()).total_seconds()
+                await asyncio.sleep(max(5.0, delay))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("⚠️ Odświeżanie tokena OAuth2 nie powiodło się: %s - ponowię za 60s", e)
+                await asyncio.sleep(60)
+
+
+_managers: Dict[str, GoogleCredentialsManager] = {}
+_managers_lock = threading.Lock()
+
+# Zamiennik managera dla całego procesu (fake_google_workspace - benchmarki bez sieci)
+FAKE_WORKSPACE = os.getenv("GOOGLE_WORKSPACE_FAKE", "0").lower() in ("1", "true", "yes")
+_override_manager = None
+
+
+def use_credentials_manager(manager):
+    """Podmienia manager zwracany przez get_credentials_manager() (None - powrót do token.json)"""
+    global _override_manager
+    _override_manager = manager
+
+
+def get_credentials_manager(token_file: str = "token.json") -> GoogleCredentialsManager:
+    """Manager dla danego pliku tokena (jeden na proces)"""
+    if _override_manager is None and FAKE_WORKSPACE:
+        from fake_google_workspace import install
+        with _managers_lock:
+            if _override_manager is None:
+                install()
+    if _override_manager is not None:
+        return _override_manager
+    path = os.path.abspath(token_file)
+    with _managers_lock:
+        manager = _managers.get(path)
+        if manager is None:
+            manager = _managers[path] = GoogleCredentialsManager(token_file)
+    return manager
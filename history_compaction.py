@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Kompaktowanie historii długich sesji ADK (before_model_callback)
+Po przekroczeniu progu tokenów starsze tury zastępuje kroczące podsumowanie
+w instrukcji systemowej; ostatnie tury zostają dosłownie, a wyniki narzędzi,
+do których rozmowa wraca (identyfikatory, tytuły), są dołączane w całości.
+Podsumowanie powstaje w tle, więc tura nie czeka na model; pełne treści
+trafiają do tabeli history_archive w chat_sessions.db.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent_tracing import span
+from token_accounting import CHARS_PER_TOKEN, callback_identity
+
+logger = logging.getLogger(__name__)
+
+COMPACT_ENABLED = os.getenv("AGENT_HISTORY_COMPACTION", "1").lower() in ("1", "true", "yes")
+COMPACT_THRESHOLD_TOKENS = int(os.getenv("AGENT_HISTORY_COMPACT_TOKENS", "8000"))
+KEEP_RECENT_TURNS = int(os.getenv("AGENT_HISTORY_KEEP_TURNS", "4"))
+SUMMARY_MODEL = os.getenv("AGENT_HISTORY_SUMMARY_MODEL", "")  # pusty = model agenta
+SUMMARY_MAX_CHARS = int(os.getenv("AGENT_HISTORY_SUMMARY_MAX_CHARS", "4000"))
+
+# Pola wyników narzędzi, po których rozpoznajemy, że rozmowa wraca do wyniku
+_REFERENCE_KEYS = ("id", "message_id", "event_id", "document_id", "file_id", "title", "subject", "name", "summary")
+_MAX_KEPT_RESULTS = 20
+_IDLE_SESSION_SECONDS = 6 * 3600
+
+SUMMARY_PROMPT = """Streszczasz wcześniejszą część rozmowy asystenta biznesowego z użytkownikiem.
+Zachowaj ustalenia, decyzje, prośby w toku, daty, godziny, nazwiska, adresy email,
+identyfikatory i tytuły. Pomiń powitania i powtórzenia. Pisz zwięźle po polsku, w punktach.
+
+Dotychczasowe podsumowanie:
+{previous}
+
+Nowy fragment rozmowy:
+{transcript}
+
+Zaktualizowane podsumowanie:"""
+
+
+def _content_text(content) -> str:
+    """Tekst, wywołania i wyniki narzędzi jednej treści (do szacunku tokenów i wyszukiwania odniesień)"""
+    pieces = []
+    for part in content.parts or []:
+        if part.text:
+            pieces.append(part.text)
+        if part.function_call:
+            pieces.append(f"{part.function_call.name}({json.dumps(part.function_call.args or {}, ensure_ascii=False, default=str)})")
+        if part.function_response:
+            pieces.append(json.dumps(part.function_response.response or {}, ensure_ascii=False, default=str))
+    return "\n".join(pieces)
+
+
+def _estimate_tokens(contents) -> int:
+    return sum(len(_content_text(content)) for content in contents) // CHARS_PER_TOKEN
+
+
+def _fingerprint(content) -> str:
+    return hashlib.sha1(_content_text(content).encode("utf-8")).hexdigest()
+
+
+def _is_user_message(content) -> bool:
+    return content.role == "user" and any(part.text for part in content.parts or [])
+
+
+def _reference_values(response: Any) -> List[str]:
+    """Identyfikatory i tytuły z wyniku narzędzia (także zagnieżdżone listy)"""
+    values = []
+    stack = [response]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            for key, value in item.items():
+                if key in _REFERENCE_KEYS and isinstance(value, str) and len(value) >= 4:
+                    values.append(value.lower())
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        elif isinstance(item, list):
+            stack.extend(item)
+    return values
+
+
+def extractive_summary(previous: str, contents) -> str:
+    """Podsumowanie bez modelu: pierwsze zdania wypowiedzi i nazwy wywołanych narzędzi"""
+    lines = [line for line in previous.splitlines() if line.strip()]
+    for content in contents:
+        for part in content.parts or []:
+            if part.text:
+                speaker = "Użytkownik" if content.role == "user" else "Asystent"
+                lines.append(f"- {speaker}: {' '.join(part.text.split())[:200]}")
+            elif part.function_call:
+                lines.append(f"- Narzędzie: {part.function_call.name}"
+                             f"({json.dumps(part.function_call.args or {}, ensure_ascii=False, default=str)[:120]})")
+    # Najstarsze punkty odpadają pierwsze
+    while lines and sum(len(line) + 1 for line in lines) > SUMMARY_MAX_CHARS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+@dataclass
+class _SessionHistory:
+    summary: str = ""
+    covered: int = 0  # liczba początkowych treści zastąpionych podsumowaniem
+    covered_fingerprint: Optional[str] = None
+    # (wywołanie, wynik, wartości odniesień) z zastąpionych treści
+    tool_results: List[Tuple[str, str, List[str]]] = field(default_factory=list)
+    task: Optional[asyncio.Task] = None
+    touched: float = field(default_factory=time.monotonic)
+
+
+class HistoryCompactor:
+    """Kroczące podsumowanie historii sesji jako callback before_model ADK"""
+
+    def __init__(self, db=None, model: Any = None, threshold_tokens: int = COMPACT_THRESHOLD_TOKENS,
+                 keep_turns: int = KEEP_RECENT_TURNS, summary_model: str = SUMMARY_MODEL):
+        self.db = db
+        self.model = model
+        self.threshold_tokens = threshold_tokens
+        self.keep_turns = keep_turns
+        self.summary_model = summary_model
+        self._sessions: Dict[str, _SessionHistory] = {}
+        self._summary_llm = None
+        self._db_ready = False
+
+    def _prune(self):
+        now = time.monotonic()
+        for session_id, history in list(self._sessions.items()):
+            if now - history.touched > _IDLE_SESSION_SECONDS and (history.task is None or history.task.done()):
+                del self._sessions[session_id]
+
+    async def before_model_callback(self, callback_context, llm_request):
+        """Podmienia starsze treści na podsumowanie; po przekroczeniu progu zleca kolejne w tle"""
+        if not COMPACT_ENABLED or not llm_request.contents:
+            return None
+        user_id, session_id = callback_identity(callback_context)
+        history = self._sessions.get(session_id)
+        if history is None:
+            self._prune()
+            history = self._sessions[session_id] = _SessionHistory()
+        history.touched = time.monotonic()
+        contents = llm_request.contents
+
+        # Historia przebudowana inaczej niż przy podsumowaniu (np. nowa sesja o tym samym id) - od zera
+        if history.covered and (len(contents) <= history.covered
+                                or _fingerprint(contents[history.covered - 1]) != history.covered_fingerprint):
+            logger.debug("🗜️ Historia sesji %s nie pasuje do podsumowania - reset", session_id)
+            self._sessions[session_id] = history = _SessionHistory()
+
+        recent = contents[history.covered:]
+        if _estimate_tokens(recent) > self.threshold_tokens and (history.task is None or history.task.done()):
+            cut = self._cut_index(contents, history.covered)
+            if cut > history.covered:
+                history.task = asyncio.create_task(
+                    self._compact(session_id, user_id, history, list(contents[history.covered:cut]), cut, contents[cut - 1])
+                )
+
+        if history.covered:
+            llm_request.contents = list(recent)
+            llm_request.append_instructions([self._instruction(history, recent)])
+        return None
+
+    def _cut_index(self, contents, covered: int) -> int:
+        """Początek keep_turns ostatnich wiadomości użytkownika (granica tury)"""
+        starts = [index for index in range(covered, len(contents)) if _is_user_message(contents[index])]
+        if len(starts) <= self.keep_turns:
+            return covered
+        return starts[-self.keep_turns]
+
+    def _instruction(self, history: _SessionHistory, recent) -> str:
+        sections = ["PODSUMOWANIE WCZEŚNIEJSZEJ CZĘŚCI ROZMOWY (starsze wiadomości nie są już dołączane):",
+                    history.summary]
+        recent_text = "\n".join(_content_text(content) for content in recent).lower()
+        referenced = [(call, result) for call, result, values in history.tool_results
+                      if any(value in recent_text for value in values)]
+        if referenced:
+            sections.append("\nWYNIKI NARZĘDZI, DO KTÓRYCH WRACA ROZMOWA (dosłownie):")
+            sections.extend(f"{call} -> {result}" for call, result in referenced)
+        return "\n".join(sections)
+
+    async def _compact(self, session_id: str, user_id: str, history: _SessionHistory, chunk, cut: int, boundary):
+        """Podsumowanie fragmentu w tle; stan sesji aktualizowany dopiero po sukcesie"""
+        start = history.covered
+        with span("history.compact", **{"session.id": session_id, "history.contents": len(chunk)}):
+            try:
+                summary = await self._summarize(history.summary, chunk)
+            except Exception as e:
+                logger.warning("⚠️ Podsumowanie historii modelem nie powiodło się (%s) - wersja skrócona", e)
+                summary = extractive_summary(history.summary, chunk)
+
+        calls = {}
+        for content in chunk:
+            for part in content.parts or []:
+                if part.function_call:
+                    calls[part.function_call.id or part.function_call.name] = (
+                        f"{part.function_call.name}({json.dumps(part.function_call.args or {}, ensure_ascii=False, default=str)})"
+                    )
+                if part.function_response:
+                    response = part.function_response.response or {}
+                    values = _reference_values(response)
+                    if values:
+                        call = calls.get(part.function_response.id or part.function_response.name, part.function_response.name)
+                        history.tool_results.append((call, json.dumps(response, ensure_ascii=False, default=str), values))
+        del history.tool_results[:-_MAX_KEPT_RESULTS]
+
+        history.summary = summary
+        history.covered = cut
+        history.covered_fingerprint = _fingerprint(boundary)
+        logger.info("🗜️ Sesja %s: %d treści zastąpione podsumowaniem (%d znaków)", session_id, cut, len(summary))
+
+        if self.db is not None:
+            try:
+                if not self._db_ready:
+                    await self.db.init_database()
+                    self._db_ready = True
+                await self.db.archive_history(session_id, user_id, start,
+                                              [content.model_dump(mode="json", exclude_none=True) for content in chunk],
+                                              summary)
+            except Exception as e:
+                logger.warning("⚠️ Nie zarchiwizowano historii sesji %s: %s", session_id, e)
+
+    async def _summarize(self, previous: str, chunk) -> str:
+        """Podsumowanie modelem (osobne wywołanie, bez callbacków agenta)"""
+        llm = self._llm()
+        if llm is None:
+            return extractive_summary(previous, chunk)
+        from google.adk.models import LlmRequest
+        from google.genai import types
+
+        transcript = "\n".join(f"[{content.role}] {_content_text(content)[:2000]}" for content in chunk)
+        prompt = SUMMARY_PROMPT.format(previous=previous or "(brak)", transcript=transcript)
+        request = LlmRequest(
+            model=self.summary_model or getattr(llm, "model", None),
+            contents=[types.Content(role="user", parts=[types.Part(text=prompt)])],
+            config=types.GenerateContentConfig(temperature=0.2, max_output_tokens=SUMMARY_MAX_CHARS // CHARS_PER_TOKEN),
+        )
+        text = ""
+        async for response in llm.generate_content_async(request, stream=False):
+            if response.content and not response.partial:
+                text = "".join(part.text or "" for part in response.content.parts or [])
+        if not text.strip():
+            raise ValueError("pusta odpowiedź modelu")
+        return text.strip()[:SUMMARY_MAX_CHARS]
+
+    def _llm(self):
+        """Instancja modelu do podsumowań (model agenta albo AGENT_HISTORY_SUMMARY_MODEL z rejestru ADK)"""
+        if self._summary_llm is None:
+            model = self.model
+            if isinstance(model, str) or (model is None and self.summary_model):
+                from google.adk.models.registry import LLMRegistry
+                model = LLMRegistry.new_llm(self.summary_model or model)
+            self._summary_llm = model
+        return self._summary_llm
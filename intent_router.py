@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Deterministyczny router intencji przed modelem (GoogleADKBusinessAgent.process_message)
+Jeden skompilowany wzorzec dopasowywany do całej znormalizowanej wiadomości:
+proste pytania (data, godzina, plan dnia, spotkania, nieprzeczytane maile,
+powitania) dostają szablonową odpowiedź z istniejących narzędzi w milisekundach.
+Każda niepewność - dodatkowe słowa, brak danych, błąd narzędzia - oddaje turę modelowi.
+"""
+
+import os
+import re
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from agent_metrics import INTENT_ROUTES
+from response_cache import TIMEZONE, normalize
+
+logger = logging.getLogger(__name__)
+
+ROUTER_ENABLED = os.getenv("AGENT_INTENT_ROUTER", "1").lower() in ("1", "true", "yes")
+MAX_LISTED = 5
+
+# Grzecznościowe wstawki, które nie zmieniają intencji
+_PREFIX = r"(?:(?:prosze|czy mozesz|mozesz|powiedz mi|powiedz|podaj|sprawdz|pokaz|a wiec|hej|czesc)\s+)*"
+_SUFFIX = r"(?:\s+(?:prosze|dzieki|dziekuje|teraz))*"
+
+# Kolejność ma znaczenie: pierwsza pasująca alternatywa wygrywa
+INTENT_PATTERNS = {
+    "weekday": r"jaki (?:jest |mamy )?(?:dzis |dzisiaj )?dzien tygodnia(?: jest| mamy)?(?: dzis| dzisiaj)?",
+    "date": r"(?:jaki|ktory) (?:jest |mamy )?(?:dzis|dzisiaj|dzien)(?: jest| mamy)?(?: dzis| dzisiaj| dzien)?"
+            r"|jaka (?:jest )?(?:dzis |dzisiaj )?data(?: jest)?(?: dzis| dzisiaj)?"
+            r"|(?:dzisiejsza )?data",
+    "time": r"(?:ktora|jaka) (?:jest )?(?:teraz )?godzina(?: jest)?"
+            r"|ile (?:jest )?(?:teraz )?godzin",
+    "briefing": r"co mam (?:dzis|dzisiaj|na dzis|na dzisiaj)(?: w planie)?"
+                r"|(?:jaki (?:jest |mam )?)?(?:moj )?plan dnia(?: na dzis| na dzisiaj)?"
+                r"|(?:poranny )?briefing",
+    "calendar": r"(?:jakie )?(?:mam )?(?:spotkania|wydarzenia)(?: mam)?(?: w kalendarzu)? (?:na )?(?P<day>dzis|dzisiaj|jutro)"
+                r"(?: w kalendarzu)?"
+                r"|(?:jakie mam|co mam w kalendarzu) (?:na )?(?P<day2>dzis|dzisiaj|jutro)(?: spotkania)?(?: w kalendarzu)?",
+    "unread": r"(?:czy mam )?(?:jakies )?(?:nowe |nieprzeczytane )+(?:maile|emaile|wiadomosci|wiadomosci email)",
+    "greeting": r"(?:czesc|hej|hejka|witaj|witam|dzien dobry|dobry wieczor|siema|hello)(?: asystencie)?",
+    "thanks": r"(?:dzieki|dziekuje|dziekuje bardzo|dzieki wielkie)(?: to wszystko)?|to wszystko(?: dzieki| dziekuje)?",
+}
+
+# Intencje bez wywołań Google API - mogą ominąć kontrolę przyjęć (admission_control)
+TEMPLATE_INTENTS = frozenset({"greeting", "thanks", "date", "weekday", "time"})
+
+
+def _plural(count: int, one: str, few: str, many: str) -> str:
+    if count == 1:
+        return one
+    if 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        return few
+    return many
+
+
+class IntentRouter:
+    """Skompilowane intencje z szablonowymi odpowiedziami na podstawie narzędzi agenta"""
+
+    def __init__(self, tools: Dict[str, Callable], briefings=None,
+                 patterns: Optional[Dict[str, str]] = None):
+        self.tools = tools
+        self.briefings = briefings
+        patterns = INTENT_PATTERNS if patterns is None else patterns
+        self._intents = list(patterns)
+        self._pattern = re.compile(
+            _PREFIX + "(?:" + "|".join(f"(?P<{name}>{pattern})" for name, pattern in patterns.items()) + ")" + _SUFFIX
+        )
+
+    @classmethod
+    def from_tools(cls, tools: Iterable[Any], briefings=None) -> Optional["IntentRouter"]:
+        if not ROUTER_ENABLED:
+            return None
+        functions = {}
+        for tool in tools:
+            func = getattr(tool, "func", tool)
+            name = getattr(func, "__name__", None)
+            if name:
+                functions[name] = func
+        return cls(functions, briefings)
+
+    def match(self, message: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """(intencja, grupy) dla wiadomości w całości pasującej do wzorca"""
+        found = self._pattern.fullmatch(normalize(message))
+        if found is None:
+            return None
+        # lastgroup wskazałby grupę zagnieżdżoną (np. day) - intencja to niepusta grupa zewnętrzna
+        intent = next(name for name in self._intents if found.group(name) is not None)
+        return intent, {key: value for key, value in found.groupdict().items() if value is not None}
+
+    async def route(self, user_id: str, message: str) -> Optional[Tuple[str, str]]:
+        """(intencja, odpowiedź) albo None - wtedy turę obsługuje model"""
+        matched = self.match(message)
+        response = await self.answer(user_id, matched)
+        return (matched[0], response) if response else None
+
+    async def answer(self, user_id: str, matched: Optional[Tuple[str, Dict[str, str]]]) -> Optional[str]:
+        """Odpowiedź dla wyniku match() albo None (model); liczy trafienia routera"""
+        response = None
+        if matched is not None:
+            intent, groups = matched
+            handler = getattr(self, f"_answer_{intent}")
+            try:
+                response = await handler(user_id, groups)
+            except Exception as e:
+                logger.warning("⚠️ Router intencji (%s) oddaje turę modelowi: %s", intent, e)
+        INTENT_ROUTES.labels(matched[0] if response else "llm").inc()
+        return response
+
+    # === Odpowiedzi ===
+
+    async def _now(self) -> Optional[Dict[str, Any]]:
+        get_current_datetime = self.tools.get("get_current_datetime")
+        return await get_current_datetime() if get_current_datetime else None
+
+    async def _answer_date(self, user_id: str, groups: Dict[str, str]) -> Optional[str]:
+        now = await self._now()
+        return f"📅 Dziś jest {now['formatted_date']}." if now else None
+
+    async def _answer_weekday(self, user_id: str, groups: Dict[str, str]) -> Optional[str]:
+        now = await self._now()
+        return f"📅 Dziś jest {now['day_of_week']}." if now else None
+
+    async def _answer_time(self, user_id: str, groups: Dict[str, str]) -> Optional[str]:
+        now = await self._now()
+        return f"⏰ Jest {now['current_time'][:5]} ({now['day_of_week']})." if now else None
+
+    async def _answer_briefing(self, user_id: str, groups: Dict[str, str]) -> Optional[str]:
+        if self.briefings is None:
+            return None
+        from briefing_scheduler import format_briefing
+        # Tylko gotowy snapshot - budowanie od zera zostawiamy modelowi z narzędziami
+        snapshot = await self.briefings.get_snapshot(user_id)
+        return format_briefing(snapshot) if snapshot else None
+
+    async def _answer_calendar(self, user_id: str, groups: Dict[str, str]) -> Optional[str]:
+        get_calendar_events = self.tools.get("get_calendar_events")
+        if get_calendar_events is None:
+            return None
+        tomorrow = (groups.get("day") or groups.get("day2")) == "jutro"
+        start = datetime.now(TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+        if tomorrow:
+            start = TIMEZONE.localize(start.replace(tzinfo=None) + timedelta(days=1))
+        end = TIMEZONE.localize(start.replace(tzinfo=None) + timedelta(days=1))
+        result = await get_calendar_events(time_min=start.isoformat(), time_max=end.isoformat(), max_results=20)
+        if not result.get("success"):
+            return None
+
+        label = "Jutro" if tomorrow else "Dziś"
+        events = result.get("events", [])
+        if not events:
+            return f"📅 {label} nie masz spotkań w kalendarzu."
+        lines = [f"📅 {label} masz {len(events)} {_plural(len(events), 'spotkanie', 'spotkania', 'spotkań')}:"]
+        for event in events[:MAX_LISTED]:
+            event_start = event.get("start") or ""
+            hour = event_start[11:16] if "T" in event_start else "cały dzień"
+            lines.append(f"• {hour} {event.get('summary') or event.get('title') or 'Bez tytułu'}")
+        if len(events) > MAX_LISTED:
+            lines.append(f"…i {len(events) - MAX_LISTED} więcej.")
+        return "\n".join(lines)
+
+    async def _answer_unread(self, user_id: str, groups: Dict[str, str]) -> Optional[str]:
+        get_gmail_messages = self.tools.get("get_gmail_messages")
+        if get_gmail_messages is None:
+            return None
+        result = await get_gmail_messages(query="is:unread", max_results=MAX_LISTED)
+        if not result.get("success"):
+            return None
+        messages = result.get("messages", [])
+        if not messages:
+            return "📧 Nie masz nieprzeczytanych emaili."
+        lines = [f"📧 Nieprzeczytane emaile ({len(messages)}{'+' if len(messages) == MAX_LISTED else ''}):"]
+        for number, message in enumerate(messages, 1):
+            sender = (message.get("sender") or "").split("<")[0].strip().strip('"')
+            lines.append(f"{number}. ID: {message.get('id')} | Od: {sender} | Temat: {(message.get('subject') or '')[:60]}")
+        return "\n".join(lines)
+
+    async def _answer_greeting(self, user_id: str, groups: Dict[str, str]) -> Optional[str]:
+        hour = datetime.now(TIMEZONE).hour
+        greeting = "Dobry wieczór" if hour >= 18 else "Dzień dobry" if hour >= 5 else "Cześć"
+        return f"👋 {greeting}! W czym mogę pomóc - kalendarz, poczta, dokumenty czy plan dnia?"
+
+    async def _answer_thanks(self, user_id: str, groups: Dict[str, str]) -> Optional[str]:
+        return "😊 Proszę bardzo! Daj znać, gdy będę potrzebny."
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Leniwe toolsety Google API (GmailToolset / CalendarToolset) dla Google ADK Business Agent
+Toolset jest budowany, a tokeny OAuth2 wstrzykiwane, dopiero przy pierwszym get_tools()
+"""
+
+import asyncio
+import logging
+from typing import Callable, List, Optional
+
+from google.adk.tools.base_toolset import BaseToolset
+
+logger = logging.getLogger(__name__)
+
+
+class LazyGoogleApiToolset(BaseToolset):
+    """Opakowuje fabrykę toolsetu Google API - koszt budowy poza startem agenta"""
+
+    def __init__(self, name: str, factory: Callable[[], BaseToolset],
+                 client_id: str, client_secret: str,
+                 access_token: Optional[str] = None, refresh_token: Optional[str] = None):
+        super().__init__()
+        self.name = name
+        self._factory = factory
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._access_token = access_token
+        self._refresh_token = refresh_token
+        self._toolset: Optional[BaseToolset] = None
+        self._tools: Optional[List] = None
+        self._lock = asyncio.Lock()
+
+    async def get_tools(self, readonly_context=None) -> List:
+        if self._tools is not None:
+            return self._tools
+        async with self._lock:
+            if self._tools is None:
+                logger.info("📦 Buduję toolset %s przy pierwszym użyciu", self.name)
+                self._toolset = self._factory()
+                tools = await self._toolset.get_tools(readonly_context)
+                if self._access_token and self._refresh_token:
+                    for tool in tools:
+                        self._configure_tokens(tool)
+                self._tools = tools
+        return self._tools
+
+    def _configure_tokens(self, tool):
+        """Wstrzykuje istniejące tokeny OAuth2 do narzędzia REST API"""
+        if not hasattr(tool, 'configure_auth'):
+            return
+        tool.configure_auth(self._client_id, self._client_secret)
+        rest_api_tool = getattr(tool, '_rest_api_tool', None)
+        credential = getattr(rest_api_tool, 'auth_credential', None)
+        if credential and credential.oauth2:
+            credential.oauth2.access_token = self._access_token
+            credential.oauth2.refresh_token = self._refresh_token
+            logger.debug("✅ Skonfigurowano tokeny dla: %s", tool.name)
+
+    async def close(self):
+        if self._toolset is not None:
+            await self._toolset.close()
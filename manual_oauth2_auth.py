@@ -11,6 +11,8 @@ from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+from google_credentials_manager import save_token
+
 # Scopes potrzebne dla Gmail, Calendar, Google Docs i Drive
 SCOPES = [
     'https://www.googleapis.com/auth/gmail.readonly',
@@ -86,8 +88,8 @@ def main():
     
     # Zapisz token
     if creds:
-        with open(token_file, 'w') as token:
-            token.write(creds.to_json())
+        # Atomowy zapis z blokadą - działający agent może w tym czasie odświeżać token
+        save_token(creds, token_file)
         print(f"💾 Token zapisany w {token_file}")
         
         print("\n🎉 Autoryzacja OAuth2 zakończona!")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Pula serwerów MCP dla BusinessAvatarAgent
+Serwery startują raz i są utrzymywane w gotowości: ping co N sekund, restart z backoffem
+"""
+
+import os
+import time
+import shutil
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from google.adk.tools.mcp_tool import MCPToolset, StdioConnectionParams
+from mcp import StdioServerParameters
+
+logger = logging.getLogger(__name__)
+
+
+class MCPServerSpec:
+    """Opis serwera MCP uruchamianego przez stdio"""
+
+    def __init__(self, name: str, package: str, binary: str, env: Dict[str, str],
+                 tool_filter: Optional[List[str]] = None):
+        self.name = name
+        self.package = package
+        self.binary = binary
+        self.env = env
+        self.tool_filter = tool_filter
+
+    def server_params(self) -> StdioServerParameters:
+        """
+        Lokalnie zainstalowana binarka (npm install -g lub node_modules/.bin)
+        zamiast `npx -y` - bez rozwiązywania pakietu przy każdym starcie
+        """
+        env = {key: value for key, value in self.env.items() if value is not None}
+        # Node potrzebuje PATH, żeby znaleźć interpreter z linii shebang
+        env.setdefault("PATH", os.environ.get("PATH", ""))
+
+        local_bin = os.path.join("node_modules", ".bin", self.binary)
+        command = local_bin if os.path.exists(local_bin) else shutil.which(self.binary)
+        if command:
+            return StdioServerParameters(command=command, args=[], env=env)
+        return StdioServerParameters(command="npx", args=["-y", self.package], env=env)
+
+
+class _PooledServer:
+    """Stan jednego serwera w puli"""
+
+    __slots__ = ("spec", "toolset", "healthy", "failures", "next_attempt")
+
+    def __init__(self, spec: MCPServerSpec, toolset: MCPToolset):
+        self.spec = spec
+        self.toolset = toolset
+        self.healthy = False
+        self.failures = 0
+        self.next_attempt = 0.0
+
+
+class MCPServerPool:
+    """
+    Nadzorowana pula serwerów MCP
+
+    Toolsety są tworzone raz i przekazywane do LlmAgent. start() uruchamia
+    wszystkie serwery równolegle (get_tools() otwiera i cache'uje sesję MCP),
+    więc pierwsze wywołanie narzędzia nie płaci za zimny start Node. Jedna sesja
+    MCP na serwer obsługuje współbieżne wywołania (żądania JSON-RPC z własnym id).
+    """
+
+    def __init__(self, specs: List[MCPServerSpec],
+                 ping_interval: Optional[float] = None,
+                 timeout: Optional[float] = None,
+                 max_backoff: float = 300.0):
+        self.ping_interval = ping_interval or float(os.getenv("MCP_PING_INTERVAL", "30"))
+        self.timeout = timeout or float(os.getenv("MCP_TIMEOUT", "10"))
+        self.max_backoff = max_backoff
+        self._servers: Dict[str, _PooledServer] = {}
+        self._supervisor: Optional[asyncio.Task] = None
+
+        for spec in specs:
+            toolset = MCPToolset(
+                connection_params=StdioConnectionParams(
+                    server_params=spec.server_params(),
+                    timeout=self.timeout
+                ),
+                tool_filter=spec.tool_filter
+            )
+            self._servers[spec.name] = _PooledServer(spec, toolset)
+
+    @property
+    def toolsets(self) -> List[MCPToolset]:
+        return [server.toolset for server in self._servers.values()]
+
+    def status(self) -> Dict[str, Dict[str, object]]:
+        return {
+            name: {"healthy": server.healthy, "failures": server.failures}
+            for name, server in self._servers.items()
+        }
+
+    async def start(self):
+        """Rozgrzewa wszystkie serwery równolegle i uruchamia nadzór"""
+        started = time.perf_counter()
+        await asyncio.gather(*(self._warm(server) for server in self._servers.values()))
+        healthy = sum(1 for server in self._servers.values() if server.healthy)
+        logger.info("🔥 Pula MCP: %d/%d serwerów gotowych w %.1fs",
+                    healthy, len(self._servers), time.perf_counter() - started)
+        if self._supervisor is None:
+            self._supervisor = asyncio.create_task(self._supervise())
+
+    async def _warm(self, server: _PooledServer):
+        try:
+            tools = await asyncio.wait_for(server.toolset.get_tools(), timeout=self.timeout * 3)
+            server.healthy = True
+            server.failures = 0
+            logger.debug("✅ MCP %s: %d narzędzi", server.spec.name, len(tools))
+        except Exception as e:
+            self._mark_failed(server, e)
+
+    def _mark_failed(self, server: _PooledServer, error: Exception):
+        server.healthy = False
+        server.failures += 1
+        backoff = min(self.max_backoff, 2 ** server.failures)
+        server.next_attempt = time.monotonic() + backoff
+        logger.warning("⚠️ MCP %s niedostępny (%s) - ponowna próba za %.0fs",
+                       server.spec.name, error, backoff)
+
+    async def _ping(self, server: _PooledServer) -> bool:
+        session_manager = getattr(server.toolset, "_mcp_session_manager", None)
+        if session_manager is None:
+            return server.healthy
+        try:
+            # Zwraca zcache'owaną sesję (albo otwiera nową po awarii procesu)
+            session = await asyncio.wait_for(session_manager.create_session(), timeout=self.timeout)
+            await asyncio.wait_for(session.send_ping(), timeout=self.timeout)
+            return True
+        except Exception as e:
+            logger.debug("MCP %s nie odpowiada na ping: %s", server.spec.name, e)
+            return False
+
+    async def _restart(self, server: _PooledServer):
+        try:
+            await server.toolset.close()
+        except Exception as e:
+            logger.debug("Błąd zamykania MCP %s: %s", server.spec.name, e)
+        await self._warm(server)
+        if server.healthy:
+            logger.info("🔄 MCP %s zrestartowany", server.spec.name)
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            for server in self._servers.values():
+                if server.healthy:
+                    if not await self._ping(server):
+                        self._mark_failed(server, RuntimeError("brak odpowiedzi na ping"))
+                elif time.monotonic() >= server.next_attempt:
+                    await self._restart(server)
+
+    async def close(self):
+        if self._supervisor:
+            self._supervisor.cancel()
+            self._supervisor = None
+        for server in self._servers.values():
+            try:
+                await server.toolset.close()
+            except Exception as e:
+                logger.debug("Błąd zamykania MCP %s: %s", server.spec.name, e)
+            server.healthy = False
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Lokalny, deterministyczny backend modelu dla agentów ADK (testy wydajności offline)
+Zamiast Gemini/Vertex odtwarza skryptowe lub nagrane odpowiedzi - tekst, wywołania
+narzędzi i strumieniowane fragmenty - z konfigurowalnym opóźnieniem i tempem tokenów.
+
+Wybór backendu: AGENT_MODEL_BACKEND=gemini (domyślnie) | mock
+Skrypt (AGENT_MOCK_SCRIPT, JSON):
+    {
+      "rules": [{"match": "kalendarz|spotkani", "calls": [{"name": "get_calendar_events", "args": {}}]},
+                {"match": "cześć", "text": "Dzień dobry!"}],
+      "after_tool": "Sprawdziłem: {tools}.",
+      "default": "Jasne, chętnie pomogę.",
+      "responses": [...]   # nagranie: odpowiedzi odtwarzane po kolei w ramach rozmowy
+    }
+Wpisy "responses" mają postać {"text": ...} / {"calls": [...]} albo są zrzutem
+LlmResponse.model_dump(mode="json") z prawdziwej sesji.
+"""
+
+import os
+import re
+import json
+import asyncio
+import logging
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from google.adk.models import BaseLlm, LlmResponse
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+MODEL_BACKEND = os.getenv("AGENT_MODEL_BACKEND", "gemini").lower()
+MOCK_SCRIPT = os.getenv("AGENT_MOCK_SCRIPT")
+MOCK_LATENCY = float(os.getenv("AGENT_MOCK_LATENCY", "0.2"))  # s do pierwszego tokenu
+MOCK_TOKENS_PER_SECOND = float(os.getenv("AGENT_MOCK_TOKENS_PER_SECOND", "60"))
+MOCK_CHUNK_TOKENS = int(os.getenv("AGENT_MOCK_CHUNK_TOKENS", "8"))  # słów na fragment przy stream=True
+
+# Reguły domyślne pokrywają narzędzia agentów z repozytorium; wywołania narzędzi,
+# których agent nie ma, są pomijane (reguła bez żadnego wywołania przepada)
+DEFAULT_RULES = [
+    {"match": r"plan dnia|na dziś|briefing", "calls": [{"name": "get_morning_briefing", "args": {}}]},
+    {"match": r"plan dnia", "calls": [{"name": "get_calendar_events", "args": {}},
+                                      {"name": "get_gmail_messages", "args": {"query": "is:unread"}}]},
+    {"match": r"kalendarz|spotkani", "calls": [{"name": "get_calendar_events", "args": {}}]},
+    {"match": r"kalendarz|spotkani", "calls": [{"name": "get_calendar_summary", "args": {}}]},
+    {"match": r"mail|poczt", "calls": [{"name": "get_gmail_messages", "args": {"query": "is:unread"}}]},
+    {"match": r"mail|poczt", "calls": [{"name": "get_email_summary", "args": {}}]},
+    {"match": r"godzin|któr[aey] jest|dzisiaj|data", "calls": [{"name": "get_current_datetime", "args": {}}]},
+    {"match": r"godzin|któr[aey] jest|dzisiaj|data", "calls": [{"name": "get_current_time", "args": {}}]},
+    {"match": r"produktywn", "calls": [{"name": "analyze_productivity", "args": {}}]},
+]
+DEFAULT_AFTER_TOOL = "Sprawdziłem ({tools}). Wszystko wygląda dobrze - daj znać, jeśli potrzebujesz szczegółów."
+DEFAULT_REPLY = "Jasne, chętnie pomogę. Czy mogę zrobić coś jeszcze?"
+
+
+def _words(text: str) -> int:
+    return len(text.split())
+
+
+class MockLlm(BaseLlm):
+    """Model ADK odtwarzający odpowiedzi ze skryptu - bez sieci i credentials"""
+
+    model: str = "mock-gemini"
+    rules: List[Dict[str, Any]] = DEFAULT_RULES
+    responses: List[Dict[str, Any]] = []
+    after_tool: str = DEFAULT_AFTER_TOOL
+    default_reply: str = DEFAULT_REPLY
+    latency: float = MOCK_LATENCY
+    tokens_per_second: float = MOCK_TOKENS_PER_SECOND
+    chunk_tokens: int = MOCK_CHUNK_TOKENS
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return [r"mock-.*"]
+
+    @classmethod
+    def from_script(cls, path: Optional[str] = None, **overrides) -> "MockLlm":
+        """Model z pliku skryptu (albo z regułami domyślnymi, gdy brak pliku)"""
+        settings: Dict[str, Any] = {}
+        if path:
+            with open(path, "r", encoding="utf-8") as f:
+                script = json.load(f)
+            for key, field in (("rules", "rules"), ("responses", "responses"),
+                               ("after_tool", "after_tool"), ("default", "default_reply")):
+                if key in script:
+                    settings[field] = script[key]
+        settings.update(overrides)
+        return cls(**settings)
+
+    async def generate_content_async(self, llm_request, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        contents = llm_request.contents or []
+        response = self._scripted_response(llm_request, contents)
+        prompt_tokens = sum(_words(part.text or "") for content in contents for part in (content.parts or []))
+
+        parts = (response.content.parts or []) if response.content else []
+        text = "".join(part.text or "" for part in parts)
+        output_tokens = max(_words(text), 1)
+        response.usage_metadata = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens
+        )
+
+        await asyncio.sleep(self.latency)
+        if not stream or not text or any(part.function_call for part in parts):
+            await asyncio.sleep(_words(text) / self.tokens_per_second)
+            yield response
+            return
+
+        # Strumień: częściowe fragmenty w tempie tokenów, na końcu pełna odpowiedź
+        words = text.split(" ")
+        for start in range(0, len(words), self.chunk_tokens):
+            chunk = words[start:start + self.chunk_tokens]
+            await asyncio.sleep(len(chunk) / self.tokens_per_second)
+            piece = " ".join(chunk) + (" " if start + self.chunk_tokens < len(words) else "")
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=piece)]), partial=True)
+        response.turn_complete = True
+        yield response
+
+    def _scripted_response(self, llm_request, contents: List[types.Content]) -> LlmResponse:
+        """Nagranie (kolejna odpowiedź rozmowy), a bez niego reguły skryptu"""
+        if self.responses:
+            index = sum(1 for content in contents if content.role == "model") % len(self.responses)
+            return self._to_response(self.responses[index])
+
+        last = contents[-1] if contents else None
+        parts = (last.parts or []) if last else []
+        tool_results = [part.function_response.name for part in parts if part.function_response]
+        if tool_results:
+            return self._to_response({"text": self.after_tool.format(tools=", ".join(tool_results))})
+
+        user_text = " ".join(part.text or "" for part in parts).lower()
+        available = set(getattr(llm_request, "tools_dict", None) or {})
+        for rule in self.rules:
+            if not re.search(rule.get("match", ""), user_text):
+                continue
+            if "calls" in rule:
+                calls = [call for call in rule["calls"] if call["name"] in available]
+                if calls:
+                    return self._to_response({"calls": calls})
+                continue
+            return self._to_response(rule)
+        return self._to_response({"text": self.default_reply})
+
+    @staticmethod
+    def _to_response(entry: Dict[str, Any]) -> LlmResponse:
+        if "content" in entry:
+            return LlmResponse.model_validate(entry)
+        if "calls" in entry:
+            parts = [types.Part(function_call=types.FunctionCall(name=call["name"], args=call.get("args", {})))
+                     for call in entry["calls"]]
+        else:
+            parts = [types.Part(text=entry.get("text", ""))]
+        return LlmResponse(content=types.Content(role="model", parts=parts))
+
+
+def create_model(model_name: str, **gemini_options) -> Any:
+    """Model dla LlmAgent wg AGENT_MODEL_BACKEND: MockLlm albo Gemini (nazwa, gdy bez opcji)"""
+    if MODEL_BACKEND == "mock":
+        logger.info(f"🧪 Lokalny model mock zamiast {model_name} (skrypt: {MOCK_SCRIPT or 'domyślny'})")
+        return MockLlm.from_script(MOCK_SCRIPT)
+    if not gemini_options:
+        return model_name
+    from google.adk.models import Gemini
+    return Gemini(model=model_name, **gemini_options)
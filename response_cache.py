@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Cache odpowiedzi agenta dla powtarzanych pytań (przed process_message)
+Klucz: klient (użytkownik albo sesja anonimowa), dzień i znormalizowany tekst; wpis pamięta źródła danych
+użyte w turze (narzędzia) i ich wersje - zapis w kalendarzu/poczcie, nowy
+kursor mirrora Workspace albo TTL źródła unieważniają odpowiedź.
+
+Dwa poziomy: dokładne dopasowanie oraz opcjonalne podobieństwo embeddingów
+(AGENT_RESPONSE_CACHE_EMBEDDINGS=1, google-genai) z wysokim progiem.
+"""
+
+import os
+import re
+import math
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pytz
+
+from agent_metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv("AGENT_RESPONSE_CACHE", "1").lower() in ("1", "true", "yes")
+DEFAULT_TTL = float(os.getenv("AGENT_RESPONSE_CACHE_TTL", "3600"))  # odpowiedzi bez narzędzi
+MAX_ENTRIES = int(os.getenv("AGENT_RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+EMBEDDINGS_ENABLED = os.getenv("AGENT_RESPONSE_CACHE_EMBEDDINGS", "0").lower() in ("1", "true", "yes")
+EMBEDDING_MODEL = os.getenv("AGENT_RESPONSE_CACHE_EMBEDDING_MODEL", "text-embedding-004")
+SIMILARITY_THRESHOLD = float(os.getenv("AGENT_RESPONSE_CACHE_SIMILARITY", "0.95"))
+# Dzień klucza liczony w strefie użytkowników (jak router intencji), nie serwera
+TIMEZONE = pytz.timezone("Europe/Warsaw")
+
+# Źródło danych narzędzia; narzędzia spoza mapy wyłączają cache dla tury
+TOOL_SOURCES: Dict[str, Tuple[str, ...]] = {
+    "get_current_datetime": ("clock",),
+    "get_calendar_events": ("calendar",),
+    "create_calendar_event": ("calendar",),
+    "update_calendar_event": ("calendar",),
+    "delete_calendar_event": ("calendar",),
+    "get_gmail_messages": ("gmail",),
+    "get_gmail_message_content": ("gmail",),
+    "send_gmail_message": ("gmail",),
+    "get_google_doc_content": ("docs",),
+    "list_google_docs": ("docs",),
+    "create_google_doc": ("docs",),
+    "update_google_doc": ("docs",),
+    "list_drawio_files": ("drive",),
+    "get_drawio_content": ("drive",),
+    "search_drawio_diagrams": ("drive",),
+    "get_morning_briefing": ("calendar", "gmail", "docs"),
+    "get_more_tool_result": (),
+}
+# Tury z zapisem nie są cache'owane i unieważniają swoje źródło
+WRITE_TOOLS = frozenset({
+    "create_calendar_event", "update_calendar_event", "delete_calendar_event",
+    "send_gmail_message", "create_google_doc", "update_google_doc",
+})
+# Sekundy ważności odpowiedzi zależnej od źródła (najkrótszy TTL wygrywa)
+SOURCE_TTL: Dict[str, float] = {
+    "clock": 60,
+    "gmail": float(os.getenv("AGENT_RESPONSE_CACHE_GMAIL_TTL", "120")),
+    "calendar": float(os.getenv("AGENT_RESPONSE_CACHE_CALENDAR_TTL", "300")),
+    "docs": 600,
+    "drive": 600,
+}
+
+_PL_ASCII = str.maketrans("ąćęłńóśźż", "acelnoszz")
+# Pytania odwołujące się do poprzednich wypowiedzi zależą od historii rozmowy
+_CONTEXT_DEPENDENT = re.compile(
+    r"^(a|i|oraz|no|ok|okej|tak|nie|dobrze|dzieki)\b"
+    r"|\b(ten|ta|te|tego|tej|temu|tym|tych|go|jego|jej|ich|powyzsz\w*|poprzedni\w*|wyzej|wczesniej)\b"
+)
+# Słowa, które muszą się zgadzać przy dopasowaniu semantycznym ("dziś" vs "jutro")
+_CRITICAL_WORDS = re.compile(
+    r"\d+|\b(dzis\w*|jutr\w*|pojutrze|wczoraj\w*|teraz|godzin\w*|tydzien|tygodni\w*|miesiac\w*|nie"
+    r"|poniedzial\w*|wtor\w*|srod\w*|czwart\w*|piat\w*|sobot\w*|niedziel\w*|nieprzeczytan\w*)\b"
+)
+_TIME_QUESTION = re.compile(r"\b(godzin\w*|czas\w*|minut\w*|teraz)\b")
+# Ile ostatnich wywołań z nieudanym narzędziem pamiętamy (tury bez store() nie zbierają wpisów)
+MAX_FAILED_INVOCATIONS = 1024
+
+
+def normalize(text: str) -> str:
+    """Małe litery bez polskich znaków i interpunkcji"""
+    text = re.sub(r"[^\w\s]", " ", text.lower().translate(_PL_ASCII))
+    return " ".join(text.split())
+
+
+def today() -> date:
+    """Dzisiejsza data w strefie TIMEZONE"""
+    return datetime.now(TIMEZONE).date()
+
+
+def is_cacheable_question(normalized: str) -> bool:
+    words = normalized.split()
+    return 2 <= len(words) <= 30 and not _CONTEXT_DEPENDENT.search(normalized)
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def genai_embedder(model: str = EMBEDDING_MODEL) -> Optional[Callable[[str], Awaitable[List[float]]]]:
+    """Embedding przez google-genai (konfiguracja Vertex/klucza z env) albo None bez biblioteki"""
+    try:
+        from google import genai
+    except ImportError:
+        logger.warning("⚠️ google-genai niedostępne - cache odpowiedzi tylko dokładny")
+        return None
+    client = genai.Client()
+
+    async def embed(text: str) -> List[float]:
+        result = await client.aio.models.embed_content(model=model, contents=text)
+        return list(result.embeddings[0].values)
+
+    return embed
+
+
+@dataclass
+class _Entry:
+    response: str
+    sources: Tuple[str, ...]
+    versions: Dict[str, str]
+    expires_at: float
+    critical: Tuple[str, ...]
+    embedding: Optional[List[float]] = None
+    hits: int = field(default=0)
+
+
+class ResponseCache:
+    """Odpowiedzi per (użytkownik, dzień, tekst) z unieważnianiem po źródłach danych"""
+
+    def __init__(self, embed: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+                 threshold: float = SIMILARITY_THRESHOLD, max_entries: int = MAX_ENTRIES, mirror=None):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.mirror = mirror
+        self._entries: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        # invocation_id tur, w których narzędzie zwróciło success: False
+        self._failed_invocations: "OrderedDict[str, None]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResponseCache"]:
+        if not CACHE_ENABLED:
+            return None
+        from workspace_sync import get_mirror
+        return cls(embed=genai_embedder() if EMBEDDINGS_ENABLED else None, mirror=get_mirror())
+
+    # === Wersje źródeł ===
+
+    def invalidate(self, *sources: str):
+        """Zmiana danych źródła (zapis narzędziem, push Workspace) - wpisy z nim stają się nieważne"""
+        for source in sources:
+            self._versions[source] = self._versions.get(source, 0) + 1
+
+    async def _source_version(self, source: str) -> str:
+        version = str(self._versions.get(source, 0))
+        # Kursor mirrora zmienia się z każdą synchronizacją, która przyniosła zmiany (także z innego workera)
+        if self.mirror is not None and source in ("gmail", "calendar"):
+            try:
+                state = await self.mirror.state(source)
+                version += f":{state['cursor'] if state else ''}"
+            except Exception as e:
+                logger.debug("Stan mirrora %s niedostępny: %s", source, e)
+        return version
+
+    async def _is_valid(self, entry: _Entry) -> bool:
+        if time.time() >= entry.expires_at:
+            return False
+        for source in entry.sources:
+            if await self._source_version(source) != entry.versions.get(source):
+                return False
+        return True
+
+    def after_tool_callback(self, tool, args, tool_context, tool_response):
+        """after_tool_callback ADK: zapis unieważnia źródło, błąd narzędzia wyklucza turę z cache"""
+        if tool.name in WRITE_TOOLS:
+            self.invalidate(*TOOL_SOURCES.get(tool.name, ()))
+        if isinstance(tool_response, dict) and tool_response.get("success") is False:
+            self._failed_invocations[tool_context.invocation_id] = None
+            while len(self._failed_invocations) > MAX_FAILED_INVOCATIONS:
+                self._failed_invocations.popitem(last=False)
+        return None
+
+    # === Odczyt i zapis ===
+
+    async def lookup(self, user_id: str, message: str) -> Optional[str]:
+        """Odpowiedź z cache albo None (pytanie zależne od kontekstu, brak lub nieaktualny wpis)"""
+        normalized = normalize(message)
+        if not is_cacheable_question(normalized):
+            return None
+        day = today().isoformat()
+        key = (user_id, day, normalized)
+
+        entry = self._entries.get(key)
+        if entry is not None and not await self._is_valid(entry):
+            del self._entries[key]
+            entry = None
+        record_cache("response_exact", hit=entry is not None)
+        if entry is None and self.embed is not None:
+            key, entry = await self._similar(user_id, day, normalized)
+            record_cache("response_semantic", hit=entry is not None)
+        if entry is None:
+            return None
+        # LRU - trafiony wpis wypychany jest jako ostatni
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        logger.debug("💾 Odpowiedź z cache (%d. trafienie)", entry.hits)
+        return entry.response
+
+    async def _similar(self, user_id: str, day: str,
+                       normalized: str) -> Tuple[Optional[Tuple[str, str, str]], Optional[_Entry]]:
+        critical = tuple(sorted(set(_CRITICAL_WORDS.findall(normalized))))
+        candidates = [(key, entry) for key, entry in self._entries.items()
+                      if key[0] == user_id and key[1] == day and entry.embedding is not None
+                      and entry.critical == critical]
+        if not candidates:
+            return None, None
+        try:
+            embedding = await self.embed(normalized)
+        except Exception as e:
+            logger.debug("Embedding zapytania nie powiódł się: %s", e)
+            return None, None
+        score, key, best = max(((_cosine(embedding, entry.embedding), key, entry) for key, entry in candidates),
+                               key=lambda item: item[0])
+        if score < self.threshold or not await self._is_valid(best):
+            return None, None
+        return key, best
+
+    async def store(self, user_id: str, message: str, response: str, tools_used: Iterable[str],
+                    invocation_id: Optional[str] = None):
+        """Zapamiętuje odpowiedź udanej tury (bez zapisów, błędów narzędzi i narzędzi o nieznanym źródle)"""
+        if invocation_id is not None and invocation_id in self._failed_invocations:
+            # Odpowiedź z przeprosinami za błąd API nie może wrócić z cache po naprawie
+            del self._failed_invocations[invocation_id]
+            logger.debug("💾 Tura %s z błędem narzędzia - bez zapisu w cache", invocation_id)
+            return
+        normalized = normalize(message)
+        tools_used = set(tools_used)
+        if not response or not is_cacheable_question(normalized) or tools_used & WRITE_TOOLS \
+                or any(tool not in TOOL_SOURCES for tool in tools_used):
+            return
+        sources = tuple(sorted({source for tool in tools_used for source in TOOL_SOURCES[tool]}))
+
+        now = time.time()
+        ttl = min([self._source_ttl(source, normalized) for source in sources] or [DEFAULT_TTL])
+        entry = _Entry(
+            response=response,
+            sources=sources,
+            versions={source: await self._source_version(source) for source in sources},
+            expires_at=now + ttl,
+            critical=tuple(sorted(set(_CRITICAL_WORDS.findall(normalized)))),
+        )
+        if self.embed is not None:
+            try:
+                entry.embedding = await self.embed(normalized)
+            except Exception as e:
+                logger.debug("Embedding odpowiedzi nie powiódł się: %s", e)
+
+        key = (user_id, today().isoformat(), normalized)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _source_ttl(source: str, normalized: str) -> float:
+        if source == "clock" and not _TIME_QUESTION.search(normalized):
+            # Data zmienia się o północy, a dzień jest częścią klucza
+            now = datetime.now(TIMEZONE)
+            midnight = TIMEZONE.localize(datetime.combine(now.date() + timedelta(days=1), datetime.min.time()))
+            return (midnight - now).total_seconds()
+        return SOURCE_TTL.get(source, DEFAULT_TTL)
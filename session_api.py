@@ -5,13 +5,21 @@ FastAPI endpoints dla zarządzania sesjami chatu
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 import uvicorn
 from session_database import SessionDatabase
+from workspace_sync import CALENDAR, GMAIL, WorkspaceMirror
+from agent_tracing import TRACE_FILE, load_turn_traces
+from agent_metrics import HTTP_REQUEST_SECONDS, render_latest
+from token_accounting import DAILY_TOKEN_BUDGET, with_cost
+import hmac
+import os
+import time
 import asyncio
 from contextlib import asynccontextmanager
+from datetime import date, timedelta
 
 # Pydantic modele
 class CreateSessionRequest(BaseModel):
@@ -56,6 +64,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Histogram latencji per trasa (szablon ścieżki, nie konkretne ID)"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            request.method, getattr(route, "path", "nieznana"), str(status)
+        ).observe(time.perf_counter() - started)
+
 # 📋 **SESSION ENDPOINTS**
 
 @app.get("/api/sessions")
@@ -172,14 +195,170 @@ async def generate_session_title(session_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Health check: baza jest krytyczna (503), upstreamy tylko obniżają status do "degraded"
+HEALTH_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+
+def _check_google_token():
+    from google_credentials_manager import get_credentials_manager
+    credentials = get_credentials_manager().credentials
+    if credentials is not None and not (credentials.token or credentials.refresh_token):
+        raise RuntimeError("token OAuth2 bez access i refresh token")
+
+async def _check_agent_websocket():
+    host = os.getenv("WEBSOCKET_HOST", "localhost")
+    port = int(os.getenv("WEBSOCKET_PORT", "8765"))
+    _, writer = await asyncio.open_connection(host, port)
+    writer.close()
+    await writer.wait_closed()
+
+async def _check_workspace_mirror():
+    from workspace_sync import OAUTH_ACCOUNT, SYNC_ENABLED, get_mirror
+    if not SYNC_ENABLED:
+        return
+    mirror = get_mirror(OAUTH_ACCOUNT)
+    stale = [resource for resource in (GMAIL, CALENDAR) if not await mirror.is_fresh(resource)]
+    if stale:
+        raise RuntimeError(f"nieaktualny mirror: {', '.join(stale)}")
+
+async def _run_check(check) -> Dict:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(check(), HEALTH_TIMEOUT)
+        result = {"status": "ok"}
+    except Exception as e:
+        result = {"status": "error", "error": str(e) or type(e).__name__}
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "service": "Chat Session API",
-        "version": "1.0.0"
-    }
+    """Health check: baza sesji, token Google, serwer WebSocket agenta, mirror Workspace"""
+    names = ["database", "google_oauth", "agent_websocket", "workspace_mirror"]
+    results = await asyncio.gather(
+        _run_check(db.ping),
+        _run_check(lambda: asyncio.to_thread(_check_google_token)),
+        _run_check(_check_agent_websocket),
+        _run_check(_check_workspace_mirror),
+    )
+    checks = dict(zip(names, results))
+    if checks["database"]["status"] != "ok":
+        status = "unhealthy"
+    elif any(check["status"] != "ok" for check in results):
+        status = "degraded"
+    else:
+        status = "healthy"
+    return JSONResponse(
+        status_code=503 if status == "unhealthy" else 200,
+        content={
+            "status": status,
+            "service": "Chat Session API",
+            "version": "1.0.0",
+            "checks": checks
+        }
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Metryki Prometheus procesu session_api"""
+    content, content_type = render_latest()
+    return Response(content=content, media_type=content_type)
+
+# 🔎 **SEARCH ENDPOINTS**
+
+@app.get("/api/search")
+async def search_messages(q: str, user_id: Optional[str] = None, limit: int = 20, offset: int = 0):
+    """Wyszukiwanie pełnotekstowe w historii rozmów (ranking, podświetlone fragmenty, paginacja)"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Puste zapytanie")
+    limit = max(1, min(limit, 100))
+    offset = max(0, offset)
+    try:
+        found = await db.search_messages(q, user_id=user_id, limit=limit, offset=offset)
+        return {
+            "success": True,
+            "query": q,
+            "results": found["results"],
+            "total": found["total"],
+            "limit": limit,
+            "offset": offset
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 🔭 **TRACES** (agent_tracing.py)
+
+@app.get("/api/traces")
+async def get_turn_traces(limit: int = 20):
+    """Ostatnie tury agenta jako waterfall spanów (model, narzędzia, TTS, baza, wysyłka)"""
+    limit = max(1, min(limit, 100))
+    try:
+        turns = await asyncio.to_thread(load_turn_traces, TRACE_FILE, limit)
+        return {"success": True, "turns": turns, "count": len(turns)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 💸 **TOKEN USAGE** (token_accounting.py)
+
+def _usage_summary(rows: List[Dict]) -> Dict:
+    rows = [with_cost(row) for row in rows]
+    totals = {key: sum(row[key] for row in rows)
+              for key in ("calls", "prompt_tokens", "output_tokens", "cached_tokens", "instruction_tokens")}
+    totals["cost_usd"] = round(sum(row["cost_usd"] or 0 for row in rows), 6)
+    return {"success": True, "usage": rows, "totals": totals, "daily_token_budget": DAILY_TOKEN_BUDGET}
+
+@app.get("/api/usage")
+async def get_token_usage(user_id: Optional[str] = None, days: int = 30):
+    """Zużycie tokenów i koszt per użytkownik, dzień i model"""
+    days = max(1, min(days, 366))
+    since_day = (date.today() - timedelta(days=days - 1)).isoformat()
+    try:
+        return _usage_summary(await db.get_token_usage(user_id=user_id, since_day=since_day))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/sessions/{session_id}/usage")
+async def get_session_token_usage(session_id: str):
+    """Zużycie tokenów i koszt jednej sesji agenta"""
+    try:
+        return _usage_summary(await db.get_token_usage(session_id=session_id))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/sessions/{session_id}/history-archive")
+async def get_history_archive(session_id: str):
+    """Tury sesji agenta zastąpione podsumowaniem (history_compaction.py) wraz z podsumowaniem"""
+    try:
+        archive = await db.get_history_archive(session_id)
+        return {"success": True, **archive, "count": len(archive["contents"])}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 📡 **WORKSPACE PUSH NOTIFICATIONS** (workspace_sync.py)
+
+def _verify_webhook_token(token: Optional[str]):
+    """Wspólny sekret kanału (WORKSPACE_WEBHOOK_TOKEN) - bez niego powiadomienia są wyłączone"""
+    expected = os.getenv("WORKSPACE_WEBHOOK_TOKEN", "")
+    if not expected:
+        raise HTTPException(status_code=503, detail="Powiadomienia push wyłączone - brak WORKSPACE_WEBHOOK_TOKEN")
+    if not hmac.compare_digest(token or "", expected):
+        raise HTTPException(status_code=403, detail="Nieprawidłowy token powiadomienia")
+
+@app.post("/api/workspace/notifications/{account}/calendar")
+async def calendar_notification(account: str, request: Request):
+    """Powiadomienie push Google Calendar - oznacza mirror do synchronizacji (delta pobierana syncTokenem)"""
+    _verify_webhook_token(request.headers.get("X-Goog-Channel-Token"))
+    # "sync" to potwierdzenie utworzenia kanału, nie zmiana
+    if request.headers.get("X-Goog-Resource-State") != "sync":
+        await WorkspaceMirror(db.db_path, account).mark_dirty(CALENDAR)
+    return {"success": True}
+
+@app.post("/api/workspace/notifications/{account}/gmail")
+async def gmail_notification(account: str, request: Request, token: Optional[str] = None):
+    """Powiadomienie Pub/Sub (push) z Gmail users.watch - delta pobierana przez history.list"""
+    _verify_webhook_token(token)
+    await WorkspaceMirror(db.db_path, account).mark_dirty(GMAIL)
+    # 2xx potwierdza wiadomość Pub/Sub
+    return {"success": True}
 
 # 📁 **STATIC FILES** (dla Glass UI)
 # Serwowanie plików statycznych
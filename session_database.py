@@ -7,15 +7,39 @@ Używa SQLite do persistencji historii rozmów
 import sqlite3
 import json
 import uuid
+import re
+import html
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 import asyncio
 import aiosqlite
 from pathlib import Path
 
+from agent_tracing import traced
+
+# Znaczniki podświetlenia z prywatnego zakresu Unicode - zamieniane na <mark> po escapowaniu HTML
+_MARK_START, _MARK_END = "\ue000", "\ue001"
+
+def _fts_query(text: str) -> Optional[str]:
+    """Tekst użytkownika -> zapytanie FTS5 (frazy w cudzysłowach, prefiks dla ostatniego słowa)"""
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+def _highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
 class SessionDatabase:
     def __init__(self, db_path: str = "chat_sessions.db"):
         self.db_path = db_path
+        # FTS5 bywa wyłączone w niestandardowych buildach SQLite - wtedy wyszukiwanie przez LIKE
+        self.fts_enabled = False
+        
+    async def ping(self):
+        """Szybki odczyt sprawdzający dostępność pliku bazy (health check)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("SELECT 1")
         
     async def init_database(self):
         """Inicjalizuje bazę danych z tabelami"""
@@ -46,6 +70,60 @@ class SessionDatabase:
                 )
             """)
             
+            # Gotowe briefingi dnia (briefing_scheduler.py) - jeden wiersz na użytkownika i dzień
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS briefing_snapshots (
+                    user_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, day)
+                )
+            """)
+            
+            # Zużycie tokenów modelu (token_accounting.py) - suma per sesja ADK, dzień i model
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS token_usage (
+                    session_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    calls INTEGER NOT NULL DEFAULT 0,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    output_tokens INTEGER NOT NULL DEFAULT 0,
+                    cached_tokens INTEGER NOT NULL DEFAULT 0,
+                    instruction_tokens INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (session_id, day, model)
+                )
+            """)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_token_usage_user_day ON token_usage(user_id, day)")
+            
+            # Historia sesji ADK zastąpiona podsumowaniem (history_compaction.py) - pełne treści Content
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS history_archive (
+                    session_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    user_id TEXT NOT NULL,
+                    role TEXT,
+                    content TEXT NOT NULL,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (session_id, position)
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS history_summaries (
+                    session_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    covered INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Indeks pełnotekstowy treści wiadomości (external content, synchronizowany triggerami)
+            await self._init_search_index(db)
+            
             # Indeksy dla wydajności
             await db.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages(session_id)")
             await db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at DESC)")
@@ -53,6 +131,45 @@ class SessionDatabase:
             await db.commit()
             print("✅ Baza danych zainicjowana")
 
+    async def _init_search_index(self, db):
+        """Tabela FTS5 messages_fts + triggery; przy pierwszym utworzeniu indeksuje istniejącą historię"""
+        cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+        exists = await cursor.fetchone() is not None
+        try:
+            await db.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    content,
+                    content='messages',
+                    content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ FTS5 niedostępne ({e}) - wyszukiwanie bez indeksu")
+            return
+        
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content);
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+                INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content);
+            END
+        """)
+        if not exists:
+            await db.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+            print("🔎 Zindeksowano historię wiadomości (FTS5)")
+        self.fts_enabled = True
+
+    @traced("db.create_session")
     async def create_session(self, title: str = "Nowa Rozmowa", user_id: str = "default_user") -> str:
         """Tworzy nową sesję"""
         session_id = str(uuid.uuid4())
@@ -68,6 +185,7 @@ class SessionDatabase:
         print(f"✅ Utworzono sesję: {session_id} - '{title}'")
         return session_id
 
+    @traced("db.add_message")
     async def add_message(self, session_id: str, role: str, content: str, metadata: Dict = None) -> str:
         """Dodaje wiadomość do sesji"""
         message_id = str(uuid.uuid4())
@@ -91,6 +209,7 @@ class SessionDatabase:
         print(f"✅ Dodano wiadomość do sesji {session_id}: {role}")
         return message_id
 
+    @traced("db.get_sessions")
     async def get_sessions(self, user_id: str = "default_user", limit: int = 50) -> List[Dict]:
         """Pobiera listę sesji dla użytkownika"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -107,6 +226,7 @@ class SessionDatabase:
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
 
+    @traced("db.get_session_messages")
     async def get_session_messages(self, session_id: str) -> List[Dict]:
         """Pobiera wszystkie wiadomości z sesji"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -126,6 +246,7 @@ class SessionDatabase:
                 messages.append(msg)
             return messages
 
+    @traced("db.update_session_title")
     async def update_session_title(self, session_id: str, title: str):
         """Aktualizuje tytuł sesji"""
         now = datetime.now().isoformat()
@@ -135,6 +256,7 @@ class SessionDatabase:
             """, (title, now, session_id))
             await db.commit()
 
+    @traced("db.delete_session")
     async def delete_session(self, session_id: str):
         """Usuwa sesję i wszystkie jej wiadomości"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -161,6 +283,172 @@ class SessionDatabase:
         
         return f"Rozmowa z {datetime.now().strftime('%d.%m.%Y')}"
 
+    @traced("db.search_messages")
+    async def search_messages(self, query: str, user_id: Optional[str] = None,
+                              limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Wyszukuje wiadomości (ranking bm25, fragmenty z podświetleniem <mark>, paginacja)"""
+        match = _fts_query(query)
+        if match is None:
+            return {"results": [], "total": 0}
+        
+        user_filter = " AND s.user_id = ?" if user_id else ""
+        user_params = (user_id,) if user_id else ()
+        
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            if self.fts_enabled:
+                base = f"""
+                    FROM messages_fts
+                    JOIN messages m ON m.rowid = messages_fts.rowid
+                    JOIN sessions s ON s.id = m.session_id
+                    WHERE messages_fts MATCH ?{user_filter}
+                """
+                params = (match,) + user_params
+                cursor = await db.execute(f"""
+                    SELECT m.id, m.session_id, s.title AS session_title, m.role, m.timestamp,
+                           snippet(messages_fts, 0, ?, ?, '…', 12) AS snippet
+                    {base}
+                    ORDER BY bm25(messages_fts)
+                    LIMIT ? OFFSET ?
+                """, (_MARK_START, _MARK_END) + params + (limit, offset))
+            else:
+                # Fallback bez indeksu: pełny skan, najnowsze najpierw
+                base = f"""
+                    FROM messages m
+                    JOIN sessions s ON s.id = m.session_id
+                    WHERE m.content LIKE ?{user_filter}
+                """
+                params = (f"%{query.strip()}%",) + user_params
+                cursor = await db.execute(f"""
+                    SELECT m.id, m.session_id, s.title AS session_title, m.role, m.timestamp,
+                           substr(m.content, 1, 200) AS snippet
+                    {base}
+                    ORDER BY m.timestamp DESC
+                    LIMIT ? OFFSET ?
+                """, params + (limit, offset))
+            rows = await cursor.fetchall()
+            
+            cursor = await db.execute(f"SELECT COUNT(*) {base}", params)
+            total = (await cursor.fetchone())[0]
+        
+        results = []
+        for row in rows:
+            result = dict(row)
+            result["snippet"] = _highlight(result["snippet"])
+            results.append(result)
+        return {"results": results, "total": total}
+
+    @traced("db.save_briefing_snapshot")
+    async def save_briefing_snapshot(self, user_id: str, day: str, payload: Dict[str, Any]):
+        """Zapisuje (nadpisuje) briefing użytkownika na dany dzień"""
+        now = datetime.now().isoformat()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                INSERT INTO briefing_snapshots (user_id, day, payload, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id, day) DO UPDATE SET payload = excluded.payload, updated_at = excluded.updated_at
+            """, (user_id, day, json.dumps(payload, default=str), now))
+            # Starsze dni nie są już potrzebne
+            await db.execute("DELETE FROM briefing_snapshots WHERE user_id = ? AND day < ?", (user_id, day))
+            await db.commit()
+
+    @traced("db.get_briefing_snapshot")
+    async def get_briefing_snapshot(self, user_id: str, day: str) -> Optional[Dict[str, Any]]:
+        """Pobiera briefing użytkownika na dany dzień (None jeśli jeszcze nie powstał)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "SELECT payload FROM briefing_snapshots WHERE user_id = ? AND day = ?", (user_id, day)
+            )
+            row = await cursor.fetchone()
+            return json.loads(row[0]) if row else None
+
+    @traced("db.record_token_usage")
+    async def record_token_usage(self, session_id: str, user_id: str, day: str, model: str,
+                                 prompt_tokens: int, output_tokens: int, cached_tokens: int = 0,
+                                 instruction_tokens: int = 0, calls: int = 1):
+        """Dodaje zużycie jednego lub kilku wywołań modelu do sumy sesji na dany dzień"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                INSERT INTO token_usage (session_id, user_id, day, model, calls, prompt_tokens,
+                                         output_tokens, cached_tokens, instruction_tokens, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(session_id, day, model) DO UPDATE SET
+                    calls = calls + excluded.calls,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    output_tokens = output_tokens + excluded.output_tokens,
+                    cached_tokens = cached_tokens + excluded.cached_tokens,
+                    instruction_tokens = instruction_tokens + excluded.instruction_tokens,
+                    updated_at = excluded.updated_at
+            """, (session_id, user_id, day, model, calls, prompt_tokens, output_tokens,
+                  cached_tokens, instruction_tokens, datetime.now().isoformat()))
+            await db.commit()
+
+    @traced("db.get_token_usage")
+    async def get_token_usage(self, user_id: Optional[str] = None, since_day: Optional[str] = None,
+                              session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Zużycie tokenów zagregowane per użytkownik, dzień i model (opcjonalnie dla jednej sesji)"""
+        conditions, params = [], []
+        for column, value in (("user_id", user_id), ("session_id", session_id)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since_day:
+            conditions.append("day >= ?")
+            params.append(since_day)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(f"""
+                SELECT user_id, day, model, COUNT(DISTINCT session_id) AS sessions, SUM(calls) AS calls,
+                       SUM(prompt_tokens) AS prompt_tokens, SUM(output_tokens) AS output_tokens,
+                       SUM(cached_tokens) AS cached_tokens, SUM(instruction_tokens) AS instruction_tokens
+                FROM token_usage {where}
+                GROUP BY user_id, day, model
+                ORDER BY day DESC, user_id, model
+            """, params)
+            return [dict(row) for row in await cursor.fetchall()]
+
+    async def get_user_tokens_for_day(self, user_id: str, day: str) -> int:
+        """Suma tokenów (prompt + output) użytkownika w danym dniu - budżet"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "SELECT COALESCE(SUM(prompt_tokens + output_tokens), 0) FROM token_usage WHERE user_id = ? AND day = ?",
+                (user_id, day)
+            )
+            return (await cursor.fetchone())[0]
+
+    @traced("db.archive_history")
+    async def archive_history(self, session_id: str, user_id: str, start: int, contents: List[Dict[str, Any]],
+                              summary: str):
+        """Zapisuje skompaktowane treści sesji (pozycje od start) i aktualne podsumowanie"""
+        now = datetime.now().isoformat()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany("""
+                INSERT OR REPLACE INTO history_archive (session_id, position, user_id, role, content, archived_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(session_id, start + offset, user_id, content.get("role"), json.dumps(content, ensure_ascii=False), now)
+                  for offset, content in enumerate(contents)])
+            await db.execute("""
+                INSERT OR REPLACE INTO history_summaries (session_id, user_id, summary, covered, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (session_id, user_id, summary, start + len(contents), now))
+            await db.commit()
+
+    async def get_history_archive(self, session_id: str) -> Dict[str, Any]:
+        """Zarchiwizowane treści sesji w kolejności i ostatnie podsumowanie"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(
+                "SELECT position, role, content FROM history_archive WHERE session_id = ? ORDER BY position",
+                (session_id,)
+            )
+            contents = [{"position": row["position"], "role": row["role"], "content": json.loads(row["content"])}
+                        for row in await cursor.fetchall()]
+            cursor = await db.execute("SELECT summary, covered, updated_at FROM history_summaries WHERE session_id = ?",
+                                      (session_id,))
+            summary = await cursor.fetchone()
+            return {"contents": contents, "summary": dict(summary) if summary else None}
+
 # Test funkcji
 async def test_database():
     """Test funkcjonalności bazy danych"""
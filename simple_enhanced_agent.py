@@ -11,22 +11,28 @@ Hybrydowy system:
 
 import os
 import asyncio
-import json
 import base64
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from dotenv import load_dotenv
 
 # ElevenLabs integration
-from elevenlabs_voice_integration import ElevenLabsVoiceManager, UE5AudioStreamer
+from elevenlabs_voice_integration import UE5AudioStreamer, create_voice_manager
 
 # Google Cloud integration
 from google_cloud_integration import GoogleCloudManager, GoogleBusinessIntegration, GoogleAnalytics
 
+# Poranny briefing liczony w tle
+from briefing_scheduler import BriefingAgentMixin, section_data
+
+# Wspólna ścieżka ramek odpowiedzi (jak w agentach ADK)
+from adk_turn_runner import send_response_chunk, send_response_complete
+from ws_gateway import ConversationBackend, WebSocketGateway
+
 # Load environment
 load_dotenv()
 
-class SimpleEnhancedAgent:
+class SimpleEnhancedAgent(BriefingAgentMixin):
     """
     Prosty Enhanced MetaHuman Business Assistant
     🎤 ElevenLabs + ☁️ Google Cloud (bez ADK)
@@ -35,11 +41,6 @@ class SimpleEnhancedAgent:
     def __init__(self):
         print("🚀 Inicjalizuję Simple Enhanced MetaHuman Assistant...")
         
-        # ElevenLabs Voice Manager
-        self.voice_manager = ElevenLabsVoiceManager()
-        self.audio_streamer = UE5AudioStreamer(self.voice_manager)
-        print("✅ ElevenLabs Voice Manager")
-        
         # Google Cloud Business APIs
         try:
             self.gcp_manager = GoogleCloudManager()
@@ -52,6 +53,14 @@ class SimpleEnhancedAgent:
             self.business_integration = None
             self.analytics = None
         
+        # Głos: ElevenLabs (główny TTS) albo strumieniowy Google Cloud TTS (TTS_PROVIDER, brak klucza ElevenLabs)
+        self.voice_manager = create_voice_manager(self.gcp_manager)
+        self.audio_streamer = UE5AudioStreamer(self.voice_manager)
+        print(f"✅ Voice Manager: {type(self.voice_manager).__name__}")
+        
+        # Snapshot briefingu i mirror Gmail/Calendar - start razem z serwerem
+        self.setup_briefing(self.gcp_manager, self.business_integration)
+        
         print("✅ Simple Enhanced Agent ready!")
     
     # === BUSINESS FUNCTIONS ===
@@ -86,7 +95,11 @@ class SimpleEnhancedAgent:
             return "⚠️ Gmail niedostępny - sprawdź konfigurację"
         
         try:
-            emails = await self.business_integration.get_recent_emails(max_emails)
+            # Gotowy snapshot briefingu zamiast zapytań do Gmail
+            emails = section_data(await self._briefing_snapshot(), "emails")
+            if emails is None:
+                emails = await self.business_integration.get_recent_emails(max_emails)
+            emails = emails[:max_emails]
             
             if not emails:
                 return "📧 Brak nieprzeczytanych emaili. Inbox zero achieved!"
@@ -142,6 +155,8 @@ class SimpleEnhancedAgent:
         """Generuje raport biznesowy"""
         current_time = datetime.now()
         
+        today = "\n        ".join(await self.briefing_report_lines())
+        
         return f"""
         📊 RAPORT BIZNESOWY
         
@@ -153,6 +168,9 @@ class SimpleEnhancedAgent:
         • ElevenLabs Voice: ✅ Premium Quality
         • Analytics Engine: {'✅ Recording' if self.analytics else '⚠️ Offline'}
         
+        📆 DZIŚ:
+        {today}
+        
         💼 GOTOWOŚĆ BIZNESOWA: 100%
         
         📋 NASTĘPNE KROKI:
@@ -169,8 +187,11 @@ class SimpleEnhancedAgent:
         """Przetwarza input użytkownika z prostym AI"""
         user_lower = user_input.lower()
         
-        # Command routing
-        if any(word in user_lower for word in ['kalendarz', 'spotkanie', 'termin', 'calendar']):
+        # Command routing (pytania o plan dnia - gotowy briefing)
+        if any(word in user_lower for word in ['briefing', 'plan dnia', 'co mam dziś', 'co mam dzisiaj', 'na dziś']):
+            return await self.get_morning_briefing()
+        
+        elif any(word in user_lower for word in ['kalendarz', 'spotkanie', 'termin', 'calendar']):
             return await self.get_calendar_summary()
         
         elif any(word in user_lower for word in ['email', 'mail', 'wiadomość', 'skrzynka']):
@@ -209,6 +230,7 @@ class SimpleEnhancedAgent:
             🤖 Jestem Twoim asystentem biznesowym MetaHuman.
             
             Mogę pomóc z:
+            • "briefing" - plan dnia
             • "kalendarz" - sprawdzenie terminów
             • "email" - nieprzeczytane wiadomości  
             • "czas" - aktualna data/godzina
@@ -228,6 +250,11 @@ class SimpleEnhancedAgent:
             # Process input
             response_text = await self.process_user_input(user_input)
             
+            # Tekst do klienta od razu, zanim wygeneruje się audio
+            if websocket:
+                await send_response_chunk(websocket, response_text)
+                await send_response_complete(websocket)
+            
             # Generate voice with ElevenLabs
             if websocket:
                 await self.audio_streamer.stream_to_ue5(response_text, websocket)
@@ -255,59 +282,34 @@ class SimpleUE5Server:
     def __init__(self, agent: SimpleEnhancedAgent, port: int = 8765):
         self.agent = agent
         self.port = port
+        self.gateway = None
         
     async def start_server(self):
-        """Uruchamia WebSocket server"""
-        import websockets
-        
-        async def handle_client(websocket, path):
-            print(f"🎭 MetaHuman Avatar połączony: {websocket.remote_address}")
-            
-            try:
-                # Welcome message
-                welcome_msg = {
-                    "type": "system",
-                    "content": "🎭 Simple Enhanced MetaHuman Business Assistant gotowy!",
-                    "features": [
-                        "🎤 ElevenLabs Premium Voice",
-                        "📅 Real Google Calendar",
-                        "📧 Live Gmail Integration", 
-                        "📊 BigQuery Analytics",
-                        "🤖 Simple AI Chat"
-                    ],
-                    "timestamp": datetime.now().isoformat()
-                }
-                await websocket.send(json.dumps(welcome_msg))
-                
-                async for message in websocket:
-                    print(f"💬 User: {message}")
-                    
-                    # Process with simple agent (includes voice)
-                    response = await self.agent.run_conversation(message, websocket)
-                    
-                    # Send text response
-                    text_message = {
-                        "type": "text",
-                        "content": response,
-                        "timestamp": datetime.now().isoformat(),
-                        "voice": "elevenlabs",
-                        "engine": "simple_ai"
-                    }
-                    await websocket.send(json.dumps(text_message))
-                    print(f"🤖 Response sent: {response[:100]}...")
-                    
-            except websockets.exceptions.ConnectionClosed:
-                print("🔌 MetaHuman disconnected")
-            except Exception as e:
-                print(f"❌ Error: {e}")
-        
+        """Uruchamia WebSocket server (wspólna bramka)"""
+        backend = ConversationBackend(
+            self.agent,
+            name="Simple Enhanced MetaHuman Business Assistant",
+            welcome_message="🎭 Simple Enhanced MetaHuman Business Assistant gotowy!",
+            features=[
+                "🎤 ElevenLabs Premium Voice",
+                "📅 Real Google Calendar",
+                "📧 Live Gmail Integration", 
+                "📊 BigQuery Analytics",
+                "🤖 Simple AI Chat"
+            ]
+        )
         print(f"🚀 Simple Enhanced MetaHuman Server")
         print(f"🎤 Voice: ElevenLabs Premium")
         print(f"☁️ Business APIs: Google Cloud")  
         print(f"🤖 AI Engine: Simple Chat")
         print(f"🎭 Waiting for MetaHuman avatar on port {self.port}...")
         
-        await websockets.serve(handle_client, "localhost", self.port)
+        # Briefing i synchronizacja w tle (potrzebują działającego event loopa)
+        self.agent.start_briefing()
+        # Wejście głosowe na credentials Service Account agenta (jeśli dostępne)
+        speech_input = self.agent.gcp_manager.speech_input if self.agent.gcp_manager else None
+        self.gateway = WebSocketGateway(backend, speech_input=speech_input)
+        await self.gateway.start("localhost", self.port)
 
 # Main Application
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Strumieniowe rozpoznawanie mowy (Google Cloud Speech) dla bramki WebSocket
+Binarne ramki audio z UE5 -> streaming_recognize -> transkrypcje pośrednie i końcowe
+"""
+
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from google.cloud import speech
+
+logger = logging.getLogger(__name__)
+
+# Kodowania audio od klienta: (RecognitionConfig.AudioEncoding, domyślny sample rate)
+AUDIO_ENCODINGS = {
+    "linear16": (speech.RecognitionConfig.AudioEncoding.LINEAR16, 16000),
+    "ogg_opus": (speech.RecognitionConfig.AudioEncoding.OGG_OPUS, 48000),
+    "webm_opus": (speech.RecognitionConfig.AudioEncoding.WEBM_OPUS, 48000),
+}
+
+# Limit rozmiaru pojedynczego żądania streaming_recognize
+MAX_CHUNK_BYTES = 25 * 1024
+# Kodowania w kontenerze: nagłówek (OpusHead/EBML) trafia tylko do pierwszego strumienia,
+# więc jest zapamiętywany i wysyłany ponownie na początku każdego kolejnego
+CONTAINER_ENCODINGS = frozenset({
+    speech.RecognitionConfig.AudioEncoding.OGG_OPUS,
+    speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
+})
+# Dłuższy "nagłówek" to błąd klienta - wtedy strumienie idą bez powtórzenia
+MAX_HEADER_BYTES = MAX_CHUNK_BYTES
+# Identyfikator elementu Cluster w WebM - wszystko przed nim to nagłówek (EBML, Segment, Tracks)
+_WEBM_CLUSTER = b"\x1f\x43\xb6\x75"
+
+def _ogg_header(data: bytes) -> Optional[bytes]:
+    """Strony Ogg z OpusHead i OpusTags z początku nagrania; None gdy jeszcze niekompletne"""
+    offset, seen_tags = 0, False
+    while offset + 27 <= len(data):
+        if data[offset:offset + 4] != b"OggS":
+            return data[:offset] if seen_tags else None
+        segments = data[offset + 26]
+        if offset + 27 + segments > len(data):
+            return None
+        end = offset + 27 + segments + sum(data[offset + 27:offset + 27 + segments])
+        if end > len(data):
+            return None
+        payload = data[offset + 27 + segments:end]
+        continued = data[offset + 5] & 0x01
+        if payload.startswith(b"OpusTags"):
+            seen_tags = True
+        elif not continued and not payload.startswith(b"OpusHead"):
+            # Pierwsza strona z dźwiękiem kończy nagłówek
+            return data[:offset] if seen_tags else None
+        offset = end
+    return None
+
+
+def container_header(encoding, data: bytes) -> Optional[bytes]:
+    """Nagłówek kontenera Opus (Ogg/WebM) z początku nagrania; None gdy jeszcze go nie ma w całości"""
+    if encoding == speech.RecognitionConfig.AudioEncoding.OGG_OPUS:
+        return _ogg_header(data)
+    cluster = data.find(_WEBM_CLUSTER)
+    return data[:cluster] if cluster > 0 else None
+
+
+InterimHandler = Callable[[str, float], Awaitable[Any]]
+FinalHandler = Callable[[str], Awaitable[Any]]
+ErrorHandler = Callable[[Exception], Awaitable[Any]]
+
+
+class SpeechInput:
+    """Fabryka strumieni rozpoznawania - jeden asynchroniczny klient na proces"""
+
+    def __init__(self, credentials=None, language: Optional[str] = None):
+        self.credentials = credentials
+        self.language = language or os.getenv("STT_LANGUAGE", "pl-PL")
+        self.model = os.getenv("STT_MODEL", "latest_short")
+        self._client: Optional[speech.SpeechAsyncClient] = None
+
+    @property
+    def client(self) -> speech.SpeechAsyncClient:
+        if self._client is None:
+            self._client = speech.SpeechAsyncClient(credentials=self.credentials)
+        return self._client
+
+    def streaming_config(self, options: Dict[str, Any]) -> speech.StreamingRecognitionConfig:
+        """Konfiguracja z ramki audio_start (encoding, sample_rate, language)"""
+        encoding_name = str(options.get("encoding", "linear16")).lower()
+        if encoding_name not in AUDIO_ENCODINGS:
+            raise ValueError(f"Nieobsługiwane kodowanie audio: {encoding_name}")
+        encoding, default_rate = AUDIO_ENCODINGS[encoding_name]
+
+        return speech.StreamingRecognitionConfig(
+            config=speech.RecognitionConfig(
+                encoding=encoding,
+                sample_rate_hertz=int(options.get("sample_rate", default_rate)),
+                language_code=options.get("language", self.language),
+                model=self.model,
+                enable_automatic_punctuation=True
+            ),
+            interim_results=True,
+            # Endpointing po stronie Google: koniec wypowiedzi kończy strumień
+            single_utterance=True
+        )
+
+    def open_stream(self, options: Dict[str, Any], on_interim: InterimHandler, on_final: FinalHandler,
+                    on_error: Optional[ErrorHandler] = None, header: Optional[bytes] = None) -> "SpeechStream":
+        """header - nagłówek kontenera z poprzedniego strumienia tego samego nagrania (wznowienie po błędzie)"""
+        return SpeechStream(self, self.streaming_config(options), on_interim, on_final, on_error, header)
+
+
+class SpeechStream:
+    """
+    Rozpoznawanie mowy dla jednego połączenia
+
+    Każda wypowiedź to osobne wywołanie streaming_recognize (single_utterance).
+    Po END_OF_SINGLE_UTTERANCE generator żądań kończy się od razu, a audio,
+    które już przyszło, trafia do następnego strumienia. Dla Ogg/WebM Opus każdy
+    kolejny strumień zaczyna się od zapamiętanego nagłówka kontenera - bez niego
+    Google nie zdekoduje dalszej części nagrania. Błąd rozpoznawania zamyka
+    strumień (dalsze audio jest odrzucane) i wywołuje on_error.
+    """
+
+    def __init__(self, speech_input: SpeechInput, config: speech.StreamingRecognitionConfig,
+                 on_interim: InterimHandler, on_final: FinalHandler, on_error: Optional[ErrorHandler] = None,
+                 header: Optional[bytes] = None):
+        self.speech_input = speech_input
+        self.config = config
+        self.on_interim = on_interim
+        self.on_final = on_final
+        self.on_error = on_error
+        self._chunks: deque = deque()
+        self._available = asyncio.Event()
+        self._closed = False
+        self._utterance_done = False
+        self._task: Optional[asyncio.Task] = None
+        # Pierwszy strumień nowego nagrania ma nagłówek w audio klienta, wznowiony - nie
+        self._resend_header = header is not None
+        # Nagłówek kontenera: znany (wznowienie), zbierany z pierwszych ramek albo niepotrzebny (LINEAR16)
+        self.header = header
+        collect = header is None and config.config.encoding in CONTAINER_ENCODINGS
+        self._header_buffer: Optional[bytearray] = bytearray() if collect else None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def push(self, chunk: bytes):
+        if self._closed:
+            return
+        if self._header_buffer is not None:
+            self._collect_header(chunk)
+        for offset in range(0, len(chunk), MAX_CHUNK_BYTES):
+            self._chunks.append(chunk[offset:offset + MAX_CHUNK_BYTES])
+        self._available.set()
+
+    def _collect_header(self, chunk: bytes):
+        self._header_buffer.extend(chunk)
+        self.header = container_header(self.config.config.encoding, bytes(self._header_buffer))
+        if self.header is not None or len(self._header_buffer) > MAX_HEADER_BYTES:
+            if self.header is None:
+                logger.warning("⚠️ Nie znaleziono nagłówka kontenera audio - kolejne wypowiedzi mogą nie zostać rozpoznane")
+            self._header_buffer = None
+
+    def finish(self):
+        """Klient zakończył nagrywanie (audio_end) - domknij bieżącą wypowiedź"""
+        self._closed = True
+        self._available.set()
+
+    async def close(self):
+        self.finish()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _wait_for_audio(self) -> bool:
+        """Czy wysłać kolejny fragment; po END_OF_SINGLE_UTTERANCE reszta kolejki czeka na nowy strumień"""
+        while True:
+            if self._utterance_done:
+                return False
+            if self._chunks:
+                return True
+            if self._closed:
+                return False
+            await self._available.wait()
+            self._available.clear()
+
+    async def _requests(self):
+        yield speech.StreamingRecognizeRequest(streaming_config=self.config)
+        if self._resend_header and self.header:
+            yield speech.StreamingRecognizeRequest(audio_content=self.header)
+        self._resend_header = True
+        while await self._wait_for_audio():
+            yield speech.StreamingRecognizeRequest(audio_content=self._chunks.popleft())
+
+    async def _recognize_utterance(self):
+        self._utterance_done = False
+        responses = await self.speech_input.client.streaming_recognize(requests=self._requests())
+        async for response in responses:
+            if response.speech_event_type == \
+                    speech.StreamingRecognizeResponse.SpeechEventType.END_OF_SINGLE_UTTERANCE:
+                self._utterance_done = True
+                self._available.set()
+            for result in response.results:
+                if not result.alternatives:
+                    continue
+                transcript = result.alternatives[0].transcript.strip()
+                if not transcript:
+                    continue
+                if result.is_final:
+                    await self.on_final(transcript)
+                else:
+                    await self.on_interim(transcript, result.stability)
+
+    async def _run(self):
+        try:
+            while True:
+                # Nowy strumień dopiero gdy jest audio - bez pustych strumieni czekających na timeout
+                if not self._chunks:
+                    if self._closed:
+                        return
+                    await self._available.wait()
+                    self._available.clear()
+                    continue
+                await self._recognize_utterance()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("❌ Błąd rozpoznawania mowy: %s", e)
+            self._closed = True
+            self._chunks.clear()
+            if self.on_error is not None:
+                await self.on_error(e)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Profil startu agenta (--profile-startup)
+Czas poszczególnych importów i kroków konfiguracji liczony od startu procesu
+"""
+
+import os
+import sys
+import time
+import logging
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+# Punkt odniesienia - moduł importowany jako pierwszy przez agenta
+PROCESS_START = time.perf_counter()
+
+
+class StartupProfiler:
+    """Zbiera czasy kroków startu; wyłączony kosztuje tylko jedno sprawdzenie flagi"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        # (nazwa, początek od startu procesu, czas trwania, nowe moduły)
+        self.steps: List[Tuple[str, float, float, int]] = []
+        self.marks: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def step(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        modules_before = len(sys.modules)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            self.steps.append((name, started - PROCESS_START, finished - started,
+                               len(sys.modules) - modules_before))
+
+    def mark(self, name: str):
+        """Punkt na osi czasu (np. serwer nasłuchuje, pierwsze połączenie) - zapisywany raz"""
+        if self.enabled and all(existing != name for existing, _ in self.marks):
+            self.marks.append((name, time.perf_counter() - PROCESS_START))
+
+    def report(self) -> str:
+        lines = ["⏱️ Profil startu (ms od startu procesu):",
+                 f"{'krok':<48}{'start':>9}{'czas':>9}{'moduły':>8}"]
+        for name, offset, duration, modules in self.steps:
+            lines.append(f"{name:<48}{offset * 1000:>9.0f}{duration * 1000:>9.0f}{modules:>8}")
+        for name, offset in self.marks:
+            lines.append(f"▶ {name:<46}{offset * 1000:>9.0f}")
+        return "\n".join(lines)
+
+    def emit(self, logger: logging.Logger, final_mark: Optional[str] = None):
+        if not self.enabled:
+            return
+        if final_mark:
+            self.mark(final_mark)
+        logger.info("%s", self.report())
+
+
+# Włączany flagą --profile-startup (sprawdzaną już przy imporcie, żeby objąć importy modułu agenta)
+startup_profiler = StartupProfiler(
+    enabled="--profile-startup" in sys.argv
+    or os.getenv("AGENT_PROFILE_STARTUP", "").lower() in ("1", "true", "yes")
+)
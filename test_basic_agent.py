@@ -8,6 +8,8 @@ import asyncio
 from google.adk.agents import LlmAgent
 from google.adk.tools.function_tool import function_tool
 
+from mock_llm_backend import create_model  # AGENT_MODEL_BACKEND=mock - test bez sieci
+
 class SimpleBusinessAgent:
     """Uproszczony agent do testów"""
     
@@ -26,7 +28,7 @@ class SimpleBusinessAgent:
         ]
         
         self.agent = LlmAgent(
-            model="gemini-2.0-flash",
+            model=create_model("gemini-2.0-flash"),
             name="Simple_Business_Assistant",
             instruction="""
             Jesteś asystentem biznesowym MetaHuman w UE5.
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test strumieniowego rozpoznawania mowy (speech_stream) bez połączenia z Google
+Dwie wypowiedzi w jednym nagraniu OGG_OPUS: drugi strumień streaming_recognize
+musi zacząć się od nagłówka kontenera (OpusHead + OpusTags) z pierwszego.
+"""
+import asyncio
+import struct
+
+from google.cloud import speech
+
+from speech_stream import SpeechInput
+
+END_OF_UTTERANCE = speech.StreamingRecognizeResponse.SpeechEventType.END_OF_SINGLE_UTTERANCE
+
+
+def ogg_page(payload: bytes, sequence: int, header_type: int = 0) -> bytes:
+    """Strona Ogg z jednym pakietem (bez poprawnej sumy CRC - test jej nie sprawdza)"""
+    segments = [255] * (len(payload) // 255) + [len(payload) % 255]
+    return (b"OggS" + bytes([0, header_type]) + struct.pack("<qIII", 0, 1, sequence, 0)
+            + bytes([len(segments)]) + bytes(segments) + payload)
+
+
+OPUS_HEAD = ogg_page(b"OpusHead" + bytes(11), 0, header_type=0x02)
+OPUS_TAGS = ogg_page(b"OpusTags" + bytes(16), 1)
+
+
+class FakeSpeechClient:
+    """streaming_recognize: zbiera audio strumienia i kończy wypowiedź po pierwszej ramce dźwięku"""
+
+    def __init__(self):
+        self.streams = []
+
+    async def streaming_recognize(self, requests):
+        audio = []
+        self.streams.append(audio)
+
+        async def responses():
+            async for request in requests:
+                if not request.audio_content:
+                    continue
+                audio.append(request.audio_content)
+                if not request.audio_content.startswith(OPUS_HEAD):
+                    yield speech.StreamingRecognizeResponse(speech_event_type=END_OF_UTTERANCE)
+                    yield speech.StreamingRecognizeResponse(results=[speech.StreamingRecognitionResult(
+                        alternatives=[speech.SpeechRecognitionAlternative(transcript=f"wypowiedź {len(self.streams)}")],
+                        is_final=True
+                    )])
+                    return
+
+        return responses()
+
+
+async def test_two_opus_utterances():
+    """Dwie wypowiedzi OGG_OPUS - każdy strumień dostaje nagłówek kontenera"""
+    speech_input = SpeechInput(language="pl-PL")
+    client = speech_input._client = FakeSpeechClient()
+    finals = []
+
+    async def on_interim(text, stability):
+        pass
+
+    async def on_final(text):
+        finals.append(text)
+
+    stream = speech_input.open_stream({"encoding": "ogg_opus"}, on_interim, on_final)
+    stream.start()
+    # Nagłówek i pierwsza wypowiedź w jednej ramce klienta, druga wypowiedź w kolejnej
+    stream.push(OPUS_HEAD + OPUS_TAGS)
+    stream.push(ogg_page(b"\x01" * 40, 2))
+    await asyncio.sleep(0.05)
+    stream.push(ogg_page(b"\x02" * 40, 3))
+    stream.finish()
+    await asyncio.wait_for(stream._task, timeout=2)
+
+    assert finals == ["wypowiedź 1", "wypowiedź 2"], finals
+    assert len(client.streams) == 2, client.streams
+    assert stream.header == OPUS_HEAD + OPUS_TAGS
+    assert client.streams[0][0] == OPUS_HEAD + OPUS_TAGS
+    assert client.streams[1][0] == OPUS_HEAD + OPUS_TAGS, "drugi strumień bez nagłówka Ogg"
+    assert client.streams[1][1] == ogg_page(b"\x02" * 40, 3)
+    print("✅ Dwie wypowiedzi OGG_OPUS: nagłówek kontenera powtórzony w drugim strumieniu")
+
+
+async def test_linear16_without_header():
+    """LINEAR16 nie ma kontenera - kolejne strumienie zaczynają się od samego audio"""
+    speech_input = SpeechInput(language="pl-PL")
+    stream = speech_input.open_stream({"encoding": "linear16"}, None, None)
+    stream.push(b"\x00" * 320)
+    assert stream.header is None and stream._header_buffer is None
+    print("✅ LINEAR16: bez nagłówka kontenera")
+
+
+async def main():
+    await test_two_opus_utterances()
+    await test_linear16_without_header()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Rozliczanie tokenów i kosztu modelu per sesja i użytkownik
+usage_metadata z każdej odpowiedzi modelu (after_model_callback) trafia do
+tabeli token_usage w chat_sessions.db; przekroczenie dziennego budżetu
+użytkownika przełącza kolejne wywołania na tańszy model (before_model_callback).
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import date
+from typing import Any, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Dzienny limit tokenów (prompt + output) na użytkownika; 0 = bez limitu
+DAILY_TOKEN_BUDGET = int(os.getenv("AGENT_USER_DAILY_TOKEN_BUDGET", "0"))
+FALLBACK_MODEL = os.getenv("AGENT_FALLBACK_MODEL", "gemini-2.0-flash-lite-001")
+# Co ile sekund zużycie dnia jest ponownie czytane z bazy (inne workery piszą do tej samej tabeli);
+# blisko budżetu (NEAR_BUDGET) - przy każdym wywołaniu modelu
+USAGE_REFRESH_SECONDS = float(os.getenv("AGENT_TOKEN_USAGE_REFRESH", "30"))
+NEAR_BUDGET = 0.9
+# Wywołania bez after_model (błąd modelu) zapominane po tym czasie
+PENDING_REQUEST_TTL = 600.0
+
+# USD za 1M tokenów: (wejście, wyjście, wejście z cache); dopasowanie po najdłuższym prefiksie
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gemini-2.0-flash-lite": (0.075, 0.30, 0.01875),
+    "gemini-2.0-flash": (0.10, 0.40, 0.025),
+    "gemini-2.5-flash": (0.30, 2.50, 0.075),
+    "gemini-2.5-pro": (1.25, 10.00, 0.31),
+    "gemini-1.5-flash": (0.075, 0.30, 0.01875),
+    "gemini-1.5-pro": (1.25, 5.00, 0.3125),
+}
+# Nadpisanie/uzupełnienie cennika: AGENT_MODEL_PRICES='{"gemini-2.0-flash": [0.1, 0.4, 0.025]}'
+MODEL_PRICES.update({model: tuple(prices) for model, prices in json.loads(os.getenv("AGENT_MODEL_PRICES", "{}")).items()})
+
+# Szacunek tokenów instrukcji systemowej (usage_metadata jej nie wyodrębnia)
+CHARS_PER_TOKEN = 4
+
+
+def model_prices(model: str) -> Optional[Tuple[float, float, float]]:
+    """Cennik modelu (np. 'gemini-2.0-flash-001' -> 'gemini-2.0-flash'); None gdy nieznany"""
+    name = (model or "").rsplit("/", 1)[-1]
+    matches = [prefix for prefix in MODEL_PRICES if name.startswith(prefix)]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+
+def usage_cost(model: str, prompt_tokens: int, output_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+    """Koszt w USD; tokeny z cache liczone po stawce cache zamiast pełnej"""
+    prices = model_prices(model)
+    if prices is None:
+        return None
+    input_price, output_price, cached_price = prices
+    billable_prompt = max(prompt_tokens - cached_tokens, 0)
+    return round((billable_prompt * input_price + cached_tokens * cached_price + output_tokens * output_price) / 1e6, 6)
+
+
+def with_cost(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Wiersz z SessionDatabase.get_token_usage uzupełniony o cost_usd"""
+    row["cost_usd"] = usage_cost(row["model"], row["prompt_tokens"], row["output_tokens"], row["cached_tokens"])
+    return row
+
+
+def callback_identity(callback_context) -> Tuple[str, str]:
+    """(user_id, session_id) z kontekstu callbacku ADK"""
+    invocation = getattr(callback_context, "_invocation_context", None)
+    user_id = getattr(callback_context, "user_id", None) or getattr(invocation, "user_id", None) or "default_user"
+    session = getattr(invocation, "session", None)
+    return user_id, getattr(session, "id", None) or "unknown"
+
+
+class TokenAccountant:
+    """Zapis zużycia tokenów i dzienny budżet użytkownika jako callbacki modelu ADK"""
+
+    def __init__(self, db, daily_budget: int = DAILY_TOKEN_BUDGET, fallback_model: str = FALLBACK_MODEL):
+        self.db = db
+        self.daily_budget = daily_budget
+        self.fallback_model = fallback_model
+        self._db_ready = False
+        # (user_id, dzień) -> (tokeny, czas odczytu z bazy); suma wszystkich workerów odświeżana co USAGE_REFRESH_SECONDS
+        self._daily: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        # invocation_id -> (model, szacowane tokeny instrukcji, czas) z before_model
+        self._requests: Dict[str, Tuple[str, int, float]] = {}
+        self._over_budget_logged: Set[Tuple[str, str]] = set()
+        self._day = date.today().isoformat()
+        self._writes: Set[asyncio.Task] = set()
+
+    async def _ensure_db(self):
+        if not self._db_ready:
+            await self.db.init_database()
+            self._db_ready = True
+
+    async def _tokens_today(self, user_id: str, day: str) -> int:
+        key = (user_id, day)
+        now = time.monotonic()
+        used, loaded_at = self._daily.get(key, (0, None))
+        ttl = 0.0 if used >= self.daily_budget * NEAR_BUDGET else USAGE_REFRESH_SECONDS
+        if loaded_at is None or now - loaded_at >= ttl:
+            await self._ensure_db()
+            stored = await self.db.get_user_tokens_for_day(user_id, day)
+            # Własne zapisy w tle mogą jeszcze nie być w bazie - nie cofamy licznika
+            used = max(used, stored)
+            self._daily[key] = (used, now)
+        return used
+
+    def _prune(self, day: str):
+        """Usuwa liczniki poprzednich dni i wywołania, które nie doczekały się odpowiedzi modelu"""
+        if day != self._day:
+            self._day = day
+            self._daily = {key: value for key, value in self._daily.items() if key[1] == day}
+            self._over_budget_logged = {key for key in self._over_budget_logged if key[1] == day}
+        stale = time.monotonic() - PENDING_REQUEST_TTL
+        for invocation_id in [key for key, request in self._requests.items() if request[2] < stale]:
+            del self._requests[invocation_id]
+
+    async def before_model_callback(self, callback_context, llm_request):
+        """Zapamiętuje model wywołania; po przekroczeniu budżetu podmienia go na FALLBACK_MODEL"""
+        user_id, _session_id = callback_identity(callback_context)
+        model = getattr(llm_request, "model", None) or "unknown"
+        config = getattr(llm_request, "config", None)
+        instruction = str(getattr(config, "system_instruction", None) or "")
+
+        day = date.today().isoformat()
+        self._prune(day)
+        if self.daily_budget and model != self.fallback_model:
+            try:
+                used = await self._tokens_today(user_id, day)
+            except Exception as e:
+                logger.warning("⚠️ Nie można odczytać zużycia tokenów: %s", e)
+                used = 0
+            if used >= self.daily_budget:
+                if (user_id, day) not in self._over_budget_logged:
+                    self._over_budget_logged.add((user_id, day))
+                    logger.info("💸 Użytkownik %s przekroczył dzienny budżet (%d/%d tokenów) - model %s",
+                                user_id, used, self.daily_budget, self.fallback_model)
+                llm_request.model = model = self.fallback_model
+
+        self._requests[callback_context.invocation_id] = (model, len(instruction) // CHARS_PER_TOKEN, time.monotonic())
+        return None
+
+    async def after_model_callback(self, callback_context, llm_response):
+        """Zlicza usage_metadata końcowej odpowiedzi; zapis do bazy w tle"""
+        usage = getattr(llm_response, "usage_metadata", None)
+        if usage is None or getattr(llm_response, "partial", False):
+            return None
+        user_id, session_id = callback_identity(callback_context)
+        model, instruction_tokens, _started = self._requests.pop(callback_context.invocation_id, (None, 0, 0.0))
+        model = model or getattr(llm_response, "model_version", None) or "unknown"
+        prompt_tokens = getattr(usage, "prompt_token_count", None) or 0
+        output_tokens = getattr(usage, "candidates_token_count", None) or 0
+        cached_tokens = getattr(usage, "cached_content_token_count", None) or 0
+
+        day = date.today().isoformat()
+        key = (user_id, day)
+        if key in self._daily:
+            used, loaded_at = self._daily[key]
+            self._daily[key] = (used + prompt_tokens + output_tokens, loaded_at)
+
+        task = asyncio.create_task(self._record(session_id, user_id, day, model, prompt_tokens,
+                                                output_tokens, cached_tokens, instruction_tokens))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        return None
+
+    async def _record(self, session_id: str, user_id: str, day: str, model: str, prompt_tokens: int,
+                      output_tokens: int, cached_tokens: int, instruction_tokens: int):
+        try:
+            await self._ensure_db()
+            await self.db.record_token_usage(session_id, user_id, day, model, prompt_tokens, output_tokens,
+                                             cached_tokens, instruction_tokens)
+        except Exception as e:
+            logger.warning("⚠️ Nie zapisano zużycia tokenów sesji %s: %s", session_id, e)
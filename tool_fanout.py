@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Równoległe wykonywanie niezależnych wywołań narzędzi z jednej odpowiedzi modelu
+after_model_callback startuje wszystkie wywołania tylko-do-odczytu naraz,
+before_tool_callback oddaje gotowy wynik - ADK składa odpowiedzi w kolejności wywołań
+"""
+
+import os
+import json
+import time
+import asyncio
+import inspect
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from agent_metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Narzędzia bez efektów ubocznych - bezpieczne do wykonania z wyprzedzeniem
+READ_ONLY_TOOLS = frozenset({
+    "get_current_datetime",
+    "get_calendar_events",
+    "get_gmail_messages",
+    "get_gmail_message_content",
+    "get_google_doc_content",
+    "list_google_docs",
+    "list_drawio_files",
+    "get_drawio_content",
+    "search_drawio_diagrams",
+})
+
+# Nieodebrane wyniki (np. przerwana tura) są usuwane po tym czasie
+_STALE_AFTER = 300.0
+
+
+def _call_key(name: str, args: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+    return name, json.dumps(dict(args or {}), sort_keys=True, default=str)
+
+
+class ToolFanout:
+    """Prefetch wywołań narzędzi z jednej odpowiedzi modelu, z limitem per tura"""
+
+    def __init__(self, tools: Iterable[Any], max_concurrency: Optional[int] = None,
+                 read_only: Iterable[str] = READ_ONLY_TOOLS):
+        self.max_concurrency = max_concurrency or int(os.getenv("AGENT_TOOL_FANOUT_CONCURRENCY", "4"))
+        self._functions: Dict[str, Callable] = {}
+        for tool in tools:
+            func = getattr(tool, "func", tool)
+            name = getattr(func, "__name__", None)
+            if name in read_only and inspect.iscoroutinefunction(func) \
+                    and "tool_context" not in inspect.signature(func).parameters:
+                self._functions[name] = func
+        # invocation_id -> (czas utworzenia, {klucz wywołania: kolejka zadań})
+        self._pending: Dict[str, Tuple[float, Dict[Tuple[str, str], deque]]] = {}
+
+    def _prune(self):
+        now = time.monotonic()
+        for invocation_id, (created, calls) in list(self._pending.items()):
+            if now - created > _STALE_AFTER:
+                for tasks in calls.values():
+                    for task in tasks:
+                        task.cancel()
+                del self._pending[invocation_id]
+
+    async def after_model_callback(self, callback_context, llm_response):
+        """Startuje równolegle niezależne wywołania z odpowiedzi modelu (nie zmienia odpowiedzi)"""
+        content = getattr(llm_response, "content", None)
+        if not content or not content.parts:
+            return None
+
+        calls = [part.function_call for part in content.parts
+                 if part.function_call and part.function_call.name in self._functions]
+        # Jedno wywołanie nic nie zyskuje na prefetchu
+        if len(calls) < 2:
+            return None
+
+        self._prune()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        _created, pending = self._pending.setdefault(callback_context.invocation_id, (time.monotonic(), {}))
+        for call in calls:
+            task = asyncio.create_task(self._run(semaphore, call.name, dict(call.args or {})))
+            pending.setdefault(_call_key(call.name, call.args), deque()).append(task)
+
+        logger.debug("⚡ Równolegle: %d wywołań (%s), limit %d",
+                     len(calls), ", ".join(call.name for call in calls), self.max_concurrency)
+        return None
+
+    async def _run(self, semaphore: asyncio.Semaphore, name: str, args: Dict[str, Any]):
+        async with semaphore:
+            return await self._functions[name](**args)
+
+    async def before_tool_callback(self, tool, args, tool_context) -> Optional[Dict[str, Any]]:
+        """Wynik z prefetchu zamiast ponownego wywołania (None = zwykłe wykonanie)"""
+        entry = self._pending.get(tool_context.invocation_id)
+        if entry is None:
+            return None
+        _created, pending = entry
+        key = _call_key(tool.name, args)
+        tasks = pending.get(key)
+        if not tasks:
+            return None
+
+        task = tasks.popleft()
+        if not tasks:
+            del pending[key]
+        if not pending:
+            del self._pending[tool_context.invocation_id]
+
+        try:
+            result = await task
+        except Exception as e:
+            # Błąd prefetchu - narzędzie wykona się normalnie
+            logger.debug("Prefetch %s nie powiódł się: %s", tool.name, e)
+            record_cache("tool_prefetch", hit=False)
+            return None
+        record_cache("tool_prefetch", hit=True)
+        # FunctionTool opakowuje wyniki nie-słownikowe tak samo
+        return result if isinstance(result, dict) else {"result": result}
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Kształtowanie wyników narzędzi przed przekazaniem do modelu (after_tool_callback)
+Projekcje pól per narzędzie, limity długości tekstów i list oraz ogólny budżet
+rozmiaru wyniku. Pełny wynik zostaje w pamięci pod uchwytem (_overflow.handle),
+a model dobiera resztę narzędziem get_more_tool_result.
+"""
+
+import os
+import copy
+import json
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent_metrics import TOOL_RESULT_CHARS
+
+logger = logging.getLogger(__name__)
+
+SHAPING_ENABLED = os.getenv("AGENT_TOOL_RESULT_SHAPING", "1").lower() in ("1", "true", "yes")
+# Budżet całego wyniku (znaki JSON) po projekcji
+RESULT_MAX_CHARS = int(os.getenv("AGENT_TOOL_RESULT_MAX_CHARS", "6000"))
+# Porcja zwracana przez get_more_tool_result
+FOLLOW_UP_CHARS = int(os.getenv("AGENT_TOOL_RESULT_FOLLOW_UP_CHARS", "4000"))
+OVERFLOW_TTL = float(os.getenv("AGENT_TOOL_RESULT_OVERFLOW_TTL", "1800"))
+OVERFLOW_MAX_ENTRIES = 256
+
+FOLLOW_UP_TOOL = "get_more_tool_result"
+
+# drop - pola pomijane; text - limit znaków; lists - limit elementów; items - reguły dla elementów listy
+TOOL_PROJECTIONS: Dict[str, Dict[str, Any]] = {
+    "get_gmail_message_content": {"drop": ["snippet"], "text": {"body": 2000}},
+    "get_gmail_messages": {"items": {"messages": {"drop": ["labels"], "text": {"snippet": 160}}}},
+    "get_calendar_events": {"items": {"events": {"text": {"description": 300}}}},
+    "get_google_doc_content": {"text": {"content": 3000}},
+    "get_drawio_content": {"drop": ["raw_content", "mime_type", "is_xml", "xml_root_tag"],
+                           "lists": {"diagram_texts": 40}},
+    "search_drawio_diagrams": {"items": {"files": {"drop": ["diagram_texts", "found_in_content"],
+                                                   "lists": {"matching_texts": 5}}}},
+}
+
+# Ogólny budżet nie skraca tekstów/list poniżej tych rozmiarów
+_MIN_TEXT_CHARS = 200
+_MIN_LIST_ITEMS = 5
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=str))
+
+
+def _get_path(value: Any, path: str) -> Any:
+    for key in path.split(".") if path else []:
+        if isinstance(value, list):
+            value = value[int(key)]
+        else:
+            value = value[key]
+    return value
+
+
+class _Shaping:
+    """Wynik w trakcie kształtowania z rejestrem skrótów (ścieżka -> pokazane/całość)"""
+
+    def __init__(self, response: Dict[str, Any]):
+        self.result = copy.deepcopy(response)
+        self.truncated: Dict[str, Dict[str, Any]] = {}
+        self.omitted: List[str] = []
+
+    def project(self, target: Dict[str, Any], spec: Dict[str, Any], prefix: str = ""):
+        for field in spec.get("drop", []):
+            if target.get(field) not in (None, "", [], {}):
+                self.omitted.append(prefix + field)
+            target.pop(field, None)
+        for field, limit in spec.get("text", {}).items():
+            self.cut(target, field, prefix + field, limit)
+        for field, limit in spec.get("lists", {}).items():
+            self.cut(target, field, prefix + field, limit)
+        for field, item_spec in spec.get("items", {}).items():
+            for index, item in enumerate(target.get(field) or []):
+                if isinstance(item, dict):
+                    self.project(item, item_spec, f"{prefix}{field}.{index}.")
+
+    def cut(self, container, key, path: str, limit: int) -> bool:
+        value = container[key] if isinstance(container, list) else container.get(key)
+        if not isinstance(value, (str, list)) or len(value) <= limit:
+            return False
+        container[key] = value[:limit]
+        total = self.truncated.get(path, {}).get("total", len(value))
+        self.truncated[path] = {"shown": limit, "total": total, "unit": "chars" if isinstance(value, str) else "items"}
+        return True
+
+    def _leaves(self, value: Any, path: str = "") -> List[Tuple[int, Any, Any, str]]:
+        """(rozmiar, kontener, klucz, ścieżka) tekstów i list dłuższych niż minimum"""
+        leaves = []
+        children = value.items() if isinstance(value, dict) else enumerate(value) if isinstance(value, list) else []
+        for key, child in children:
+            child_path = f"{path}{key}"
+            if isinstance(child, str) and len(child) > _MIN_TEXT_CHARS:
+                leaves.append((len(child), value, key, child_path))
+            elif isinstance(child, list):
+                if len(child) > _MIN_LIST_ITEMS:
+                    leaves.append((_size(child), value, key, child_path))
+                leaves.extend(self._leaves(child, child_path + "."))
+            elif isinstance(child, dict):
+                leaves.extend(self._leaves(child, child_path + "."))
+        return leaves
+
+    def fit(self, budget: int):
+        """Połowi największy tekst/listę, aż wynik zmieści się w budżecie"""
+        for _ in range(32):
+            if _size(self.result) <= budget:
+                return
+            leaves = self._leaves(self.result)
+            if not leaves:
+                return
+            _, container, key, path = max(leaves, key=lambda leaf: leaf[0])
+            value = container[key]
+            minimum = _MIN_TEXT_CHARS if isinstance(value, str) else _MIN_LIST_ITEMS
+            self.cut(container, key, path, max(len(value) // 2, minimum))
+
+
+class ToolResultShaper:
+    """Projekcje i budżety wyników narzędzi z magazynem pełnych wyników dla get_more_tool_result"""
+
+    def __init__(self, projections: Optional[Dict[str, Dict[str, Any]]] = None, max_chars: int = RESULT_MAX_CHARS):
+        self.projections = TOOL_PROJECTIONS if projections is None else projections
+        self.max_chars = max_chars
+        # uchwyt -> (czas zapisu, nazwa narzędzia, pełny wynik)
+        self._overflow: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+
+    def shape(self, tool_name: str, response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Wynik po projekcji i budżecie albo None, gdy nie trzeba nic skracać"""
+        shaping = _Shaping(response)
+        spec = self.projections.get(tool_name)
+        if spec:
+            shaping.project(shaping.result, spec)
+        shaping.fit(self.max_chars)
+        if not shaping.truncated and not shaping.omitted:
+            return None
+
+        handle = self._store(tool_name, response)
+        shaping.result["_overflow"] = {
+            "handle": handle,
+            "truncated": shaping.truncated,
+            "omitted": shaping.omitted,
+            "hint": f"Wynik skrócony. Resztę pola pobierz przez {FOLLOW_UP_TOOL}(handle, field, offset) "
+                    f"z offset = truncated[field].shown; pominięte pola tą samą ścieżką.",
+        }
+        return shaping.result
+
+    def _store(self, tool_name: str, response: Dict[str, Any]) -> str:
+        now = time.monotonic()
+        while self._overflow:
+            handle, (stored_at, _, _) = next(iter(self._overflow.items()))
+            if now - stored_at <= OVERFLOW_TTL and len(self._overflow) < OVERFLOW_MAX_ENTRIES:
+                break
+            del self._overflow[handle]
+        handle = f"res_{uuid.uuid4().hex[:12]}"
+        self._overflow[handle] = (now, tool_name, response)
+        return handle
+
+    def after_tool_callback(self, tool, args, tool_context, tool_response):
+        """after_tool_callback ADK: zwraca skrócony wynik (zastępuje oryginał) albo None"""
+        if not SHAPING_ENABLED or tool.name == FOLLOW_UP_TOOL or not isinstance(tool_response, dict) \
+                or tool_response.get("success") is False:
+            return None
+        shaped = self.shape(tool.name, tool_response)
+        raw_chars = _size(tool_response)
+        TOOL_RESULT_CHARS.labels(tool.name, "raw").inc(raw_chars)
+        TOOL_RESULT_CHARS.labels(tool.name, "shaped").inc(_size(shaped) if shaped else raw_chars)
+        if shaped is not None:
+            logger.debug("✂️ Wynik %s skrócony: %d -> %d znaków", tool.name, raw_chars, _size(shaped))
+        return shaped
+
+    def read_more(self, handle: str, field: str, offset: int = 0) -> Dict[str, Any]:
+        """Porcja pola pełnego wyniku od offset (znaki tekstu lub elementy listy)"""
+        entry = self._overflow.get(handle)
+        if entry is None:
+            return {"success": False, "error": "unknown_handle",
+                    "message": "Uchwyt wygasł lub nie istnieje - wywołaj ponownie oryginalne narzędzie"}
+        _, tool_name, response = entry
+        try:
+            value = _get_path(response, field)
+        except (KeyError, IndexError, ValueError, TypeError):
+            return {"success": False, "error": "unknown_field", "message": f"Brak pola {field} w wyniku {tool_name}"}
+
+        offset = max(offset, 0)
+        if isinstance(value, str):
+            part = value[offset:offset + FOLLOW_UP_CHARS]
+        elif isinstance(value, list):
+            part, used = [], 0
+            for item in value[offset:]:
+                used += _size(item)
+                if part and used > FOLLOW_UP_CHARS:
+                    break
+                part.append(item)
+        else:
+            return {"success": True, "tool": tool_name, "field": field, "value": value}
+        next_offset = offset + len(part)
+        return {
+            "success": True,
+            "tool": tool_name,
+            "field": field,
+            "offset": offset,
+            "value": part,
+            "total": len(value),
+            "next_offset": next_offset if next_offset < len(value) else None,
+        }
+
+    def follow_up_tool(self):
+        """Narzędzie ADK do pobierania skróconych części wyników"""
+
+        async def get_more_tool_result(handle: str, field: str, offset: int = 0) -> Dict[str, Any]:
+            """
+            Pobiera dalszą część wyniku narzędzia, który został skrócony (pole _overflow w wyniku).
+            Używaj tylko, gdy pokazana część nie wystarcza do odpowiedzi.
+
+            Args:
+                handle: uchwyt z _overflow.handle
+                field: ścieżka pola, np. "body", "diagram_texts" albo "files.0.diagram_texts"
+                offset: od którego znaku/elementu kontynuować (np. _overflow.truncated[field].shown)
+            """
+            return self.read_more(handle, field, offset)
+
+        return get_more_tool_result
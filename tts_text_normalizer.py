@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Normalizacja tekstu dla TTS (ElevenLabs i Google Cloud TTS)
+Usuwa emoji i markdown, rozwija liczby, daty, godziny i kwoty po polsku,
+dzieli tekst na zdania i buduje SSML z pauzami. Wyniki są memoizowane.
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+from xml.sax.saxutils import escape
+
+# === Liczebniki ===
+
+_UNITS = ["zero", "jeden", "dwa", "trzy", "cztery", "pięć", "sześć", "siedem", "osiem", "dziewięć"]
+_TEENS = ["dziesięć", "jedenaście", "dwanaście", "trzynaście", "czternaście", "piętnaście",
+          "szesnaście", "siedemnaście", "osiemnaście", "dziewiętnaście"]
+_TENS = ["", "", "dwadzieścia", "trzydzieści", "czterdzieści", "pięćdziesiąt",
+         "sześćdziesiąt", "siedemdziesiąt", "osiemdziesiąt", "dziewięćdziesiąt"]
+_HUNDREDS = ["", "sto", "dwieście", "trzysta", "czterysta", "pięćset",
+             "sześćset", "siedemset", "osiemset", "dziewięćset"]
+_SCALES = [
+    ("tysiąc", "tysiące", "tysięcy"),
+    ("milion", "miliony", "milionów"),
+    ("miliard", "miliardy", "miliardów"),
+]
+
+# Liczebniki porządkowe: dzień miesiąca (dopełniacz) i godzina (mianownik, rodzaj żeński)
+_DAY_ORDINALS = ["", "pierwszego", "drugiego", "trzeciego", "czwartego", "piątego", "szóstego",
+                 "siódmego", "ósmego", "dziewiątego", "dziesiątego", "jedenastego", "dwunastego",
+                 "trzynastego", "czternastego", "piętnastego", "szesnastego", "siedemnastego",
+                 "osiemnastego", "dziewiętnastego", "dwudziestego"]
+_HOUR_ORDINALS = ["zero", "pierwsza", "druga", "trzecia", "czwarta", "piąta", "szósta", "siódma",
+                  "ósma", "dziewiąta", "dziesiąta", "jedenasta", "dwunasta", "trzynasta",
+                  "czternasta", "piętnasta", "szesnasta", "siedemnasta", "osiemnasta",
+                  "dziewiętnasta", "dwudziesta"]
+_MONTHS = ["", "stycznia", "lutego", "marca", "kwietnia", "maja", "czerwca", "lipca",
+           "sierpnia", "września", "października", "listopada", "grudnia"]
+
+# Waluty: (mianownik lp., mianownik lm. 2-4, dopełniacz lm.) + jednostka setna
+_CURRENCIES = {
+    "zł": (("złoty", "złote", "złotych"), ("grosz", "grosze", "groszy")),
+    "pln": (("złoty", "złote", "złotych"), ("grosz", "grosze", "groszy")),
+    "usd": (("dolar", "dolary", "dolarów"), ("cent", "centy", "centów")),
+    "$": (("dolar", "dolary", "dolarów"), ("cent", "centy", "centów")),
+    "eur": (("euro", "euro", "euro"), ("cent", "centy", "centów")),
+    "€": (("euro", "euro", "euro"), ("cent", "centy", "centów")),
+}
+
+# Skróty, po których kropka nie kończy zdania
+_ABBREVIATIONS = frozenset({
+    "np", "itp", "itd", "tzn", "tj", "m.in", "godz", "ul", "dr", "prof", "ok", "wg", "nr",
+    "tel", "pkt", "r", "tys", "mln", "mld", "zob", "ds", "im", "al", "św", "inż", "mgr",
+})
+
+
+def plural_form(number: int, forms: Tuple[str, str, str]) -> str:
+    """Polska odmiana po liczebniku: 1 złoty, 2 złote, 5 złotych"""
+    if number == 1:
+        return forms[0]
+    if number % 10 in (2, 3, 4) and number % 100 not in (12, 13, 14):
+        return forms[1]
+    return forms[2]
+
+
+def _below_thousand(number: int) -> str:
+    words = []
+    hundreds, rest = divmod(number, 100)
+    if hundreds:
+        words.append(_HUNDREDS[hundreds])
+    if 10 <= rest < 20:
+        words.append(_TEENS[rest - 10])
+    else:
+        tens, units = divmod(rest, 10)
+        if tens:
+            words.append(_TENS[tens])
+        if units:
+            words.append(_UNITS[units])
+    return " ".join(words)
+
+
+def number_to_words(number: int) -> str:
+    """Liczba całkowita słownie (do 999 miliardów)"""
+    if number == 0:
+        return _UNITS[0]
+    if number < 0:
+        return "minus " + number_to_words(-number)
+
+    words = []
+    groups = []
+    while number:
+        number, group = divmod(number, 1000)
+        groups.append(group)
+    if len(groups) > len(_SCALES) + 1:
+        raise ValueError("Liczba poza zakresem")
+
+    for scale_index in range(len(groups) - 1, -1, -1):
+        group = groups[scale_index]
+        if not group:
+            continue
+        if scale_index == 0:
+            words.append(_below_thousand(group))
+            continue
+        forms = _SCALES[scale_index - 1]
+        # "tysiąc", nie "jeden tysiąc"
+        if group == 1:
+            words.append(forms[0])
+        else:
+            words.append(f"{_below_thousand(group)} {plural_form(group, forms)}")
+    return " ".join(words)
+
+
+def _day_ordinal(day: int) -> str:
+    if day <= 20:
+        return _DAY_ORDINALS[day]
+    tens, units = divmod(day, 10)
+    base = "dwudziestego" if tens == 2 else "trzydziestego"
+    return f"{base} {_DAY_ORDINALS[units]}" if units else base
+
+
+def _hour_ordinal(hour: int) -> str:
+    if hour <= 20:
+        return _HOUR_ORDINALS[hour]
+    return f"dwudziesta {_HOUR_ORDINALS[hour - 20]}"
+
+
+def _date_words(day: int, month: int, year: Optional[int]) -> Optional[str]:
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    words = f"{_day_ordinal(day)} {_MONTHS[month]}"
+    if year:
+        words += f" {number_to_words(year)}"
+    return words
+
+
+def _parse_number(digits: str) -> Tuple[int, Optional[str]]:
+    """'1 234,50' -> (1234, '50')"""
+    integer, _sep, fraction = _GROUP_SEPARATOR.sub("", digits).replace(",", ".").partition(".")
+    return int(integer), fraction or None
+
+
+def _decimal_words(integer: int, fraction: Optional[str]) -> str:
+    words = number_to_words(integer)
+    if fraction:
+        # "2,05" -> "dwa przecinek zero pięć"
+        leading_zeros = len(fraction) - len(fraction.lstrip("0"))
+        fraction_words = ["zero"] * leading_zeros
+        if fraction.strip("0"):
+            fraction_words.append(number_to_words(int(fraction)))
+        words += " przecinek " + " ".join(fraction_words)
+    return words
+
+
+def _amount_words(integer: int, fraction: Optional[str], currency: str) -> str:
+    main_forms, sub_forms = _CURRENCIES[currency.lower()]
+    words = f"{number_to_words(integer)} {plural_form(integer, main_forms)}"
+    if fraction:
+        cents = int(fraction[:2].ljust(2, "0"))
+        if cents:
+            words += f" {number_to_words(cents)} {plural_form(cents, sub_forms)}"
+    return words
+
+
+# === Wzorce (kompilowane raz) ===
+
+_EMOJI = (
+    "\U0001F000-\U0001FAFF"   # emoji, symbole, piktogramy, flagi
+    "\u2600-\u27BF"           # symbole różne i dingbaty
+    "\u2190-\u21FF\u2300-\u23FF\u2B00-\u2BFF"
+    "\uFE0F\u200D\u20E3"      # selektory wariantu, ZWJ, keycap
+)
+
+# Markdown na poziomie linii: nagłówki, cytaty, punkty list, separatory tabel
+_MARKDOWN_LINE = re.compile(r"^[ \t]*(?:#{1,6}[ \t]+|>[ \t]?|[-*+•][ \t]+|\d{1,2}[.)][ \t]+|\|?[ \t:|-]{3,}$)",
+                            re.MULTILINE)
+
+_GROUP_SEPARATOR = re.compile("[ \u00a0]")
+_NUMBER = r"\d{1,3}(?:[ \u00a0]\d{3})+(?:[.,]\d+)?|\d+(?:[.,]\d+)?"
+_CURRENCY_SUFFIX = r"zł|PLN|USD|EUR|€|\$"
+
+# Jeden wzorzec tokenów - jedno przejście re.sub z dispatchem po nazwie grupy
+_TOKENS = re.compile(
+    rf"(?P<emoji>[{_EMOJI}]+)"
+    r"|(?P<link>\[(?P<link_text>[^\]]*)\]\([^)]*\))"
+    r"|(?P<url>https?://\S+|www\.\S+)"
+    r"|(?P<emphasis>\*\*|__|`+|~~|(?<!\w)[*_](?=\S)|(?<=\S)[*_](?!\w))"
+    r"|(?P<date_iso>\b(?P<iso_y>\d{4})-(?P<iso_m>\d{1,2})-(?P<iso_d>\d{1,2})\b)"
+    r"|(?P<date_dmy>\b(?P<dmy_d>\d{1,2})\.(?P<dmy_m>\d{1,2})\.(?P<dmy_y>\d{4})\b)"
+    r"|(?P<time>\b(?P<hour>[01]?\d|2[0-3]):(?P<minute>[0-5]\d)\b)"
+    rf"|(?P<currency_prefix>(?P<prefix_symbol>[$€])[ \u00a0]?(?P<prefix_amount>{_NUMBER}))"
+    rf"|(?P<amount>(?P<amount_number>{_NUMBER})(?:[ \u00a0]?(?P<percent>%)|[ \u00a0]?(?P<currency>{_CURRENCY_SUFFIX})(?!\w))?)"
+    r"|(?P<table>[ \t]*\|[ \t]*)"
+)
+
+_WHITESPACE = re.compile(r"[ \t\u00a0]+")
+_SPACE_BEFORE_PUNCT = re.compile(r"\s+([,.!?;:…])")
+_SENTENCE_END = re.compile(r"([.!?…]+)[\"”»)]*\s+")
+
+
+def _replace_token(match: "re.Match") -> str:
+    kind = match.lastgroup
+    if kind == "link":
+        return match.group("link_text")
+    if kind in ("emoji", "url", "emphasis"):
+        return ""
+    if kind == "table":
+        return ", "
+    if kind == "date_iso":
+        words = _date_words(int(match.group("iso_d")), int(match.group("iso_m")), int(match.group("iso_y")))
+        return words or match.group(0)
+    if kind == "date_dmy":
+        words = _date_words(int(match.group("dmy_d")), int(match.group("dmy_m")), int(match.group("dmy_y")))
+        return words or match.group(0)
+    if kind == "time":
+        hour, minute = int(match.group("hour")), int(match.group("minute"))
+        if minute == 0:
+            return _hour_ordinal(hour)
+        minute_words = number_to_words(minute) if minute >= 10 else f"zero {_UNITS[minute]}"
+        return f"{_hour_ordinal(hour)} {minute_words}"
+    if kind == "currency_prefix":
+        integer, fraction = _parse_number(match.group("prefix_amount"))
+        return _amount_words(integer, fraction, match.group("prefix_symbol"))
+
+    # amount: liczba, procent lub kwota z walutą po liczbie
+    integer, fraction = _parse_number(match.group("amount_number"))
+    if integer >= 10 ** 12:
+        return match.group(0)
+    if match.group("currency"):
+        return _amount_words(integer, fraction, match.group("currency"))
+    words = _decimal_words(integer, fraction)
+    if match.group("percent"):
+        words += " procent"
+    return words
+
+
+def _strip_markdown_lines(text: str) -> str:
+    """Linie list i nagłówków stają się osobnymi zdaniami"""
+    lines = []
+    for line in _MARKDOWN_LINE.sub("", text).splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line[-1] not in ".!?…:;,":
+            line += "."
+        lines.append(line)
+    return " ".join(lines)
+
+
+@lru_cache(maxsize=1024)
+def normalize_text(text: str) -> str:
+    """Tekst gotowy do syntezy: bez emoji i markdown, liczby i kwoty słownie"""
+    text = _strip_markdown_lines(text)
+    text = _TOKENS.sub(_replace_token, text)
+    text = _WHITESPACE.sub(" ", text)
+    text = _SPACE_BEFORE_PUNCT.sub(r"\1", text)
+    return text.strip(" ,;:")
+
+
+def _split_sentences(text: str) -> Tuple[str, ...]:
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        candidate = text[start:match.end()].strip()
+        last_word = candidate.rstrip(".!?…\"”») ").rsplit(" ", 1)[-1].lower()
+        # Kropka po skrócie ("np.", "m.in.") nie kończy zdania
+        if match.group(1) == "." and last_word in _ABBREVIATIONS:
+            continue
+        if candidate:
+            sentences.append(candidate)
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return tuple(sentences)
+
+
+@lru_cache(maxsize=1024)
+def speech_sentences(text: str, max_chars: Optional[int] = None) -> Tuple[str, ...]:
+    """
+    Znormalizowany tekst podzielony na zdania
+
+    Args:
+        text: Surowa odpowiedź agenta
+        max_chars: Limit długości (całe zdania; zawsze co najmniej jedno)
+    """
+    sentences = _split_sentences(normalize_text(text))
+    if max_chars is None:
+        return sentences
+
+    kept = []
+    length = 0
+    for sentence in sentences:
+        if kept and length + len(sentence) > max_chars:
+            break
+        kept.append(sentence)
+        length += len(sentence) + 1
+    return tuple(kept)
+
+
+def prepare_for_tts(text: str, max_chars: Optional[int] = None) -> str:
+    """Zwykły tekst dla silników bez SSML (ElevenLabs)"""
+    return " ".join(speech_sentences(text, max_chars))
+
+
+def to_ssml(sentences: Iterable[str], break_ms: int = 300) -> str:
+    """SSML z pauzą między zdaniami (Google Cloud TTS)"""
+    pause = f'<break time="{break_ms}ms"/>'
+    body = pause.join(escape(sentence) for sentence in sentences)
+    return f"<speak>{body}</speak>"
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+"""
+Lokalny mirror Gmail i Google Calendar aktualizowany przyrostowo
+Gmail: history.list od zapamiętanego historyId, Calendar: syncToken.
+Push (Pub/Sub dla Gmail, kanały web_hook dla Calendar) tylko budzi synchronizację,
+a odczyty narzędzi idą z SQLite - wywołania API rosną z liczbą zmian, nie pytań
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import aiosqlite
+from googleapiclient.errors import HttpError
+
+from admission_control import execute_with_limit
+from agent_metrics import record_cache
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows - bez wyboru lidera, synchronizuje każdy proces
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+GMAIL = "gmail"
+CALENDAR = "calendar"
+
+# Konto OAuth2 z token.json (custom_google_tools) i konto Service Account (GoogleCloudManager)
+OAUTH_ACCOUNT = "me"
+SERVICE_ACCOUNT = "service_account"
+
+SYNC_ENABLED = os.getenv("WORKSPACE_SYNC_ENABLED", "0").lower() in ("1", "true", "yes")
+# Okno mirrora: poczta z ostatnich N dni (+ wszystkie nieprzeczytane), kalendarz od wczoraj do +N dni
+MAIL_DAYS = int(os.getenv("WORKSPACE_MAIL_DAYS", "14"))
+CALENDAR_DAYS = int(os.getenv("WORKSPACE_CALENDAR_DAYS", "30"))
+# Bez push: przyrostowa synchronizacja co tyle sekund (z push: siatka bezpieczeństwa)
+POLL_SECONDS = float(os.getenv("WORKSPACE_SYNC_POLL_SECONDS", "120"))
+# Jak często sprawdzamy lokalnie flagę "dirty" ustawianą przez webhook
+CHECK_SECONDS = 2.0
+# Pełna synchronizacja raz na dobę przesuwa okno i czyści stare wpisy
+FULL_RESYNC_SECONDS = 24 * 3600
+# Mirror starszy niż to nie obsługuje odczytów (synchronizator nie działa)
+MAX_STALENESS = max(2 * POLL_SECONDS, 60.0)
+
+METADATA_HEADERS = ["From", "Subject", "Date"]
+# Poczta poza domyślnym widokiem messages.list
+_HIDDEN_LABELS = {"SPAM", "TRASH"}
+
+Execute = Callable[[Any, str], Awaitable[Dict[str, Any]]]
+
+
+class _CursorExpired(Exception):
+    """historyId / syncToken nieważny - potrzebna pełna synchronizacja"""
+
+
+def _default_execute(request, upstream: str):
+    return execute_with_limit(upstream, request.execute)
+
+
+def _to_ms(value: str) -> int:
+    """RFC3339 lub data całodniowa -> epoch ms"""
+    if len(value) == 10:
+        moment = datetime.fromisoformat(value).astimezone()
+    else:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+# === Magazyn mirrora (SQLite) ===
+
+class WorkspaceMirror:
+    """Mirror metadanych poczty i wydarzeń kalendarza jednego konta w SQLite"""
+
+    def __init__(self, db_path: str = "chat_sessions.db", account: str = OAUTH_ACCOUNT):
+        self.db_path = db_path
+        self.account = account
+        self._initialized = False
+
+    async def init(self):
+        if self._initialized:
+            return
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS mail_mirror (
+                    account TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    internal_date INTEGER NOT NULL,
+                    unread INTEGER NOT NULL DEFAULT 0,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (account, id)
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS calendar_mirror (
+                    account TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    start_ms INTEGER NOT NULL,
+                    end_ms INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (account, id)
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS workspace_sync_state (
+                    account TEXT NOT NULL,
+                    resource TEXT NOT NULL,
+                    cursor TEXT,
+                    window_start INTEGER,
+                    window_end INTEGER,
+                    full_synced_at INTEGER,
+                    synced_at INTEGER,
+                    dirty INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (account, resource)
+                )
+            """)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_mail_mirror_date ON mail_mirror(account, internal_date DESC)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_calendar_mirror_start ON calendar_mirror(account, start_ms)")
+            await db.commit()
+        self._initialized = True
+
+    async def state(self, resource: str) -> Optional[Dict[str, Any]]:
+        await self.init()
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(
+                "SELECT * FROM workspace_sync_state WHERE account = ? AND resource = ?", (self.account, resource)
+            )
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+
+    async def mark_dirty(self, resource: str):
+        """Powiadomienie push - synchronizator podejmie zmiany przy najbliższym sprawdzeniu"""
+        await self.init()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                INSERT INTO workspace_sync_state (account, resource, dirty) VALUES (?, ?, 1)
+                ON CONFLICT(account, resource) DO UPDATE SET dirty = 1
+            """, (self.account, resource))
+            await db.commit()
+
+    async def clear_dirty(self, resource: str):
+        """Przed synchronizacją - powiadomienie w jej trakcie wywoła kolejną"""
+        await self.init()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("UPDATE workspace_sync_state SET dirty = 0 WHERE account = ? AND resource = ?",
+                             (self.account, resource))
+            await db.commit()
+
+    async def is_fresh(self, resource: str) -> bool:
+        state = await self.state(resource)
+        if not state or not state["cursor"] or not state["synced_at"]:
+            return False
+        return (_now_ms() - state["synced_at"]) / 1000 <= MAX_STALENESS
+
+    async def _save_state(self, db, resource: str, cursor: str, full: bool,
+                          window_start: Optional[int] = None, window_end: Optional[int] = None):
+        now = _now_ms()
+        if full:
+            await db.execute("""
+                INSERT INTO workspace_sync_state
+                    (account, resource, cursor, window_start, window_end, full_synced_at, synced_at, dirty)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                ON CONFLICT(account, resource) DO UPDATE SET
+                    cursor = excluded.cursor, window_start = excluded.window_start,
+                    window_end = excluded.window_end, full_synced_at = excluded.full_synced_at,
+                    synced_at = excluded.synced_at
+            """, (self.account, resource, cursor, window_start, window_end, now, now))
+        else:
+            await db.execute("""
+                UPDATE workspace_sync_state SET cursor = ?, synced_at = ?
+                WHERE account = ? AND resource = ?
+            """, (cursor, now, self.account, resource))
+
+    # === Poczta ===
+
+    def _mail_row(self, message: Dict[str, Any]):
+        return (self.account, message["id"], message["internal_date"],
+                int("UNREAD" in message["labels"]), json.dumps(message))
+
+    async def replace_mail(self, messages: List[Dict[str, Any]], history_id: str):
+        await self.init()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("DELETE FROM mail_mirror WHERE account = ?", (self.account,))
+            await db.executemany("INSERT OR REPLACE INTO mail_mirror VALUES (?, ?, ?, ?, ?)",
+                                 [self._mail_row(message) for message in messages])
+            await self._save_state(db, GMAIL, history_id, full=True)
+            await db.commit()
+
+    async def apply_mail(self, upserts: List[Dict[str, Any]], deletes: Iterable[str], history_id: str):
+        await self.init()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany("DELETE FROM mail_mirror WHERE account = ? AND id = ?",
+                                 [(self.account, message_id) for message_id in deletes])
+            await db.executemany("INSERT OR REPLACE INTO mail_mirror VALUES (?, ?, ?, ?, ?)",
+                                 [self._mail_row(message) for message in upserts])
+            await self._save_state(db, GMAIL, history_id, full=False)
+            await db.commit()
+
+    async def known_messages(self, message_ids: Iterable[str]) -> Set[str]:
+        """Identyfikatory, które mirror już trzyma (z podanych)"""
+        await self.init()
+        message_ids, known = list(message_ids), set()
+        async with aiosqlite.connect(self.db_path) as db:
+            # Limit parametrów SQLite
+            for start in range(0, len(message_ids), 500):
+                batch = message_ids[start:start + 500]
+                cursor = await db.execute(
+                    f"SELECT id FROM mail_mirror WHERE account = ? AND id IN ({', '.join('?' * len(batch))})",
+                    (self.account, *batch)
+                )
+                known.update(row[0] for row in await cursor.fetchall())
+        return known
+
+    async def recent_messages(self, unread_only: bool = False, limit: int = 10) -> List[Dict[str, Any]]:
+        await self.init()
+        query = "SELECT payload FROM mail_mirror WHERE account = ?"
+        if unread_only:
+            query += " AND unread = 1"
+        query += " ORDER BY internal_date DESC LIMIT ?"
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(query, (self.account, limit))
+            return [json.loads(row[0]) for row in await cursor.fetchall()]
+
+    # === Kalendarz ===
+
+    def _event_row(self, event: Dict[str, Any]):
+        return (self.account, event["id"], _to_ms(event["start"]), _to_ms(event["end"]), json.dumps(event))
+
+    async def replace_events(self, events: List[Dict[str, Any]], sync_token: str, window_start: int, window_end: int):
+        await self.init()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("DELETE FROM calendar_mirror WHERE account = ?", (self.account,))
+            await db.executemany("INSERT OR REPLACE INTO calendar_mirror VALUES (?, ?, ?, ?, ?)",
+                                 [self._event_row(event) for event in events])
+            await self._save_state(db, CALENDAR, sync_token, full=True,
+                                   window_start=window_start, window_end=window_end)
+            await db.commit()
+
+    async def apply_events(self, upserts: List[Dict[str, Any]], deletes: Iterable[str], sync_token: str):
+        await self.init()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany("DELETE FROM calendar_mirror WHERE account = ? AND id = ?",
+                                 [(self.account, event_id) for event_id in deletes])
+            await db.executemany("INSERT OR REPLACE INTO calendar_mirror VALUES (?, ?, ?, ?, ?)",
+                                 [self._event_row(event) for event in upserts])
+            await self._save_state(db, CALENDAR, sync_token, full=False)
+            await db.commit()
+
+    async def events_between(self, time_min: str, time_max: str, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Wydarzenia nachodzące na zakres; None gdy zakres wychodzi poza okno mirrora"""
+        state = await self.state(CALENDAR)
+        start_ms, end_ms = _to_ms(time_min), _to_ms(time_max)
+        if not state or state["window_start"] is None or start_ms < state["window_start"] or end_ms > state["window_end"]:
+            return None
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute("""
+                SELECT payload FROM calendar_mirror
+                WHERE account = ? AND end_ms > ? AND start_ms < ?
+                ORDER BY start_ms LIMIT ?
+            """, (self.account, start_ms, end_ms, limit))
+            return [json.loads(row[0]) for row in await cursor.fetchall()]
+
+
+# === Synchronizacja z Google ===
+
+def _format_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadane wiadomości w kształcie wyniku get_gmail_messages"""
+    headers = message.get("payload", {}).get("headers", [])
+    header = lambda name, default: next((h["value"] for h in headers if h["name"] == name), default)
+    return {
+        "id": message["id"],
+        "subject": header("Subject", "Bez tematu"),
+        "sender": header("From", "Nieznany nadawca"),
+        "date": header("Date", ""),
+        "snippet": message.get("snippet", ""),
+        "labels": message.get("labelIds", []),
+        "internal_date": int(message.get("internalDate", 0)),
+    }
+
+
+def _format_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Wydarzenie w kształcie wyniku get_calendar_events"""
+    return {
+        "id": event.get("id"),
+        "summary": event.get("summary", "Bez tytułu"),
+        "start": event["start"].get("dateTime", event["start"].get("date")),
+        "end": event["end"].get("dateTime", event["end"].get("date")),
+        "description": event.get("description", ""),
+        "location": event.get("location", ""),
+        "attendees": [att.get("email") for att in event.get("attendees", [])],
+    }
+
+
+class WorkspaceSync:
+    """
+    Synchronizator mirrora: pełna synchronizacja raz na dobę, potem tylko delty
+
+    W procesach z wieloma workerami synchronizuje tylko właściciel blokady pliku;
+    pozostałe procesy czytają ten sam mirror z SQLite.
+    """
+
+    def __init__(self, gmail_service, calendar_service, mirror: Optional[WorkspaceMirror] = None,
+                 execute: Optional[Execute] = None, poll_interval: float = POLL_SECONDS):
+        self.gmail = gmail_service
+        self.calendar = calendar_service
+        self.mirror = mirror or WorkspaceMirror()
+        self.execute = execute or _default_execute
+        self.poll_interval = poll_interval
+        self._locks = {GMAIL: asyncio.Lock(), CALENDAR: asyncio.Lock()}
+        self._task: Optional[asyncio.Task] = None
+        self._leader_file = None
+        # Kanały push: zasób -> {"expiration": ms, ...}
+        self._channels: Dict[str, Dict[str, Any]] = {}
+        # Zasoby, dla których już ostrzegliśmy o braku tokenu webhooka
+        self._push_refused: Set[str] = set()
+
+    # === Cykl życia ===
+
+    def start(self):
+        """Uruchamia synchronizację w tle (idempotentne)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for resource in list(self._channels):
+            await self._stop_channel(resource)
+
+    def _acquire_leadership(self) -> bool:
+        if not FCNTL_AVAILABLE or self._leader_file is not None:
+            return True
+        lock_file = open(f"{self.mirror.db_path}.{self.mirror.account}.sync.lock", "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._leader_file = lock_file
+        return True
+
+    async def _run(self):
+        await self.mirror.init()
+        while not self._acquire_leadership():
+            # Inny worker synchronizuje - przejmiemy, gdy zakończy działanie
+            await asyncio.sleep(self.poll_interval)
+        logger.info("🔁 Synchronizacja Workspace (%s): delty co %.0fs lub po powiadomieniu push",
+                    self.mirror.account, self.poll_interval)
+
+        while True:
+            for resource in (GMAIL, CALENDAR):
+                try:
+                    state = await self.mirror.state(resource)
+                    due = not state or not state["synced_at"] or state["dirty"] \
+                        or (_now_ms() - state["synced_at"]) / 1000 >= self.poll_interval
+                    if due:
+                        if state and state["dirty"]:
+                            await self.mirror.clear_dirty(resource)
+                        await self.sync(resource)
+                    await self._renew_channel(resource)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("⚠️ Synchronizacja %s nie powiodła się: %s", resource, e)
+            await asyncio.sleep(CHECK_SECONDS)
+
+    async def sync(self, resource: str) -> int:
+        """Synchronizuje zasób (przyrostowo, a gdy kursor wygasł - w całości); zwraca liczbę zmian"""
+        async with self._locks[resource]:
+            state = await self.mirror.state(resource)
+            full_due = not state or not state["cursor"] or not state["full_synced_at"] \
+                or (_now_ms() - state["full_synced_at"]) / 1000 >= FULL_RESYNC_SECONDS
+            if not full_due:
+                try:
+                    return await self._incremental(resource, state["cursor"])
+                except _CursorExpired:
+                    logger.info("🔁 Kursor %s wygasł - pełna synchronizacja", resource)
+            return await self._full(resource)
+
+    async def _incremental(self, resource: str, cursor: str) -> int:
+        if resource == GMAIL:
+            return await self._gmail_incremental(cursor)
+        return await self._calendar_incremental(cursor)
+
+    async def _full(self, resource: str) -> int:
+        if resource == GMAIL:
+            return await self._gmail_full()
+        return await self._calendar_full()
+
+    # === Gmail ===
+
+    async def _fetch_messages(self, message_ids: Iterable[str]):
+        """Metadane wiadomości; usunięte w międzyczasie są pomijane"""
+        async def fetch(message_id: str):
+            try:
+                return await self.execute(self.gmail.users().messages().get(
+                    userId="me", id=message_id, format="metadata", metadataHeaders=METADATA_HEADERS
+                ), "gmail")
+            except HttpError as e:
+                if e.resp.status == 404:
+                    return None
+                raise
+
+        results = await asyncio.gather(*(fetch(message_id) for message_id in message_ids))
+        return [_format_message(message) for message in results if message is not None]
+
+    async def _gmail_full(self) -> int:
+        # historyId przed listowaniem - zmiany w trakcie trafią do pierwszej delty
+        profile = await self.execute(self.gmail.users().getProfile(userId="me"), "gmail")
+        message_ids, page_token = [], None
+        while True:
+            response = await self.execute(self.gmail.users().messages().list(
+                userId="me", q=f"newer_than:{MAIL_DAYS}d OR is:unread", maxResults=500, pageToken=page_token
+            ), "gmail")
+            message_ids.extend(message["id"] for message in response.get("messages", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+
+        messages = await self._fetch_messages(message_ids)
+        await self.mirror.replace_mail(messages, str(profile["historyId"]))
+        logger.info("📧 Mirror Gmail: pełna synchronizacja, %d wiadomości", len(messages))
+        return len(messages)
+
+    async def _gmail_incremental(self, history_id: str) -> int:
+        changed, relabeled, deleted, page_token, latest = set(), set(), set(), None, history_id
+        while True:
+            try:
+                response = await self.execute(self.gmail.users().history().list(
+                    userId="me", startHistoryId=history_id, pageToken=page_token,
+                    historyTypes=["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+                ), "gmail")
+            except HttpError as e:
+                if e.resp.status == 404:
+                    raise _CursorExpired() from e
+                raise
+            for record in response.get("history", []):
+                changed.update(item["message"]["id"] for item in record.get("messagesAdded", []))
+                for key in ("labelsAdded", "labelsRemoved"):
+                    relabeled.update(item["message"]["id"] for item in record.get(key, []))
+                deleted.update(item["message"]["id"] for item in record.get("messagesDeleted", []))
+            latest = str(response.get("historyId", latest))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+
+        # Zmiana etykiet starej poczty spoza okna mirrora nie może jej do niego dopisać
+        changed |= await self.mirror.known_messages(relabeled - changed)
+        changed -= deleted
+        messages = await self._fetch_messages(changed)
+        fetched = {message["id"] for message in messages}
+        hidden = {message["id"] for message in messages if _HIDDEN_LABELS.intersection(message["labels"])}
+        upserts = [message for message in messages if message["id"] not in hidden]
+        deleted |= (changed - fetched) | hidden
+        await self.mirror.apply_mail(upserts, deleted, latest)
+        if upserts or deleted:
+            logger.debug("📧 Mirror Gmail: +%d / -%d", len(upserts), len(deleted))
+        return len(upserts) + len(deleted)
+
+    # === Calendar ===
+
+    async def _calendar_pages(self, **params):
+        events, page_token = [], None
+        while True:
+            try:
+                response = await self.execute(self.calendar.events().list(
+                    calendarId="primary", singleEvents=True, maxResults=250, pageToken=page_token, **params
+                ), "calendar")
+            except HttpError as e:
+                if e.resp.status == 410:
+                    raise _CursorExpired() from e
+                raise
+            events.extend(response.get("items", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return events, response.get("nextSyncToken")
+
+    async def _calendar_full(self) -> int:
+        today = datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+        window_start, window_end = today - timedelta(days=1), today + timedelta(days=CALENDAR_DAYS)
+        items, sync_token = await self._calendar_pages(
+            timeMin=window_start.isoformat(), timeMax=window_end.isoformat()
+        )
+        events = [_format_event(item) for item in items if item.get("status") != "cancelled"]
+        await self.mirror.replace_events(events, sync_token, int(window_start.timestamp() * 1000),
+                                         int(window_end.timestamp() * 1000))
+        logger.info("📅 Mirror Calendar: pełna synchronizacja, %d wydarzeń", len(events))
+        return len(events)
+
+    async def _calendar_incremental(self, sync_token: str) -> int:
+        items, next_token = await self._calendar_pages(syncToken=sync_token)
+        deletes = [item["id"] for item in items if item.get("status") == "cancelled"]
+        upserts = [_format_event(item) for item in items if item.get("status") != "cancelled"]
+        await self.mirror.apply_events(upserts, deletes, next_token or sync_token)
+        if items:
+            logger.debug("📅 Mirror Calendar: +%d / -%d", len(upserts), len(deletes))
+        return len(items)
+
+    # === Kanały push ===
+
+    async def _renew_channel(self, resource: str):
+        """Rejestruje/odnawia kanał push, gdy skonfigurowany (dzień przed wygaśnięciem)"""
+        channel = self._channels.get(resource)
+        if channel and channel["expiration"] - _now_ms() > 24 * 3600 * 1000:
+            return
+        token = os.getenv("WORKSPACE_WEBHOOK_TOKEN")
+        if resource == GMAIL:
+            topic = os.getenv("GMAIL_PUBSUB_TOPIC")
+            if not topic or not self._push_token_set(resource, token):
+                return
+            response = await self.execute(self.gmail.users().watch(
+                userId="me", body={"topicName": topic, "labelIds": ["INBOX"]}
+            ), "gmail")
+            self._channels[GMAIL] = {"expiration": int(response["expiration"])}
+        else:
+            address = os.getenv("WORKSPACE_WEBHOOK_URL")
+            if not address or not self._push_token_set(resource, token):
+                return
+            await self._stop_channel(CALENDAR)
+            body = {"id": uuid.uuid4().hex, "type": "web_hook", "token": token,
+                    "address": f"{address.rstrip('/')}/api/workspace/notifications/{self.mirror.account}/calendar"}
+            response = await self.execute(self.calendar.events().watch(calendarId="primary", body=body), "calendar")
+            self._channels[CALENDAR] = {"expiration": int(response["expiration"]),
+                                        "id": response["id"], "resourceId": response["resourceId"]}
+        logger.info("📡 Kanał push %s ważny do %s", resource,
+                    datetime.fromtimestamp(self._channels[resource]["expiration"] / 1000))
+
+    def _push_token_set(self, resource: str, token: Optional[str]) -> bool:
+        """Webhook session_api odrzuca powiadomienia bez WORKSPACE_WEBHOOK_TOKEN - kanał byłby bezużyteczny"""
+        if token:
+            return True
+        if resource not in self._push_refused:
+            self._push_refused.add(resource)
+            logger.warning("⚠️ Kanał push %s nie zarejestrowany: brak WORKSPACE_WEBHOOK_TOKEN", resource)
+        return False
+
+    async def _stop_channel(self, resource: str):
+        channel = self._channels.pop(resource, None)
+        if not channel:
+            return
+        try:
+            if resource == GMAIL:
+                await self.execute(self.gmail.users().stop(userId="me"), "gmail")
+            else:
+                await self.execute(self.calendar.channels().stop(
+                    body={"id": channel["id"], "resourceId": channel["resourceId"]}
+                ), "calendar")
+        except Exception as e:
+            logger.debug("Zamknięcie kanału %s: %s", resource, e)
+
+
+# === Odczyty z mirrora ===
+
+_mirrors: Dict[str, WorkspaceMirror] = {}
+
+
+def get_mirror(account: str = OAUTH_ACCOUNT) -> Optional[WorkspaceMirror]:
+    """Mirror konta (None gdy synchronizacja wyłączona)"""
+    if not SYNC_ENABLED:
+        return None
+    if account not in _mirrors:
+        _mirrors[account] = WorkspaceMirror(os.getenv("WORKSPACE_MIRROR_DB", "chat_sessions.db"), account)
+    return _mirrors[account]
+
+
+async def read_messages(mirror: Optional[WorkspaceMirror], unread_only: bool,
+                        limit: int) -> Optional[List[Dict[str, Any]]]:
+    """Wiadomości z mirrora albo None (brak świeżego mirrora - trzeba zapytać API)"""
+    try:
+        if mirror is None:
+            return None
+        messages = await mirror.recent_messages(unread_only, limit) if await mirror.is_fresh(GMAIL) else None
+    except Exception as e:
+        logger.debug("Mirror Gmail niedostępny: %s", e)
+        messages = None
+    # Okno mirrora obejmuje wszystkie nieprzeczytane, ale tylko ostatnie dni pozostałej poczty
+    if messages is not None and not unread_only and len(messages) < limit:
+        messages = None
+    record_cache("gmail_mirror", hit=messages is not None)
+    return messages
+
+
+async def read_events(mirror: Optional[WorkspaceMirror], time_min: str, time_max: str,
+                      limit: int) -> Optional[List[Dict[str, Any]]]:
+    """Wydarzenia z mirrora albo None (zakres poza oknem lub brak świeżego mirrora)"""
+    try:
+        if mirror is None:
+            return None
+        events = await mirror.events_between(time_min, time_max, limit) if await mirror.is_fresh(CALENDAR) else None
+    except Exception as e:
+        logger.debug("Mirror Calendar niedostępny: %s", e)
+        events = None
+    record_cache("calendar_mirror", hit=events is not None)
+    return events
+
+
+def oauth_workspace_sync() -> WorkspaceSync:
+    """Synchronizator dla konta OAuth2 z token.json (klienci i tokeny z custom_google_tools)"""
+    from custom_google_tools import CustomGoogleTools, _execute
+    tools = CustomGoogleTools()
+    return WorkspaceSync(tools.gmail_service, tools.calendar_service, get_mirror(OAUTH_ACCOUNT), execute=_execute)
+
+
+# Lokalny zamiennik powiadomień push (testy i development):
+#   python workspace_sync.py notify gmail|calendar  - jak webhook, oznacza zasób do synchronizacji
+#   python workspace_sync.py sync                   - jednorazowa synchronizacja konta OAuth2
+if __name__ == "__main__":
+    async def _main(command: str, resource: Optional[str]):
+        mirror = WorkspaceMirror(os.getenv("WORKSPACE_MIRROR_DB", "chat_sessions.db"))
+        if command == "notify":
+            await mirror.mark_dirty(resource)
+            print(f"📨 Oznaczono {resource} do synchronizacji")
+        elif command == "sync":
+            from custom_google_tools import CustomGoogleTools, _execute
+            tools = CustomGoogleTools()
+            sync = WorkspaceSync(tools.gmail_service, tools.calendar_service, mirror, execute=_execute)
+            for name in (GMAIL, CALENDAR):
+                print(f"🔁 {name}: {await sync.sync(name)} zmian")
+
+    args = sys.argv[1:]
+    if not args or args[0] not in ("notify", "sync") or (args[0] == "notify" and
+                                                          (len(args) < 2 or args[1] not in (GMAIL, CALENDAR))):
+        print("Użycie: python workspace_sync.py notify gmail|calendar | sync")
+        sys.exit(1)
+    asyncio.run(_main(args[0], args[1] if len(args) > 1 else None))
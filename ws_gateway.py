@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Wspólna bramka WebSocket dla wszystkich agentów (ADK, Enhanced, Simple, Avatar)
+Jedna pętla accept, wersjonowany protokół ramek, permessage-deflate i binarne ramki audio
+"""
+
+import os
+import json
+import base64
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlparse, parse_qs
+
+import websockets
+
+from agent_metrics import CONNECTED_CLIENTS, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+# Wersja protokołu - każda ramka JSON niesie pole "v"
+PROTOCOL_VERSION = 1
+
+# Tryby dostarczania audio: binarne ramki (nowi klienci) lub base64 w JSON (stare UI)
+AUDIO_BINARY = "binary"
+AUDIO_BASE64 = "base64"
+
+
+def protocol_frame(frame_type: str, **fields) -> str:
+    """Serializuje ramkę protokołu (typ, wersja, timestamp + pola)"""
+    frame: Dict[str, Any] = {"type": frame_type, "v": PROTOCOL_VERSION}
+    frame.update(fields)
+    frame.setdefault("timestamp", datetime.now().isoformat())
+    return json.dumps(frame, ensure_ascii=False)
+
+
+def parse_client_message(message) -> Optional[Dict[str, Any]]:
+    """
+    Normalizuje wiadomość klienta do {"type": ..., ...}
+
+    Obsługuje wszystkie formaty używane przez istniejące UI: {"type": "message",
+    "content"}, {"message"}, ping, dowolny słownik z wartością tekstową
+    oraz zwykły tekst (np. klient UE5).
+    """
+    try:
+        data = json.loads(message)
+    except (json.JSONDecodeError, TypeError):
+        return {"type": "message", "content": message}
+
+    if not isinstance(data, dict):
+        return {"type": "message", "content": message}
+
+    frame_type = data.get("type")
+    if frame_type == "message":
+        return {"type": "message", "content": data.get("content", "")}
+    if data.get("message"):
+        return {"type": "message", "content": data["message"]}
+    if frame_type in ("ping", "hello", "audio_start", "audio_end"):
+        return data
+
+    # Pierwsza niepusta wartość tekstowa jako treść wiadomości
+    for value in data.values():
+        if isinstance(value, str) and value.strip():
+            return {"type": "message", "content": value}
+    return None
+
+
+class GatewayConnection:
+    """Połączenie klienta z bramką - jedyne miejsce, które pisze do socketu"""
+
+    def __init__(self, websocket, query: Dict[str, str]):
+        self.websocket = websocket
+        self.query = query
+        self.session_id: Optional[str] = query.get("session_id")
+        self.user_id: Optional[str] = query.get("user_id")
+        self.audio_mode = AUDIO_BINARY if query.get("audio") == AUDIO_BINARY else AUDIO_BASE64
+        # Stan backendu powiązany z połączeniem
+        self.state: Dict[str, Any] = {}
+        # Tury tekstowe i głosowe jednego połączenia nie nakładają się
+        self.turn_lock = asyncio.Lock()
+        self.speech_stream = None
+        self.voice_turns: Set[asyncio.Task] = set()
+
+    @property
+    def remote_address(self):
+        return getattr(self.websocket, "remote_address", None)
+
+    @property
+    def compression(self) -> Optional[str]:
+        """Wynegocjowane rozszerzenie kompresji (lub None)"""
+        response = getattr(self.websocket, "response", None)
+        if response is not None:
+            header = response.headers.get("Sec-WebSocket-Extensions", "")
+            return "permessage-deflate" if "permessage-deflate" in header else None
+        extensions = getattr(self.websocket, "extensions", None) or []
+        return "permessage-deflate" if extensions else None
+
+    async def send(self, message):
+        """Surowa ramka (kompatybilność z kodem piszącym wprost do websocket)"""
+        await self.websocket.send(message)
+
+    async def send_frame(self, frame_type: str, **fields):
+        await self.websocket.send(protocol_frame(frame_type, **fields))
+
+    async def send_audio(self, audio: bytes, audio_format: str = "mp3", text: str = "", **fields):
+        """
+        Wysyła audio w trybie wynegocjowanym przez klienta
+
+        binary: ramka nagłówka JSON, potem jedna ramka binarna z surowymi bajtami
+        base64: pojedyncza ramka JSON (zgodna ze starymi interfejsami)
+        """
+        if self.audio_mode == AUDIO_BINARY:
+            await self.send_frame("audio", format=audio_format, text=text,
+                                  bytes=len(audio), binary=True, **fields)
+            await self.websocket.send(audio)
+        else:
+            await self.send_frame("audio", format=audio_format, text=text,
+                                  data=base64.b64encode(audio).decode("ascii"), **fields)
+
+
+class AgentBackend:
+    """
+    Interfejs agenta podłączanego do bramki
+
+    Backend dostaje znormalizowane wiadomości tekstowe i odpowiada przez
+    GatewayConnection (send_frame / send_audio).
+    """
+
+    name = "Agent"
+    welcome_message = "🤖 Agent gotowy do pracy!"
+    features: List[str] = []
+
+    async def on_connect(self, conn: GatewayConnection):
+        """Nowe połączenie (przed ramką powitalną) - np. powiązanie z sesją"""
+
+    async def handle_message(self, conn: GatewayConnection, text: str):
+        """Jedna wiadomość tekstowa użytkownika"""
+        raise NotImplementedError
+
+    async def handle_audio(self, conn: GatewayConnection, chunk: bytes):
+        """Binarna ramka audio, gdy rozpoznawanie mowy bramki jest wyłączone"""
+        await conn.send_frame("error", message="Ten agent nie obsługuje wejścia audio")
+
+    async def handle_control(self, conn: GatewayConnection, frame: Dict[str, Any]):
+        """Ramki sterujące nieobsłużone przez bramkę (własne typy klienta)"""
+
+    async def on_disconnect(self, conn: GatewayConnection):
+        """Rozłączenie klienta - zwolnienie sesji"""
+
+
+class ConversationBackend(AgentBackend):
+    """Adapter dla agentów z metodą run_conversation(text, websocket)"""
+
+    def __init__(self, agent, name: str, welcome_message: str, features: Optional[List[str]] = None):
+        self.agent = agent
+        self.name = name
+        self.welcome_message = welcome_message
+        self.features = features or []
+
+    async def handle_message(self, conn: GatewayConnection, text: str):
+        logger.debug("💬 %s: wiadomość (%d znaków)", self.name, len(text))
+        # Agent wysyła response_chunk/response_complete i audio przez połączenie
+        await self.agent.run_conversation(text, conn)
+
+    async def on_disconnect(self, conn: GatewayConnection):
+        end_conversation = getattr(self.agent, "end_conversation", None)
+        if end_conversation:
+            await end_conversation(conn)
+
+
+class WebSocketGateway:
+    """Jedna pętla accept dla dowolnego AgentBackend"""
+
+    def __init__(self, backend: AgentBackend, speech_input=None):
+        self.backend = backend
+        self.server = None
+        self.connections: Dict[Any, GatewayConnection] = {}
+        # Rozpoznawanie mowy (speech_stream.SpeechInput) tworzone przy pierwszym audio
+        self.speech_input = speech_input
+        self.speech_enabled = os.getenv("STT_ENABLED", "1").lower() not in ("0", "false", "no")
+
+    @staticmethod
+    def _connection_query(websocket) -> Dict[str, str]:
+        """Parametry query string z żądania otwierającego WebSocket"""
+        request = getattr(websocket, "request", None)
+        path = getattr(request, "path", None) or getattr(websocket, "path", "") or ""
+        return {key: values[0] for key, values in parse_qs(urlparse(path).query).items()}
+
+    async def _welcome(self, conn: GatewayConnection):
+        await conn.send_frame(
+            "welcome",
+            message=self.backend.welcome_message,
+            content=self.backend.welcome_message,
+            agent=self.backend.name,
+            features=self.backend.features,
+            session_id=conn.session_id,
+            protocol={
+                "version": PROTOCOL_VERSION,
+                "audio": conn.audio_mode,
+                "compression": conn.compression,
+                "speech_input": self.speech_enabled,
+            }
+        )
+
+    async def _dispatch(self, conn: GatewayConnection, message):
+        if isinstance(message, bytes):
+            if not self.speech_enabled:
+                await self.backend.handle_audio(conn, message)
+                return
+            if conn.speech_stream is None:
+                # Audio bez audio_start (albo po błędzie strumienia) - ostatnie opcje lub LINEAR16 16 kHz
+                await self._start_speech(conn, conn.state.get("speech_options", {}),
+                                         header=conn.state.pop("speech_header", None))
+            if conn.speech_stream is not None:
+                conn.speech_stream.push(message)
+            return
+
+        frame = parse_client_message(message)
+        if frame is None:
+            logger.warning("⚠️ Nieznany format wiadomości od %s", conn.remote_address)
+            return
+
+        frame_type = frame.get("type")
+        if frame_type == "message":
+            async with conn.turn_lock:
+                await self.backend.handle_message(conn, frame.get("content", ""))
+        elif frame_type == "ping":
+            await conn.send_frame("pong")
+        elif frame_type == "hello":
+            # Renegocjacja trybu audio po połączeniu (klienci bez query string)
+            if frame.get("audio") in (AUDIO_BINARY, AUDIO_BASE64):
+                conn.audio_mode = frame["audio"]
+            await self._welcome(conn)
+        elif frame_type == "audio_start" and self.speech_enabled:
+            await self._start_speech(conn, frame)
+        elif frame_type == "audio_end" and conn.speech_stream is not None:
+            conn.speech_stream.finish()
+            conn.speech_stream = None
+        else:
+            await self.backend.handle_control(conn, frame)
+
+    # === Wejście głosowe (streaming STT) ===
+
+    async def _start_speech(self, conn: GatewayConnection, options: Dict[str, Any], header: Optional[bytes] = None):
+        """Otwiera strumień rozpoznawania mowy (ramka audio_start: encoding, sample_rate, language)"""
+        if self.speech_input is None:
+            try:
+                from speech_stream import SpeechInput
+            except ImportError as e:
+                logger.warning("⚠️ Rozpoznawanie mowy niedostępne: %s", e)
+                self.speech_enabled = False
+                await conn.send_frame("error", message="Wejście głosowe jest niedostępne")
+                return
+            self.speech_input = SpeechInput()
+
+        if conn.speech_stream is not None:
+            await conn.speech_stream.close()
+        conn.state["speech_options"] = options
+        if header is None:
+            # Nowe nagranie (audio_start) ma własny nagłówek kontenera
+            conn.state.pop("speech_header", None)
+
+        async def on_interim(text: str, stability: float):
+            await conn.send_frame("transcript", text=text, final=False, stability=round(stability, 2))
+
+        async def on_final(text: str):
+            await conn.send_frame("transcript", text=text, final=True)
+            # Tura startuje od razu po endpointingu - strumień audio dalej jest odbierany
+            task = asyncio.create_task(self._voice_turn(conn, text))
+            conn.voice_turns.add(task)
+            task.add_done_callback(conn.voice_turns.discard)
+
+        async def on_error(error: Exception):
+            # Martwy strumień nie przyjmuje audio - następna ramka otworzy nowy z tymi samymi opcjami
+            if conn.speech_stream is stream:
+                conn.speech_stream = None
+                # To samo nagranie Ogg/WebM leci dalej - nowy strumień potrzebuje jego nagłówka
+                if stream.header:
+                    conn.state["speech_header"] = stream.header
+            try:
+                await conn.send_frame("error", message="Błąd rozpoznawania mowy - spróbuj powiedzieć to jeszcze raz")
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
+        try:
+            stream = conn.speech_stream = self.speech_input.open_stream(options, on_interim, on_final, on_error,
+                                                                         header)
+        except ValueError as e:
+            await conn.send_frame("error", message=str(e))
+            return
+        conn.speech_stream.start()
+
+    async def _voice_turn(self, conn: GatewayConnection, text: str):
+        try:
+            async with conn.turn_lock:
+                await self.backend.handle_message(conn, text)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.exception("❌ Błąd tury głosowej: %s", e)
+
+    async def handle_client(self, websocket):
+        """Obsługa jednego połączenia (sygnatura websockets>=10: tylko websocket)"""
+        conn = GatewayConnection(websocket, self._connection_query(websocket))
+        self.connections[websocket] = conn
+        CONNECTED_CLIENTS.labels(self.backend.name).inc()
+        logger.info("🔗 %s: nowe połączenie %s", self.backend.name, conn.remote_address)
+
+        try:
+            await self.backend.on_connect(conn)
+            await self._welcome(conn)
+
+            async for message in websocket:
+                try:
+                    await self._dispatch(conn, message)
+                except websockets.exceptions.ConnectionClosed:
+                    raise
+                except Exception as e:
+                    logger.exception("❌ Błąd obsługi wiadomości: %s", e)
+                    await conn.send_frame("error", message=f"Błąd: {str(e)}")
+
+        except websockets.exceptions.ConnectionClosed:
+            logger.info("🔌 %s: połączenie zamknięte", self.backend.name)
+        except Exception as e:
+            logger.exception("Nieoczekiwany błąd połączenia: %s", e)
+        finally:
+            self.connections.pop(websocket, None)
+            CONNECTED_CLIENTS.labels(self.backend.name).dec()
+            if conn.speech_stream is not None:
+                await conn.speech_stream.close()
+            for task in list(conn.voice_turns):
+                task.cancel()
+            try:
+                await self.backend.on_disconnect(conn)
+            except Exception as e:
+                logger.debug("Błąd zamykania połączenia: %s", e)
+
+    async def start(self, host: str = "localhost", port: int = 8765, reuse_port: bool = False):
+        """Uruchamia serwer i zwraca go (nie blokuje)"""
+        extra_options = {}
+        if reuse_port:
+            # Kilka procesów nasłuchuje na tym samym porcie (tryb --workers)
+            extra_options["reuse_port"] = True
+
+        # permessage-deflate negocjowany z klientem; WS_COMPRESSION=0 wyłącza (np. za proxy kompresującym)
+        compression = "deflate" if os.getenv("WS_COMPRESSION", "1").lower() not in ("0", "false", "no") else None
+
+        self.server = await websockets.serve(
+            self.handle_client,
+            host,
+            port,
+            compression=compression,
+            max_size=int(os.getenv("WS_MAX_MESSAGE_BYTES", str(4 * 1024 * 1024))),
+            ping_interval=20,
+            ping_timeout=60,
+            **extra_options
+        )
+        logger.info("🚀 %s na ws://%s:%d (protokół v%d, kompresja: %s)",
+                    self.backend.name, host, port, PROTOCOL_VERSION, compression or "brak")
+        # /metrics dla tego procesu (AGENT_METRICS_PORT)
+        start_metrics_server()
+        return self.server
+
+    async def serve_forever(self, host: str = "localhost", port: int = 8765, reuse_port: bool = False):
+        """Uruchamia serwer i czeka na jego zamknięcie"""
+        await self.start(host, port, reuse_port)
+        await self.server.wait_closed()
+
+    def stop(self):
+        if self.server:
+            self.server.close()